@@ -7,6 +7,9 @@ import sys
 import subprocess
 import numpy as np
 import glob
+import shutil
+import time
+import re
 import exoplasim.gcmt 
 import exoplasim.pyburn
 import exoplasim.filesupport
@@ -16,6 +19,16 @@ import exoplasim.makestellarspec
 import exoplasim.surfacespecs
 import exoplasim.constants
 from exoplasim.constants import *
+import exoplasim.buildcache
+import exoplasim.inputcache
+import exoplasim.boundaries
+import exoplasim.telemetry
+import exoplasim.diagnostics
+import exoplasim.checkpoints
+import exoplasim.restartfile
+import exoplasim.ensemble
+import exoplasim.monitor
+from exoplasim.ensemble import Ensemble
 try:
   import exoplasim.pRT
 except:
@@ -51,6 +64,54 @@ def _noneparse(text,dtype):
     else:
         return dtype(text)
     
+def _linkfile(src,dest):
+    '''Hard-link src to dest, falling back to a symlink and then a copy.'''
+    if os.path.lexists(dest):
+        os.remove(dest)
+    try:
+        os.link(src,dest)
+    except OSError:
+        try:
+            os.symlink(os.path.abspath(src),dest)
+        except OSError:
+            shutil.copy2(src,dest)
+    
+def _stageinputs(source,workdir,executable):
+    '''Populate a work directory with links to static inputs and copies of everything else.
+    
+    Boundary condition files (.sra) and the executable are never modified in place by ExoPlaSim,
+    so they can be shared between many work directories. Namelists and everything else get
+    edited by :py:func:`Model.configure <exoplasim.Model.configure>`, so they are copied.
+    '''
+    for item in glob.glob(source+"/*"):
+        if not os.path.isfile(item):
+            continue
+        dest = workdir+"/"+os.path.basename(item)
+        if item[-4:]==".sra" or item[-2:]==".x":
+            _linkfile(item,dest)
+        else:
+            shutil.copy2(item,dest)
+    _linkfile(executable,workdir+"/"+os.path.basename(executable))
+    
+def _forkinputs(parentdir,childdir,skip=()):
+    '''Populate a forked model's work directory from its parent's.
+    
+    Outputs, checkpoints, and PlaSim's scratch files are left behind, and the restart file is
+    written separately. Boundary files, the executable, and anything the parent already shares
+    through a link are linked; everything else (namelists, logs) is copied, since it may be edited.
+    '''
+    scratch = ("plasim_restart","plasim_status","plasim_output","plasim_snapshot",
+               "plasim_hcadence","plasim_diag","Abort_Message")
+    for item in glob.glob(parentdir+"/*"):
+        name = os.path.basename(item)
+        if not os.path.isfile(item) or name[:4]=="MOST" or name in scratch or name in skip:
+            continue
+        dest = childdir+"/"+name
+        if name[-4:] in (".sra",".srb") or name[-2:]==".x" or os.stat(item).st_nlink>1:
+            _linkfile(item,dest)
+        else:
+            shutil.copy2(item,dest)
+    
 #def readsourcepath():
     #with open("sourcepath","r") as sf:
         #spth = sf.read()
@@ -313,6 +374,43 @@ class Model(object):
         If True, uses the --use-hwthread-cpus flag when calling the mpi executable
     mpi_opts : str, optional
         String of any additional keywords/flags that should be passed to mpiexec/mpirun
+    linkinputs : bool, optional
+        If True, the executable and static boundary files (.sra) are hard-linked (or symlinked,
+        if hard links are not possible) into the working directory instead of copied. Namelists
+        are always copied, since they are edited in place. Useful when many models share the
+        same inputs, e.g. in an :py:class:`Ensemble <exoplasim.ensemble.Ensemble>`.
+    buildcache : bool, optional
+        If True, take the executable from the content-addressed build cache in
+        :py:mod:`exoplasim.buildcache`, compiling it there if necessary. Builds are keyed on
+        resolution, layers, ncpus, precision, compiler flags, and a digest of the source tree,
+        so variants never overwrite each other, and concurrent Model construction is safe.
+        Only an explicit ``recompile=True`` forces a rebuild.
+    binaryboundaries : bool, optional
+        If True, boundary condition files (.sra) in the working directory are converted to
+        unformatted binary (.srb) files before each year is run, so PlaSim can read them without
+        parsing text. The .sra files remain the reference copies; binary files are refreshed
+        whenever they change. See :py:mod:`exoplasim.boundaries`.
+    inputcache : bool, optional
+        If True, stellar spectra, land and topography maps, and other resources given to
+        :py:func:`configure <exoplasim.Model.configure>` are stored once in the content-addressed
+        :py:mod:`input cache <exoplasim.inputcache>` and linked into the working directory,
+        instead of being copied into every working directory.
+    restartschedule : sequence of (int, int) pairs, optional
+        Retention schedule for the yearly restart files (``MOST_REST.XXXXX``), as
+        ``(span, interval)`` pairs counted back from the most recent year, e.g.
+        :py:data:`exoplasim.checkpoints.SCHEDULE` keeps every year for the last 10 years, every
+        10th year for the 100 before that, and every 100th year after that. By default, every
+        restart file is kept. See :py:mod:`exoplasim.checkpoints`.
+    compressrestarts : bool, optional
+        If True, restart files are gzip-compressed as they are saved.
+    healthmonitor : bool or dict, optional
+        If True, PlaSim's raw output and diagnostics are checked every few seconds while each
+        year runs, and PlaSim is stopped as soon as surface temperature or temperature become
+        non-finite, surface temperature leaves physical bounds, or the diagnostics print NaN or
+        Infinity. The year is then treated as a crash (so with ``crashtolerant``, the model rolls
+        back and tries again), without waiting for the year to finish. A dict of
+        {code: (lower, upper)} checks those variable codes instead (None for no bound). See
+        :py:mod:`exoplasim.monitor`.
         
     Returns
     -------
@@ -355,12 +453,22 @@ class Model(object):
     def __init__(self,resolution="T21",layers=10,ncpus=4,precision=8,debug=False,inityear=0,
                 recompile=False,optimization=None,mars=False,workdir="most",source=None,force991=False,
                 modelname="MOST_EXP",outputtype=".npz",crashtolerant=False,outputfaulttolerant=False,
-                hyperthreading=True,mpi_opts=None):
+                hyperthreading=True,mpi_opts=None,linkinputs=False,buildcache=False,
+                binaryboundaries=False,inputcache=False,restartschedule=None,compressrestarts=False,
+                healthmonitor=False):
         
         global sourcedir
         
+        forcerebuild = recompile #Only an explicit request should bypass the build cache
+        
         #self.burn7 = burn7
         self.mars = mars
+        self.precision = precision
+        self.binaryboundaries = binaryboundaries
+        self.inputcache = inputcache
+        self.restartschedule = restartschedule
+        self.compressrestarts = compressrestarts
+        self.healthmonitor = healthmonitor
         
         self.extension = outputtype
         self.extensions = {"regular"     : self.extension,
@@ -489,6 +597,7 @@ class Model(object):
         self.modelname=modelname
         self.cleaned=False
         self.recursecheck=False
+        self.profiling=None
         
         if debug or optimization: #There is no need to set these for precompiled binaries
             recompile=True
@@ -556,7 +665,13 @@ class Model(object):
         
         print("Checking for %s...."%self.executable)
         
-        if recompile or not os.path.exists(self.executable):
+        if buildcache:
+            self.executable = exoplasim.buildcache.getexecutable(self.nsp,self.layers,self.ncpus,
+                                                                 precision=precision,debug=debug,
+                                                                 optimization=optimization,
+                                                                 mars=self.mars,force991=force991,
+                                                                 rebuild=forcerebuild)
+        elif recompile or not os.path.exists(self.executable):
             extraflags = ""
             if debug:
                 extraflags+= "-d "
@@ -573,12 +688,15 @@ class Model(object):
                     extraflags+" &&"+
                     "cd $cwd")
         
-        os.system("cp %s/* %s/"%(source,self.workdir))
-        #if self.burn7:
-            #os.system("cp %s/burn7.x %s/"%(burnsource,self.workdir))
-        
-        #Copy the executable to the working directory, and then CD there
-        os.system("cp %s %s"%(self.executable,self.workdir))
+        if linkinputs:
+            _stageinputs(source,self.workdir,self.executable)
+        else:
+            os.system("cp %s/* %s/"%(source,self.workdir))
+            #if self.burn7:
+                #os.system("cp %s/burn7.x %s/"%(burnsource,self.workdir))
+            
+            #Copy the executable to the working directory, and then CD there
+            os.system("cp %s %s"%(self.executable,self.workdir))
         #os.chdir(self.workdir)
         
         self.executable = self.executable.split("/")[-1] #Strip off all the preceding path
@@ -618,63 +736,81 @@ class Model(object):
                 print(e)
                 self._crash()
     
+    def profile(self,enable=True,cprofile=False,memory=False,logfile=None):
+        """Record where the walltime goes in each model year.
+
+        While enabled, every year run with :py:func:`run <exoplasim.Model.run>` or
+        :py:func:`runtobalance <exoplasim.Model.runtobalance>` is written as one JSON line to
+        a timing log, with the time spent running PlaSim, in each stage of the postprocessor
+        (reading, spectral transforms, deriving variables, time-averaging, and writing), in
+        integrity checks, and in file handling. Energy balance checks and pRT calls made outside
+        the year are logged as their own lines. See :py:mod:`exoplasim.telemetry`.
+
+        Parameters
+        ----------
+        enable : bool, optional
+            Turn timing on (True) or off (False).
+        cprofile : bool, optional
+            Also save a cProfile dump of each year, in ``profiles/`` next to the log.
+        memory : bool, optional
+            Also record the peak memory allocated in Python during each year (via tracemalloc).
+            This slows the postprocessor down noticeably.
+        logfile : str, optional
+            Log to write. Defaults to ``timing.log`` in the model's work directory.
+        """
+        if not enable:
+            self.profiling = None
+            exoplasim.telemetry.disable()
+            return
+        if logfile is None:
+            logfile = self.workdir+"/timing.log"
+        self.profiling = {"logfile":logfile,"cprofile":cprofile,"memory":memory}
+        exoplasim.telemetry.enable(**self.profiling)
+
+    def diagnostics(self):
+        """Return PlaSim's diagnostic output for every year run so far, as arrays.
+
+        Each year's ``MOST_DIAG`` file is parsed once (see :py:mod:`exoplasim.diagnostics`) and
+        the result kept in ``diagnostics.npz`` in the work directory, so repeated calls only
+        read that store.
+
+        Returns
+        -------
+        dict
+            Arrays with one row per year, keyed by quantity (e.g. "year", "secondsperyear",
+            "cputime", "memory", "distancemodulus", "ta"). Years run with
+            :py:func:`runtobalance() <exoplasim.Model.runtobalance>` also record "hfns" and "ntr".
+        """
+        storename = self.workdir+"/diagnostics.npz"
+        store = exoplasim.diagnostics.load(storename)
+        known = set(store["year"])
+        updated = False
+        for diagfile in sorted(glob.glob(self.workdir+"/MOST_DIAG.*")):
+            try:
+                year = int(diagfile.split(".")[-1])
+            except ValueError:
+                continue
+            if year not in known:
+                exoplasim.diagnostics.ingest(diagfile,storename,year)
+                updated = True
+        if updated:
+            store = exoplasim.diagnostics.load(storename)
+        return store
+
     def _checktimes(self):
         """Get list of durations for each year computed so far."""
-        diagfiles = sorted(glob.glob(self.workdir+"/*DIAG*"))
-        times = []
-        for df in diagfiles:
-            with open(df,"r") as diagf:
-                diag = diagf.read().split("\n")
-            elapsed=1.0e6 #Assume a large value so we stop if there's a problem.
-            found=False
-            for ln in range(len(diag)-1,-1,-1):
-                if "Seconds per sim year" in diag[ln]:
-                    elapsed = float(diag[ln].split(":")[1].split("*")[0].strip()) #seconds
-                    found=True
-                    break
-            if not found:
-                for ln in range(len(diag)-1,-1,-1):
-                    if "Minutes per sim year" in diag[ln]:
-                        try:
-                            elapsed =diag[ln].split('year')
-                            elapsed = elapsed[1].split("*")
-                            elapsed = elapsed[0].strip()
-                            elapsed = float(elapsed)*60.0 
-                                                                                #seconds
-                        except:
-                            raise 
-                        found=True
-                        break
-                
-            times.append(elapsed/60.0)
-        return times
-            
+        elapsed = self.diagnostics().get("secondsperyear",np.zeros(0))
+        #Assume a large value so we stop if there's a problem.
+        return list(np.where(np.isfinite(elapsed),elapsed,1.0e6)/60.0)
     
     def _checktime(self,year=-1):
         """Get walltime duration for a given year of output."""
-        diagfiles = sorted(glob.glob(self.workdir+"/*DIAG*"))
-        recent = diagfiles[year]
-        with open(recent,"r") as diagf:
-            diag = diagf.read().split("\n")
-        elapsed=1.0e6 #Assume a large value so we stop if there's a problem.
-        found=False
-        for ln in range(len(diag)-1,-1,-1):
-            if "Seconds per sim year" in diag[ln]:
-                elapsed = float(diag[ln].split(":")[1].split("*")[0].strip()) #seconds
-                found=True
-                break
-        if not found:
-            for ln in range(len(diag)-1,-1,-1):
-                if "Minutes per sim year" in diag[ln]:
-                    elapsed = float(diag[ln].split(":")[1].split("*")[0].strip())*60.0 
-                                                                            #seconds
-                    found=True
-                    break
-        return elapsed/60.0 #convert to minutes
+        return self._checktimes()[year]
         
         
     def runtobalance(self,threshold = None,baseline=50,maxyears=300,minyears=75,
-                    timelimit=None,crashifbroken=True,clean=True,diagnosticvars=None):
+                    timelimit=None,crashifbroken=True,clean=True,diagnosticvars=None,
+                    margin=0.05):
         """ Run the model until energy balance equilibrium is reached at the top and surface.
             
         Parameters
@@ -692,9 +828,13 @@ class Model(object):
             The minimum number of years to run before determining that the model is in
             equilibrium.
         timelimit : float, optional
-            If set, maxyears will be revised each year based on the average minutes
-            per year thus far, to try to avoid going over the time limit, which should
-            be given in minutes.
+            If set, the walltime (in minutes, counted from when this method is called) that
+            the run must fit within. The time taken by each year (running the model, moving
+            files, postprocessing, and analysis) is recorded in a
+            :py:class:`Telemetry <exoplasim.telemetry.Telemetry>` store, and before each year
+            a :py:class:`Scheduler <exoplasim.telemetry.Scheduler>` forecasts whether another
+            year will fit, keeping a safety margin in reserve. If not, the model is saved
+            (see :py:func:`save <exoplasim.Model.save>`) and the run stops, ready to be resumed.
         crashifbroken : bool, optional
             True/False. If True, Pythonic error handling is enabled. Default True.
         clean : bool, optional
@@ -702,6 +842,8 @@ class Model(object):
         diagnosticvars : array-like, optional
             List of output variables for which global annual means should be computed and
             printed to standard output each year.
+        margin : float, optional
+            Fraction of timelimit to hold in reserve (at least one minute) for stopping cleanly.
 
         Returns
         -------
@@ -713,13 +855,19 @@ class Model(object):
             self.threshold = threshold
         ogrunlimit = runlimit
         ogminyears = minyears
-        runstart = self.currentyear
         if os.getcwd()!=self.workdir:
             os.chdir(self.workdir)
         os.system("mkdir snapshots")
         if self.highcadence["toggle"]:
             os.system("mkdir highcadence")
         os.system("rm %s/runtimes.log"%self.workdir) #We only want runtimes for this run
+        self.telemetry = exoplasim.telemetry.Telemetry(self.workdir)
+        if timelimit:
+            scheduler = exoplasim.telemetry.Scheduler(self.telemetry,timelimit,margin=margin)
+        if getattr(self,"profiling",None) is not None:
+            exoplasim.telemetry.enable(**self.profiling)
+        exoplasim.telemetry.reset() #Drop anything left open by an earlier crash
+        exoplasim.telemetry.setcontext(model=self.modelname,year=self.currentyear)
             
             
         #Not balanced, but have run more than minyears: (True+False)*True= True
@@ -729,28 +877,33 @@ class Model(object):
         #Balanced, and ran more than minyears:          (False+False)*True=False
         while (not self._isbalanced(threshold=self.threshold,baseline=baseline) \
                 or self.currentyear<minyears) and self.currentyear<runlimit:
+            if timelimit and not scheduler.canrun():
+                os.system("echo 'stopping at year %d with %1.1f minutes left; %1.1f minutes/year'>>%s/limits.log"%(self.currentyear,(scheduler.deadline-time.time())/60.0,scheduler.forecast(1)/60.0,self.workdir))
+                print("Stopping before year %d to stay within the time limit."%self.currentyear)
+                self.save() #Checkpoint; plasim_restart already holds the start of the next year
+                break
+            
+            yearspan = exoplasim.telemetry.start("model.year")
             dataname="MOST.%05d"%self.currentyear
             snapname="MOST_SNAP.%05d"%self.currentyear
             hcname  ="MOST_HC.%05d"%self.currentyear
             diagname="MOST_DIAG.%05d"%self.currentyear
-            restname="MOST_REST.%05d"%self.currentyear
             snowname="MOST_SNOW.%05d"%self.currentyear
             stormname="MOST.%05d.STORM"%self.currentyear
             
+            if getattr(self,"binaryboundaries",False):
+                exoplasim.boundaries.syncbinary(self.workdir,precision=self.precision)
+            
             runerror = True
             failed_postprocess = False
             
             #Run ExoPlaSim
             try:
-                if float(sys.version[:3])>=3.5 and float(sys.version[:3])<3.7:
-                    subprocess.run([self._exec+self.executable],shell=True,check=True)
-                elif float(sys.version[:3])>=3.7:
-                    subprocess.run([self._exec+self.executable],shell=True,check=True,
-                                   capture_output=True)
-                else:
-                    stat = os.system(self._exec+self.executable)
-                    if stat!=0:
-                        raise Exception("runtime crash")
+                tstart = time.time()
+                plasimspan = exoplasim.telemetry.start("model.plasim")
+                self._runplasim()
+                exoplasim.telemetry.stop(plasimspan)
+                tmodel = time.time()
             
                 #Sort, categorize, and arrange the various outputs
                 os.system("[ -e restart_dsnow ] && rm restart_dsnow")
@@ -768,15 +921,14 @@ class Model(object):
                     print("[ -e plasim_hcadence ] && mv plasim_hcadence "+hcname)
                 os.system("[ -e plasim_diag ] && mv plasim_diag "+diagname)
                 print("[ -e plasim_diag ] && mv plasim_diag "+diagname)
-                os.system("[ -e plasim_status ] && cp plasim_status plasim_restart")
-                print("[ -e plasim_status ] && cp plasim_status plasim_restart")
-                os.system("[ -e plasim_status ] && mv plasim_status "+restname)
-                print("[ -e plasim_status ] && mv plasim_status "+restname)
+                self._checkpoint()
                 os.system("[ -e restart_snow ] && mv restart_snow "+snowname)
                 print("[ -e restart_snow ] && mv restart_snow "+snowname)
                 os.system("[ -e hurricane_indicators ] && mv hurricane_indicators "+stormname)
                 print("[ -e hurricane_indicators ] && mv hurricane_indicators "+stormname)
                 
+                tio = time.time()
+                
                 #Do any additional work
                 timeavg=0
                 snapsht=0
@@ -799,6 +951,7 @@ class Model(object):
                     if self.crashtolerant or self.outputfaulttolerant:
                         raise #We actually need to get out of here before the cleanup routines kick in
                     self._crash()
+                tpost = time.time()
                 if diagnosticvars is not None:
                     print("Diagnostics for year %d:"%self.currentyear)
                     for dv in diagnosticvars:
@@ -806,6 +959,7 @@ class Model(object):
                             print("\t%9s:\t%f"%(dv,self.inspect(dv,year=-1,savg=True,tavg=True)))
                         except:
                             print("\tError computing global annual mean for variable %s"%dv)
+                tdiag = time.time()
                 if clean:
                     if timeavg:
                         os.system("rm %s"%dataname)
@@ -813,6 +967,7 @@ class Model(object):
                         os.system("rm %s"%snapname)
                     if highcdn:
                         os.system("rm %s"%hcname)
+                tclean = time.time()
                     
                 if os.path.exists("Abort_Message"): #We need to stop RIGHT NOW
                     if self.crashtolerant: #get out right now before the cleanup routines start
@@ -834,35 +989,30 @@ class Model(object):
                 self.currentyear += 1
                 sb = self.getbalance("hfns")
                 tb = self.getbalance("ntr")
+                try:
+                    exoplasim.diagnostics.ingest(diagname,self.workdir+"/diagnostics.npz",
+                                                 self.currentyear-1,hfns=sb,ntr=tb)
+                except Exception as e:
+                    print("Could not record diagnostics: %s"%e)
                 os.system("echo '%02.6f  %02.6f'>>%s/balance.log"%(sb,tb,self.workdir))
                 
+                tend = time.time()
+                timing = self.telemetry.record(self.currentyear-1,model=tmodel-tstart,
+                                               io=(tio-tmodel)+(tclean-tdiag),
+                                               postprocess=tpost-tio,
+                                               analysis=(tdiag-tpost)+(tend-tclean))
+                os.system("echo '%1.3f minutes'>>%s/runtimes.log"%(timing["total"]/60.0,self.workdir))
+                
                 if timelimit:
-                    avgyear = self._checktimes() #get how long it took to run each year
-                    os.system("echo '%1.3f minutes'>>%s/runtimes.log"%(avgyear[-1],self.workdir))
-                    currentyears = np.loadtxt("%s/runtimes.log"%self.workdir,usecols=[0,]) 
-                        #^Get how long it took to run each year of the current run
-                    currentavgyear = np.nanmean(currentyears) 
-                        #^Average walltime per year for this run
-                    runlimit = min(runstart + int(timelimit//currentavgyear),ogrunlimit)
-                    crunlimit = min(int(timelimit//currentavgyear),ogrunlimit-runstart)
-                                #options for the runlimit are N0+T/tau, where tau is avg year
-                    os.system("echo 'limit to %d years total; %d years this run'>>%s/limits.log"%(runlimit,crunlimit,self.workdir))
+                    crunlimit = scheduler.yearsleft()
+                    runlimit = min(self.currentyear + crunlimit,ogrunlimit)
+                    os.system("echo 'limit to %d years total; %d more years this run'>>%s/limits.log"%(runlimit,crunlimit,self.workdir))
                     minyears = min(ogminyears,runlimit)
                 
             except Exception as e:
                 if runerror:
                     if (self.crashtolerant and self.currentyear>=10):
-                        self.currentyear-=10
-                        os.system("cp MOST_REST.%05d plasim_restart"%self.currentyear)
-                        for n in range(self.currentyear+1,self.currentyear+10):
-                            os.system("rm MOST*%05d*"%n)
-                            os.system("rm snapshots/MOST*%05d*"%n)
-                            os.system("rm highcadence/MOST*%05d*"%n)
-                        os.system("rm plasim_status")
-                        os.system("rm plasim_output")
-                        os.system("rm plasim_hcadence")
-                        os.system("rm plasim_snapshot")
-                        self.currentyear+=1
+                        self.rollback(self.currentyear-10)
                     else:
                         print(e)
                         self._crash() #Bring in the cleaners
@@ -870,18 +1020,11 @@ class Model(object):
                     print("Failed to postprocess year %d!"%self.currentyear)
                     print(e)
                     print("Continuing on to year %d."%(self.currentyear+1))
-                    os.system("cp MOST_REST.%05d plasim_restart"%self.currentyear)
-                    for n in range(self.currentyear+1,self.currentyear+10):
-                        os.system("rm MOST*%05d*"%n)
-                        os.system("rm snapshots/MOST*%05d*"%n)
-                        os.system("rm highcadence/MOST*%05d*"%n)
-                    os.system("rm plasim_status")
-                    os.system("rm plasim_output")
-                    os.system("rm plasim_hcadence")
-                    os.system("rm plasim_snapshot")
-                    self.currentyear+=1
+                    self.rollback(self.currentyear)
                 else:
                     pass
+            exoplasim.telemetry.stop(yearspan)
+            exoplasim.telemetry.setcontext(year=self.currentyear)
             
             
         bott = self.gethistory(key="hfns")
@@ -936,20 +1079,23 @@ class Model(object):
         """
         files = sorted(glob.glob("%s/MOST*%s"%(self.workdir,self.extension)))
         dd=np.zeros(len(files))
+        grid = None
         for n in range(0,len(files)):
             if "_metadata" not in files[n]:
-                ncd = gcmt.load(files[n])
+                ncd = gcmt.load(files[n],cache=True)
                 variable = ncd.variables[key][:]
                 lon = ncd.variables['lon'][:]
                 lat = ncd.variables['lat'][:]
                 if len(variable.shape)>3:
                     variable = variable[:,layer,:,:]
-                dd[n] = gcmt.spatialmath(variable,lon=lon,lat=lat,
-                                        mean=mean,radius=self.radius)
+                if grid is None:
+                    grid = gcmt.getgrid(lat,lon,radius=self.radius)
+                dd[n] = gcmt.spatialmath(variable,mean=mean,grid=grid)
                 ncd.close()
         return dd
     
     
+    @exoplasim.telemetry.timed("model.isbalanced")
     def _isbalanced(self,threshold = 5.0e-4,baseline=50):
         """Return whether or not the model is in energy balance equilibrium
 
@@ -1032,28 +1178,29 @@ class Model(object):
         os.system("mkdir snapshots")
         if self.highcadence["toggle"]:
             os.system("mkdir highcadence")
+        if getattr(self,"profiling",None) is not None:
+            exoplasim.telemetry.enable(**self.profiling)
+        exoplasim.telemetry.reset() #Drop anything left open by an earlier crash
         for year in range(years):
+            exoplasim.telemetry.setcontext(model=self.modelname,year=self.currentyear)
+            yearspan = exoplasim.telemetry.start("model.year")
             dataname="MOST.%05d"%self.currentyear
             snapname="MOST_SNAP.%05d"%self.currentyear
             hcname  ="MOST_HC.%05d"%self.currentyear
             diagname="MOST_DIAG.%05d"%self.currentyear
-            restname="MOST_REST.%05d"%self.currentyear
             snowname="MOST_SNOW.%05d"%self.currentyear
             stormname="MOST.%05d.STORM"%self.currentyear
             
+            if getattr(self,"binaryboundaries",False):
+                exoplasim.boundaries.syncbinary(self.workdir,precision=self.precision)
+            
             failed_postprocess = False
             
             #Run ExoPlaSim
             try:
-                if float(sys.version[:3])>=3.5 and float(sys.version[:3])<3.7:
-                    subprocess.run([self._exec+self.executable],shell=True,check=True)
-                elif float(sys.version[:3])>=3.7:
-                    subprocess.run([self._exec+self.executable],shell=True,check=True,
-                                   capture_output=True)
-                else:
-                    stat = os.system(self._exec+self.executable)
-                    if stat!=0:
-                        raise Exception("runtime crash")
+                plasimspan = exoplasim.telemetry.start("model.plasim")
+                self._runplasim()
+                exoplasim.telemetry.stop(plasimspan)
             
                 #Sort, categorize, and arrange the various outputs
                 os.system("[ -e restart_dsnow ] && rm restart_dsnow")
@@ -1064,8 +1211,7 @@ class Model(object):
                 if self.highcadence["toggle"]:
                     os.system("[ -e plasim_hcadence ] && mv plasim_hcadence "+hcname)
                 os.system("[ -e plasim_diag ] && mv plasim_diag "+diagname)
-                os.system("[ -e plasim_status ] && cp plasim_status plasim_restart")
-                os.system("[ -e plasim_status ] && mv plasim_status "+restname)
+                self._checkpoint()
                 os.system("[ -e restart_snow ] && mv restart_snow "+snowname)
                 os.system("[ -e hurricane_indicators ] && mv hurricane_indicators "+stormname)
                 
@@ -1112,39 +1258,27 @@ class Model(object):
                             raise
                         print(e)
                         self._crash()
+                
+                try:
+                    exoplasim.diagnostics.ingest(diagname,self.workdir+"/diagnostics.npz",
+                                                 self.currentyear)
+                except Exception as e:
+                    print("Could not record diagnostics: %s"%e)
                     
                 self.currentyear += 1
             except Exception as e:
                 if self.crashtolerant and self.currentyear>=10:
                     print(self.currentyear,e)
-                    self.currentyear-=10
-                    os.system("cp MOST_REST.%05d plasim_restart"%self.currentyear)
-                    for n in range(self.currentyear+1,self.currentyear+10):
-                        os.system("rm MOST*%05d*"%n)
-                        os.system("rm snapshots/MOST*%05d*"%n)
-                        os.system("rm highcadence/MOST*%05d*"%n)
-                    os.system("rm plasim_status")
-                    os.system("rm plasim_output")
-                    os.system("rm plasim_hcadence")
-                    os.system("rm plasim_snapshot")
-                    self.currentyear+=1
+                    self.rollback(self.currentyear-10)
                 elif self.outputfaulttolerant and failed_postprocess:
                     print("Failed to postprocess year %d!"%self.currentyear)
                     print(e)
                     print("Continuing on to year %d."%(self.currentyear+1))
-                    os.system("cp MOST_REST.%05d plasim_restart"%self.currentyear)
-                    for n in range(self.currentyear+1,self.currentyear+10):
-                        os.system("rm MOST*%05d*"%n)
-                        os.system("rm snapshots/MOST*%05d*"%n)
-                        os.system("rm highcadence/MOST*%05d*"%n)
-                    os.system("rm plasim_status")
-                    os.system("rm plasim_output")
-                    os.system("rm plasim_hcadence")
-                    os.system("rm plasim_snapshot")
-                    self.currentyear+=1
+                    self.rollback(self.currentyear)
                 else:
                     print(e)
                     self._crash() #Bring in the cleaners
+            exoplasim.telemetry.stop(yearspan)
         os.chdir(odir)
                 
     
@@ -1279,6 +1413,7 @@ class Model(object):
                                 "smooth":smooth,
                                 "smoothweight": smoothweight}
     
+    @exoplasim.telemetry.timed("model.postprocess")
     def postprocess(self,inputfile,variables,ftype="regular",log="postprocess.log",
                     crashifbroken=False,transit=False,image=False,**kwargs):
         """    Produce NetCDF output from an input file, using a specified postprocessing namelist. 
@@ -1344,6 +1479,10 @@ class Model(object):
             #del pRTkwargs['transit']
             #del pRTkwargs['image']
             
+            if self._configuredpostprocessor[ftype]:
+                gcmt.invalidate(inputfile+self.extensions[ftype]) #Don't hold the old file open
+            else:
+                gcmt.invalidate(inputfile+self.extension)
             if variables is None and self._configuredpostprocessor[ftype]:
                 pyburn.postprocess(inputfile,inputfile+self.extensions[ftype],logfile=log,
                                    radius=self.radius,
@@ -1407,6 +1546,7 @@ class Model(object):
             return 0
         
         
+    @exoplasim.telemetry.timed("model.integritycheck")
     def integritycheck(self,ncfile): #MUST pass an output archive that contains surface temperature
         """    Check an output file to see it contains the expected variables and isn't full of NaNs.
             
@@ -1433,7 +1573,7 @@ class Model(object):
                 ioe = self.postprocess(ncfile[:-3],"example.nl",crashifbroken=False)
                 self.recursecheck=True
         if ioe:
-            ncd = gcmt.load(ncfile)
+            ncd = gcmt.load(ncfile,cache=True)
             try:
                 ts = ncd.variables["ts"][:]
             except:
@@ -1485,6 +1625,9 @@ class Model(object):
             if self.highcadence['toggle']:
                 os.system("cp -r %s/highcadence %s/highcadence"%(self.workdir,self.modelname))
             os.system("cp %s/MOST*DIAG* %s/"%(self.workdir,self.modelname))
+            os.system("[ -e %s/diagnostics.npz ] && cp %s/diagnostics.npz %s/"%(self.workdir,
+                                                                               self.workdir,
+                                                                               self.modelname))
             if keeprestarts:
                 os.system("cp %s/MOST_REST* %s/"%(self.workdir,self.modelname))
             #else:
@@ -1505,6 +1648,8 @@ class Model(object):
                 os.system("cp %s %s%s"%(metaoutputs[-1],self.modelname+"_metadata",self.extension))
             diags = sorted(glob.glob("%s/MOST*DIAG*"%self.workdir))
             os.system("cp %s %s.DIAG"%(diags[-1],self.modelname))
+            os.system("[ -e %s/diagnostics.npz ] && cp %s/diagnostics.npz %s_diagnostics.npz"%(
+                                                      self.workdir,self.workdir,self.modelname))
             if self.snapshots:
                 if self.extension==".npz" or self.extension==".npy":
                     metasnps = sorted(glob.glob("%s/*SNAP*metadata%s"%(self.workdir,self.extension)))
@@ -1528,13 +1673,14 @@ class Model(object):
                     os.system("cp %s %s_highcadence_metadata%s"%(metahcs[-1],self.modelname,
                                                               self.extension))
             if keeprestarts:
-                rsts = sorted(glob.glob("%s/MOST_REST*"%self.workdir))
-                os.system("cp %s %s_restart"%(rsts[-1],self.modelname))
+                exoplasim.checkpoints.restore(self.workdir,restartfile="%s/%s_restart"%(os.getcwd(),
+                                                                                       self.modelname))
             if clean:
                 newworkdir = os.getcwd()
                 self.cleaned=True
         os.system("cp %s/*.cfg %s/"%(self.workdir,outputdir))
         if clean:
+            gcmt.invalidate(self.workdir)
             os.system("rm -rf %s"%self.workdir)
             self.workdir = newworkdir
                 
@@ -1557,6 +1703,15 @@ class Model(object):
             An open netCDF4 data opject
         """
         #Note: if the work directory has been cleaned out, only the final year will be returned.
+        filename = self._outputfile(year,snapshot=snapshot,highcadence=highcadence)
+        if os.path.exists(filename):
+            ncd = gcmt.load(filename,cache=True)
+            return ncd
+        else:
+            raise RuntimeError("Output file %s not found."%filename)
+    
+    def _outputfile(self,year,snapshot=False,highcadence=False):
+        """Return the path to the output file for a given year."""
         if year<0:
             year+=self.currentyear
         if snapshot and not highcadence:
@@ -1572,11 +1727,7 @@ class Model(object):
                 name = "%s_highcadence%s"%(self.modelname,self.extension)
             else:
                 name = "%s%s"%(self.modelname,self.extension)
-        if os.path.exists(self.workdir+"/"+name):
-            ncd = gcmt.load(self.workdir+"/"+name)
-            return ncd
-        else:
-            raise RuntimeError("Output file %s not found."%(self.workdir+"/"+name))
+        return self.workdir+"/"+name
     
     def transit(self,year,times,inputfile=None,snapshot=True,highcadence=False,
                 h2o_linelist='Exomol',
@@ -1854,7 +2005,7 @@ class Model(object):
         return atm,output
         
     def inspect(self,variable,year=-1,ignoreNaNs=True,snapshot=False,
-                highcadence=False,savg=False,tavg=False,layer=None):
+                highcadence=False,savg=False,tavg=False,layer=None,threads=None):
         """Return a given output variable from a given year or list of years, with optional averaging parameters.
 
         Parameters
@@ -1880,6 +2031,9 @@ class Model(object):
             If specified and data has 3 spatial dimensions, extract the specified layer. If
             unspecified and data has 3 spatial dimensions, the vertical dimension will be
             preserved (even if spatial averages are being computed).
+        threads : int, optional
+            If multiple years are requested, read their files with this many threads at once.
+            See :py:func:`exoplasim.gcmt.loadseries`.
 
         Returns
         -------
@@ -1917,17 +2071,22 @@ class Model(object):
             
             var = ncd.variables[variable][:]
         else:
-            ncd = self.get(year[0],snapshot=snapshot,highcadence=highcadence)
-            var = ncd.variables[variable][:]
-            
-            for kyear in range(1,len(year)):
-                ncd = self.get(year[kyear],snapshot=snapshot,highcadence=highcadence)
-                var = np.append(var,ncd.variables[variable][:],axis=0) #Concatenate along time axis
+            files = [self._outputfile(kyear,snapshot=snapshot,highcadence=highcadence) 
+                     for kyear in year]
+            for filename in files:
+                if not os.path.exists(filename):
+                    raise RuntimeError("Output file %s not found."%filename)
+            var = gcmt.loadseries(files,variable,threads=threads) #Concatenate along time axis
+            ncd = self.get(year[-1],snapshot=snapshot,highcadence=highcadence)
         
         if variable!="lat" and variable!="lon" and variable!="lev" and variable!="time":
             lon = ncd.variables['lon'][:]
             lat = ncd.variables['lat'][:]
-            lev = ncd.variables['lev'][:]
+        ncd.close()
+        
+        if variable!="lat" and variable!="lon" and variable!="lev" and variable!="time":
+            if savg:
+                grid = gcmt.getgrid(lat,lon,radius=self.radius)
             if not savg and not tavg:
                 if type(layer)!=type(None) and len(var.shape)==4:
                     return var[:,layer,:,:]
@@ -1939,39 +2098,24 @@ class Model(object):
             elif tavg and savg:
                 if type(layer)!=type(None) and len(var.shape)==4: #3D spatial array, plus time
                 #We're going to get a scalar; user has specified a level
-                    return gcmt.spatialmath(var,lat=lat,lon=lon,ignoreNaNs=ignoreNaNs,lev=layer)
+                    return gcmt.spatialmath(var,grid=grid,ignoreNaNs=ignoreNaNs,lev=layer)
                 elif type(layer)==type(None) and len(var.shape)==4:
                     #We're going to get a 1D vertical profile where each layer is a spatial avg
-                    output = np.zeros(lev.shape)
-                    for l in range(len(lev)):
-                        output[l] = gcmt.spatialmath(var,lat=lat,lon=lon,
-                                                    ignoreNaNs=ignoreNaNs,lev=l)
-                    return output
+                    return gcmt.spatialmath(var,grid=grid,ignoreNaNs=ignoreNaNs,lev="all")
                 elif len(var.shape)==3: #2D spatial array, plus time
-                    return gcmt.spatialmath(var,lat=lat,lon=lon,ignoreNaNs=ignoreNaNs)
+                    return gcmt.spatialmath(var,grid=grid,ignoreNaNs=ignoreNaNs)
             else:
                 if type(layer)!=type(None) and len(var.shape)==4: #3D spatial array, plus time
                 #We're going to get a 1D array; user has specified a level
-                    output = np.zeros(var.shape[0])
-                    for t in range(len(output)):
-                        output[t] = gcmt.spatialmath(var,lat=lat,lon=lon,ignoreNaNs=ignoreNaNs,
-                                                    lev=layer,time=t)
-                    return output
+                    return gcmt.spatialmath(var,grid=grid,ignoreNaNs=ignoreNaNs,
+                                            lev=layer,time="all")
                 elif type(layer)==type(None) and len(var.shape)==4:
                     #We're going to get a 1D vertical profile plus time
-                    output = np.zeros((var.shape[0],len(lev)))
-                    for t in range(var.shape[0]):
-                        for l in range(len(lev)):
-                            output[t,l] = gcmt.spatialmath(var,lat=lat,lon=lon,time=t,
-                                                    ignoreNaNs=ignoreNaNs,lev=l)
-                    return output
+                    return gcmt.spatialmath(var,grid=grid,time="all",
+                                            ignoreNaNs=ignoreNaNs,lev="all")
                 elif len(var.shape)==3: #2D spatial array, plus time
                     #We're going to get a 1D array
-                    output = np.zeros(var.shape[0])
-                    for t in range(len(output)):
-                        output[t] = gcmt.spatialmath(var,lat=lat,lon=lon,
-                                                    time=t,ignoreNaNs=ignoreNaNs)
-                    return output
+                    return gcmt.spatialmath(var,grid=grid,time="all",ignoreNaNs=ignoreNaNs)
                 else:
                     return -1
         else:
@@ -1983,23 +2127,203 @@ class Model(object):
         os.chdir(self.workdir)
         os.chdir("..")
         os.system("mkdir %s_crashed"%self.crashdir)
+        gcmt.invalidate(self.workdir)
         if self.secondarydir:
             os.system("mv %s/* %s_crashed/"%(self.secondarydir,self.crashdir))
         os.system("mv %s/* %s_crashed/"%(self.workdir,self.crashdir))
         raise RuntimeError("ExoPlaSim has crashed or begun producing garbage. All working files have been moved to %s_crashed/"%(os.getcwd()+"/"+self.modelname))
         
     def emergencyabort(self):
-        """A problem has been encountered by an external script, and the model needs to crash gracefully"""
+        """A problem has been encountered by an external script, and the model needs to crash gracefully.
+        
+        If the model is crash-tolerant and has run at least 10 years, it is rolled back to the
+        restart file from 10 years ago, and the year after that restart is numbered as that
+        year again (so output from year Y-10 is rewritten), as it always has been. Otherwise
+        the model crashes.
+        """
         if self.crashtolerant and self.currentyear>=10:
-            self.currentyear-=10
-            os.system("cp MOST_REST.%05d plasim_restart"%self.currentyear)
-            os.system("rm plasim_status")
-            os.system("rm plasim_output")
-            os.system("rm plasim_hcadence")
-            os.system("rm plasim_snapshot")
+            restored = self.rollback(self.currentyear-10)
+            #Resume as year Y-10, not Y-9: the rerun year keeps the restart file's number
+            self.currentyear = restored
+            exoplasim.diagnostics.truncate(self.workdir+"/diagnostics.npz",restored-1)
         else:
             self._crash()
     
+    def _runplasim(self):
+        """Run the PlaSim executable for one year, under the health monitor if it is enabled.
+        
+        If the monitor stops PlaSim, the reason is appended to ``health.log`` in the work
+        directory and a RuntimeError is raised, so it is handled like any other crash.
+        """
+        healthmonitor = getattr(self,"healthmonitor",False)
+        if healthmonitor:
+            bounds = None
+            if isinstance(healthmonitor,dict):
+                bounds = healthmonitor
+            monitor = exoplasim.monitor.HealthMonitor(self.workdir,bounds=bounds)
+            reason = monitor.run(self._exec+self.executable)
+            if reason is not None:
+                message = "Health monitor stopped year %d: %s"%(self.currentyear,reason)
+                print(message)
+                with open(self.workdir+"/health.log","a") as healthlog:
+                    healthlog.write(message+"\n")
+                raise RuntimeError(message)
+        elif float(sys.version[:3])>=3.5 and float(sys.version[:3])<3.7:
+            subprocess.run([self._exec+self.executable],shell=True,check=True)
+        elif float(sys.version[:3])>=3.7:
+            subprocess.run([self._exec+self.executable],shell=True,check=True,
+                           capture_output=True)
+        else:
+            stat = os.system(self._exec+self.executable)
+            if stat!=0:
+                raise Exception("runtime crash")
+    
+    def _checkpoint(self):
+        """Save the end-of-year state as the next restart file and a checkpoint, then prune old checkpoints."""
+        exoplasim.checkpoints.store(self.workdir,self.currentyear,
+                                    compress=getattr(self,"compressrestarts",False))
+        schedule = getattr(self,"restartschedule",None)
+        if schedule is not None:
+            exoplasim.checkpoints.prune(self.workdir,schedule)
+    
+    def rollback(self,year):
+        """Roll the model back to the end of a given year.
+        
+        The restart file from that year (or the latest one before it that was kept) becomes the
+        next restart file, and output, diagnostics, and checkpoints from later years are deleted,
+        so the next year run is the one after the restored year.
+        
+        Parameters
+        ----------
+        year : int
+            Year to roll back to
+            
+        Returns
+        -------
+        int
+            The year that was restored
+        """
+        restored = exoplasim.checkpoints.restore(self.workdir,year)
+        exoplasim.checkpoints.discard(self.workdir,restored)
+        pattern = re.compile(r"^MOST[A-Z_]*\.(\d{5})")
+        for folder in (self.workdir,self.workdir+"/snapshots",self.workdir+"/highcadence"):
+            if not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                match = pattern.match(name)
+                if match and int(match.group(1))>restored:
+                    os.remove(folder+"/"+name)
+        exoplasim.diagnostics.truncate(self.workdir+"/diagnostics.npz",restored)
+        for name in ("plasim_status","plasim_output","plasim_hcadence","plasim_snapshot"):
+            if os.path.exists(self.workdir+"/"+name):
+                os.remove(self.workdir+"/"+name)
+        self.currentyear = restored+1
+        return restored
+    
+    def fork(self,n,perturbations=None,overrides=None,workdir=None,modelname=None,seed=None,
+             cores=None,maxconcurrent=None):
+        """Spawn an ensemble of models that pick up where this one left off.
+        
+        Each child gets a work directory of its own, with static inputs linked from this model's
+        and a copy of its current restart file, optionally perturbed and with its own parameter
+        changes. Children start from this model's current year and keep its energy balance and
+        diagnostics history, so a model spun up once (e.g. with :py:func:`runtobalance
+        <exoplasim.Model.runtobalance>`) can seed any number of experiments without each one
+        repeating the spin-up. Output and restart files from earlier years are not copied.
+        
+        Parameters
+        ----------
+        n : int
+            Number of children
+        perturbations : dict, optional
+            Restart fields to perturb (see :py:mod:`exoplasim.restartfile`), e.g. ``{"st":1.0e-5}``.
+            A number adds Gaussian noise with that standard deviation to every value in the
+            field. A function is called as ``f(field,rng,k)`` for child ``k``, with a
+            ``numpy.random.Generator``, and should return the new field.
+        overrides : dict or list(dict), optional
+            Parameter changes to apply with :py:func:`modify <exoplasim.Model.modify>`, either
+            the same for every child or one dictionary per child.
+        workdir : str, optional
+            Directory in which the children's work directories will be created. Defaults to
+            this model's work directory with "_fork" appended.
+        modelname : str, optional
+            Name stem for the children. Child ``k`` will be called ``<modelname>_<k>``, with k
+            zero-padded to 3 digits. Defaults to this model's name with "_fork" appended.
+        seed : int, optional
+            Seed for the perturbations, so that a fork can be reproduced.
+        cores : int, optional
+            Number of cores available for running the children. Defaults to ``os.cpu_count()``.
+        maxconcurrent : int, optional
+            Maximum number of children that may run at once.
+            
+        Returns
+        -------
+        Ensemble
+            The children, ready to run with :py:func:`Ensemble.run <exoplasim.ensemble.Ensemble.run>`.
+            
+        Examples
+        --------
+        
+        >>> spinup = exo.Model(workdir="spinup",modelname="spinup",ncpus=4)
+        >>> spinup.configure(pCO2=280.0e-6)
+        >>> spinup.runtobalance()
+        >>> sweep = spinup.fork(12,perturbations={"st":1.0e-5},
+                                overrides=[{"pCO2":p} for p in np.geomspace(280.0e-6,2.8e-3,num=12)],
+                                cores=48)
+        >>> sweep.run("run",years=20)
+        """
+        import copy
+        if overrides is None:
+            overrides = {}
+        if type(overrides)==dict:
+            overrides = [overrides for k in range(n)]
+        if len(overrides)!=n:
+            raise ValueError("Got %d sets of overrides for %d children"%(len(overrides),n))
+        if perturbations is None:
+            perturbations = {}
+        restart = self.workdir+"/plasim_restart"
+        if not os.path.exists(restart):
+            raise OSError("Error: %s not found; a model can only be forked once it has a restart file."%restart)
+        if workdir is None:
+            workdir = self.workdir+"_fork"
+        elif workdir[0]!="/":
+            workdir = os.getcwd()+"/"+workdir
+        if modelname is None:
+            modelname = self.modelname+"_fork"
+        os.makedirs(workdir,exist_ok=True)
+        rng = np.random.default_rng(seed)
+        skip = (self.modelname+".cfg",self.modelname+".npy")
+        children = []
+        with exoplasim.restartfile.RestartFile(restart) as parentrestart:
+            for field in perturbations:
+                if field not in parentrestart:
+                    raise KeyError("No field %s in %s to perturb"%(field,restart))
+            for k in range(n):
+                name = "%s_%03d"%(modelname,k)
+                childdir = workdir+"/"+name
+                os.makedirs(childdir,exist_ok=True)
+                _forkinputs(self.workdir,childdir,skip=skip)
+                with parentrestart.clone(childdir+"/plasim_restart") as childrestart:
+                    for field,perturbation in perturbations.items():
+                        if callable(perturbation):
+                            childrestart[field] = perturbation(childrestart[field],rng,k)
+                        else:
+                            childrestart[field] = childrestart[field]+rng.normal(
+                                                     scale=perturbation,size=np.shape(childrestart[field]))
+                child = copy.deepcopy(self)
+                child.workdir = childdir
+                child.modelname = name
+                child.crashdir = childdir
+                child.secondarydir = None
+                if hasattr(child,"telemetry"):
+                    child.telemetry = exoplasim.telemetry.Telemetry(childdir)
+                if len(overrides[k])>0:
+                    child.modify(**overrides[k])
+                child.exportcfg()
+                children.append(child)
+        return exoplasim.ensemble.Ensemble.frommodels(children,workdir=workdir,modelname=modelname,
+                                                      cores=cores,maxconcurrent=maxconcurrent)
+    
     def configure(self,noutput=True,flux=1367.0,startemp=None,starradius=1.0,starspec=None,pH2=None,
             pHe=None,pN2=None,pO2=None,pCO2=None,pCH4=None,pAr=None,pNe=None,
             pKr=None,pH2O=None,gascon=None,pressure=None,pressurebroaden=True,
@@ -2510,9 +2834,7 @@ References
                 raise OSError(f"Error: {starspec} not found.")
             if not os.path.isfile("%s_hr.dat"%(starspec[:-4])):
                 raise OSError("Error: %s_hr.dat not found; both %s and %s_hr.dat must be present."%(starspec[:-4],starspec,starspec[:-4]))
-            self._edit_namelist("radmod_namelist","NSTARFILE","1")
-            self._edit_namelist("radmod_namelist","STARFILE","'%s'"%starspec)
-            self._edit_namelist("radmod_namelist","STARFILEHR","'%s_hr.dat'"%(starspec[:-4]))
+            self._setstarfile(starspec)
         self.starspec = starspec
         if aerofile is not None:
             sourcedir = "/".join(__file__.split("/")[:-1])
@@ -2774,7 +3096,7 @@ References
         self._edit_namelist("glacier_namelist","GLACELIM",str(self.glaciers["mindepth"]))
         self._edit_namelist("glacier_namelist","ICESHEETH",str(self.glaciers["initialh"]))
         if self.glaciers["initialh"]>0:
-            os.system("rm %s/*174.sra %s/*1740.sra %s/*210.sra %s/*232.sra"%tuple([self.workdir,]*4))
+            os.system("rm %s/*174.sr[ab] %s/*1740.sr[ab] %s/*210.sr[ab] %s/*232.sr[ab]"%tuple([self.workdir,]*4))
         
         if type(snowicealbedo)!=type(None):
             alb = str(snowicealbedo)
@@ -2796,7 +3118,7 @@ References
         
         if type(soilalbedo)!=type(None):
             alb = str(soilalbedo)
-            os.system("rm %s/*0174.sra"%self.workdir)
+            os.system("rm %s/*0174.sr[ab]"%self.workdir)
             self._edit_namelist("landmod_namelist","ALBLAND",alb)
             self._edit_namelist("landmod_namelist","DGROUNDALB","%s,%s"%(alb,alb))
         self.soilalbedo=soilalbedo
@@ -2845,19 +3167,19 @@ References
                 print("Warning: wetsoil=True cannot be used with two-band albedos. Since you have a stellar temperature set, wetsoil is being set to False.")
         if soilwatercap:
             self._edit_namelist("landmod_namelist","WSMAX",str(soilwatercap))
-            os.system("rm %s/*0229.sra"%self.workdir)
+            os.system("rm %s/*0229.sr[ab]"%self.workdir)
         if desertplanet:
             self._edit_namelist("plasim_namelist","NDESERT","1")
             self._edit_namelist("landmod_namelist","NWATCINI","1")
             self._edit_namelist("landmod_namelist","DWATCINI","0.0")
-            os.system("rm %s/*.sra"%self.workdir)
+            os.system("rm %s/*.sr[ab]"%self.workdir)
         if type(soilsaturation)!=type(None):
             self._edit_namelist("landmod_namelist","NWATCINI","1")
             self._edit_namelist("landmod_namelist","DWATCINI",str(soilsaturation))
-            os.system("rm %s/*0229.sra"%self.workdir)
+            os.system("rm %s/*0229.sr[ab]"%self.workdir)
         if aquaplanet:
             self._edit_namelist("plasim_namelist","NAQUA","1")
-            os.system("rm %s/*.sra"%self.workdir)
+            os.system("rm %s/*.sr[ab]"%self.workdir)
         self.soilwatercap=soilwatercap
         self.soilsaturation=soilsaturation
         self.desertplanet=desertplanet
@@ -2931,15 +3253,17 @@ References
         
         if len(resources)>0:
             for res in resources:
-                os.system("cp %s %s/"%(res,self.workdir))
+                #Unlink first so we never write through a link into shared inputs
+                os.system("rm -f %s/%s"%(self.workdir,res.split("/")[-1]))
+                self._stageinput(res,"%s/%s"%(self.workdir,res.split("/")[-1]))
         self.resources=resources
         
         if landmap or topomap:
-            os.system("rm %s/*.sra"%self.workdir)
+            os.system("rm %s/*.sr[ab]"%self.workdir)
         if landmap:
-            os.system("cp %s %s/N%03d_surf_0172.sra"%(landmap,self.workdir,self.nlats))
+            self._stageinput(landmap,"%s/N%03d_surf_0172.sra"%(self.workdir,self.nlats))
         if topomap:
-            os.system("cp %s %s/N%03d_surf_0129.sra"%(topomap,self.workdir,self.nlats))
+            self._stageinput(topomap,"%s/N%03d_surf_0129.sra"%(self.workdir,self.nlats))
         self.landmap=landmap
         self.topomap=topomap
         
@@ -3289,9 +3613,7 @@ References
                     if not os.path.isfile("%s_hr.dat"%(starspec[:-4])):
                         raise OSError("Error: %s_hr.dat not found; both %s and %s_hr.dat must be present."%(starspec[:-4],starspec,starspec[:-4]))
 
-                    self._edit_namelist("radmod_namelist","NSTARFILE","1")
-                    self._edit_namelist("radmod_namelist","STARFILE","'%s'"%starspec)
-                    self._edit_namelist("radmod_namelist","STARFILEHR","'%s_hr.dat'"%(starspec[:-4]))
+                    self._setstarfile(starspec)
                 self.starspec = starspec
             if key=="pH2":
                 setgas=True
@@ -3545,8 +3867,8 @@ References
                 self._edit_namelist("glacier_namelist","ICESHEETH",
                                     str(self.glaciers["initialh"]))
                 if self.glaciers["initialh"]>0:
-                    os.system("rm %s/*174.sra %s/*1740.sra "+
-                            "%s/*210.sra %s/*232.sra"%tuple([self.workdir,]*4))
+                    os.system("rm %s/*174.sr[ab] %s/*1740.sr[ab] "+
+                            "%s/*210.sr[ab] %s/*232.sr[ab]"%tuple([self.workdir,]*4))
                 
             if key=="snowicealbedo":
                 self.snowicealbedo=value
@@ -3581,7 +3903,7 @@ References
                 self.soilalbedo=value
                 if type(self.soilalbedo)!=type(None):
                     alb = str(self.soilalbedo)
-                    os.system("rm %s/*0174.sra"%self.workdir)
+                    os.system("rm %s/*0174.sr[ab]"%self.workdir)
                     self._edit_namelist("landmod_namelist","ALBLAND",alb)
                     self._edit_namelist("landmod_namelist","DGROUNDALB","%s,%s"%(alb,alb))
                 else:
@@ -3623,7 +3945,7 @@ References
                 self.soilwatercap=value
                 if self.soilwatercap:
                     self._edit_namelist("landmod_namelist","WSMAX",str(self.soilwatercap))
-                    os.system("rm %s/*0229.sra"%self.workdir)
+                    os.system("rm %s/*0229.sr[ab]"%self.workdir)
                 else:
                     self._rm_namelist_param("landmod_namelist","WSMAX")
             if key=="soilsaturation":
@@ -3631,7 +3953,7 @@ References
                 if type(self.soilsaturation)!=type(None):
                     self._edit_namelist("landmod_namelist","NWATCINI","1")
                     self._edit_namelist("landmod_namelist","DWATCINI",str(self.soilsaturation))
-                    os.system("rm %s/*0229.sra"%self.workdir)
+                    os.system("rm %s/*0229.sr[ab]"%self.workdir)
                 else:
                     self._edit_namelist("landmod_namelist","NWATCINI","0")
                     self._rm_namelist_param("landmod_namelist","DWATCINI")
@@ -3677,7 +3999,7 @@ References
                     else:
                         self._edit_namelist("landmod_namelist","NWATCINI","1")
                         self._edit_namelist("landmod_namelist","DWATCINI","0.0")
-                    os.system("rm %s/*.sra"%self.workdir)
+                    os.system("rm %s/*.sr[ab]"%self.workdir)
                 else:
                     self._edit_namelist("landmod_namelist","NDESERT","0")
                     self._rm_namelist_param("landmod_namelist","NWATCINI")
@@ -3686,7 +4008,7 @@ References
                 self.aquaplanet=value
                 if self.aquaplanet:
                     self._edit_namelist("plasim_namelist","NAQUA","1")
-                    os.system("rm %s/*.sra"%self.workdir)
+                    os.system("rm %s/*.sr[ab]"%self.workdir)
                 else:
                     self._edit_namelist("plasim_namelist","NAQUA","0")
 
@@ -3788,7 +4110,7 @@ References
                 self.resources=value
                 if len(self.resources)>0:
                     for res in self.resources:
-                        os.system("cp %s %s/"%(res,self.workdir))
+                        self._stageinput(res,"%s/%s"%(self.workdir,res.split("/")[-1]))
                 
             if key=="landmap":
                 self.landmap=value
@@ -3969,11 +4291,11 @@ References
                     
         if changeland:
             if self.landmap or self.topomap:
-                os.system("rm %s/*.sra"%self.workdir)
+                os.system("rm %s/*.sr[ab]"%self.workdir)
             if self.landmap:
-                os.system("cp %s %s/N%03d_surf_0172.sra"%(self.landmap,self.workdir,self.nlats))
+                self._stageinput(self.landmap,"%s/N%03d_surf_0172.sra"%(self.workdir,self.nlats))
             if self.topomap:
-                os.system("cp %s %s/N%03d_surf_0129.sra"%(self.topomap,self.workdir,self.nlats))
+                self._stageinput(self.topomap,"%s/N%03d_surf_0129.sra"%(self.workdir,self.nlats))
     
     def save(self,filename=None):
         """Save the current Model object to a NumPy save file. 
@@ -4195,6 +4517,32 @@ References
         f.write('\n'.join(fnl))
         f.close()
             
+    def _stageinput(self,filename,dest):
+        """Put an input file in the work directory, through the input cache if it is enabled."""
+        if dest[-4:]==".sra": #A binary copy of whatever was there before would take precedence
+            exoplasim.boundaries.discardbinary(dest)
+        if getattr(self,"inputcache",False):
+            exoplasim.inputcache.stage(filename,dest)
+        else:
+            os.system("cp %s %s"%(filename,dest))
+    
+    def _setstarfile(self,starspec):
+        """Point PlaSim at a stellar spectrum (and its _hr.dat counterpart).
+        
+        With the input cache, the spectra are linked into the work directory and referred to by
+        their file names, which also keeps them within the 80 characters PlaSim allows.
+        """
+        hrspec = "%s_hr.dat"%(starspec[:-4])
+        if getattr(self,"inputcache",False):
+            name = os.path.basename(starspec)[:-4]
+            self._stageinput(starspec,"%s/%s.dat"%(self.workdir,name))
+            self._stageinput(hrspec,"%s/%s_hr.dat"%(self.workdir,name))
+            starspec = name+".dat"
+            hrspec = name+"_hr.dat"
+        self._edit_namelist("radmod_namelist","NSTARFILE","1")
+        self._edit_namelist("radmod_namelist","STARFILE","'%s'"%starspec)
+        self._edit_namelist("radmod_namelist","STARFILEHR","'%s'"%hrspec)
+    
     def _edit_namelist(self,namelist,arg,val):
         """Either edit or add argument/value pair to a namelist"""
         
@@ -0,0 +1,630 @@
+"""
+Benchmarks for the postprocessing, analysis, and imaging routines.
+
+Synthetic raw output is written with the same record layout as PlaSim's ``outmod.f90``, so
+the whole :py:mod:`pyburn <exoplasim.pyburn>` pipeline can be timed without a compiled model
+(or petitRADTRANS). Each benchmark reports the best walltime over several repeats, a
+throughput, and the peak memory allocated while it ran (as seen by :py:mod:`tracemalloc`).
+Results can be saved as a baseline and compared against later, to catch regressions before
+they show up in production runs.
+
+From the command line::
+
+    python -m exoplasim.benchmarks -r T21 T42 --save baseline.json
+    python -m exoplasim.benchmarks -r T21 T42 --baseline baseline.json
+
+Benchmarks whose optional dependencies are unavailable (e.g. netCDF4 or h5py for those
+writers, or the compiled ``pyfft`` extension for anything that reads raw output) are
+reported as skipped rather than failing the whole suite.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import tracemalloc
+import numpy as np
+import argparse as ag
+from pathlib import Path
+
+RESOLUTIONS = {"T21":(32,64,21),
+               "T42":(64,128,42),
+               "T85":(128,256,85)}
+
+#Grid-point output codes written by writegp, with (offset, amplitude) used to fill them. 162
+#(cloud fraction) is written on every level; the rest are surface fields.
+GRIDCODES = {110:(50.0,0.0),     139:(270.0,30.0), 140:(0.2,0.1),     141:(0.0,0.1),
+             142:(2.0e-8,1.0e-8),143:(2.0e-8,1.0e-8),144:(0.0,1.0e-9),146:(-15.0,10.0),
+             147:(-80.0,40.0),   160:(0.0,1.0e-9), 162:(0.3,0.2),     164:(0.6,0.2),
+             167:(268.0,30.0),   169:(270.0,30.0), 170:(275.0,20.0),  172:(0.0,1.0),
+             173:(1.0e-3,0.0),   174:(0.2,0.1),    175:(0.3,0.1),     176:(150.0,100.0),
+             177:(-60.0,20.0),   178:(240.0,150.0),179:(-240.0,30.0), 180:(0.0,0.1),
+             181:(0.0,0.1),      182:(-3.0e-8,1.0e-8),183:(275.0,20.0),184:(0.3,0.1),
+             203:(-100.0,50.0),  204:(-30.0,20.0), 205:(-390.0,60.0), 210:(0.0,0.5),
+             211:(0.0,1.0),      218:(0.0,1.0e-9), 221:(0.0,1.0e-9),  230:(20.0,10.0),
+             232:(0.0,0.0)}
+LEVELCODES = [162,]
+
+#Variables requested from pyburn.dataset: a mix of surface, column, and 3-D fields, including
+#some that have to be derived from others. Winds, geopotential height, and relative humidity
+#cannot currently be produced in Fourier mode, so they are left out there.
+VARIABLES = ["ts","tas","ps","ta","ua","va","hus","wap","hur","zg","cl","clt","pr","rlut",
+             "rst","rsut","hfss","hfls","ntr","hfns","sic","prw","lsm"]
+FOURIERVARIABLES = [var for var in VARIABLES if var not in ("ua","va","zg","hur")]
+
+def _fortranrecords(header,data,itype,rtype):
+    '''Pack an 8-integer header and a data array as two Fortran unformatted sequential records'''
+    hbytes = np.asarray(header,dtype=itype).tobytes()
+    dbytes = np.asarray(data,dtype=rtype).tobytes()
+    hmarker = np.array([len(hbytes)],dtype=itype).tobytes()
+    dmarker = np.array([len(dbytes)],dtype=itype).tobytes()
+    return hmarker+hbytes+hmarker+dmarker+dbytes+dmarker
+
+def _spectralfield(rng,nrsp,ntru,mean,amplitude):
+    '''Random spectral coefficients with a red spectrum and the given global mean'''
+    falloff = 1.0/(1.0+np.arange(nrsp)/(2.0*(ntru+1)))**2
+    field = rng.standard_normal(nrsp)*amplitude*falloff
+    field[0] = mean*np.sqrt(2.0) #Roughly PlaSim's normalization of the (0,0) mode
+    field[1] = 0.0
+    return field
+
+def _gridfield(rng,lat,lon,offset,amplitude):
+    '''A smooth meridional/zonal pattern plus noise'''
+    rlat = np.radians(lat)[:,np.newaxis]
+    rlon = np.radians(lon)[np.newaxis,:]
+    pattern = np.cos(rlat)**2+0.25*np.cos(rlat)*np.cos(rlon)-0.5
+    noise = 0.1*rng.standard_normal((len(lat),len(lon)))
+    return offset+amplitude*(pattern+noise)
+
+def writeraw(filename,resolution="T21",layers=10,ntimes=12,codes=None,seed=None,
+             daysperyear=360,timestep=45.0,byteorder="="):
+    '''Write a synthetic PlaSim raw output file.
+
+    Records follow ``outmod.f90``: a header record ([333,0,date,0,NLON,NLAT,NLEV,NTRU]) and
+    the half-level sigma values, then for each output time the spectral fields (surface
+    geopotential, log surface pressure, and temperature, humidity, divergence, and vorticity
+    on every level) followed by the grid-point fields. Values are random but physically
+    plausible in magnitude, so every derived variable can be computed.
+
+    Parameters
+    ----------
+    filename : str
+        File to write
+    resolution : str, optional
+        "T21", "T42", or "T85"
+    layers : int, optional
+        Number of vertical levels
+    ntimes : int, optional
+        Number of output times (e.g. 12 for monthly output)
+    codes : list(int), optional
+        Grid-point codes to write. Defaults to all the codes in ``GRIDCODES``.
+    seed : int, optional
+        Seed for the random number generator
+    daysperyear : int, optional
+        Days per year, recorded in the headers
+    timestep : float, optional
+        Model timestep in minutes, used to fill in the step counter
+    byteorder : str, optional
+        "<" for little-endian, ">" for big-endian, or "=" for the native byte order.
+
+    Returns
+    -------
+    int
+        Size of the file written, in bytes
+    '''
+    if resolution not in RESOLUTIONS:
+        raise ValueError("Unknown resolution %s; must be one of %s"%(resolution,
+                                                                    ", ".join(RESOLUTIONS)))
+    nlat,nlon,ntru = RESOLUTIONS[resolution]
+    nrsp = (ntru+1)*(ntru+2)
+    nugp = nlat*nlon
+    if codes is None:
+        codes = sorted(GRIDCODES)
+    rng = np.random.default_rng(seed)
+    itype = np.dtype(byteorder+"i4")
+    rtype = np.dtype(byteorder+"f4")
+
+    lat = np.degrees(np.arcsin(np.polynomial.legendre.leggauss(nlat)[0][::-1]))
+    lon = np.arange(nlon)/float(nlon)*360.0
+    sigmah = (np.arange(1,layers+1)/float(layers))**1.5
+    zsig = np.zeros(nugp)
+    zsig[:layers] = sigmah
+    zsig[layers] = daysperyear
+
+    stepsperday = int(round(1440.0/timestep))
+    stepsperoutput = stepsperday*daysperyear//ntimes
+    with open(filename,"wb") as rawf:
+        rawf.write(_fortranrecords([333,0,10101,0,nlon,nlat,layers,ntru],zsig,itype,rtype))
+        for nt in range(ntimes):
+            day = (nt*daysperyear)//ntimes
+            date = 10000+100*(day//30+1)+day%30+1
+            nstep = (nt+1)*stepsperoutput
+            sphead = [0,0,date,0,nrsp,1,nstep,daysperyear]
+            gphead = [0,0,date,0,nlon,nlat,nstep,daysperyear]
+            for code,mean,amplitude in ((129,0.0,50.0),(152,np.log(1.0e5),1.0e-3)):
+                sphead[0:2] = [code,0]
+                rawf.write(_fortranrecords(sphead,_spectralfield(rng,nrsp,ntru,mean,amplitude),
+                                           itype,rtype))
+            for code,mean,amplitude in ((130,250.0,1.0),(133,2.0e-3,1.0e-4),
+                                        (155,0.0,1.0e-7),(138,0.0,1.0e-6)):
+                for jlev in range(layers):
+                    levmean = mean
+                    if code==130:
+                        levmean = mean*sigmah[jlev]**0.19
+                    elif code==133:
+                        levmean = mean*sigmah[jlev]**3
+                    sphead[0:2] = [code,jlev+1]
+                    rawf.write(_fortranrecords(sphead,_spectralfield(rng,nrsp,ntru,levmean,
+                                                                     amplitude),itype,rtype))
+            for code in codes:
+                offset,amplitude = GRIDCODES.get(code,(0.0,1.0))
+                if code in LEVELCODES:
+                    levels = range(1,layers+1)
+                else:
+                    levels = [0,]
+                for jlev in levels:
+                    gphead[0:2] = [code,jlev]
+                    field = _gridfield(rng,lat,lon,offset,amplitude)
+                    if code in (140,141,162,164,172,175,174,184,210):
+                        field = np.clip(field,0.0,1.0)
+                    rawf.write(_fortranrecords(gphead,field,itype,rtype))
+    return os.path.getsize(filename)
+
+def _arraybytes(rdataset):
+    '''Total size in bytes of the arrays in a dataset'''
+    nbytes = 0
+    for key in rdataset:
+        if type(rdataset[key])==list or type(rdataset[key])==tuple:
+            nbytes += np.asarray(rdataset[key][0]).nbytes
+    return nbytes
+
+class _Workspace(object):
+    '''Synthetic inputs for one resolution, built lazily and shared between benchmarks'''
+    def __init__(self,workdir,resolution,layers,ntimes,seed):
+        self.workdir = workdir
+        self.resolution = resolution
+        self.layers = layers
+        self.ntimes = ntimes
+        self.seed = seed
+        self.nlat,self.nlon,self.ntru = RESOLUTIONS[resolution]
+        self.logfile = os.path.join(workdir,"benchmark.log")
+        self._rawfile = None
+        self._dataset = None
+        self._fields = None
+
+    @property
+    def rawfile(self):
+        if self._rawfile is None:
+            self._rawfile = os.path.join(self.workdir,"MOST.%s.raw"%self.resolution)
+            writeraw(self._rawfile,resolution=self.resolution,layers=self.layers,
+                     ntimes=self.ntimes,seed=self.seed)
+        return self._rawfile
+
+    @property
+    def rawsize(self):
+        return os.path.getsize(self.rawfile)/1.0e6
+
+    @property
+    def dataset(self):
+        if self._dataset is None:
+            import exoplasim.pyburn as pyburn
+            self._dataset = pyburn.dataset(self.rawfile,VARIABLES,mode="grid",
+                                           logfile=self.logfile)
+        return self._dataset
+
+    @property
+    def fields(self):
+        '''(time,lev,lat,lon) field on the Gaussian grid, plus its coordinates'''
+        if self._fields is None:
+            nlat,nlon = self.nlat,self.nlon
+            lat = np.degrees(np.arcsin(np.polynomial.legendre.leggauss(nlat)[0][::-1]))
+            lon = np.arange(nlon)/float(nlon)*360.0
+            rng = np.random.default_rng(self.seed)
+            variable = (250.0+30.0*np.cos(np.radians(lat))[:,np.newaxis]
+                        +rng.standard_normal((self.ntimes,self.layers,nlat,nlon)))
+            self._fields = (lon,lat,variable)
+        return self._fields
+
+    def path(self,name):
+        return os.path.join(self.workdir,name)
+
+#Each benchmark takes a _Workspace and returns the function to be timed, the amount of work
+#it does, and the unit of that amount (per second) for reporting throughput.
+
+def _readfile(ws):
+    import exoplasim.pyburn as pyburn
+    rawfile = ws.rawfile
+    return (lambda: pyburn.readfile(rawfile)),ws.rawsize,"MB/s"
+
+def _datasetmode(mode):
+    def setup(ws):
+        import exoplasim.pyburn as pyburn
+        rawfile = ws.rawfile
+        variables = VARIABLES
+        if mode=="fourier":
+            variables = FOURIERVARIABLES
+        def run():
+            return pyburn.dataset(rawfile,variables,mode=mode,logfile=ws.logfile)
+        return run,ws.rawsize,"MB/s"
+    return setup
+
+def _netcdf(ws):
+    import netCDF4
+    import exoplasim.pyburn as pyburn
+    rdataset = ws.dataset
+    def run():
+        ncd = pyburn.netcdf(rdataset,filename=ws.path("bench.nc"),logfile=ws.logfile)
+        ncd.close()
+    return run,_arraybytes(rdataset)/1.0e6,"MB/s"
+
+def _npsavez(ws):
+    import exoplasim.pyburn as pyburn
+    rdataset = ws.dataset
+    def run():
+        pyburn.npsavez(rdataset,filename=ws.path("bench.npz"),logfile=ws.logfile)
+    return run,_arraybytes(rdataset)/1.0e6,"MB/s"
+
+def _csv(ws):
+    import exoplasim.pyburn as pyburn
+    rdataset = ws.dataset
+    def run():
+        pyburn.csv(rdataset,filename=ws.path("bench.tar.gz"),logfile=ws.logfile)
+    return run,_arraybytes(rdataset)/1.0e6,"MB/s"
+
+def _hdf5(ws):
+    import h5py
+    import exoplasim.pyburn as pyburn
+    rdataset = ws.dataset
+    def run():
+        hdfile = pyburn.hdf5(rdataset,filename=ws.path("bench.hdf5"),logfile=ws.logfile)
+        hdfile.close()
+    return run,_arraybytes(rdataset)/1.0e6,"MB/s"
+
+def _spatialmath(ws):
+    import exoplasim.gcmt as gcmt
+    lon,lat,variable = ws.fields
+    def run():
+        return gcmt.spatialmath(variable,lat=lat,lon=lon,time="all",lev="all")
+    return run,variable.size/1.0e6,"Mpoint/s"
+
+def _eq2tl(ws):
+    import exoplasim.gcmt as gcmt
+    lon,lat,variable = ws.fields
+    return (lambda: gcmt.eq2tl(variable,lon,lat,substellar=180.0)),variable.size/1.0e6,"Mpoint/s"
+
+def _tl2eq(ws):
+    import exoplasim.gcmt as gcmt
+    lon,lat,variable = ws.fields
+    return (lambda: gcmt.tl2eq(variable,lon,lat,substellar=180.0)),variable.size/1.0e6,"Mpoint/s"
+
+def _orthographic(ws):
+    import exoplasim.gcmt as gcmt
+    lon,lat,variable = ws.fields
+    imaps = variable[:,-1]
+    views = np.linspace(0.0,360.0,num=len(imaps),endpoint=False)
+    def run():
+        return [gcmt.orthographic(lon,lat,imaps[n],central_longitude=views[n],
+                                  central_latitude=30.0) for n in range(len(imaps))]
+    return run,len(imaps),"frame/s"
+
+def _orthographicframes(ws):
+    import exoplasim.gcmt as gcmt
+    lon,lat,variable = ws.fields
+    imaps = variable[:,-1]
+    views = np.linspace(0.0,360.0,num=len(imaps),endpoint=False)
+    def run():
+        return gcmt.orthographicframes(lon,lat,imaps,central_longitude=views,
+                                       central_latitude=30.0,timeseries=True)
+    return run,len(imaps),"frame/s"
+
+def _specs2rgb(ws):
+    import exoplasim.colormatch as colormatch
+    wvl = np.linspace(380.0,780.0,num=401)
+    rng = np.random.default_rng(ws.seed)
+    ncols = ws.nlat*ws.nlon
+    temperatures = 3000.0+3000.0*rng.random(ncols)[:,np.newaxis]
+    specs = 1.0/(wvl**5*(np.exp(1.4388e7/(wvl*temperatures))-1.0))
+    return (lambda: colormatch.specs2rgb(wvl,specs)),ncols,"spectrum/s"
+
+def _randomcontinents(ws):
+    import exoplasim.randomcontinents as randomcontinents
+    name = ws.path("bench")
+    def run():
+        return randomcontinents.generate(name=name,nlats=ws.nlat,ntopo=True,seed=ws.seed)
+    return run,1,"world/s"
+
+BENCHMARKS = [("readfile"          ,_readfile),
+              ("dataset-grid"      ,_datasetmode("grid")),
+              ("dataset-synchronous",_datasetmode("synchronous")),
+              ("dataset-fourier"   ,_datasetmode("fourier")),
+              ("netcdf"            ,_netcdf),
+              ("npsavez"           ,_npsavez),
+              ("csv"               ,_csv),
+              ("hdf5"              ,_hdf5),
+              ("spatialmath"       ,_spatialmath),
+              ("eq2tl"             ,_eq2tl),
+              ("tl2eq"             ,_tl2eq),
+              ("orthographic"      ,_orthographic),
+              ("orthographicframes",_orthographicframes),
+              ("specs2rgb"         ,_specs2rgb),
+              ("randomcontinents"  ,_randomcontinents)]
+
+def timeit(function,repeats=3,memory=True):
+    '''Time a function, and optionally measure its peak memory allocation.
+
+    The function is called once untimed to warm up any caches, then ``repeats`` times. Peak
+    memory is measured on a separate call, since tracing allocations slows the function down.
+
+    Parameters
+    ----------
+    function : callable
+        Function taking no arguments
+    repeats : int, optional
+        Number of timed calls
+    memory : bool, optional
+        Whether to measure peak memory
+
+    Returns
+    -------
+    float, float
+        Best walltime in seconds, and peak memory allocated in MB (NaN if not measured)
+    '''
+    function()
+    times = []
+    for n in range(max(1,repeats)):
+        tstart = time.perf_counter()
+        function()
+        times.append(time.perf_counter()-tstart)
+    peak = np.nan
+    if memory:
+        tracemalloc.start()
+        try:
+            function()
+            peak = tracemalloc.get_traced_memory()[1]/1.0e6
+        finally:
+            tracemalloc.stop()
+    return min(times),peak
+
+def run(resolutions=["T21",],cases=None,layers=10,ntimes=12,repeats=3,memory=True,seed=42,
+        workdir=None,verbose=True):
+    '''Run the benchmark suite.
+
+    Parameters
+    ----------
+    resolutions : list(str), optional
+        Resolutions at which to run each benchmark ("T21", "T42", and/or "T85")
+    cases : list(str), optional
+        Names of the benchmarks to run (see ``BENCHMARKS``). Defaults to all of them.
+    layers : int, optional
+        Number of vertical levels in the synthetic output
+    ntimes : int, optional
+        Number of output times in the synthetic output
+    repeats : int, optional
+        Number of timed calls per benchmark; the best is reported.
+    memory : bool, optional
+        Whether to measure peak memory
+    seed : int, optional
+        Seed for the synthetic data
+    workdir : str, optional
+        Directory for synthetic inputs and outputs. A temporary directory is used (and
+        removed afterwards) if not given.
+    verbose : bool, optional
+        Print each result as it finishes
+
+    Returns
+    -------
+    dict
+        Results keyed by "<resolution>/<benchmark>", each a dictionary with the walltime in
+        seconds, throughput and its unit, peak memory in MB, and a status ("ok", or the reason
+        the benchmark was skipped or failed).
+    '''
+    known = [name for name,setup in BENCHMARKS]
+    if cases is None:
+        cases = known
+    for case in cases:
+        if case not in known:
+            raise ValueError("Unknown benchmark %s; must be one of %s"%(case,", ".join(known)))
+    cleanup = workdir is None
+    if workdir is None:
+        workdir = tempfile.mkdtemp(prefix="exoplasim_bench_")
+    else:
+        os.makedirs(workdir,exist_ok=True)
+    results = {}
+    try:
+        for resolution in resolutions:
+            ws = _Workspace(workdir,resolution,layers,ntimes,seed)
+            for name,setup in BENCHMARKS:
+                if name not in cases:
+                    continue
+                result = {"resolution":resolution,"benchmark":name,"seconds":np.nan,
+                          "throughput":np.nan,"unit":"","peakmemory":np.nan,"status":"ok"}
+                try:
+                    function,amount,unit = setup(ws)
+                    result["unit"] = unit
+                    seconds,peak = timeit(function,repeats=repeats,memory=memory)
+                    result["seconds"] = seconds
+                    result["throughput"] = amount/seconds
+                    result["peakmemory"] = peak
+                except ImportError as err:
+                    result["status"] = "skipped: %s"%str(err)
+                except Exception as err:
+                    result["status"] = "failed: %s: %s"%(type(err).__name__,
+                                                         str(err).split("\n")[0])
+                results[resolution+"/"+name] = result
+                if verbose:
+                    print(_formatrow(result))
+    finally:
+        if cleanup:
+            shutil.rmtree(workdir,ignore_errors=True)
+    return results
+
+def save(results,filename):
+    '''Save benchmark results (e.g. as a baseline) to a JSON file, with system information.
+
+    Parameters
+    ----------
+    results : dict
+        Output of :py:func:`run`
+    filename : str
+        File to write
+    '''
+    record = {"python":platform.python_version(),"numpy":np.__version__,
+              "machine":platform.machine(),"processor":platform.processor(),
+              "node":platform.node(),"timestamp":time.time(),
+              "results":results}
+    with open(filename,"w") as jsonf:
+        json.dump(record,jsonf,indent=1,default=float)
+
+def load(filename):
+    '''Load benchmark results saved with :py:func:`save`.
+
+    Parameters
+    ----------
+    filename : str
+        JSON file to read
+
+    Returns
+    -------
+    dict
+        Results keyed by "<resolution>/<benchmark>"
+    '''
+    with open(filename,"r") as jsonf:
+        record = json.load(jsonf)
+    return record["results"]
+
+def compare(results,baseline,tolerance=0.25):
+    '''Compare benchmark results against a baseline.
+
+    Parameters
+    ----------
+    results : dict
+        Output of :py:func:`run`
+    baseline : dict or str
+        Baseline results, or a JSON file written by :py:func:`save`
+    tolerance : float, optional
+        Fractional slowdown (or increase in peak memory) beyond which a benchmark is flagged
+        as a regression.
+
+    Returns
+    -------
+    dict
+        For each benchmark present in both, the ratios of walltime and peak memory to the
+        baseline ("time" and "memory"), and whether either is a regression ("regression").
+        A benchmark that succeeded in the baseline but not now is always a regression, with
+        NaN ratios and its current status ("status"). Benchmarks that failed in the baseline
+        are left out.
+    '''
+    if type(baseline)==str:
+        baseline = load(baseline)
+    comparison = {}
+    for key in results:
+        if key not in baseline:
+            continue
+        new = results[key]
+        old = baseline[key]
+        if old["status"]!="ok":
+            continue
+        if new["status"]!="ok": #It worked before, so failing now is a regression
+            comparison[key] = {"time":np.nan,"memory":np.nan,"regression":True,
+                               "status":new["status"]}
+            continue
+        tratio = new["seconds"]/old["seconds"]
+        mratio = np.nan
+        if np.isfinite(new["peakmemory"]) and np.isfinite(old["peakmemory"]) and old["peakmemory"]>0:
+            mratio = new["peakmemory"]/old["peakmemory"]
+        comparison[key] = {"time":tratio,"memory":mratio,
+                           "regression":bool(tratio>1.0+tolerance or mratio>1.0+tolerance)}
+    return comparison
+
+def _formatrow(result,comparison=None):
+    '''One line of the results table'''
+    label = "%-4s %-20s"%(result["resolution"],result["benchmark"])
+    if result["status"]!="ok":
+        row = label+" "+result["status"]
+        if comparison is not None and comparison["regression"]:
+            row += "  REGRESSION"
+        return row
+    row = label+" %10.4f s %12.3f %-10s %9.1f MB"%(result["seconds"],result["throughput"],
+                                                   result["unit"],result["peakmemory"])
+    if comparison is not None:
+        row += "   x%.2f time  x%.2f memory"%(comparison["time"],comparison["memory"])
+        if comparison["regression"]:
+            row += "  REGRESSION"
+    return row
+
+def report(results,comparison=None):
+    '''Format benchmark results (and optionally a comparison against a baseline) as a table.
+
+    Parameters
+    ----------
+    results : dict
+        Output of :py:func:`run`
+    comparison : dict, optional
+        Output of :py:func:`compare`
+
+    Returns
+    -------
+    str
+    '''
+    if comparison is None:
+        comparison = {}
+    lines = [_formatrow(results[key],comparison.get(key)) for key in results]
+    return "\n".join(lines)
+
+def main():
+    """Command-line tool to benchmark the postprocessing, analysis, and imaging routines.
+
+    Do not invoke as an imported function; must run directly.
+
+**Options**
+        -r,--resolutions
+            Resolutions to benchmark (T21, T42, T85)
+        -b,--benchmarks
+            Benchmarks to run (default all)
+        -n,--repeats
+            Number of timed calls per benchmark
+        --layers
+            Number of vertical levels in the synthetic output
+        --ntimes
+            Number of output times in the synthetic output
+        --save
+            Save the results to a JSON file (e.g. as a new baseline)
+        --baseline
+            Compare against a JSON file of baseline results
+        -t,--tolerance
+            Fractional slowdown flagged as a regression
+        --nomemory
+            Skip peak memory measurement
+
+    Yields
+    ------
+    Results table on standard output. Exits with status 1 if any benchmark regressed.
+    """
+    parser = ag.ArgumentParser(description="Benchmark ExoPlaSim's postprocessing, analysis, and imaging routines on synthetic output.")
+    parser.add_argument("-r","--resolutions",nargs="+",default=["T21",],help="Resolutions to benchmark (T21, T42, T85)")
+    parser.add_argument("-b","--benchmarks",nargs="+",help="Benchmarks to run (default all)")
+    parser.add_argument("-n","--repeats",type=int,default=3,help="Number of timed calls per benchmark")
+    parser.add_argument("--layers",type=int,default=10,help="Number of vertical levels")
+    parser.add_argument("--ntimes",type=int,default=12,help="Number of output times")
+    parser.add_argument("--save",help="Save the results to a JSON file")
+    parser.add_argument("--baseline",help="Compare against a JSON file of baseline results")
+    parser.add_argument("-t","--tolerance",type=float,default=0.25,help="Fractional slowdown flagged as a regression")
+    parser.add_argument("--nomemory",action="store_true",help="Skip peak memory measurement")
+    args = parser.parse_args()
+
+    results = run(resolutions=args.resolutions,cases=args.benchmarks,layers=args.layers,
+                  ntimes=args.ntimes,repeats=args.repeats,memory=not args.nomemory,
+                  verbose=args.baseline is None)
+    if args.save:
+        save(results,args.save)
+    if args.baseline:
+        comparison = compare(results,args.baseline,tolerance=args.tolerance)
+        print(report(results,comparison))
+        if any([comparison[key]["regression"] for key in comparison]):
+            sys.exit(1)
+
+if __name__=="__main__" and (Path(sys.argv[0]).name!="sphinx-build" and
+                             Path(sys.argv[0]).name!="build.py"):
+    main()
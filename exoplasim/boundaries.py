@@ -0,0 +1,322 @@
+"""
+Read, write, and convert PlaSim surface boundary files.
+
+PlaSim reads time-invariant and climatological boundary maps from files named
+``NXXX_surf_CCCC.sra``, where XXX is the number of latitudes and CCCC is the variable code.
+Each file contains one or more records, each consisting of an 8-integer header followed by
+NLAT*NLON values in free (list-directed) format. The header is::
+
+    [code, level, date, time, NLON, NLAT, 0, 0]
+
+Monthly climatologies have one record per month (up to 14, with December and January
+repeated at either end), distinguished by the date.
+
+In addition to the text format, ExoPlaSim's PlaSim can read the same records from Fortran
+unformatted sequential files named ``NXXX_surf_CCCC.srb``. These are read directly into memory
+without any parsing, and take precedence over a ``.sra`` file with the same code. Because they
+are unformatted, the precision of the reals must match the precision PlaSim was compiled with.
+"""
+import numpy as np
+import glob
+import os
+import exoplasim.pyburn as pyburn
+
+def _asrecords(fields):
+    '''Return fields as a 3-D (record,lat,lon) array'''
+    fields = np.asarray(fields,dtype=float)
+    if fields.ndim==2:
+        fields = fields[np.newaxis,...]
+    if fields.ndim!=3:
+        raise ValueError("Boundary fields must be (NLAT,NLON) or (records,NLAT,NLON); got shape %s"%
+                         str(fields.shape))
+    return fields
+
+def _makeheaders(fields,code,headers,date):
+    '''Build (or check) the 8-integer headers for each record'''
+    nrec,nlat,nlon = fields.shape
+    if headers is None:
+        headers = np.zeros((nrec,8),dtype=int)
+        headers[:,0] = code
+        headers[:,2] = date
+        headers[:,4] = nlon
+        headers[:,5] = nlat
+    headers = np.atleast_2d(np.asarray(headers,dtype=int))
+    if headers.shape!=(nrec,8):
+        raise ValueError("Expected %d headers of 8 integers; got shape %s"%(nrec,str(headers.shape)))
+    return headers
+
+def writesra(filename,fields,code,headers=None,date=20170927,fmt="%9.3f"):
+    '''Write one or more lat-lon fields to a formatted .sra file.
+
+    Parameters
+    ----------
+    filename : str
+        File to write
+    fields : numpy.ndarray
+        Map or maps to write. Should have the dimensions (NLAT,NLON) or (records,NLAT,NLON).
+    code : int
+        The integer map code for specifying what kind of boundary file this is (see the
+        PlaSim documentation for more details)
+    headers : array-like, optional
+        (records,8) array of record headers. If not given, headers are built from ``code``,
+        ``date``, and the shape of ``fields``.
+    date : int, optional
+        Date to put in generated headers.
+    fmt : str, optional
+        Format specifier for each value.
+    '''
+    fields = _asrecords(fields)
+    headers = _makeheaders(fields,code,headers,date)
+    nrec = fields.shape[0]
+    ngp = fields.shape[1]*fields.shape[2]
+    nlines = ngp//8
+    nextra = ngp%8
+    hformat = " %11d"*8+"\n"
+    dformat = (" "+fmt)*8+"\n"
+    with open(filename,"w") as f:
+        for n in range(nrec):
+            values = fields[n].ravel()
+            f.write(hformat%tuple(headers[n]))
+            f.write((dformat*nlines)%tuple(values[:nlines*8]))
+            if nextra:
+                f.write(((" "+fmt)*nextra+"\n")%tuple(values[nlines*8:]))
+
+def readsra(filename):
+    '''Read a formatted .sra file.
+
+    Parameters
+    ----------
+    filename : str
+        File to read
+
+    Returns
+    -------
+    numpy.ndarray, numpy.ndarray
+        (records,8) integer array of headers, and (records,NLAT,NLON) array of fields
+    '''
+    with open(filename,"r") as f:
+        tokens = np.array(f.read().split(),dtype=float)
+    headers = []
+    fields = []
+    n = 0
+    while n+8<=len(tokens):
+        header = tokens[n:n+8].astype(int)
+        nlon = header[4]
+        nlat = header[5]
+        n+=8
+        if n+nlon*nlat>len(tokens):
+            raise ValueError("%s: record %d is truncated"%(filename,len(headers)))
+        headers.append(header)
+        fields.append(np.reshape(tokens[n:n+nlon*nlat],(nlat,nlon)))
+        n+=nlon*nlat
+    return np.array(headers),np.array(fields)
+
+def writesrb(filename,fields,code,headers=None,date=20170927,precision=8,byteorder="="):
+    '''Write one or more lat-lon fields to an unformatted binary .srb file.
+
+    Each record is written as two Fortran unformatted sequential records with 4-byte markers:
+    the 8-integer header, and then NLAT*NLON reals.
+
+    Parameters
+    ----------
+    filename : str
+        File to write
+    fields : numpy.ndarray
+        Map or maps to write. Should have the dimensions (NLAT,NLON) or (records,NLAT,NLON).
+    code : int
+        The integer map code for specifying what kind of boundary file this is
+    headers : array-like, optional
+        (records,8) array of record headers. If not given, headers are built from ``code``,
+        ``date``, and the shape of ``fields``.
+    date : int, optional
+        Date to put in generated headers.
+    precision : int, optional
+        Bytes per real (4 or 8). Must match the precision PlaSim was compiled with.
+    byteorder : str, optional
+        "<" for little-endian, ">" for big-endian, or "=" for the native byte order.
+    '''
+    if precision not in (4,8):
+        raise ValueError("Precision must be 4 or 8 bytes; got %s"%str(precision))
+    fields = _asrecords(fields)
+    headers = _makeheaders(fields,code,headers,date)
+    itype = np.dtype(byteorder+"i4")
+    rtype = np.dtype(byteorder+"f%d"%precision)
+    hmarker = np.array([8*itype.itemsize],dtype=itype).tobytes()
+    dmarker = np.array([fields.shape[1]*fields.shape[2]*precision],dtype=itype).tobytes()
+    with open(filename,"wb") as f:
+        for n in range(fields.shape[0]):
+            f.write(hmarker+headers[n].astype(itype).tobytes()+hmarker)
+            f.write(dmarker+fields[n].astype(rtype).tobytes()+dmarker)
+
+def readsrb(filename):
+    '''Read an unformatted binary .srb file.
+
+    Byte order, record marker length, and precision are detected from the file.
+
+    Parameters
+    ----------
+    filename : str
+        File to read
+
+    Returns
+    -------
+    numpy.ndarray, numpy.ndarray
+        (records,8) integer array of headers, and (records,NLAT,NLON) array of fields
+    '''
+    with open(filename,"rb") as f:
+        fbuffer = f.read()
+    if len(fbuffer)==0:
+        return np.zeros((0,8),dtype=int),np.zeros((0,0,0))
+    en = pyburn._getEndian(fbuffer)
+    ml = pyburn._getmarkerlength(fbuffer,en)
+    mtype = np.dtype(en+"i%d"%ml)
+    headers = []
+    fields = []
+    n = 0
+    while n<len(fbuffer):
+        hlength = int(np.frombuffer(fbuffer,dtype=mtype,count=1,offset=n)[0])
+        header = np.frombuffer(fbuffer,dtype=en+"i%d"%(hlength//8),count=8,offset=n+ml).astype(int)
+        n += 2*ml+hlength
+        dlength = int(np.frombuffer(fbuffer,dtype=mtype,count=1,offset=n)[0])
+        ngp = header[4]*header[5]
+        wordlength = dlength//ngp
+        data = np.frombuffer(fbuffer,dtype=en+"f%d"%wordlength,count=ngp,offset=n+ml)
+        n += 2*ml+dlength
+        headers.append(header)
+        fields.append(np.reshape(data.astype(float),(header[5],header[4])))
+    return np.array(headers),np.array(fields)
+
+def read(filename):
+    '''Read a boundary file in either format, based on its extension.
+
+    Parameters
+    ----------
+    filename : str
+        A .sra or .srb file
+
+    Returns
+    -------
+    numpy.ndarray, numpy.ndarray
+        (records,8) integer array of headers, and (records,NLAT,NLON) array of fields
+    '''
+    if filename[-4:]==".srb":
+        return readsrb(filename)
+    return readsra(filename)
+
+def sra2srb(srafile,srbfile=None,precision=8,byteorder="="):
+    '''Convert a formatted .sra file to an unformatted binary .srb file.
+
+    Parameters
+    ----------
+    srafile : str
+        File to convert
+    srbfile : str, optional
+        File to write. Defaults to ``srafile`` with the extension changed to .srb.
+    precision : int, optional
+        Bytes per real (4 or 8). Must match the precision PlaSim was compiled with.
+    byteorder : str, optional
+        "<" for little-endian, ">" for big-endian, or "=" for the native byte order.
+
+    Returns
+    -------
+    str
+        Name of the file written
+    '''
+    if srbfile is None:
+        srbfile = os.path.splitext(srafile)[0]+".srb"
+    headers,fields = readsra(srafile)
+    writesrb(srbfile,fields,None,headers=headers,precision=precision,byteorder=byteorder)
+    return srbfile
+
+def srb2sra(srbfile,srafile=None,fmt="%9.3f"):
+    '''Convert an unformatted binary .srb file to a formatted .sra file.
+
+    Parameters
+    ----------
+    srbfile : str
+        File to convert
+    srafile : str, optional
+        File to write. Defaults to ``srbfile`` with the extension changed to .sra.
+    fmt : str, optional
+        Format specifier for each value.
+
+    Returns
+    -------
+    str
+        Name of the file written
+    '''
+    if srafile is None:
+        srafile = os.path.splitext(srbfile)[0]+".sra"
+    headers,fields = readsrb(srbfile)
+    writesra(srafile,fields,None,headers=headers,fmt=fmt)
+    return srafile
+
+def _sourcestamp(srafile,precision):
+    '''Identify the exact .sra file a .srb was made from.
+
+    Modification times alone aren't enough: a .sra staged through the input cache is a link
+    to a cached file that keeps its original (possibly old) modification time. The device,
+    inode, size, and modification time together change whenever the file is replaced or edited.
+    '''
+    stat = os.stat(srafile)
+    return "%d %d %d %d %d"%(stat.st_dev,stat.st_ino,stat.st_size,stat.st_mtime_ns,precision)
+
+def _readstamp(stampfile):
+    try:
+        with open(stampfile,"r") as stampf:
+            return stampf.read().strip()
+    except OSError:
+        return None
+
+def discardbinary(srafile):
+    '''Remove the .srb counterpart of a .sra file (and its record of its source), if there is one.
+
+    Parameters
+    ----------
+    srafile : str
+        A .sra file that is about to be replaced or removed
+    '''
+    srbfile = srafile[:-4]+".srb"
+    for name in (srbfile,srbfile+"stamp"):
+        if os.path.lexists(name):
+            os.remove(name)
+
+def syncbinary(workdir,precision=8):
+    '''Make sure every .sra file in a directory has an up-to-date .srb counterpart.
+
+    Each binary file has a ``.srbstamp`` file next to it identifying the .sra file it was made
+    from. Binary files are (re)written when they are missing, or when their .sra file has been
+    replaced or changed since (or the precision differs), and removed when their .sra file no
+    longer exists, so the text files remain the source of truth and can still be replaced or
+    deleted as usual.
+
+    Parameters
+    ----------
+    workdir : str
+        Directory containing boundary files
+    precision : int, optional
+        Bytes per real (4 or 8). Must match the precision PlaSim was compiled with.
+
+    Returns
+    -------
+    list(str)
+        Binary files that were written
+    '''
+    written = []
+    srafiles = glob.glob(workdir+"/*_surf_*.sra")
+    for srafile in srafiles:
+        srbfile = srafile[:-4]+".srb"
+        stamp = _sourcestamp(srafile,precision)
+        if not os.path.exists(srbfile) or _readstamp(srbfile+"stamp")!=stamp:
+            written.append(sra2srb(srafile,srbfile+".tmp",precision=precision)[:-4])
+            os.replace(srbfile+".tmp",srbfile)
+            with open(srbfile+"stamp.tmp","w") as stampf:
+                stampf.write(stamp+"\n")
+            os.replace(srbfile+"stamp.tmp",srbfile+"stamp")
+    for srbfile in glob.glob(workdir+"/*_surf_*.srb"):
+        if srbfile[:-4]+".sra" not in srafiles:
+            discardbinary(srbfile[:-4]+".sra")
+    for stampfile in glob.glob(workdir+"/*_surf_*.srbstamp"):
+        if not os.path.exists(stampfile[:-5]):
+            os.remove(stampfile)
+    return written
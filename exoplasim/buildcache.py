@@ -0,0 +1,367 @@
+import os
+import glob
+import json
+import time
+import fcntl
+import shutil
+import hashlib
+import subprocess
+
+_sourcedir = os.path.dirname(os.path.abspath(__file__))
+
+_digests = {}
+
+def cachedir():
+    '''Return the directory in which compiled executables are cached.
+
+    This is ``exoplasim`` in the user's cache directory (``$XDG_CACHE_HOME``, or ``~/.cache``
+    if that is not set), so that it is writable and survives reinstalling the package, unless
+    the ``EXOPLASIM_BUILDCACHE`` environment variable is set, in which case that path is used.
+
+    Returns
+    -------
+    str
+        Absolute path to the build cache
+    '''
+    path = os.environ.get("EXOPLASIM_BUILDCACHE")
+    if not path:
+        path = os.path.join(os.environ.get("XDG_CACHE_HOME") or "~/.cache","exoplasim")
+    path = os.path.abspath(os.path.expanduser(path))
+    os.makedirs(path,exist_ok=True)
+    return path
+
+class _FileLock:
+    '''Exclusive advisory lock on a file, for use as a context manager.
+
+    Parameters
+    ----------
+    path : str
+        Lock file to use. It will be created if it does not exist.
+    blocking : bool, optional
+        If False, entering the context raises BlockingIOError if the lock is held elsewhere.
+    '''
+    def __init__(self,path,blocking=True):
+        self.path = path
+        self.blocking = blocking
+        self.fd = None
+
+    def __enter__(self):
+        self.fd = open(self.path,"a+")
+        flags = fcntl.LOCK_EX
+        if not self.blocking:
+            flags |= fcntl.LOCK_NB
+        try:
+            fcntl.flock(self.fd,flags)
+        except BlockingIOError:
+            self.fd.close()
+            self.fd = None
+            raise
+        return self
+
+    def __exit__(self,*args):
+        fcntl.flock(self.fd,fcntl.LOCK_UN)
+        self.fd.close()
+        self.fd = None
+
+def sourcedigest(sourcedir=None):
+    '''Compute a digest of the PlaSim source tree and the build scripts that act on it.
+
+    The digest is memoized on the modification times of the files, so repeated calls are cheap.
+
+    Parameters
+    ----------
+    sourcedir : str, optional
+        Path to the exoplasim package. Defaults to the installed package.
+
+    Returns
+    -------
+    str
+        SHA-256 hex digest
+    '''
+    if sourcedir is None:
+        sourcedir = _sourcedir
+    files = sorted(glob.glob(sourcedir+"/plasim/src/*"))
+    files += [sourcedir+"/"+f for f in ("compile.sh","most_precision_optionsx",
+                                           "most_debug_options")]
+    files = [f for f in files if os.path.isfile(f)]
+    stamp = tuple((f,os.stat(f).st_mtime_ns,os.stat(f).st_size) for f in files)
+    if sourcedir in _digests and _digests[sourcedir][0]==stamp:
+        return _digests[sourcedir][1]
+    digest = hashlib.sha256()
+    for f in files:
+        digest.update(os.path.basename(f).encode())
+        with open(f,"rb") as srcf:
+            digest.update(srcf.read())
+    _digests[sourcedir] = (stamp,digest.hexdigest())
+    return _digests[sourcedir][1]
+
+def _compilerconfig(ncpus,sourcedir):
+    '''Return the contents of the compiler configuration written by configure.sh.'''
+    cfgfile = sourcedir+"/most_compiler"
+    if ncpus>1:
+        cfgfile += "_mpi"
+    try:
+        with open(cfgfile,"r") as cfgf:
+            return cfgf.read()
+    except OSError:
+        return ""
+
+def buildkey(nsp,layers,ncpus,precision=8,debug=False,optimization=None,mars=False,
+             force991=False,sourcedir=None,withsource=True):
+    '''Compute the cache key for a particular compiled variant of PlaSim.
+
+    Parameters
+    ----------
+    nsp : int
+        Spectral truncation, e.g. 21 for T21
+    layers : int
+        Number of vertical layers
+    ncpus : int
+        Number of MPI processes
+    precision : int, optional
+        Bytes per Fortran real (4 or 8)
+    debug : bool, optional
+        Whether debugging flags are used
+    optimization : str, optional
+        Extra optimization flags
+    mars : bool, optional
+        Whether Mars-specific routines are used
+    force991 : bool, optional
+        Whether the FFT991 library is forced
+    sourcedir : str, optional
+        Path to the exoplasim package. Defaults to the installed package.
+    withsource : bool, optional
+        If False, leave the source tree digest out of the key. The result identifies the build
+        configuration only, and is used to find object files to seed incremental rebuilds.
+
+    Returns
+    -------
+    str
+        SHA-256 hex digest
+    '''
+    if sourcedir is None:
+        sourcedir = _sourcedir
+    config = {"nsp"          : int(nsp),
+              "layers"       : int(layers),
+              "ncpus"        : int(ncpus),
+              "precision"    : int(precision),
+              "debug"        : bool(debug),
+              "optimization" : optimization,
+              "mars"         : bool(mars),
+              "force991"     : bool(force991),
+              "compiler"     : _compilerconfig(ncpus,sourcedir)}
+    if withsource:
+        config["source"] = sourcedigest(sourcedir)
+    return hashlib.sha256(json.dumps(config,sort_keys=True).encode()).hexdigest()
+
+def _entries():
+    '''Return metadata for every complete entry in the cache.'''
+    entries = []
+    for metafile in glob.glob(cachedir()+"/*/meta.json"):
+        try:
+            with open(metafile,"r") as metaf:
+                meta = json.load(metaf)
+        except (OSError,ValueError):
+            continue
+        meta["path"] = os.path.dirname(metafile)
+        try:
+            meta["lastused"] = os.stat(meta["path"]+"/lastused").st_mtime
+        except OSError:
+            meta["lastused"] = meta.get("built",0.0)
+        entries.append(meta)
+    return entries
+
+def listcache():
+    '''List the executables currently in the build cache, most recently used first.
+
+    Returns
+    -------
+    list(dict)
+        Metadata for each cached build, including its path and parameters.
+    '''
+    return sorted(_entries(),key=lambda meta: meta["lastused"],reverse=True)
+
+def _entrysize(path):
+    size = 0
+    for root,dirs,files in os.walk(path):
+        for f in files:
+            try:
+                size += os.lstat(os.path.join(root,f)).st_size
+            except OSError:
+                pass
+    return size
+
+def evict(maxentries=None,maxbytes=None,maxage=None):
+    '''Remove least-recently-used builds from the cache.
+
+    Entries that are currently locked (being built or copied) are never removed.
+
+    Parameters
+    ----------
+    maxentries : int, optional
+        Maximum number of builds to keep. Defaults to the ``EXOPLASIM_BUILDCACHE_MAX``
+        environment variable, or 32.
+    maxbytes : int, optional
+        Maximum total size of the cache in bytes, including object files.
+    maxage : float, optional
+        Remove builds that have not been used in this many days.
+
+    Returns
+    -------
+    list(str)
+        Paths of the removed entries
+    '''
+    if maxentries is None:
+        maxentries = int(os.environ.get("EXOPLASIM_BUILDCACHE_MAX",32))
+    entries = listcache()
+    now = time.time()
+    total = 0
+    removed = []
+    for n,meta in enumerate(entries):
+        size = _entrysize(meta["path"])
+        total += size
+        expired = (n>=maxentries)
+        expired = expired or (maxbytes is not None and total>maxbytes)
+        expired = expired or (maxage is not None and now-meta["lastused"]>maxage*86400.0)
+        if not expired:
+            continue
+        try:
+            with _FileLock(meta["path"]+".lock",blocking=False):
+                shutil.rmtree(meta["path"],ignore_errors=True)
+            removed.append(meta["path"])
+            total -= size
+        except BlockingIOError:
+            pass
+    return removed
+
+def _privatetree(sourcedir,top):
+    '''Mirror the source tree in top with symlinks, except for an empty plasim/run.
+
+    compile.sh writes the run script and copies the boundary data into plasim/run under
+    whatever directory it is run from, so running it from here keeps concurrent builds of
+    different variants from writing over each other's files in the shared tree.
+    '''
+    os.makedirs(top+"/plasim/run")
+    for name in os.listdir(sourcedir):
+        if name!="plasim":
+            os.symlink(sourcedir+"/"+name,top+"/"+name)
+    for name in os.listdir(sourcedir+"/plasim"):
+        if name not in ("run","bld","cache"):
+            os.symlink(sourcedir+"/plasim/"+name,top+"/plasim/"+name)
+
+def _installrun(entry,sourcedir):
+    '''Copy a cached build's run files into plasim/run, where models copy their inputs from.'''
+    rundir = entry+"/run"
+    if not os.path.isdir(rundir):
+        return
+    with _FileLock(cachedir()+"/run.lock"):
+        for name in os.listdir(rundir):
+            shutil.copy2(rundir+"/"+name,sourcedir+"/plasim/run/"+name)
+
+def getexecutable(nsp,layers,ncpus,precision=8,debug=False,optimization=None,mars=False,
+                  force991=False,rebuild=False,sourcedir=None):
+    '''Return the path to a compiled PlaSim executable, building it if necessary.
+
+    Executables are stored under a hash of every input that affects the build, so different
+    variants never overwrite each other. Concurrent calls for the same variant are serialized
+    with a file lock, so only one of them compiles and the rest reuse its result; calls for
+    different variants build in parallel, each in its own build directory. compile.sh also
+    writes a run script and the variant's boundary data; each build writes these into a private
+    run directory, which is kept with the executable and copied into ``plasim/run`` (under a
+    lock shared by all variants) each time the executable is requested. Object files are
+    kept alongside each executable, and a new variant with the same configuration but
+    different source code starts from the most recent matching object files, so only the
+    changed source files are recompiled.
+
+    Parameters
+    ----------
+    nsp : int
+        Spectral truncation, e.g. 21 for T21
+    layers : int
+        Number of vertical layers
+    ncpus : int
+        Number of MPI processes
+    precision : int, optional
+        Bytes per Fortran real (4 or 8)
+    debug : bool, optional
+        Compile with debugging flags
+    optimization : str, optional
+        Extra optimization flags
+    mars : bool, optional
+        Use Mars-specific routines
+    force991 : bool, optional
+        Force the FFT991 library
+    rebuild : bool, optional
+        Recompile even if the executable is already cached
+    sourcedir : str, optional
+        Path to the exoplasim package. Defaults to the installed package.
+
+    Returns
+    -------
+    str
+        Absolute path to the cached executable
+    '''
+    if sourcedir is None:
+        sourcedir = _sourcedir
+    key = buildkey(nsp,layers,ncpus,precision=precision,debug=debug,optimization=optimization,
+                   mars=mars,force991=force991,sourcedir=sourcedir)
+    config = buildkey(nsp,layers,ncpus,precision=precision,debug=debug,optimization=optimization,
+                      mars=mars,force991=force991,sourcedir=sourcedir,withsource=False)
+    entry = cachedir()+"/"+key
+    executable = entry+"/most_plasim_t%d_l%d_p%d.x"%(nsp,layers,ncpus)
+    with _FileLock(entry+".lock"):
+        if rebuild or not os.path.exists(executable):
+            bld = entry+"/bld"
+            if not os.path.isdir(bld):
+                #Seed the build directory with object files from the same configuration
+                for meta in listcache():
+                    if meta.get("config")==config and os.path.isdir(meta["path"]+"/bld"):
+                        shutil.copytree(meta["path"]+"/bld",bld,symlinks=True)
+                        break
+            os.makedirs(bld,exist_ok=True)
+            flags = ["-n","%d"%ncpus,"-p","%d"%precision,"-r","T%d"%nsp,"-v","%d"%layers,"-b",bld]
+            if debug:
+                flags.append("-d")
+            if optimization:
+                flags += ["-O",optimization]
+            if mars:
+                flags.append("-m")
+            if force991:
+                flags.append("-f")
+            print("Building %s in %s...."%(os.path.basename(executable),bld))
+            top = entry+"/top"
+            shutil.rmtree(top,ignore_errors=True) #Left over from an interrupted build
+            _privatetree(sourcedir,top)
+            try:
+                subprocess.run(["./compile.sh"]+flags,cwd=top)
+                if not os.path.exists(bld+"/plasim.x"):
+                    raise RuntimeError("Compilation failed; no executable was produced in %s"%bld)
+                shutil.rmtree(entry+"/run",ignore_errors=True)
+                os.rename(top+"/plasim/run",entry+"/run")
+            finally:
+                shutil.rmtree(top,ignore_errors=True)
+            shutil.copy2(bld+"/plasim.x",executable+".tmp")
+            os.replace(executable+".tmp",executable)
+            meta = {"key"          : key,
+                    "config"       : config,
+                    "nsp"          : nsp,
+                    "layers"       : layers,
+                    "ncpus"        : ncpus,
+                    "precision"    : precision,
+                    "debug"        : bool(debug),
+                    "optimization" : optimization,
+                    "mars"         : bool(mars),
+                    "force991"     : bool(force991),
+                    "executable"   : executable,
+                    "built"        : time.time()}
+            with open(entry+"/meta.json","w") as metaf:
+                json.dump(meta,metaf,indent=1)
+            built = True
+        else:
+            built = False
+        _installrun(entry,sourcedir)
+        with open(entry+"/lastused","w") as lastf:
+            lastf.write("%f\n"%time.time())
+    if built:
+        evict()
+    return executable
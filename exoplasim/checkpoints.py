@@ -0,0 +1,212 @@
+"""
+Keep, thin out, and roll back to PlaSim restart files.
+
+At the end of each year PlaSim writes its full state to ``plasim_status``, which becomes both the
+next year's ``plasim_restart`` and a checkpoint named ``MOST_REST.XXXXX``. This module manages
+those checkpoints. They can be thinned out on a retention schedule, so that recent years are
+all kept and older ones only every so often. They can be gzip-compressed, and a checkpoint
+identical to the one before it is stored as a hard link instead of a second copy. Rolling back
+to a checkpoint, e.g. to recover from a crash, is a single call to :py:func:`restore` that
+writes the state straight into ``plasim_restart``.
+
+A retention schedule is a sequence of ``(span, interval)`` pairs, applied from the most recent
+checkpoint backwards. The first ``span`` years keep a checkpoint every ``interval`` years, the
+next pair covers the years before that, and so on. A span of None covers everything that is
+left. Years past the end of the schedule are not kept. The most recent checkpoint is always
+kept. For example, :py:data:`SCHEDULE` keeps every year for the last 10 years, every 10th year
+for the 100 before that, and every 100th year after that.
+"""
+import os
+import re
+import gzip
+import glob
+import shutil
+import hashlib
+
+SCHEDULE = ((10,1),(100,10),(None,100))
+
+_restartname = re.compile(r"^MOST_REST\.(\d{5})(\.gz)?$")
+
+def _digest(filename):
+    digest = hashlib.sha256()
+    with open(filename,"rb") as f:
+        for block in iter(lambda: f.read(1<<20),b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def checkpoints(workdir):
+    '''Find the checkpoints in a work directory.
+
+    Parameters
+    ----------
+    workdir : str
+        Model work directory
+
+    Returns
+    -------
+    dict
+        Path to the checkpoint for each year that has one
+    '''
+    found = {}
+    for filename in glob.glob(workdir+"/MOST_REST.*"):
+        match = _restartname.match(os.path.basename(filename))
+        if match:
+            found[int(match.group(1))] = filename
+    return found
+
+def years(workdir):
+    '''Return the sorted list of years with a checkpoint in a work directory.'''
+    return sorted(checkpoints(workdir).keys())
+
+def store(workdir,year,statusfile="plasim_status",restartfile="plasim_restart",compress=False):
+    '''Turn PlaSim's end-of-year status file into the next restart file and a checkpoint.
+
+    This replaces ``cp plasim_status plasim_restart && mv plasim_status MOST_REST.XXXXX``.
+
+    Parameters
+    ----------
+    workdir : str
+        Model work directory
+    year : int
+        The year that just finished
+    statusfile : str, optional
+        Status file written by PlaSim, relative to ``workdir``
+    restartfile : str, optional
+        Restart file PlaSim will read next, relative to ``workdir``
+    compress : bool, optional
+        If True, gzip the checkpoint (``MOST_REST.XXXXX.gz``)
+
+    Returns
+    -------
+    str or None
+        Path to the checkpoint, or None if there was no status file
+    '''
+    status = workdir+"/"+statusfile
+    if not os.path.exists(status):
+        return None
+    shutil.copyfile(status,workdir+"/"+restartfile)
+    previous = [y for y in years(workdir) if y<year]
+    discard(workdir,year-1) #Anything at or after this year is from an abandoned run
+    checkpoint = workdir+"/MOST_REST.%05d"%year
+    if compress:
+        checkpoint += ".gz"
+        with open(status,"rb") as raw, open(checkpoint+".tmp","wb") as out:
+            #No name or mtime in the header, so identical states compress to identical files
+            with gzip.GzipFile(filename="",fileobj=out,mode="wb",compresslevel=1,mtime=0) as zipped:
+                shutil.copyfileobj(raw,zipped,1<<20)
+        os.replace(checkpoint+".tmp",checkpoint)
+        os.remove(status)
+    else:
+        os.replace(status,checkpoint)
+    if len(previous)>0:
+        last = checkpoints(workdir)[previous[-1]]
+        if (last[-3:]==checkpoint[-3:] and os.path.getsize(last)==os.path.getsize(checkpoint)
+            and _digest(last)==_digest(checkpoint)):
+            try:
+                os.link(last,checkpoint+".tmp")
+                os.replace(checkpoint+".tmp",checkpoint)
+            except OSError:
+                pass
+    return checkpoint
+
+def retained(yearlist,schedule=SCHEDULE):
+    '''Work out which years a retention schedule keeps.
+
+    Parameters
+    ----------
+    yearlist : list(int)
+        Years with checkpoints
+    schedule : sequence of (int or None, int) pairs, optional
+        Retention schedule (see the module description)
+
+    Returns
+    -------
+    set(int)
+        The years to keep
+    '''
+    if len(yearlist)==0:
+        return set()
+    newest = max(yearlist)
+    keep = set([newest,])
+    for year in yearlist:
+        age = newest-year
+        start = 0
+        for span,interval in schedule:
+            if span is None or age<start+span:
+                if year%interval==0:
+                    keep.add(year)
+                break
+            start += span
+    return keep
+
+def prune(workdir,schedule=SCHEDULE):
+    '''Delete the checkpoints a retention schedule doesn't keep.
+
+    Parameters
+    ----------
+    workdir : str
+        Model work directory
+    schedule : sequence of (int or None, int) pairs, optional
+        Retention schedule (see the module description)
+
+    Returns
+    -------
+    list(int)
+        Years whose checkpoints were deleted
+    '''
+    found = checkpoints(workdir)
+    keep = retained(list(found.keys()),schedule)
+    removed = []
+    for year in sorted(found):
+        if year not in keep:
+            os.remove(found[year])
+            removed.append(year)
+    return removed
+
+def discard(workdir,after):
+    '''Delete every checkpoint later than a given year.
+
+    Returns
+    -------
+    list(int)
+        Years whose checkpoints were deleted
+    '''
+    found = checkpoints(workdir)
+    removed = []
+    for year in sorted(found):
+        if year>after:
+            os.remove(found[year])
+            removed.append(year)
+    return removed
+
+def restore(workdir,year=None,restartfile="plasim_restart"):
+    '''Write a checkpoint into the restart file, so the next run picks up from it.
+
+    Parameters
+    ----------
+    workdir : str
+        Model work directory
+    year : int, optional
+        Year to roll back to. If there is no checkpoint for that year, the most recent one
+        before it is used. Defaults to the most recent checkpoint.
+    restartfile : str, optional
+        Restart file to write, relative to ``workdir`` (or an absolute path)
+
+    Returns
+    -------
+    int
+        The year that was restored. The next year to run is one after it.
+    '''
+    found = checkpoints(workdir)
+    candidates = [y for y in found if year is None or y<=year]
+    if len(candidates)==0:
+        raise FileNotFoundError("No restart file from year %s or earlier in %s"%(year,workdir))
+    restored = max(candidates)
+    dest = os.path.join(workdir,restartfile)
+    if found[restored][-3:]==".gz":
+        with gzip.open(found[restored],"rb") as zipped, open(dest+".tmp","wb") as raw:
+            shutil.copyfileobj(zipped,raw,1<<20)
+    else:
+        shutil.copyfile(found[restored],dest+".tmp")
+    os.replace(dest+".tmp",dest)
+    return restored
@@ -105,6 +105,92 @@ def makexyz(wvl,spec,interpolant=None):
     
     return xnu,ynu,YI
 
+def _trapzweights(wvl,valid):
+    '''Trapezoid-rule quadrature weights for each point of one or more spectra.
+
+    Points flagged as invalid get zero weight, and their valid neighbours are joined directly,
+    exactly as if the invalid points had been removed before integrating.
+
+    Parameters
+    ----------
+    wvl : array-like
+        Wavelengths, of shape (N,)
+    valid : array-like
+        Boolean mask of shape (N,) or (...,N)
+
+    Returns
+    -------
+    numpy.ndarray
+        Weights with the same shape as ``valid``
+    '''
+    nw = len(wvl)
+    idx = np.broadcast_to(np.arange(nw),valid.shape)
+    last = np.maximum.accumulate(np.where(valid,idx,-1),axis=-1) #Last valid point at or before n
+    first = np.minimum.accumulate(np.where(valid,idx,nw)[...,::-1],axis=-1)[...,::-1]
+    before = np.concatenate((np.zeros(valid.shape[:-1]+(1,),dtype=int)-1,last[...,:-1]),axis=-1)
+    after = np.concatenate((first[...,1:],np.zeros(valid.shape[:-1]+(1,),dtype=int)+nw),axis=-1)
+    before = np.where(before<0,idx,before)
+    after = np.where(after>=nw,idx,after)
+    weights = 0.5*(wvl[after]-wvl[before])
+    weights[~valid] = 0.0
+    return weights
+
+def makexyzs(wvl,specs,interpolant=None):
+    '''Convert many spectra to XYZ colour coordinates at once.
+
+    Equivalent to calling :py:func:`makexyz` on each spectrum, but the integrals against the
+    colour-matching functions are done for all spectra as a single matrix product. NaNs are
+    skipped in the same way as :py:func:`makexyz`, by adjusting the quadrature weights of each
+    spectrum rather than masking spectra one at a time.
+
+    Parameters
+    ----------
+    wvl : array-like
+        Wavelengths in nanometers, of shape (N,)
+    specs : array-like
+        Spectra, of shape (M,N) (or any shape whose last axis has length N); units are
+        arbitrary, but they should be given in flux, not flux density.
+    interpolant : array-like, optional
+        2D array of shape (3,N), corresponding to interpolated color-matching functions
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (M,3) (or the leading shape of ``specs`` followed by 3), containing x,y,Y
+        for each spectrum.
+    '''
+    wvl = np.asarray(wvl,dtype=float)
+    if np.amin(wvl)<1.0e-3: #probably meters not nanometers
+        wvl = wvl*1.0e9
+    specs = np.asarray(specs,dtype=float)
+    imin = np.where(wvl>np.amin(cie_wvl))[0][0]
+    imax = np.where(wvl<np.amax(cie_wvl))[0][-1]
+    wn = wvl[imin:imax+1]
+    specn = specs[...,imin:imax+1]
+    if interpolant is None:
+        cmf = np.array([np.interp(wn,cie_wvl,cie_xx),
+                        np.interp(wn,cie_wvl,cie_yy),
+                        np.interp(wn,cie_wvl,cie_zz)])
+    else:
+        cmf = np.asarray(interpolant)
+
+    valid = ~np.isnan(specn)
+    if np.all(valid):
+        weights = cmf*_trapzweights(wn,np.ones(len(wn),dtype=bool))[np.newaxis,:]
+        XYZ = np.dot(specn,weights.T)
+    else:
+        XYZ = np.dot(np.where(valid,specn,0.0)*_trapzweights(wn,valid),cmf.T)
+
+    xyzmin = np.amin(XYZ,axis=-1)
+    XYZ -= np.minimum(xyzmin,0.0)[...,np.newaxis]
+    total = np.sum(XYZ,axis=-1)
+    positive = total>0
+    intensities = np.zeros(XYZ.shape)
+    intensities[...,0] = np.divide(XYZ[...,0],total,out=np.zeros(total.shape),where=positive)
+    intensities[...,1] = np.divide(XYZ[...,1],total,out=np.zeros(total.shape),where=positive)
+    intensities[...,2] = XYZ[...,1]
+    return intensities
+
 def xyz2rgb(x,y,normalization,gamut="sRGB"):
     '''Convert (x,y) coordinates to RGB tuples, normalized to a given value.
     
@@ -151,6 +237,68 @@ def xyz2rgb(x,y,normalization,gamut="sRGB"):
     return r,g,b
 
 
+def xyzs2rgb(x,y,normalization,gamut="sRGB"):
+    '''Convert arrays of (x,y) coordinates to RGB values in one pass.
+
+    Equivalent to calling :py:func:`xyz2rgb` on each element.
+
+    Parameters
+    ----------
+    x : array-like
+        x colour-coordinates
+    y : array-like
+        y colour-coordinates, with the same shape as ``x``
+    normalization : array-like or float
+        Normalization factors for scaling RGB values
+    gamut : str or np.ndarray(3,3), optional
+        Color gamut to be used. For available built-in color gamuts, see colormatch.colorgamuts.
+
+    Returns
+    -------
+    numpy.ndarray
+        Array with the shape of ``x`` plus a trailing axis of length 3, containing R,G,B.
+    '''
+    if type(gamut)==str:
+        if gamut not in colorgamuts:
+            raise Exception("Error: must specify valid RGB color gamut")
+        colorgamut = colorgamuts[gamut]
+    else:
+        if gamut.shape==np.array((3,3)).shape:
+            colorgamut = gamut
+        else:
+            raise Exception("Error: must specify valid RGB color gamut")
+    x = np.asarray(x,dtype=float)
+    y = np.asarray(y,dtype=float)
+    z = 1-(x+y)
+    scale = np.sum(colorgamut,axis=1)
+    colors = np.stack((x,y,z),axis=-1)*scale*np.asarray(normalization)[...,np.newaxis]
+    return colors
+
+def gammacorrect(colors,gamma=True):
+    '''Apply gamma correction to RGB values.
+
+    Parameters
+    ----------
+    colors : array-like
+        RGB values
+    gamma : bool or float, optional
+        If True, use the piecewise gamma-function defined for sRGB; otherwise if a float, use rgb^(1/gamma).
+        If None, gamma=1.0 is used.
+
+    Returns
+    -------
+    numpy.ndarray
+        Gamma-corrected RGB values
+    '''
+    colors = np.array(colors,dtype=float)
+    if gamma is True:
+        colors[colors<0.0031308] = 12.92*colors[colors<0.0031308]
+        colors[colors>=0.0031308] = 1.055*colors[colors>=0.0031308]**(1./2.4)-0.055
+    elif gamma is not None:
+        colors = colors**(1./gamma)
+    return colors
+
+
 #From http://www.brucelindbloom.com/index.html?Eqn_RGB_XYZ_Matrix.html
 #Assume whitepoint is D50 unless indicated otherwise
 colorgamuts = {"wide": np.array([[ 1.4628067, -0.1840623, -0.2743606],
@@ -344,19 +492,8 @@ def specs2rgb(wvl,specs,gamma=True,gamut='sRGB'):
     array-like
         (M,3)-shape numpy array of R/G/B values
     '''
-    interpol = interpolant(wvl)
-    intensities = np.zeros((len(specs),3))
-    for n in range(0,len(specs)):
-        intensities[n,:] = makexyz(wvl,specs[n,:],interpolant=interpol)
-    norms = intensities[:,2]/np.amax(intensities[:,2])
-    colors = np.zeros((len(specs),3))
-    for n in range(0,len(specs)):
-        colors[n,:] = xyz2rgb(intensities[n,0],intensities[n,1],norms[n],gamut=gamut)
-    if gamma is True:
-        colors[colors<0.0031308] = 12.92*colors[colors<0.0031308]
-        colors[colors>=0.0031308] = 1.055*colors[colors>=0.0031308]**(1./2.4)-0.055
-    elif gamma is not None:
-        colors = colors**(1./gamma)
-    return colors
+    intensities = makexyzs(wvl,specs,interpolant=interpolant(wvl))
+    norms = intensities[...,2]/np.amax(intensities[...,2])
+    colors = xyzs2rgb(intensities[...,0],intensities[...,1],norms,gamut=gamut)
+    return gammacorrect(colors,gamma=gamma)
     
-    
\ No newline at end of file
@@ -24,6 +24,10 @@
 #
 #      -d:   Compile in debug mode (will produce line-number tracebacks on crash)
 #
+#      -b:   Build in the given directory instead of plasim/bld. Object files in that
+#            directory are kept for incremental rebuilds, and the executable is left there
+#            as plasim.x instead of being copied to plasim/bin and plasim/run.
+#
 helptext=$(cat <<-END
                EXOPLASIM COMPILATION SCRIPT
 
@@ -53,6 +57,10 @@ helptext=$(cat <<-END
 
       -m:   Compile with Mars routines
       
+      -b:   Build in the given directory instead of plasim/bld. Object files in that
+            directory are kept for incremental rebuilds, and the executable is left there
+            as plasim.x instead of being copied to plasim/bin and plasim/run.
+      
       -h:   Output this text
 END
 )
@@ -70,8 +78,11 @@ optimization=""
 nopt=0
 years=1
 nmars=0
+top=$(pwd)
+bld=$top/plasim/bld
+cached=0
 
-while getopts "p:r:v:n:O:t:dhm" opt; do
+while getopts "p:r:v:n:O:t:b:dhmf" opt; do
     case $opt in
         p)
             case $OPTARG in
@@ -190,6 +201,10 @@ while getopts "p:r:v:n:O:t:dhm" opt; do
             optimization="-"$OPTARG
             nopt=1
             ;;
+        b)
+            bld=$OPTARG
+            cached=1
+            ;;
         h)
             echo "$helptext"
             exit 0
@@ -210,8 +225,9 @@ executable="most_plasim_"$resolution"_l"$levels"_p"$ncpus".x"
 
 echo "Writing resmod.f90....."
 
-cd plasim/bld/
-rm -rf *
+mkdir -p $bld
+cd $bld
+(($cached)) || rm -rf *
 
 
 #       ! T85L30 on 16/32/64 processors
@@ -238,32 +254,34 @@ rm -rf *
 #       !parameter(NPRO_ATM = 64) 
 
 
-echo "      module resmod ! generated by compile.sh ">resmod.f90
-echo "      parameter(NLAT_ATM = "$latitudes") ">>resmod.f90
-echo "      parameter(NLEV_ATM = "$levels") ">>resmod.f90
-echo "      parameter(NPRO_ATM = "$ncpus") ">>resmod.f90
-echo "      end module resmod ">>resmod.f90
-echo " ">>resmod.f90
+echo "      module resmod ! generated by compile.sh ">resmod.new
+echo "      parameter(NLAT_ATM = "$latitudes") ">>resmod.new
+echo "      parameter(NLEV_ATM = "$levels") ">>resmod.new
+echo "      parameter(NPRO_ATM = "$ncpus") ">>resmod.new
+echo "      end module resmod ">>resmod.new
+echo " ">>resmod.new
+#Only touch resmod.f90 if it changed, so incremental builds don't recompile everything
+cmp -s resmod.new resmod.f90 && rm resmod.new || mv resmod.new resmod.f90
 
-rm plasim.x
-rm ../bin/$executable
-rm ../run/$executable
-cp -p ../src/* .
+rm -f plasim.x
+(($cached)) || rm ../bin/$executable
+(($cached)) || rm ../run/$executable
+cp -p $top/plasim/src/* .
 
 if [ "$ncpus" -gt 1 ]
 then
     [ ! -e MPI ] && rm -f *.o *.mod *.x
     touch MPI
-    cp ../../most_compiler_mpi compilerargs
+    cp $top/most_compiler_mpi compilerargs
 else
     [ ! -e MPI ] && rm -f *.o *.mod *.x MPI
-    cp ../../most_compiler compilerargs
+    cp $top/most_compiler compilerargs
 fi
 
 dbgs=""
-(($debug)) && dbgs='../../most_debug_options '
+(($debug)) && dbgs=$top'/most_debug_options '
 
-cp ../../most_precision_optionsx precisionargsx
+cp $top/most_precision_optionsx precisionargsx
 if [ "$prec" -gt 4 ]
 then
     sed -i.bak '1s/$/'$prec'/' precisionargsx
@@ -274,7 +292,7 @@ fi
 
 (($nopt)) && sed -i.bak '3s/$/ '$optimization'/' compilerargs && rm -rf compilerargs.bak
 
-cat compilerargs $dbgs../bld/precisionargsx make_plasim > makefile
+cat compilerargs $dbgs precisionargsx make_plasim > makefile
 
 echo "Writing makefile..."
 echo ""
@@ -286,9 +304,12 @@ export FFTMOD=$fftopt
 make -e
 ./most_snow_build$prec
 ./most_ice_build$prec
-cp plasim.x ../bin/$executable
-cp ../bin/$executable ../run/
-cd ../../
+if [ "$cached" -eq 0 ]
+then
+    cp plasim.x ../bin/$executable
+    cp ../bin/$executable ../run/
+fi
+cd $top
 
 (($nmars)) && cp plasim/dat/T"${resolution[@]:1}"_mars/* plasim/run/ || cp plasim/dat/T"${resolution[@]:1}"/* plasim/run/
 
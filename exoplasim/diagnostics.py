@@ -0,0 +1,233 @@
+"""
+Parse PlaSim's text diagnostics (``MOST_DIAG.XXXXX``) into a per-year columnar store.
+
+Each year, PlaSim writes a diagnostic file containing (among the namelists and start-up
+information) periodic printouts of orbital parameters and zonal-mean cross-sections of wind,
+temperature, humidity, and cloud cover, and at the end of the year a summary of the resources
+the run used, including the walltime per simulated year. :py:func:`parse` reduces one of these
+files to a flat record, and :py:func:`ingest` appends that record to a compact NumPy archive
+(``diagnostics.npz`` in the model's work directory) with one column per quantity and one row per
+year, so the whole history can be read back as arrays without opening any text files or
+postprocessed outputs again.
+"""
+import os
+import re
+import numpy as np
+
+#Resource summary printed at the end of each run. Labels are matched with whitespace collapsed.
+RESOURCES = {"user time"           :("usertime"      ,1.0    ),
+             "system time"         :("systemtime"    ,1.0    ),
+             "total cpu time"      :("cputime"       ,1.0    ),
+             "memory usage"        :("memory"        ,1.0    ),
+             "page reclaims"       :("pagereclaims"  ,1.0    ),
+             "page faults"         :("pagefaults"    ,1.0    ),
+             "page swaps"          :("pageswaps"     ,1.0    ),
+             "disk read"           :("diskread"      ,1.0    ),
+             "disk write"          :("diskwrite"     ,1.0    ),
+             "seconds per sim year":("secondsperyear",1.0    ),
+             "minutes per sim year":("secondsperyear",60.0   ),
+             "days per sim year"   :("secondsperyear",86400.0),
+             "sim years per day"   :("yearsperday"   ,1.0    )}
+
+#Zonal cross-sections printed every NDIAG steps: (key, scale, offset) to recover SI units
+#from the printed integers.
+CROSSSECTIONS = {"Zonal Wind [0.1 m/s]"       :("ua" ,0.1   ,0.0   ),
+                 "Meridional Wind [0.1 m/s]"  :("va" ,0.1   ,0.0   ),
+                 "Temperature [C]"            :("ta" ,1.0   ,273.15),
+                 "specific humidity [0.1g/Kg]":("hus",1.0e-4,0.0   ),
+                 "cloud cover [%]"            :("cl" ,0.01  ,0.0   )}
+
+_resourceline = re.compile(r"^\s*\*\s*([A-Za-z][A-Za-z ]*?)\s*:?\s*([-+]?\d+\.?\d*(?:[eE][-+]?\d+)?)")
+_orbitline = re.compile(r"^>>>\s*\*\s*\d+-\w{3}-\d+\s+\d+:\d+\s+(.+?)\s*=\s*(\S+)")
+
+def _number(text):
+    try:
+        return float(text)
+    except ValueError: #Fortran prints asterisks when a value overflows its field
+        return np.nan
+
+def parse(filename):
+    '''Reduce a PlaSim diagnostic file to a flat record.
+
+    Parameters
+    ----------
+    filename : str
+        A ``MOST_DIAG.XXXXX`` file (or ``plasim_diag``)
+
+    Returns
+    -------
+    dict
+        The resources used (``secondsperyear``, ``yearsperday``, ``cputime``, ``usertime``,
+        ``systemtime`` [s], ``memory`` [MB], ``pagereclaims``, ``pagefaults``, ``pageswaps``,
+        ``diskread``, ``diskwrite``), the number of months completed (``months``) and of
+        diagnostic printouts (``samples``), the mean orbital distance modulus
+        (``distancemodulus``) and extremes of solar declination (``maxdeclination``,
+        ``mindeclination``), and the annual mean of each zonal cross-section as a vertical
+        profile (``ua``, ``va`` [m/s], ``ta`` [K], ``hus`` [kg/kg], ``cl`` [1]), averaged over
+        the latitudes PlaSim prints. Quantities not found in the file are NaN (or missing,
+        for the profiles).
+    '''
+    record = {}
+    for label in RESOURCES:
+        record[RESOURCES[label][0]] = np.nan
+    record["months"] = 0
+    record["samples"] = 0
+    modulus = []
+    declination = []
+    sections = {}
+    table = None
+    with open(filename,"r",errors="replace") as diagf:
+        for line in diagf:
+            if line.startswith(">>>"):
+                match = _orbitline.match(line)
+                if match:
+                    title = match.group(1)
+                    if title=="Distance Modulus":
+                        modulus.append(_number(match.group(2)))
+                    elif title=="Solar Declination [deg]":
+                        declination.append(_number(match.group(2)))
+                        record["samples"] += 1
+                continue
+            if line.startswith("Completed month"):
+                record["months"] += 1
+                continue
+            if table is not None:
+                if line[3:5]=="Lv" or line.strip().startswith("****"):
+                    if line.strip().startswith("****") and len(table[1])>0:
+                        sections.setdefault(table[0],[]).append(np.array(table[1]))
+                        table = None
+                    continue
+                values = [_number(line[n:n+4]) for n in range(8,72,4)]
+                table[1].append(np.nanmean(values) if np.any(np.isfinite(values)) else np.nan)
+                continue
+            if line.startswith(" *    * ") and line[28:58].strip() in CROSSSECTIONS:
+                table = (line[28:58].strip(),[])
+                continue
+            match = _resourceline.match(line)
+            if match:
+                label = " ".join(match.group(1).split()).lower()
+                if label in RESOURCES:
+                    key,scale = RESOURCES[label]
+                    record[key] = float(match.group(2))*scale
+    if len(modulus)>0:
+        record["distancemodulus"] = np.nanmean(modulus)
+    else:
+        record["distancemodulus"] = np.nan
+    if len(declination)>0:
+        record["maxdeclination"] = np.nanmax(declination)
+        record["mindeclination"] = np.nanmin(declination)
+    else:
+        record["maxdeclination"] = np.nan
+        record["mindeclination"] = np.nan
+    for title in sections:
+        key,scale,offset = CROSSSECTIONS[title]
+        profiles = [profile for profile in sections[title] if len(profile)==len(sections[title][0])]
+        profiles = np.array(profiles)
+        counts = np.sum(np.isfinite(profiles),axis=0)
+        profile = np.nansum(profiles,axis=0)/np.maximum(counts,1)
+        profile[counts==0] = np.nan
+        record[key] = profile*scale+offset
+    return record
+
+def load(filename):
+    '''Load a diagnostics store.
+
+    Parameters
+    ----------
+    filename : str
+        Store written by :py:func:`append` or :py:func:`ingest`
+
+    Returns
+    -------
+    dict
+        Arrays with one row per year, including "year". Empty if the store does not exist.
+    '''
+    if not os.path.exists(filename):
+        return {"year":np.zeros(0,dtype=int)}
+    with np.load(filename) as store:
+        return {key:store[key] for key in store.files}
+
+def append(filename,record):
+    '''Add a year's record to a diagnostics store, replacing any earlier record for that year.
+
+    Parameters
+    ----------
+    filename : str
+        Store to update (created if it does not exist)
+    record : dict
+        Record with a "year" entry and scalar or 1-D array values. Columns missing from either
+        the store or the record are filled with NaN.
+    '''
+    columns = load(filename)
+    keep = columns["year"]!=int(record["year"])
+    columns = {key:columns[key][keep] for key in columns}
+    nrows = int(np.sum(keep))
+    for key in set(columns)|set(record):
+        if key=="year":
+            continue
+        value = record.get(key)
+        if key in columns:
+            shape = columns[key].shape[1:]
+        else:
+            shape = np.shape(value)
+            columns[key] = np.full((nrows,)+shape,np.nan)
+        if value is None or np.shape(value)!=shape:
+            value = np.full(shape,np.nan)
+        columns[key] = np.concatenate([columns[key],np.asarray(value,dtype=float)[np.newaxis,...]])
+    columns["year"] = np.append(columns["year"],int(record["year"]))
+    order = np.argsort(columns["year"],kind="stable")
+    tmpfile = filename+".tmp"
+    with open(tmpfile,"wb") as storef:
+        np.savez(storef,**{key:columns[key][order] for key in columns})
+    os.replace(tmpfile,filename) #Never leave a half-written store behind
+
+def truncate(filename,year):
+    '''Drop every record after a given year from a diagnostics store, e.g. after a rollback.
+
+    Parameters
+    ----------
+    filename : str
+        Store to update. Nothing happens if it does not exist.
+    year : int
+        Last year to keep
+
+    Returns
+    -------
+    int
+        Number of records dropped
+    '''
+    columns = load(filename)
+    keep = columns["year"]<=int(year)
+    ndropped = int(np.sum(~keep))
+    if ndropped==0:
+        return 0
+    tmpfile = filename+".tmp"
+    with open(tmpfile,"wb") as storef:
+        np.savez(storef,**{key:columns[key][keep] for key in columns})
+    os.replace(tmpfile,filename)
+    return ndropped
+
+def ingest(diagfile,filename,year,**extra):
+    '''Parse a year's diagnostic file and add it to a diagnostics store.
+
+    Parameters
+    ----------
+    diagfile : str
+        The ``MOST_DIAG.XXXXX`` file for the year
+    filename : str
+        Store to update
+    year : int
+        The model year
+    **extra : float, optional
+        Other quantities to record for the year, e.g. ``hfns=0.3,ntr=0.2``.
+
+    Returns
+    -------
+    dict
+        The record that was stored
+    '''
+    record = parse(diagfile)
+    record.update(extra)
+    record["year"] = int(year)
+    append(filename,record)
+    return record
@@ -0,0 +1,274 @@
+import os
+import numpy as np
+import multiprocessing as mp
+import exoplasim
+
+def _runmember(model,method,kwargs):
+    '''Run a single ensemble member inside a worker process.
+
+    Parameters
+    ----------
+    model : exoplasim.Model
+        The member to run.
+    method : str
+        Name of the Model method to call, e.g. "run" or "runtobalance".
+    kwargs : dict
+        Keyword arguments to pass to the method.
+
+    Returns
+    -------
+    exoplasim.Model, object, str
+        The updated model, whatever the method returned, and a status string.
+    '''
+    try:
+        result = getattr(model,method)(**kwargs)
+        status = "finished"
+    except Exception as err: #Model._crash() raises a RuntimeError once the files are moved
+        result = None
+        status = "crashed: %s"%str(err).split("\n")[0]
+    return model,result,status
+
+def _runmember_star(args):
+    return _runmember(*args)
+
+class Ensemble(object):
+    """Create an ensemble of ExoPlaSim models that share a single compiled executable.
+
+    Every member is built from the same resolution, layer count, and number of CPUs, so the
+    executable is compiled (at most) once, by the first member. Subsequent members skip the
+    compile check, and their work directories are populated with links to the shared
+    executable and boundary condition files instead of full copies. Members are configured
+    with a shared base configuration, updated with each member's own overrides.
+
+    Parameters
+    ----------
+    overrides : list(dict) or int
+        Either a list of dictionaries of :py:func:`Model.configure <exoplasim.Model.configure>`
+        keyword arguments, one per member, or an integer number of identical members.
+    base : dict, optional
+        Keyword arguments to :py:func:`Model.configure <exoplasim.Model.configure>` shared by
+        all members. Member overrides take precedence.
+    workdir : str, optional
+        Directory in which all the member work directories will be created.
+    modelname : str, optional
+        Name stem for the members. Member ``n`` will be called ``<modelname>_<n>``,
+        with n zero-padded to 3 digits.
+    cores : int, optional
+        Number of cores available on this machine. Defaults to ``os.cpu_count()``.
+    maxconcurrent : int, optional
+        Maximum number of members that may run at once. The actual number will also be
+        limited by how many members fit in ``cores`` given each member's ``ncpus``.
+    linkinputs : bool, optional
+        If True (default), link static inputs into the member work directories instead of
+        copying them.
+    buildcache : bool, optional
+        If True (default), members take their executable from the
+        :py:mod:`build cache <exoplasim.buildcache>`, so it is compiled at most once per variant
+        and member construction never waits on a rebuild.
+    inputcache : bool, optional
+        If True (default), stellar spectra, maps, and other input files are stored once in the
+        :py:mod:`input cache <exoplasim.inputcache>` and linked into the member work directories.
+    **kwargs : optional
+        Any other keyword arguments accepted by :py:class:`Model <exoplasim.Model>`, such as
+        ``resolution``, ``layers``, ``ncpus``, or ``outputtype``. Note that ``workdir``
+        and ``modelname`` are set per-member.
+
+    Returns
+    -------
+    Ensemble
+        An ensemble of configured Models, ready to run.
+
+    Examples
+    --------
+
+    >>> import exoplasim as exo
+    >>> sweep = exo.Ensemble([{"flux":f} for f in np.linspace(1100.,1600.,num=12)],
+                             base={"pCO2":400.0e-6},workdir="fluxsweep",modelname="flux",
+                             resolution="T21",layers=10,ncpus=4,cores=48)
+    >>> sweep.run("runtobalance",baseline=30,maxyears=100,minyears=50)
+    >>> table = sweep.summary(variables=["ts"],filename="fluxsweep.csv")
+
+    Here, 12 T21 models with different instellations are created, and run to energy balance
+    12 at a time (48 cores divided among 4-CPU members). Global annual means of surface
+    temperature and the energy balance of each member are then collected in a single table.
+    """
+    def __init__(self,overrides,base={},workdir="ensemble",modelname="member",cores=None,
+                 maxconcurrent=None,linkinputs=True,buildcache=True,inputcache=True,**kwargs):
+
+        if type(overrides)==int:
+            overrides = [{} for n in range(overrides)]
+        self.overrides = list(overrides)
+        self.base = dict(base)
+        self.nmembers = len(self.overrides)
+
+        self.odir = os.getcwd()
+        if workdir[0]!="/":
+            workdir = self.odir+"/"+workdir
+        self.workdir = workdir
+        os.system("mkdir -p %s"%self.workdir)
+        self.modelname = modelname
+
+        self.ncpus = kwargs.get("ncpus",4)
+        if cores is None:
+            cores = os.cpu_count()
+        self.cores = cores
+        self.nslots = max(1,self.cores//self.ncpus)
+        if maxconcurrent is not None:
+            self.nslots = max(1,min(self.nslots,maxconcurrent))
+
+        self.members = []
+        self.status = []
+        self.results = []
+        for n in range(self.nmembers):
+            memberkwargs = dict(kwargs)
+            if n>0: #Only the first member is allowed to trigger a compile
+                memberkwargs["recompile"] = False
+            if n>0 and not buildcache:
+                memberkwargs["debug"] = False
+                memberkwargs["optimization"] = None
+            model = exoplasim.Model(workdir=self.workdir+"/%s_%03d"%(modelname,n),
+                                    modelname="%s_%03d"%(modelname,n),
+                                    linkinputs=linkinputs,buildcache=buildcache,
+                                    inputcache=inputcache,
+                                    **memberkwargs)
+            cfg = dict(self.base)
+            cfg.update(self.overrides[n])
+            model.configure(**cfg)
+            model.exportcfg()
+            self.members.append(model)
+            self.status.append("configured")
+            self.results.append(None)
+        os.chdir(self.odir)
+
+    @classmethod
+    def frommodels(cls,models,workdir=None,modelname="member",cores=None,maxconcurrent=None):
+        """Make an ensemble out of models that already exist, e.g. from :py:func:`Model.fork <exoplasim.Model.fork>`.
+
+        Parameters
+        ----------
+        models : list(exoplasim.Model)
+            Configured models to use as the members
+        workdir : str, optional
+            Directory containing the members' work directories
+        modelname : str, optional
+            Name stem of the members
+        cores : int, optional
+            Number of cores available on this machine. Defaults to ``os.cpu_count()``.
+        maxconcurrent : int, optional
+            Maximum number of members that may run at once.
+
+        Returns
+        -------
+        Ensemble
+            An ensemble of the given models, ready to run.
+        """
+        ensemble = cls.__new__(cls)
+        ensemble.members = list(models)
+        ensemble.nmembers = len(ensemble.members)
+        ensemble.overrides = [{} for model in ensemble.members]
+        ensemble.base = {}
+        ensemble.odir = os.getcwd()
+        ensemble.workdir = workdir
+        ensemble.modelname = modelname
+        ensemble.ncpus = max([model.ncpus for model in ensemble.members]+[1,])
+        if cores is None:
+            cores = os.cpu_count()
+        ensemble.cores = cores
+        ensemble.nslots = max(1,ensemble.cores//ensemble.ncpus)
+        if maxconcurrent is not None:
+            ensemble.nslots = max(1,min(ensemble.nslots,maxconcurrent))
+        ensemble.status = ["configured" for model in ensemble.members]
+        ensemble.results = [None for model in ensemble.members]
+        return ensemble
+
+    def __len__(self):
+        return self.nmembers
+
+    def __getitem__(self,n):
+        return self.members[n]
+
+    def __iter__(self):
+        return iter(self.members)
+
+    def run(self,method="run",members=None,**kwargs):
+        """Run ensemble members concurrently on the local machine.
+
+        Members are handed out to a pool of worker processes, at most ``nslots`` at a time, so
+        that the total number of MPI ranks in use never exceeds ``cores``. As each member
+        finishes, the next one in line starts. Members that crash do not stop the rest of the
+        ensemble; their status is recorded instead.
+
+        Parameters
+        ----------
+        method : str, optional
+            Name of the :py:class:`Model <exoplasim.Model>` method to call for each member,
+            e.g. "run" or "runtobalance".
+        members : array-like, optional
+            Indices of the members to run. If unset, all members are run.
+        **kwargs : optional
+            Keyword arguments to pass to the method, e.g. ``years=10``.
+
+        Returns
+        -------
+        list
+            Return values of the method for each member that was run (None if it crashed).
+        """
+        if members is None:
+            members = range(self.nmembers)
+        members = list(members)
+        args = [(self.members[n],method,kwargs) for n in members]
+        for n in members:
+            self.status[n] = "running"
+        if self.nslots>1 and len(members)>1:
+            with mp.Pool(min(self.nslots,len(members))) as pool:
+                outputs = pool.map(_runmember_star,args,chunksize=1)
+        else:
+            outputs = [_runmember(*arg) for arg in args]
+        for n,output in zip(members,outputs):
+            self.members[n] = output[0]
+            self.results[n] = output[1]
+            self.status[n] = output[2]
+        os.chdir(self.odir)
+        return [self.results[n] for n in members]
+
+    def summary(self,variables=[],year=-1,filename=None):
+        """Collect energy balance and global annual means for every member into one table.
+
+        Parameters
+        ----------
+        variables : list(str), optional
+            Output variables for which global annual means should be included in addition to
+            the surface ("hfns") and top-of-atmosphere ("ntr") energy balance.
+        year : int, optional
+            Which year of output to summarize (Pythonic indexing).
+        filename : str, optional
+            If given, the table is also written to this file as comma-separated values.
+
+        Returns
+        -------
+        dict
+            Dictionary of 1-D arrays, one per column, with one entry per member. Columns
+            are "member", "status", "year", "hfns", "ntr", and any requested variables.
+            Missing values are NaN.
+        """
+        columns = ["hfns","ntr"]+[var for var in variables if var not in ("hfns","ntr")]
+        table = {"member":np.array([model.modelname for model in self.members]),
+                 "status":np.array(self.status),
+                 "year"  :np.array([model.currentyear for model in self.members])}
+        for key in columns:
+            table[key] = np.zeros(self.nmembers)+np.nan
+        for n,model in enumerate(self.members):
+            for key in columns:
+                try:
+                    table[key][n] = model.inspect(key,year=year,savg=True,tavg=True)
+                except (RuntimeError,KeyError,OSError,ValueError,
+                        exoplasim.gcmt.DatafileError): #No output (e.g. it crashed), or no such variable
+                    pass
+        os.chdir(self.odir)
+        if filename is not None:
+            header = ["member","status","year"]+columns
+            with open(filename,"w") as csvf:
+                csvf.write(",".join(header)+"\n")
+                for n in range(self.nmembers):
+                    csvf.write(",".join([str(table[key][n]) for key in header])+"\n")
+        return table
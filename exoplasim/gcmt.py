@@ -2,6 +2,7 @@ import numpy as np
 import exoplasim.filesupport
 from exoplasim.filesupport import SUPPORTED
 import os, glob
+from collections import OrderedDict
 
 class _Constants:
     def __init__(self):
@@ -354,89 +355,116 @@ class _csvData(dict):
 class _Dataset:
     def __init__(self,filename,csvbuffersize=1):
         self.body=None
+        self.filename=filename
+        self._cached=False
+        self._metadata=None
+        self._metaformat=None
         fileparts = filename.split('.')
         if fileparts[-1] == "nc":
             self.body,self.variables = _loadnetcdf(filename)
-            self.metadata = {}
+            self._metaformat = "nc"
+            
+        elif fileparts[-1] == "npz" or fileparts[-1] == "npy":
+            self.variables=_loadnpsavez(filename)
+            self._metaformat = "npz"
+            
+        elif (fileparts[-1]=="tar" or \
+                fileparts[-2]+"."+fileparts[-1] in ("tar.gz","tar.bz2","tar.xz")):
+            self.variables,self.metadata =_loadcsv(filename,buffersize=csvbuffersize)
+            self.tarball = True
+        elif (fileparts[-1] in ("csv","txt","gz")):
+            self.variables,self.metadata =_loadcsv(filename,buffersize=csvbuffersize)
+            self.tarball = False
+            
+        elif fileparts[-1] in ("hdf5","h5","he5"):
+            self.variables=_loadhdf5(filename)
+            self._metaformat = "hdf5"
+            
+        else:
+            raise DatafileError("Unsupported output format detected. Supported formats are:\n%s"%("\n\t".join(SUPPORTED)))
+    
+    @property
+    def metadata(self):
+        """Names, units, and codes of each variable, built the first time they are needed."""
+        if self._metadata is None:
+            self._metadata = self._buildmetadata()
+        return self._metadata
+    
+    @metadata.setter
+    def metadata(self,value):
+        self._metadata = value
+        
+    def _buildmetadata(self):
+        metadata = {}
+        if self._metaformat == "nc":
             for var in self.variables:
-                self.metadata[var] =  {}
+                metadata[var] =  {}
                 try:
-                    self.metadata[var]["standard_name"]= self.variables[var].standard_name
+                    metadata[var]["standard_name"]= self.variables[var].standard_name
                 except:
-                    self.metadata[var]["standard_name"]= var
+                    metadata[var]["standard_name"]= var
                 try:
-                    self.metadata[var]["long_name"]= self.variables[var].long_name
+                    metadata[var]["long_name"]= self.variables[var].long_name
                 except:
-                    self.metadata[var]["long_name"] = var
+                    metadata[var]["long_name"] = var
                 try:
-                    self.metadata[var]["units"] = self.variables[var].units
+                    metadata[var]["units"] = self.variables[var].units
                 except:
-                    self.metadata[var]["units"] = "N/A"
+                    metadata[var]["units"] = "N/A"
                 try:
-                    self.metadata[var]["code"] = int(self.variables[var].code)
+                    metadata[var]["code"] = int(self.variables[var].code)
                 except:
-                    self.metadata[var]["code"] = -999
+                    metadata[var]["code"] = -999
             
-        elif fileparts[-1] == "npz" or fileparts[-1] == "npy":
-            self.variables=_loadnpsavez(filename)
-            meta = _loadnpsavez(filename[:-4]+"_metadata.npz")
-            self.metadata = {}
+        elif self._metaformat == "npz":
+            meta = _loadnpsavez(self.filename[:-4]+"_metadata.npz")
             for var in self.variables:
-                self.metadata[var] =  {}
+                metadata[var] =  {}
                 try:
-                    self.metadata[var]["standard_name"]= meta[var][1]
+                    metadata[var]["standard_name"]= meta[var][1]
                 except:
-                    self.metadata[var]["standard_name"]= var
+                    metadata[var]["standard_name"]= var
                 try:
-                    self.metadata[var]["long_name"]= meta[var][1]
+                    metadata[var]["long_name"]= meta[var][1]
                 except:
-                    self.metadata[var]["long_name"] = var
+                    metadata[var]["long_name"] = var
                 try:
-                    self.metadata[var]["units"] = meta[var][2]
+                    metadata[var]["units"] = meta[var][2]
                 except:
-                    self.metadata[var]["units"] = "N/A"
+                    metadata[var]["units"] = "N/A"
                 try:
-                    self.metadata[var]["code"] = int(meta[var][3])
+                    metadata[var]["code"] = int(meta[var][3])
                 except:
-                    self.metadata[var]["code"] = -999
+                    metadata[var]["code"] = -999
             
-        elif (fileparts[-1]=="tar" or \
-                fileparts[-2]+"."+fileparts[-1] in ("tar.gz","tar.bz2","tar.xz")):
-            self.variables,self.metadata =_loadcsv(filename,buffersize=csvbuffersize)
-            self.tarball = True
-        elif (fileparts[-1] in ("csv","txt","gz")):
-            self.variables,self.metadata =_loadcsv(filename,buffersize=csvbuffersize)
-            self.tarball = False
-            
-        elif fileparts[-1] in ("hdf5","h5","he5"):
-            self.variables=_loadhdf5(filename)
-            self.metadata={}
+        elif self._metaformat == "hdf5":
             for var in self.variables:
                 meta = self.variables.attrs[var]
-                self.metadata[var] = {}
+                metadata[var] = {}
                 try:
-                    self.metadata[var]["standard_name"]= meta[1]
+                    metadata[var]["standard_name"]= meta[1]
                 except:
-                    self.metadata[var]["standard_name"]= var
+                    metadata[var]["standard_name"]= var
                 try:
-                    self.metadata[var]["long_name"]= meta[1]
+                    metadata[var]["long_name"]= meta[1]
                 except:
-                    self.metadata[var]["long_name"] = var
+                    metadata[var]["long_name"] = var
                 try:
-                    self.metadata[var]["units"] = meta[2]
+                    metadata[var]["units"] = meta[2]
                 except:
-                    self.metadata[var]["units"] = "N/A"
+                    metadata[var]["units"] = "N/A"
                 try:
-                    self.metadata[var]["code"] = int(meta[3])
+                    metadata[var]["code"] = int(meta[3])
                 except:
-                    self.metadata[var]["code"] = -999
-                
-                
-            
-        else:
-            raise DatafileError("Unsupported output format detected. Supported formats are:\n%s"%("\n\t".join(SUPPORTED)))
+                    metadata[var]["code"] = -999
+        return metadata
         
     def close(self):
+        if self._cached: #The file cache owns this handle, and will close it when it is evicted
+            return
+        self._release()
+        
+    def _release(self):
         try:
             if self.body is not None:
                 if type(self.body)==list:
@@ -452,6 +480,71 @@ class _Dataset:
         except: #We have a standard python dictionary for variables, so ignore the error quietly
             pass
 
+_openfiles = OrderedDict()
+_maxopenfiles = 8
+
+def _filestamp(filename):
+    stat = os.stat(filename)
+    return (stat.st_mtime_ns,stat.st_size)
+
+def _cachedload(filename,csvbuffersize=1):
+    """Return an open _Dataset for a file from the cache, opening it if necessary."""
+    path = os.path.abspath(filename)
+    if os.path.exists(path):
+        stamp = _filestamp(path)
+    else: #Directories of CSV files don't exist under their nominal name; don't cache those
+        return _Dataset(filename,csvbuffersize=csvbuffersize)
+    key = (path,csvbuffersize)
+    if key in _openfiles:
+        entrystamp,data = _openfiles[key]
+        if entrystamp==stamp:
+            _openfiles.move_to_end(key)
+            return data
+        invalidate(path) #The file has been rewritten since we opened it
+    data = _Dataset(filename,csvbuffersize=csvbuffersize)
+    data._cached = True
+    _openfiles[key] = (stamp,data)
+    while len(_openfiles)>_maxopenfiles:
+        oldkey,(oldstamp,olddata) = _openfiles.popitem(last=False)
+        olddata._cached = False
+        olddata._release()
+    return data
+
+def invalidate(path=None):
+    """Close and forget cached open files (see :py:func:`load`).
+
+    This should be called before a cached file is overwritten, moved, or deleted. Files that
+    have been rewritten are also detected automatically from their modification times.
+
+    Parameters
+    ----------
+    path : str, optional
+        A file, or a directory whose files should all be invalidated. If not given, the whole
+        cache is cleared.
+    """
+    if path is not None:
+        path = os.path.abspath(path)
+    for key in list(_openfiles.keys()):
+        if path is None or key[0]==path or key[0].startswith(path.rstrip("/")+"/"):
+            stamp,data = _openfiles.pop(key)
+            data._cached = False
+            data._release()
+
+def setcachesize(nfiles):
+    """Set the maximum number of files :py:func:`load` keeps open when caching is used.
+
+    Parameters
+    ----------
+    nfiles : int
+        Number of files to keep open. Setting this to 0 disables the cache.
+    """
+    global _maxopenfiles
+    _maxopenfiles = max(0,int(nfiles))
+    while len(_openfiles)>_maxopenfiles:
+        oldkey,(oldstamp,olddata) = _openfiles.popitem(last=False)
+        olddata._cached = False
+        olddata._release()
+
 def xcolorbar(mappable,fontsize=None,ticksize=None,**kwargs):
     import matplotlib.pyplot as plt
     cbar = plt.colorbar(mappable,**kwargs)
@@ -540,6 +633,182 @@ def parse(file,variable,lat=None,lon=None):
 
 
 
+class Grid:
+    """Geometry of a latitude-longitude grid, computed once and reused.
+
+    Cell bounds, areas, and the various averaging weights are computed when the Grid is
+    created, so repeated spatial means and sums over the same grid cost only one weighted
+    reduction. Use :py:func:`getgrid` to get a cached Grid rather than building a new one
+    for every call.
+
+    Parameters
+    ----------
+    lat : array-like
+        Latitudes in degrees, ordered north to south as in ExoPlaSim output
+    lon : array-like
+        Longitudes in degrees, evenly-spaced and increasing
+    radius : float, optional
+        Planet radius in meters
+    poles : bool, optional
+        If True (default), the outermost latitude bounds are at the poles. If False, they are
+        half a grid spacing beyond the outermost latitudes (as used by :py:func:`cspatialmath`).
+    centered : bool, optional
+        If True, every longitude cell is centered on its longitude. If False (default), the
+        first and last longitude bounds are placed one full spacing west of the first longitude
+        and of 360 degrees respectively, as :py:func:`spatialmath` has always done.
+
+    Attributes
+    ----------
+    latbounds, lonbounds : numpy.ndarray
+        Cell boundaries in degrees, with lengths nlat+1 and nlon+1
+    dsinlat : numpy.ndarray
+        Sine-latitude extent of each latitude band
+    dlon : numpy.ndarray
+        Longitude extent of each cell in radians
+    darea : numpy.ndarray
+        (nlat,nlon) solid angle of each cell in steradians
+    area : numpy.ndarray
+        (nlat,nlon) area of each cell in square meters
+    weights : numpy.ndarray
+        (nlat,nlon) area weights normalized to sum to 1
+    zonalweights : numpy.ndarray
+        (nlon,) weights for averaging along longitude, normalized to sum to 1
+    meridionalweights : numpy.ndarray
+        (nlat,) weights for averaging along latitude, normalized to sum to 1
+    """
+    def __init__(self,lat,lon,radius=6.371e6,poles=True,centered=False):
+        self.lat = np.array(lat,dtype=float)
+        self.lon = np.array(lon,dtype=float)
+        self.radius = radius
+        self.poles = poles
+        self.centered = centered
+        self.nlat = len(self.lat)
+        self.nlon = len(self.lon)
+        
+        lt1 = np.zeros(self.nlat+1)
+        lt1[1:-1] = 0.5*(self.lat[:-1]+self.lat[1:])
+        if poles:
+            lt1[0] = 90.0
+            lt1[-1] = -90.0
+        else:
+            lt1[0] = self.lat[0]+0.5*abs(self.lat[1]-self.lat[0])
+            lt1[-1] = self.lat[-1]-0.5*abs(self.lat[-1]-self.lat[-2])
+        dln = np.diff(self.lon)[0]
+        ln1 = np.zeros(self.nlon+1)
+        ln1[1:-1] = 0.5*(self.lon[:-1]+self.lon[1:])
+        if centered:
+            ln1[0] = self.lon[0]-0.5*dln
+            ln1[-1] = self.lon[-1]+0.5*dln
+        else:
+            ln1[0] = -dln
+            ln1[-1] = 360.0-dln
+        self.latbounds = lt1
+        self.lonbounds = ln1
+        
+        self.dsinlat = abs(np.sin(lt1[:-1]*np.pi/180.0)-np.sin(lt1[1:]*np.pi/180.0))
+        self.dlon = abs(np.diff(ln1))*np.pi/180.0
+        self.darea = self.dsinlat[:,np.newaxis]*self.dlon[np.newaxis,:]
+        self.area = self.darea*radius**2
+        self.weights = self.darea/np.sum(self.darea)
+        self.zonalweights = self.dlon/np.sum(self.dlon)
+        self.meridionalweights = self.dsinlat/np.sum(self.dsinlat)
+        self._gaussianweights = None
+        
+    @property
+    def gaussianweights(self):
+        """Gaussian quadrature weights for the latitudes (which should be Gaussian latitudes).
+
+        Taken from ``pyfft.inigau`` if the pyfft extension has been compiled, and otherwise from
+        Gauss-Legendre quadrature in NumPy. The weights sum to 2.
+        """
+        if self._gaussianweights is None:
+            try:
+                if self.nlat in [192,320]:
+                    import exoplasim.pyfft991 as pyfft
+                else:
+                    import exoplasim.pyfft as pyfft
+                sid,gwd = pyfft.inigau(self.nlat)
+            except ImportError:
+                sid,gwd = np.polynomial.legendre.leggauss(self.nlat)
+                gwd = gwd[::-1]
+            self._gaussianweights = np.array(gwd)
+        return self._gaussianweights
+    
+    def _prepare(self,variable,ignoreNaNs):
+        variable = np.asarray(variable,dtype=float)
+        if variable.shape[-2:]!=(self.nlat,self.nlon):
+            raise DimensionError("Trailing dimensions %s do not match the grid (%d,%d)"%
+                                 (str(variable.shape[-2:]),self.nlat,self.nlon))
+        if ignoreNaNs:
+            variable = np.where(np.isnan(variable),0.0,variable)
+        return variable
+    
+    def mean(self,variable,ignoreNaNs=True):
+        """Area-weighted mean over the last two (lat,lon) axes.
+
+        As in :py:func:`spatialmath`, NaNs are treated as zero if ignoreNaNs is set, but their
+        area still counts towards the total.
+
+        Parameters
+        ----------
+        variable : numpy.ndarray
+            Array whose last two dimensions are (lat,lon). Any leading dimensions are kept.
+        ignoreNaNs : bool, optional
+            If True, ignore NaNs.
+
+        Returns
+        -------
+        float or numpy.ndarray
+        """
+        return np.tensordot(self._prepare(variable,ignoreNaNs),self.weights,axes=2)
+    
+    def sum(self,variable,ignoreNaNs=True):
+        """Area-weighted sum over the last two (lat,lon) axes, in units of the variable times m^2.
+
+        Parameters
+        ----------
+        variable : numpy.ndarray
+            Array whose last two dimensions are (lat,lon). Any leading dimensions are kept.
+        ignoreNaNs : bool, optional
+            If True, ignore NaNs.
+
+        Returns
+        -------
+        float or numpy.ndarray
+        """
+        return np.tensordot(self._prepare(variable,ignoreNaNs),self.area,axes=2)
+    
+_grids = {}
+
+def getgrid(lat,lon,radius=6.371e6,poles=True,centered=False):
+    """Return a cached :py:class:`Grid` for the given coordinates, creating it if necessary.
+
+    Parameters
+    ----------
+    lat : array-like
+        Latitudes in degrees
+    lon : array-like
+        Longitudes in degrees
+    radius : float, optional
+        Planet radius in meters
+    poles : bool, optional
+        If True (default), the outermost latitude bounds are at the poles.
+    centered : bool, optional
+        If True, longitude cells are centered on each longitude.
+
+    Returns
+    -------
+    Grid
+    """
+    lat = np.asarray(lat,dtype=float)
+    lon = np.asarray(lon,dtype=float)
+    key = (lat.tobytes(),lon.tobytes(),float(radius),bool(poles),bool(centered))
+    if key not in _grids:
+        if len(_grids)>=64:
+            _grids.pop(next(iter(_grids)))
+        _grids[key] = Grid(lat,lon,radius=radius,poles=poles,centered=centered)
+    return _grids[key]
+
 def make2d(variable,lat=None,lon=None,time=None,lev=None,ignoreNaNs=True,radius=6.371e6,
            latitudes=None,longitudes=None):
     """Compress a variable in two dimensions by slicing or averaging.
@@ -633,8 +902,55 @@ def make2d(variable,lat=None,lon=None,time=None,lev=None,ignoreNaNs=True,radius=
     return variable
     
 
+def _keepaxes(variable,time=None,lev=None,ignoreNaNs=True,latitudes=None,longitudes=None):
+    """Reduce a variable to its spatial dimensions, optionally keeping the time and/or level axes.
+
+    This behaves like :py:func:`make2d`, except that ``time="all"`` and ``lev="all"`` keep the
+    corresponding axis instead of slicing or averaging it, so that the result can be reduced
+    in one pass by :py:meth:`Grid.mean` or :py:meth:`Grid.sum`.
+
+    Returns
+    -------
+    numpy.ndarray
+        Array with dimensions ([time,][lev,]lat,lon)
+    """
+    if time!="all" and lev!="all":
+        return make2d(variable,time=time,lev=lev,ignoreNaNs=ignoreNaNs,longitudes=longitudes,
+                      latitudes=latitudes)
+    if ignoreNaNs:
+        sumop = np.nansum
+        meanop = np.nanmean
+    else:
+        sumop = np.sum
+        meanop = np.mean
+    variable = np.asarray(variable)
+    if len(variable.shape)==2:
+        return variable
+    if time is None:
+        variable = meanop(variable,axis=0)
+    elif time!="all":
+        try:
+            variable = variable[time,...]
+        except:
+            raise UnitError("You have probably passed a float time to a variable with no "+
+                            "information about what that means. You should pass an integer "+
+                            "time index instead")
+    levaxis = int(time=="all") #The level axis follows the time axis if it was kept
+    if len(variable.shape)>levaxis+2:
+        if lev is None:
+            raise DimensionError("Inappropriate or insufficient dimensional constraints")
+        elif type(lev)==int:
+            variable = np.take(variable,lev,axis=levaxis)
+        elif lev=="sum":
+            variable = sumop(variable,axis=levaxis)
+        elif lev=="mean":
+            variable = meanop(variable,axis=levaxis)
+        elif lev!="all":
+            raise UnitError("Unknown level specification")
+    return variable
+
 def spatialmath(variable,lat=None,lon=None,file=None,mean=True,time=None,
-               ignoreNaNs=True,lev=None,radius=6.371e6):
+               ignoreNaNs=True,lev=None,radius=6.371e6,grid=None):
     """Compute spatial means or sums of data
 
     Parameters
@@ -653,98 +969,44 @@ def spatialmath(variable,lat=None,lon=None,file=None,mean=True,time=None,
         "all", the time axis will be preserved.
     ignoreNaNs : bool, optional
         If True, use NaN-safe numpy operators.
-    lev : int, optional
-        If set, slice a 3D spatial array at the specified level.
+    lev : int, str, optional
+        If set, slice a 3D spatial array at the specified level. May also be "sum" or "mean" to
+        collapse the level axis, or "all" to preserve it.
     radius : float, optional
         Radius of the planet in meters. Only used if mean=False.
+    grid : Grid, optional
+        Precomputed grid geometry (see :py:func:`getgrid`). If given, lat and lon may be omitted,
+        and radius is taken from the grid.
         
     Returns
     -------
-    float
+    float or numpy.ndarray
+        A scalar, or if time and/or lev are "all", an array with dimensions ([time,][lev]).
+        Preserved axes are reduced together in a single weighted sum.
 
     """
     
-    if ignoreNaNs:
-        sumop = np.nansum
-        meanop = np.nanmean
-    else:
-        sumop = np.sum
-        meanop = np.mean
-        
     if file:
         ln,lt,variable = parse(file,variable,lat=lat,lon=lon)
         
+    elif grid is not None:
+        lt=grid.lat
+        ln=grid.lon
     else:
         if type(lat)==type(None) or type(lon)==type(None):
             raise DimensionError("Need to provide latitude and longitude data")
         ln=lon
         lt=lat
+    if grid is None:
+        grid = getgrid(lt,ln,radius=radius)
         
-    if time!="all":
-        variable = make2d(variable,time=time,lev=lev,ignoreNaNs=ignoreNaNs,longitudes=ln,latitudes=lt)
-        
-        lt1 = np.zeros(len(lt)+1)
-        lt1[0] = 90
-        for n in range(0,len(lt)-1):
-            lt1[n+1] = 0.5*(lt[n]+lt[n+1])
-        lt1[-1] = -90
-        dln = np.diff(ln)[0]
-        ln1 = np.zeros(len(ln)+1)
-        ln1[0] = -dln
-        for n in range(0,len(ln)-1):
-            ln1[n+1] = 0.5*(ln[n]+ln[n+1])
-        ln1[-1] = 360.0-dln
-        
-        lt1*=np.pi/180.0
-        ln1*=np.pi/180.0
-        
-        darea = np.zeros((len(lt),len(ln)))
-        for jlat in range(0,len(lt)):
-            for jlon in range(0,len(ln)):
-                dln = ln1[jlon+1]-ln1[jlon]
-                darea[jlat,jlon] = abs(np.sin(lt1[jlat])-np.sin(lt1[jlat+1]))*abs(dln)
-        
-        svar = variable*darea
-        if mean:
-            outvar = sumop(svar)/sumop(darea)
-        else:
-            outvar = sumop(svar) * radius**2
+    variable = _keepaxes(variable,time=time,lev=lev,ignoreNaNs=ignoreNaNs,longitudes=ln,
+                         latitudes=lt)
+    
+    if mean:
+        outvar = grid.mean(variable,ignoreNaNs=ignoreNaNs)
     else:
-        ntimes = variable.shape[0]
-        variable_ = make2d(variable,time=0,lev=lev,ignoreNaNs=ignoreNaNs,longitudes=ln,latitudes=lt)
-        outvariable = np.zeros([ntimes,]+list(variable_.shape))
-        outvariable[0,...] = variable_[:]
-        for n in range(1,ntimes):
-            outvariable[n,...] = make2d(variable,time=n,lev=lev,ignoreNaNs=ignoreNaNs,
-                                        longitudes=ln,latitudes=lt)
-        
-        lt1 = np.zeros(len(lt)+1)
-        lt1[0] = 90
-        for n in range(0,len(lt)-1):
-            lt1[n+1] = 0.5*(lt[n]+lt[n+1])
-        lt1[-1] = -90
-        dln = np.diff(ln)[0]
-        ln1 = np.zeros(len(ln)+1)
-        ln1[0] = -dln
-        for n in range(0,len(ln)-1):
-            ln1[n+1] = 0.5*(ln[n]+ln[n+1])
-        ln1[-1] = 360.0-dln
-        
-        lt1*=np.pi/180.0
-        ln1*=np.pi/180.0
-        
-        darea = np.zeros((len(lt),len(ln)))
-        for jlat in range(0,len(lt)):
-            for jlon in range(0,len(ln)):
-                dln = ln1[jlon+1]-ln1[jlon]
-                darea[jlat,jlon] = abs(np.sin(lt1[jlat])-np.sin(lt1[jlat+1]))*abs(dln)
-        
-        svar = outvariable*darea[np.newaxis,:,:]
-        svar = np.reshape(svar,[ntimes,np.prod(variable_.shape)])
-        if mean:
-            outvar = sumop(svar,axis=1)/sumop(darea)
-        else:
-            outvar = sumop(svar,axis=1) * radius**2
+        outvar = grid.sum(variable,ignoreNaNs=ignoreNaNs)
     
     return outvar
 
@@ -907,7 +1169,7 @@ def lonsum(variable,longitudes,dsinlat=2.0,radius=6.371e6):
     return np.nansum(variable*darea,axis=-1)
     
 def cspatialmath(variable,lat=None,lon=None,file=None,mean=True,time=None,
-               ignoreNaNs=True,lev=None,radius=6.371e6,poles=False):
+               ignoreNaNs=True,lev=None,radius=6.371e6,poles=False,grid=None):
     """Compute spatial means or sums of data, but optionally don't go all the way to the poles.
 
     Sometimes, saying that the latitudes covered go all the way to :math:`\pm90^\circ` results in
@@ -925,73 +1187,49 @@ def cspatialmath(variable,lat=None,lon=None,file=None,mean=True,time=None,
         Path to a NetCDF output file to open and extract data from.
     mean : bool, optional
         If True, compute a global mean. If False, compute a global sum.
-    time : int, optional
-        The time index on which to slice. If unspecified, a time average will be returned.
+    time : int, optional, or "all"
+        The time index on which to slice. If unspecified, a time average will be returned. If set to 
+        "all", the time axis will be preserved.
     ignoreNaNs : bool, optional
         If True, use NaN-safe numpy operators.
-    lev : int, optional
-        If set, slice a 3D spatial array at the specified level.
+    lev : int, str, optional
+        If set, slice a 3D spatial array at the specified level. May also be "sum" or "mean" to
+        collapse the level axis, or "all" to preserve it.
     radius : float, optional
         Radius of the planet in meters. Only used if mean=False.
     poles : bool, optional
         If False (default), exclude the poles.
+    grid : Grid, optional
+        Precomputed grid geometry (see :py:func:`getgrid`), which should have been created with
+        ``centered=True``. If given, lat, lon, radius, and poles are taken from the grid.
         
     Returns
     -------
-    float
+    float or numpy.ndarray
+        A scalar, or if time and/or lev are "all", an array with dimensions ([time,][lev]).
 
     """
     
-    if ignoreNaNs:
-        sumop = np.nansum
-        meanop = np.nanmean
-    else:
-        sumop = np.sum
-        meanop = np.mean
-        
     if file:
         ln,lt,variable = parse(file,variable,lat=lat,lon=lon)
         
+    elif grid is not None:
+        lt=grid.lat
+        ln=grid.lon
     else:
         if type(lat)==type(None) or type(lon)==type(None):
             raise DimensionError("Need to provide latitude and longitude data")
         ln=lon
         lt=lat
-    variable = make2d(variable,time=time,lev=lev,ignoreNaNs=ignoreNaNs,
-                      latitudes=lt,longitudes=ln)
-    
-    lt1 = np.zeros(len(lt)+1)
-    dlt1 = abs(np.diff(lt)[0])
-    dlt2 = abs(np.diff(lt)[-1])
-    lt1[0] = lt[0]+0.5*dlt1
-    for n in range(0,len(lt)-1):
-        lt1[n+1] = 0.5*(lt[n]+lt[n+1])
-    lt1[-1] = lt[-1]-0.5*dlt2
-    if poles:
-        lt1[0] = 90.0
-        lt1[-1] = -90.0
-    
-    dln = np.diff(ln)[0]
-    ln1 = np.zeros(len(ln)+1)
-    ln1[0] = ln[0]-dln*0.5
-    for n in range(0,len(ln)-1):
-        ln1[n+1] = 0.5*(ln[n]+ln[n+1])
-    ln1[-1] = ln[-1]+dln*0.5
-    
-    lt1*=np.pi/180.0
-    ln1*=np.pi/180.0
-    
-    darea = np.zeros((len(lt),len(ln)))
-    for jlat in range(0,len(lt)):
-        for jlon in range(0,len(ln)):
-            dln = ln1[jlon+1]-ln1[jlon]
-            darea[jlat,jlon] = abs(np.sin(lt1[jlat])-np.sin(lt1[jlat+1]))*abs(dln)
+    if grid is None:
+        grid = getgrid(lt,ln,radius=radius,poles=poles,centered=True)
+    variable = _keepaxes(variable,time=time,lev=lev,ignoreNaNs=ignoreNaNs,
+                         latitudes=lt,longitudes=ln)
     
-    svar = variable*darea
     if mean:
-        outvar = sumop(svar)/sumop(darea)
+        outvar = grid.mean(variable,ignoreNaNs=ignoreNaNs)
     else:
-        outvar = sumop(svar) * radius**2
+        outvar = grid.sum(variable,ignoreNaNs=ignoreNaNs)
     
     return outvar
 
@@ -1007,61 +1245,80 @@ def streamfxn(file,time=None):
     '''Deprecated. Passes args to eqstream().'''
     return eqstream(file,time=time)
     
-def eqstream(file,radius=6.371e6,gravity=9.80665):
-    '''Compute the tidally-locked streamfunction
+def _streamchunks(dataset,chunksize,winds=("ua","va")):
+    """Yield (lon,lat,lev,ps,[winds]) for successive blocks of times from one or more datasets.
+
+    Only the coordinates, surface pressure, and the wind components named in ``winds`` are read,
+    one block at a time, so that long (or multiple) output files never need to be held in
+    memory all at once.
+    """
+    if type(dataset) not in (list,tuple):
+        dataset = [dataset,]
+    for data in dataset:
+        opened = (type(data)==str)
+        if opened:
+            data = _Dataset(data)
+        lon = np.array(data.variables['lon'][:])
+        lat = np.array(data.variables['lat'][:])
+        lev = np.array(data.variables['lev'][:])
+        ntimes = data.variables['ps'].shape[0]
+        step = ntimes if chunksize is None else max(1,int(chunksize))
+        for t0 in range(0,ntimes,step):
+            t1 = min(ntimes,t0+step)
+            yield (lon,lat,lev,np.array(data.variables['ps'][t0:t1]),
+                   [np.array(data.variables[wind][t0:t1]) for wind in winds])
+        if opened:
+            data.close()
+
+def _streamfunction(dataset,radius,gravity,sign,substellar=None,chunksize=None):
+    """Integrate the meridional mass flux down each column, for all columns at once.
+
+    If substellar is not None, winds are first remapped to tidally-locked coordinates.
+    """
+    from scipy.integrate import cumulative_trapezoid
+    
+    blocks = []
+    psums = []
+    winds = ("va",) if substellar is None else ("ua","va") #Remapping needs both components
+    for lon,lat,lev,ps,wind in _streamchunks(dataset,chunksize,winds=winds):
+        if substellar is None:
+            va = wind[0]
+        else:
+            lon_TL,lat_TL,ua_TL,va = eq2tl_uv(wind[0],wind[1],lon,lat,substellar=substellar)
+        pa = ps[:,np.newaxis,:,:] * lev[np.newaxis,:,np.newaxis,np.newaxis] * 100.0
+        vadp = cumulative_trapezoid(va,x=pa,axis=1,initial=0.0)
+        prefactor = 2*np.pi*radius/gravity*np.cos(lat*np.pi/180.0)
+        blocks.append(sign*prefactor[np.newaxis,np.newaxis,:,np.newaxis]*vadp)
+        psums.append(np.sum(spatialmath(ps,lon=lon,lat=lat,time="all")))
+    stf = np.concatenate(blocks,axis=0)
+    psurf = np.sum(psums)/stf.shape[0] #Mean over all times of the global mean surface pressure
+    return lat,psurf*lev,stf
+
+def eqstream(dataset,radius=6.371e6,gravity=9.80665,chunksize=None):
+    '''Compute the meridional mass streamfunction
+    
+    The mass flux is integrated in pressure along every column at once. 
     
     Parameters
     ----------
-    dataset : str or ExoPlaSim Dataset
-        Either path to ExoPlaSim Dataset of model output or an instance of the dataset.
-    plarad : float, optional
+    dataset : str, ExoPlaSim Dataset, or list
+        Either path to ExoPlaSim Dataset of model output or an instance of the dataset. A list
+        of paths or datasets will be treated as consecutive pieces of one time series.
+    radius : float, optional
         Planetary radius [m]
-    grav : float, optional
+    gravity : float, optional
         Surface gravity [m/s^2]
+    chunksize : int, optional
+        If set, read and process this many timesteps at a time, to limit memory usage for long
+        files. 
             
     Returns
     -------
-    numpy.ndarray(1D), numpy.ndarray(1D), numpy.ndarray(2D)
-        tidally-locked latitude, layer interface pressures, and TL streamfunction
+    numpy.ndarray(1D), numpy.ndarray(1D), numpy.ndarray(4D)
+        latitude, layer pressures, and streamfunction (time,lev,lat,lon)
     '''
-    from scipy.integrate import cumulative_trapezoid
-    
-    if type(dataset)==str:
-        dataset = _Dataset(dataset,"r")
-    lon = dataset.variables['lon'][:]
-    lat = dataset.variables['lat'][:]
-    
-    #mva = np.nanmean(va_TL,axis=3) #tidally-locked meridional wind
-    #ps = spatialmath(dataset.variables['ps'][:],lon=lon,lat=lat)
-    lev = dataset.variables['lev'][:]
-    pa = dataset.variables['ps'][:,np.newaxis,:,:] * lev[np.newaxis,:,np.newaxis,np.newaxis] * 100.0
-    
-    va = dataset.variables['va'][:]
-    
-    nlon = len(lon)
-    nlat = len(lat)
-    ntime = pa.shape[0]
-    nlev = len(lev)
-
-    vadp = np.zeros(va.shape)
-    for nt in range(ntime):
-        for jlat in range(nlat):
-            for jlon in range(nlon):
-                vadp[nt,:jlat,jlon] = cumulative_trapezoid(va[nt,:,jlat,jlon],
-                                               x=pa[nt,:,jlat,jlon],
-                                               initial=0.0)
-        
-    prefactor = 2*np.pi*radius/gravity*np.cos(lat*np.pi/180.0)
     sign = 1 #-1 for synchronous, 1 for equatorial
-    stf = sign*prefactor[np.newaxis,np.newaxis,:,np.newaxis]*vadp
-    
-    psurf = spatialmath(dataset.variables['ps'][:],lon=lon,lat=lat)
-    
-    #mvadp = cumulative_trapezoid(mva,x=lev[:]*ps*100.0,axis=1) #integrate in Pa not hPa
-    #prefactor = 2*np.pi*plarad/grav #2piR/g
-    #stf = prefactor*np.cos(lat_TL[np.newaxis,np.newaxis,:]*np.pi/180.0)*mvadp
-    #pmid = 0.5*(lev[1:]+lev[:-1])*ps
-    return lat,psurf*lev,stf
+    return _streamfunction(dataset,radius,gravity,sign,chunksize=chunksize)
 
 
 def adist(lon1,lat1,lon2,lat2):
@@ -1155,6 +1412,126 @@ def tl2eq_coords(lon,lat,substellar=0.0):
     return qlons,qlats
 
 
+_remaps = {}
+
+def _remapoperator(lon,lat,substellar,polemethod,inverse=False):
+    """Build (or fetch from the cache) the sparse matrix that remaps a lat-lon field.
+
+    Each point of the new grid is an inverse-distance-weighted combination of at most four
+    neighbouring points on the old grid (or of a whole latitude row near the poles), so the
+    transformation is linear and depends only on the coordinates. It is computed once per
+    grid and substellar longitude, and then applied to any number of fields with a single
+    sparse matrix product.
+
+    Parameters
+    ----------
+    lon, lat : numpy.ndarray
+        1D arrays of longitudes and latitudes [deg]
+    substellar : float
+        Longitude of the substellar point [deg]
+    polemethod : str
+        "interp" or "nearest"; see :py:func:`eq2tl`
+    inverse : bool, optional
+        If False, remap from equatorial to tidally-locked coordinates; if True, the reverse.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        (nlat*nlon, nlat*nlon) remapping operator
+    """
+    from scipy.sparse import csr_matrix
+    lon = np.asarray(lon,dtype=float)
+    lat = np.asarray(lat,dtype=float)
+    key = (lon.tobytes(),lat.tobytes(),float(substellar),polemethod,inverse)
+    if key in _remaps:
+        return _remaps[key]
+    nlon = len(lon)
+    nlat = len(lat)
+    if inverse:
+        slons,slats = eq2tl_coords(lon,lat,substellar=substellar)
+    else:
+        slons,slats = tl2eq_coords(lon,lat,substellar=substellar)
+    rows = []
+    cols = []
+    vals = []
+    def neighbourlon(ii,dlon,loncomparison):
+        if ii==0:
+            ln1 = abs(loncomparison[-1]-360.0-dlon) #if chosen, our indices will be -1 and 0
+            ln2 = loncomparison[ 1] #if chosen, our indices will be 0 and 1
+        elif ii==nlon-1:
+            ln1 = loncomparison[ii-1] #if chosen, our indices will be nlon-2 and nlon-1
+            ln2 = abs(360.0-dlon) #if chosen, our indices will be nlon-1 and 0
+        else:
+            ln1 = loncomparison[ii-1]
+            ln2 = loncomparison[ii+1]
+        return (ii + 2*np.argmin([ln1,ln2])-1)%nlon
+    def neighbourlat(jj,dlat,latcomparison):
+        if jj==0:
+            lt1 = abs(100.0-dlat) #shouldn't be chosen
+            lt2 = latcomparison[1]
+        elif jj==nlat-1:
+            lt1 = latcomparison[jj-1]
+            lt2 = abs(-100.0-dlat) #shouldn't be chosen
+        else:
+            lt1 = latcomparison[jj-1]
+            lt2 = latcomparison[jj+1]
+        return jj + 2*np.argmin([lt1,lt2])-1
+    for i in range(nlon):
+        for j in range(nlat):
+            dlon = slons[j,i]
+            dlat = slats[j,i]
+            if abs(dlat)>abs(lat).max():
+                if polemethod!="nearest":
+                    jj = abs(lat-dlat).argmin()
+                    points = [(jj,ii) for ii in range(nlon)]
+                    weights = 1.0/adist(lon,dlon,lat[jj],dlat)
+                else:
+                    points = [(np.argmin(abs(dlat-lat)),np.argmin(abs(dlon-lon)))]
+                    weights = [1.0]
+            else:
+                latcomparison = abs(lat-dlat)
+                loncomparison = abs(lon-dlon)
+                colat = (latcomparison.min()==0.0) #We are colatitude
+                colon = (loncomparison.min()==0.0) #We are colongitude
+                jj = latcomparison.argmin()
+                ii = loncomparison.argmin()
+                if not colat and not colon:
+                    ni = neighbourlon(ii,dlon,loncomparison)
+                    nj = neighbourlat(jj,dlat,latcomparison)
+                    if nj>=nlat or nj<0:
+                        raise DimensionError("Remapping stencil at (%f,%f) falls off the grid"%
+                                             (dlon,dlat))
+                    points = [(jj,ii),(jj,ni),(nj,ii),(nj,ni)]
+                elif colat: #only changing longitude
+                    ni = neighbourlon(ii,dlon,loncomparison)
+                    points = [(jj,ii),(jj,ni)]
+                elif colon: #only changing latitude
+                    nj = neighbourlat(jj,dlat,latcomparison)
+                    points = [(jj,ii),(nj,ii)]
+                else: #We coincide with a real point
+                    points = [(jj,ii)]
+                if len(points)>1:
+                    weights = [1.0/adist(lon[pi],dlon,lat[pj],dlat) for pj,pi in points]
+                else:
+                    weights = [1.0]
+            weights = np.array(weights,dtype=float)
+            for (pj,pi),w in zip(points,weights/np.sum(weights)):
+                rows.append(j*nlon+i)
+                cols.append(pj*nlon+pi)
+                vals.append(w)
+    operator = csr_matrix((vals,(rows,cols)),shape=(nlat*nlon,nlat*nlon))
+    if len(_remaps)>=16:
+        _remaps.pop(next(iter(_remaps)))
+    _remaps[key] = operator
+    return operator
+
+def _applyremap(operator,variable):
+    """Apply a remapping operator to every (lat,lon) slice of an N-D array at once."""
+    variable = np.asarray(variable,dtype=float)
+    shape = variable.shape
+    flat = np.reshape(variable,(-1,shape[-2]*shape[-1]))
+    return np.reshape(np.asarray(operator.dot(flat.T)).T,shape)
+
 def eq2tl(variable,lon,lat,substellar=0.0, polemethod="interp"):
     '''Transform a variable to tidally-locked coordinates
 
@@ -1180,105 +1557,8 @@ def eq2tl(variable,lon,lat,substellar=0.0, polemethod="interp"):
     '''
     tlon = np.copy(lon)
     tlat = np.copy(lat)
-    tlvariable = np.zeros(variable.shape)
-    nlon = len(lon)
-    nlat = len(lat)
-    elons,elats = tl2eq_coords(tlon,tlat,substellar=substellar)
-    elons *= np.pi/180.0
-    elats *= np.pi/180.0
-    for i in range(nlon):
-        for j in range(nlat):
-            rlon = elons[j,i]
-            rlat = elats[j,i]
-            dlon = rlon*180.0/np.pi
-            dlat = rlat*180.0/np.pi
-            if abs(dlat)>abs(lat).max():
-                if polemethod!="nearest":
-                    jj = abs(lat-dlat).argmin()
-                    distances = np.zeros(nlon)
-                    for ii in range(nlon):
-                        distances[ii] = 1.0/adist(lon[ii],dlon,lat[jj],dlat)
-                    tlvariable[...,j,i] = np.average(variable[...,jj,:],weights=distances,axis=len(variable.shape)-2)
-                else:
-                    ilat=np.argmin(abs(dlat-lat))
-                    ilon=np.argmin(abs(dlon-lon))
-                    tlvariable[...,j,i] = variable[...,ilat,ilon]
-            else:
-                latcomparison = abs(lat-dlat)
-                loncomparison = abs(lon-dlon)
-                colat = (latcomparison.min()==0.0) #We are colatitude
-                colon = (loncomparison.min()==0.0) #We are colongitude
-                if not colat and not colon:
-                    jj = latcomparison.argmin()
-                    ii = loncomparison.argmin()
-                    if ii==0:
-                        ln1 = abs(loncomparison[-1]-360.0-dlon) #if chosen, our indices will be -1 and 0
-                        ln2 = loncomparison[ 1] #if chosen, our indices will be 0 and 1
-                    elif ii==nlon-1:
-                        ln1 = loncomparison[ii-1] #if chosen, our indices will be nlon-2 and nlon-1
-                        ln2 = abs(360.0-dlon) #if chosen, our indices will be nlon-1 and 0
-                    else:
-                        ln1 = loncomparison[ii-1]
-                        ln2 = loncomparison[ii+1]
-                    if jj==0:
-                        lt1 = abs(100.0-dlat) #shouldn't be chosen
-                        lt2 = latcomparison[1]
-                    elif jj==nlat-1:
-                        lt1 = latcomparison[jj-1]
-                        lt2 = abs(-100.0-dlat) #shouldn't be chosen
-                    else:
-                        lt1 = latcomparison[jj-1]
-                        lt2 = latcomparison[jj+1]
-                    ni = (ii + 2*np.argmin([ln1,ln2])-1)%nlon
-                    nj = jj + 2*np.argmin([lt1,lt2])-1
-                    if nj>=nlat or nj<0:
-                        print(ii,jj,ni,nj,dlon,dlat)
-                        raise
-                    d11 = 1.0/adist(lon[ii],dlon,lat[jj],dlat)
-                    d22 = 1.0/adist(lon[ni],dlon,lat[nj],dlat)
-                    d21 = 1.0/adist(lon[ii],dlon,lat[nj],dlat)
-                    d12 = 1.0/adist(lon[ni],dlon,lat[jj],dlat)
-                    tlvariable[...,j,i] = np.average(np.array([variable[...,jj,ii],variable[...,jj,ni],
-                                                            variable[...,nj,ii],variable[...,nj,ni]]),
-                                                  weights=[d11,d12,d21,d22],axis=0)
-                elif colat: #only changing longitude
-                    ii = loncomparison.argmin()
-                    jj = latcomparison.argmin()
-                    if ii==0:
-                        ln1 = abs(loncomparison[-1]-360.0-dlon) #if chosen, our indices will be -1 and 0
-                        ln2 = loncomparison[ 1] #if chosen, our indices will be 0 and 1
-                    elif ii==nlon-1:
-                        ln1 = loncomparison[ii-1] #if chosen, our indices will be nlon-2 and nlon-1
-                        ln2 = abs(360.0-dlon) #if chosen, our indices will be nlon-1 and 0
-                    else:
-                        ln1 = loncomparison[ii-1]
-                        ln2 = loncomparison[ii+1]
-                    ni = (ii + 2*np.argmin([ln1,ln2])-1)%nlon
-                    d1 = 1.0/adist(lon[ii],dlon,lat[jj],dlat)
-                    d2 = 1.0/adist(lon[ni],dlon,lat[jj],dlat)
-                    tlvariable[...,j,i] = np.average(np.array([variable[...,jj,ii],variable[...,jj,ni]]),
-                                                  weights = [d1,d2],axis=0)
-                elif colon: #only changing latitude
-                    ii = loncomparison.argmin()
-                    jj = latcomparison.argmin()
-                    if jj==0:
-                        lt1 = abs(100.0-dlat) #shouldn't be chosen
-                        lt2 = latcomparison[1]
-                    elif jj==nlat-1:
-                        lt1 = latcomparison[jj-1]
-                        lt2 = abs(-100.0-dlat) #shouldn't be chosen
-                    else:
-                        lt1 = latcomparison[jj-1]
-                        lt2 = latcomparison[jj+1]
-                    nj = jj + 2*np.argmin([lt1,lt2])-1
-                    d1 = 1.0/adist(lon[ii],dlon,lat[jj],dlat)
-                    d2 = 1.0/adist(lon[ii],dlon,lat[nj],dlat)
-                    tlvariable[...,j,i] = np.average(np.array([variable[...,jj,ii],variable[...,nj,ii]]),
-                                                  weights = [d1,d2],axis=0)
-                else: #We coincide with a real point
-                    ii = loncomparison.argmin()
-                    jj = latcomparison.argmin()
-                    tlvariable[...,j,i] = variable[...,jj,ii]
+    operator = _remapoperator(lon,lat,substellar,polemethod,inverse=False)
+    tlvariable = _applyremap(operator,variable)
     return tlon,tlat,tlvariable
 
         
@@ -1305,100 +1585,8 @@ def tl2eq(variable,lon,lat,substellar=0.0):
     '''
     qlon = np.copy(lon)
     qlat = np.copy(lat)
-    eqvariable = np.zeros(variable.shape)
-    nlon = len(lon)
-    nlat = len(lat)
-    qlons,qlats = eq2tl_coords(qlon,qlat,substellar=substellar)
-    qlons *= np.pi/180.0
-    qlats *= np.pi/180.0
-    for i in range(nlon):
-        for j in range(nlat):
-            rlon = qlons[j,i]
-            rlat = qlats[j,i]
-            dlon = rlon*180.0/np.pi
-            dlat = rlat*180.0/np.pi
-            if abs(dlat)>abs(lat).max():
-                jj = abs(lat-dlat).argmin()
-                distances = np.zeros(nlon)
-                for ii in range(nlon):
-                    distances[ii] = 1.0/adist(lon[ii],dlon,lat[jj],dlat)
-                eqvariable[...,j,i] = np.average(variable[...,jj,:],weights=distances,axis=len(variable.shape)-2)
-            else:
-                latcomparison = abs(lat-dlat)
-                loncomparison = abs(lon-dlon)
-                colat = (latcomparison.min()==0.0) #We are colatitude
-                colon = (loncomparison.min()==0.0) #We are colongitude
-                if not colat and not colon:
-                    jj = latcomparison.argmin()
-                    ii = loncomparison.argmin()
-                    if ii==0:
-                        ln1 = abs(loncomparison[-1]-360.0-dlon) #if chosen, our indices will be -1 and 0
-                        ln2 = loncomparison[ 1] #if chosen, our indices will be 0 and 1
-                    elif ii==nlon-1:
-                        ln1 = loncomparison[ii-1] #if chosen, our indices will be nlon-2 and nlon-1
-                        ln2 = abs(360.0-dlon) #if chosen, our indices will be nlon-1 and 0
-                    else:
-                        ln1 = loncomparison[ii-1]
-                        ln2 = loncomparison[ii+1]
-                    if jj==0:
-                        lt1 = abs(100.0-dlat) #shouldn't be chosen
-                        lt2 = latcomparison[1]
-                    elif jj==nlat-1:
-                        lt1 = latcomparison[jj-1]
-                        lt2 = abs(-100.0-dlat) #shouldn't be chosen
-                    else:
-                        lt1 = latcomparison[jj-1]
-                        lt2 = latcomparison[jj+1]
-                    ni = (ii + 2*np.argmin([ln1,ln2])-1)%nlon
-                    nj = jj + 2*np.argmin([lt1,lt2])-1
-                    if nj>=nlat or nj<0:
-                        print(ii,jj,ni,nj,dlon,dlat)
-                        raise
-                    d11 = 1.0/adist(lon[ii],dlon,lat[jj],dlat)
-                    d22 = 1.0/adist(lon[ni],dlon,lat[nj],dlat)
-                    d21 = 1.0/adist(lon[ii],dlon,lat[nj],dlat)
-                    d12 = 1.0/adist(lon[ni],dlon,lat[jj],dlat)
-                    eqvariable[...,j,i] = np.average(np.array([variable[...,jj,ii],variable[...,jj,ni],
-                                                            variable[...,nj,ii],variable[...,nj,ni]]),
-                                                  weights=[d11,d12,d21,d22],axis=0)
-                elif colat: #only changing longitude
-                    ii = loncomparison.argmin()
-                    jj = latcomparison.argmin()
-                    if ii==0:
-                        ln1 = abs(loncomparison[-1]-360.0-dlon) #if chosen, our indices will be -1 and 0
-                        ln2 = loncomparison[ 1] #if chosen, our indices will be 0 and 1
-                    elif ii==nlon-1:
-                        ln1 = loncomparison[ii-1] #if chosen, our indices will be nlon-2 and nlon-1
-                        ln2 = abs(360.0-dlon) #if chosen, our indices will be nlon-1 and 0
-                    else:
-                        ln1 = loncomparison[ii-1]
-                        ln2 = loncomparison[ii+1]
-                    ni = (ii + 2*np.argmin([ln1,ln2])-1)%nlon
-                    d1 = 1.0/adist(lon[ii],dlon,lat[jj],dlat)
-                    d2 = 1.0/adist(lon[ni],dlon,lat[jj],dlat)
-                    eqvariable[...,j,i] = np.average(np.array([variable[...,jj,ii],variable[...,jj,ni]]),
-                                                  weights = [d1,d2],axis=0)
-                elif colon: #only changing latitude
-                    ii = loncomparison.argmin()
-                    jj = latcomparison.argmin()
-                    if jj==0:
-                        lt1 = abs(100.0-dlat) #shouldn't be chosen
-                        lt2 = latcomparison[1]
-                    elif jj==nlat-1:
-                        lt1 = latcomparison[jj-1]
-                        lt2 = abs(-100.0-dlat) #shouldn't be chosen
-                    else:
-                        lt1 = latcomparison[jj-1]
-                        lt2 = latcomparison[jj+1]
-                    nj = jj + 2*np.argmin([lt1,lt2])-1
-                    d1 = 1.0/adist(lon[ii],dlon,lat[jj],dlat)
-                    d2 = 1.0/adist(lon[ii],dlon,lat[nj],dlat)
-                    eqvariable[...,j,i] = np.average(np.array([variable[...,jj,ii],variable[...,nj,ii]]),
-                                                  weights = [d1,d2],axis=0)
-                else: #We coincide with a real point
-                    ii = loncomparison.argmin()
-                    jj = latcomparison.argmin()
-                    eqvariable[...,j,i] = variable[...,jj,ii]
+    operator = _remapoperator(lon,lat,substellar,"interp",inverse=True)
+    eqvariable = _applyremap(operator,variable)
     return qlon,qlat,eqvariable
 
 
@@ -1459,69 +1647,252 @@ def eq2tl_uv(u, v, lon, lat, substellar=0.0):
     return lon_tl,lat_tl,u_tl,v_tl    
 
 
-def tlstream(dataset,radius=6371.0e3,gravity=9.80665,substellar=0.0):
+def tlstream(dataset,radius=6371.0e3,gravity=9.80665,substellar=0.0,chunksize=None):
     '''Compute the tidally-locked streamfunction
     
+    Winds are remapped with a cached remapping operator (see :py:func:`eq2tl`), and the mass
+    flux is integrated in pressure along every column at once.
+    
     Parameters
     ----------
-    dataset : str or ExoPlaSim Dataset
-        Either path to ExoPlaSim Dataset of model output or an instance of the dataset.
+    dataset : str, ExoPlaSim Dataset, or list
+        Either path to ExoPlaSim Dataset of model output or an instance of the dataset. A list
+        of paths or datasets will be treated as consecutive pieces of one time series.
     radius : float, optional
         Planetary radius [m]
     gravity : float, optional
         Surface gravity [m/s^2]
     substellar : float, optional
         Longitude of the substellar point in degrees.
+    chunksize : int, optional
+        If set, read and process this many timesteps at a time, to limit memory usage for long
+        files. 
             
     Returns
     -------
-    numpy.ndarray(1D), numpy.ndarray(1D), numpy.ndarray(2D)
-        tidally-locked latitude, layer interface pressures, and TL streamfunction
+    numpy.ndarray(1D), numpy.ndarray(1D), numpy.ndarray(4D)
+        tidally-locked latitude, layer pressures, and TL streamfunction (time,lev,lat,lon)
     '''
-    from scipy.integrate import cumulative_trapezoid
-    
-    if type(dataset)==str:
-        dataset = _Dataset(dataset,"r")
-    lon = dataset.variables['lon'][:]
-    lat = dataset.variables['lat'][:]
-    lon_TL,lat_TL,ua_TL,va_TL = eq2tl_uv(dataset.variables['ua'][:],
-                                         dataset.variables['va'][:],
-                                         lon,lat,substellar=substellar)
-    
-    #mva = np.nanmean(va_TL,axis=3) #tidally-locked meridional wind
-    #ps = spatialmath(dataset.variables['ps'][:],lon=lon,lat=lat)
-    lev = dataset.variables['lev'][:]
-    lev = np.array(lev)
-    ps = dataset.variables['ps']
-    ps = np.array(ps)
-    pa = ps[:,np.newaxis,:,:] * lev[np.newaxis,:,np.newaxis,np.newaxis] * 100.0
+    sign = -1 #-1 for synchronous, 1 for equatorial
+    return _streamfunction(dataset,radius,gravity,sign,substellar=substellar,
+                           chunksize=chunksize)
 
-    nlon = len(lon)
+_orthogeometries = {}
+
+def _orthogeometry(lon,lat,central_latitude=0,ny=200,nx=200,interp='bilinear'):
+    """Compute (or fetch from the cache) the pixel->grid geometry for an orthographic projection.
+
+    The projection is always computed with the view centred on the middle of the longitude
+    axis; other central longitudes are reached by rolling the map a whole number of columns
+    (see :py:func:`_orthostencil`). The geometry therefore only depends on the grid, the
+    central latitude, and the image, so one geometry serves every central longitude.
+
+    Returns
+    -------
+    dict
+        "pixels": flat indices of the (ny,nx) pixels that fall on the disk;
+        "rows", "cols": (npixels,4) latitude and (unrolled) longitude indices into the map;
+        "weights": (npixels,4) interpolation weights for those points;
+        "nlat", "nlon", "dlon", "negative": the grid, and what is needed to turn a central
+        longitude into a roll.
+    """
+    lon = np.array(lon,dtype=float)
+    lat = np.array(lat,dtype=float)
+    key = (lon.tobytes(),lat.tobytes(),float(central_latitude),int(ny),int(nx),interp)
+    if key in _orthogeometries:
+        return _orthogeometries[key]
+    
     nlat = len(lat)
-    ntime = pa.shape[0]
-    nlev = len(lev)
-
-    vadp = np.zeros(va_TL.shape)
-    for nt in range(ntime):
-        for jlat in range(nlat):
-            for jlon in range(nlon):
-                vadp[nt,:,jlat,jlon] = cumulative_trapezoid(va_TL[nt,:,jlat,jlon],x=pa[nt,:,jlat,jlon],initial=0.0)
-        
-    prefactor = 2*np.pi*radius/gravity*np.cos(lat*np.pi/180.0)
-    sign = -1 #-1 for synchronous, 1 for equatorial
-    stf = sign*prefactor[np.newaxis,np.newaxis,:,np.newaxis]*vadp
+    nlon = len(lon)
+    p0 = central_latitude
+    rad=0.5*(8*nx/18.0+8*ny/18.0)
     
-    psurf = spatialmath(dataset.variables['ps'][:],lon=lon,lat=lat)
+    negative = lon.min()<0
+    if negative: #we're in a -180 to 180 domain
+        if lon.max()>180.0:
+            lon[lon>180]-=360.0
+        l0 = 0.0
+    else:
+        l0 = 180.0
+        
+    #Add ghost cells: at the poles they are duplicates, and at the edges they are cyclical
+    zlat = np.zeros(nlat+2)
+    zlon = np.zeros(nlon+2)
+    dlat = np.diff(lat)
+    dlon = np.diff(lon)
+    zlon[0] = lon[0]-dlon[0]
+    zlon[1:-1] = lon[:]
+    zlon[-1] = lon[-1]+dlon[-1]
+    zlat[0] = lat[0]-dlat[0]
+    zlat[-1] = lat[-1]+dlat[-1]
+    zlat[1:-1] = lat[:]
+    zrows = np.concatenate([[0],np.arange(nlat),[nlat-1]])
+    zcols = np.concatenate([[nlon-1],np.arange(nlon),[0]])
     
-    #mvadp = cumulative_trapezoid(mva,x=lev[:]*ps*100.0,axis=1) #integrate in Pa not hPa
-    #prefactor = 2*np.pi*plarad/grav #2piR/g
-    #stf = prefactor*np.cos(lat_TL[np.newaxis,np.newaxis,:]*np.pi/180.0)*mvadp
-    #pmid = 0.5*(lev[1:]+lev[:-1])*ps
-    return lat_TL,psurf*lev,stf
+    p0 *= np.pi/180.0
+    l0 *= np.pi/180.0
+    xx = np.arange(nx)-nx/2
+    yy = np.arange(ny)-ny/2
+    ix,jy = np.meshgrid(xx,yy)
+    ondisk = ((ix**2+jy**2)<=rad**2).flatten()
+    ix = ix.flatten()[ondisk]
+    jy = jy.flatten()[ondisk]
+    rho = np.sqrt(ix**2+jy**2)
+    cc = np.arcsin(rho/rad)
+    with np.errstate(divide='ignore',invalid='ignore'):
+        phi = np.arcsin(np.cos(cc)*np.sin(p0) + jy*np.sin(cc)*np.cos(p0)/rho)
+        lamb = l0 + np.arctan2(ix*np.sin(cc),(rho*np.cos(cc)*np.cos(p0)-jy*np.sin(cc)*np.sin(p0)))
+    phi[rho==0] = p0
+    lamb[rho==0] = l0
+    phi *= 180.0/np.pi
+    lamb *= 180.0/np.pi
+    if not negative:
+        lamb[lamb<0] += 360
+    else:
+        lamb[lamb>180] -= 360
+    
+    jlat = np.argmin(abs(phi[:,np.newaxis]-zlat[np.newaxis,:]),axis=1)
+    jlon = np.argmin(abs(lamb[:,np.newaxis]-zlon[np.newaxis,:]),axis=1)
+    npix = len(phi)
+    zj = np.repeat(jlat[:,np.newaxis],4,axis=1)
+    zi = np.repeat(jlon[:,np.newaxis],4,axis=1)
+    weights = np.zeros((npix,4))
+    weights[:,0] = 1.0
+    
+    if interp=="bilinear":
+        def bracket(x,z):
+            below = z[np.newaxis,:]<x[:,np.newaxis]
+            above = ~below & ~np.isnan(x[:,np.newaxis])
+            z1 = np.where(below,z[np.newaxis,:],-np.inf).max(axis=1)
+            z2 = np.where(above,z[np.newaxis,:],np.inf).min(axis=1)
+            j1 = np.argmax(z[np.newaxis,:]==z1[:,np.newaxis],axis=1)
+            j2 = np.argmax(z[np.newaxis,:]==z2[:,np.newaxis],axis=1)
+            return below.any(axis=1)&above.any(axis=1),j1,j2
+        oklat,jlat1,jlat2 = bracket(phi,zlat)
+        oklon,jlon1,jlon2 = bracket(lamb,zlon)
+        ok = oklat&oklon
+        p1 = zlat[jlat1]
+        p2 = zlat[jlat2]
+        l1 = zlon[jlon1]
+        l2 = zlon[jlon2]
+        dl = l2-l1
+        dp = p2-p1
+        with np.errstate(divide='ignore',invalid='ignore'):
+            wl1 = np.where(dl>0,(l2-lamb)/dl,1.0)
+            wl2 = np.where(dl>0,(lamb-l1)/dl,0.0)
+            wp1 = np.where(dp>0,(p2-phi)/dp,1.0)
+            wp2 = np.where(dp>0,(phi-p1)/dp,0.0)
+        #Where an interval is degenerate, fall back to the nearest row or column
+        jl1 = np.where(dp>0,jlat1,jlat)
+        jl2 = np.where(dp>0,jlat2,jlat)
+        il1 = np.where(dl>0,jlon1,jlon)
+        il2 = np.where(dl>0,jlon2,jlon)
+        zj[ok] = np.stack([jl1,jl1,jl2,jl2],axis=1)[ok]
+        zi[ok] = np.stack([il1,il2,il1,il2],axis=1)[ok]
+        weights[ok] = np.stack([wp1*wl1,wp1*wl2,wp2*wl1,wp2*wl2],axis=1)[ok]
+    
+    geometry = {"key"     : key,
+                "pixels"  : np.arange(ny*nx)[ondisk],
+                "rows"    : zrows[zj],
+                "cols"    : zcols[zi],
+                "weights" : weights,
+                "shape"   : (ny,nx),
+                "nlat"    : nlat,
+                "nlon"    : nlon,
+                "dlon"    : dlon[0],
+                "negative": negative}
+    if len(_orthogeometries)>=64:
+        _orthogeometries.pop(next(iter(_orthogeometries)))
+    _orthogeometries[key] = geometry
+    return geometry
+
+def _orthoshift(geometry,central_longitude):
+    """Number of columns to roll the map by to bring central_longitude under the observer."""
+    l0 = float(central_longitude)
+    if geometry["negative"]:
+        if l0>180.0:
+            l0 -= 360.0
+        dl0 = l0
+    else:
+        if l0<0:
+            l0 += 360.0
+        dl0 = l0-180.
+    return int(dl0/geometry["dlon"])
+
+_orthostencils = {}
+
+def _shiftedstencil(geometry,shift):
+    """Return (or fetch from the cache) a geometry's stencil for a map rolled by shift columns."""
+    import scipy.sparse
+    key = (geometry["key"],shift)
+    if key in _orthostencils:
+        return _orthostencils[key]
+    nlon = geometry["nlon"]
+    ny,nx = geometry["shape"]
+    indices = geometry["rows"]*nlon+(geometry["cols"]+shift)%nlon
+    counts = np.zeros(ny*nx,dtype=int)
+    counts[geometry["pixels"]] = 4
+    matrix = scipy.sparse.csr_matrix((geometry["weights"].ravel(),indices.ravel(),
+                                      np.concatenate([[0],np.cumsum(counts)])),
+                                     shape=(ny*nx,geometry["nlat"]*nlon))
+    stencil = {"pixels" : geometry["pixels"],
+               "indices": indices,
+               "weights": geometry["weights"],
+               "matrix" : matrix,
+               "shape"  : geometry["shape"]}
+    if len(_orthostencils)>=256:
+        _orthostencils.pop(next(iter(_orthostencils)))
+    _orthostencils[key] = stencil
+    return stencil
+
+def _orthostencil(lon,lat,central_longitude=0,central_latitude=0,ny=200,nx=200,
+                  interp='bilinear'):
+    """Return (or fetch from the cache) the pixel->grid stencil for an orthographic projection.
+
+    Returns
+    -------
+    dict
+        "pixels": flat indices of the (ny,nx) pixels that fall on the disk;
+        "indices": (npixels,4) flat indices into the (lat,lon) map;
+        "weights": (npixels,4) interpolation weights for those points;
+        "matrix": the same stencil as a sparse (ny*nx, NLAT*NLON) matrix, with empty rows
+        for pixels off the disk.
+    """
+    geometry = _orthogeometry(lon,lat,central_latitude=central_latitude,ny=ny,nx=nx,
+                              interp=interp)
+    return _shiftedstencil(geometry,_orthoshift(geometry,central_longitude))
+
+def _applyortho(stencil,imap):
+    """Project a (lat,lon,...) map through a stencil."""
+    imap = np.asarray(imap,dtype=float)
+    return _applyorthostack(stencil,imap[np.newaxis,...])[0]
+
+def _applyorthostack(stencil,imaps):
+    """Project a (time,lat,lon,...) stack of maps through a stencil.
+
+    The whole stack goes through the stencil as a single sparse matrix product, so every
+    stencil point is read once for all frames, and each frame comes out contiguous without
+    gathering the points into an intermediate array or scattering them into the image.
+    """
+    nframes = imaps.shape[0]
+    trailing = imaps.shape[3:]
+    ny,nx = stencil["shape"]
+    flat = np.reshape(imaps,(nframes,imaps.shape[1]*imaps.shape[2])+trailing)
+    if len(trailing)>0: #Move e.g. colour channels next to time, so each row is one map
+        flat = np.reshape(np.moveaxis(flat,1,-1),(-1,flat.shape[1]))
+    xymaps = np.asarray(flat@stencil["matrix"].T)
+    if len(trailing)>0:
+        return np.moveaxis(np.reshape(xymaps,(nframes,)+trailing+(ny,nx)),
+                           tuple(range(1,len(trailing)+1)),tuple(range(-len(trailing),0)))
+    return np.reshape(xymaps,(nframes,ny,nx))
 
 def orthographic(lon,lat,imap,central_longitude=0,central_latitude=0,ny=200,nx=200,interp='bilinear'):
     '''Perform an orthographic projection.
     
+    The mapping from pixels to grid points and interpolation weights is computed once for
+    each combination of grid, viewing angle, and image size, and cached, so projecting many
+    maps with the same view only costs one gather each.
+    
     Parameters
     ----------
     lon : numpy.ndarray (1D)
@@ -1546,140 +1917,105 @@ def orthographic(lon,lat,imap,central_longitude=0,central_latitude=0,ny=200,nx=2
     numpy.ndarray (ny,nx)
         The projected output
     '''
+    stencil = _orthostencil(lon,lat,central_longitude=central_longitude,
+                            central_latitude=central_latitude,ny=ny,nx=nx,interp=interp)
+    return _applyortho(stencil,imap)
+
+def orthographicframes(lon,lat,imaps,central_longitude=0,central_latitude=0,ny=200,nx=200,
+                       interp='bilinear',timeseries=None):
+    '''Render a series of orthographic projections in one call.
     
-    l0 = central_longitude
-    p0 = central_latitude
-    
-    shape = np.array(imap.shape)
-    shape[0] = ny
-    shape[1] = nx
-    
-    xymap = np.zeros(tuple(shape))
-    xymap[:] = 0.0
-    coords = np.zeros((ny,nx,2))
-    coords2 = np.zeros((ny,nx,2,3))
-    coords3 = np.zeros((ny,nx,2))
-    rad=0.5*(8*nx/18.0+8*ny/18.0)
-    
-    if lon.min()<0: #we're in a -180 to 180 domain
-        if l0>180.0:
-            l0 -= 360.0
+    This can be used to render a time series of maps from a fixed (or moving) viewpoint, or
+    a single map viewed from a sequence of viewpoints (e.g. a rotating planet). Frames that
+    share a central latitude are projected together in a single sparse matrix product.
     
-        if lon.max()>180.0:
-            zlon[zlon>180]-=360.0
-        
-        dl0 = l0 #lon-dl0 and l0-dl0 will rotate things so l0=0.
-        l0 -= dl0
-        
-        imap = np.roll(imap,-int(dl0/np.diff(lon)[0]),axis=1) #l0 should now be centered in the data array
+    Parameters
+    ----------
+    lon : numpy.ndarray (1D)
+        Longitude array [degrees]
+    lat : numpy.ndarray (1D)
+        Latitude array [degrees]
+    imaps : numpy.ndarray
+        Either a single map whose first two dimensions are (lat,lon), or a stack of maps
+        whose first three dimensions are (time,lat,lon). Any trailing dimensions (e.g. RGB
+        channels) are carried through.
+    central_longitude : float or array-like, optional
+        Longitude(s) in degrees to be centered beneath the observer, either one for all frames
+        or one per frame.
+    central_latitude : float or array-like, optional
+        Latitude(s) in degrees to be centered beneath the observer, either one for all frames
+        or one per frame.
+    ny : int, optional
+        Number of pixels in the Y direction for the output projection
+    nx : int, optional
+        Number of pixels in the X direction for the output projection
+    interp : str, optional
+        Interpolation to use. Currently only 'bilinear' is accepted; otherwise nearest-neighbor will be used.
+    timeseries : bool, optional
+        Whether the first dimension of imaps is time. By default this is inferred from the
+        shape: imaps is a time series if its second and third dimensions match the grid.
         
+    Returns
+    -------
+    numpy.ndarray (nframes,ny,nx,...)
+        The projected frames
+    '''
+    imaps = np.asarray(imaps,dtype=float)
+    if timeseries is None:
+        timeseries = (imaps.ndim>=3 and imaps.shape[1:3]==(len(lat),len(lon)))
+    views = np.broadcast(np.asarray(central_longitude,dtype=float),
+                         np.asarray(central_latitude,dtype=float))
+    if views.ndim>1:
+        raise DimensionError("Viewing angles must be scalars or 1D arrays")
+    if timeseries:
+        nframes = imaps.shape[0]
+        if views.size not in (1,nframes):
+            raise DimensionError("Got %d viewing angles for %d frames"%(views.size,nframes))
     else:
-        if l0<0:
-            l0 += 360.0
-        
-        dl0 = l0-180. #l0-dl0 = 180
-        l0 -= dl0
-        
-        imap = np.roll(imap,-int(dl0/np.diff(lon)[0]),axis=1) #l0 should now be centered in the data array
-        
-    #Add ghost cells
-    zlat = np.zeros(np.array(lat.shape)+2)
-    zlon = np.zeros(np.array(lon.shape)+2)
-    dlat = np.diff(lat)
-    dlon = np.diff(lon)
-    zlon[0] = lon[0]-dlon[0]
-    zlon[1:-1] = lon[:]
-    zlon[-1] = lon[-1]+dlon[-1]
-    zlat[0] = lat[0]-dlat[0]
-    zlat[-1] = lat[-1]+dlat[-1]
-    zlat[1:-1] = lat[:]
-    newshape = np.array(imap.shape)
-    newshape[0] += 2
-    newshape[1] += 2
-    zmap = np.zeros(tuple(newshape))
-    zmap[1:-1,1:-1] = imap[:]
-    #At the poles, ghost cells are just duplicates
-    zmap[0,...] = zmap[1,...]
-    zmap[-1,...] = zmap[-2,...]
-    #At the left and right edges, ghost cells are cyclical
-    zmap[:,0] = zmap[:,-2]
-    zmap[:,-1] = zmap[:,1]
-    
-
-    p0 *= np.pi/180.0
-    l0 *= np.pi/180.0
-    xx = np.arange(nx)-nx/2
-    yy = np.arange(ny)-ny/2
-    for j in range(0,ny):
-        jy = yy[j]
-        for i in range(0,nx):
-            ix = xx[i]
-            if (ix**2+jy**2)<=rad**2:
-                rho = np.sqrt(ix**2+jy**2)
-                cc = np.arcsin(rho/rad)
-                if rho==0:
-                    phi = p0
-                    lamb = l0
-                else:
-                    phi = np.arcsin(np.cos(cc)*np.sin(p0) + jy*np.sin(cc)*np.cos(p0)/rho)
-                    lamb = l0 + np.arctan2(ix*np.sin(cc),(rho*np.cos(cc)*np.cos(p0)-jy*np.sin(cc)*np.sin(p0)))
-                phi *= 180.0/np.pi
-                lamb *= 180.0/np.pi
-                if lamb<0 and lon.min()>=0:
-                    lamb += 360
-                if lamb>180 and lon.min()<0:
-                    lamb -= 360
-                jlat = np.argmin(abs(phi-zlat))
-                jlon = np.argmin(abs(lamb-zlon))
-                if interp=="bilinear":
-                    xlat1 = np.where(zlat<phi)[0]
-                    xlat2 = np.where(zlat>=phi)[0]
-                    xlon1 = np.where(zlon<lamb)[0]
-                    xlon2 = np.where(zlon>=lamb)[0]
-                    if len(xlat1)>0 and len(xlat2)>0 and len(xlon1)>0 and len(xlon2)>0:
-                        jlat1 = np.where(zlat==zlat[xlat1].max())[0][0]
-                        jlat2 = np.where(zlat==zlat[xlat2].min())[0][0]
-                        jlon1 = np.where(zlon==zlon[xlon1].max())[0][0]
-                        jlon2 = np.where(zlon==zlon[xlon2].min())[0][0]
-                        p1 = zlat[jlat1]
-                        p2 = zlat[jlat2]
-                        l1 = zlon[jlon1]
-                        l2 = zlon[jlon2]
-                        #print "interpolating;",jlat1,jlat2,jlon1,jlon2,lamb#,zlon[np.where(zlon<lamb)]
-                        dl = l2-l1
-                        dp = p2-p1
-                        try:
-                            if dl==0 and dp>0:
-                                fxy1 = zmap[jlat1,jlon]
-                                fxy2 = zmap[jlat2,jlon]
-                                xymap[j,i] = (p2-phi)/dp*fxy1 + (phi-p1)/dp*fxy2
-                            elif dp==0 and dl>0:
-                                fx1y = zmap[jlat,jlon1]
-                                fx2y = zmap[jlat,jlon2]
-                                xymap[j,i] = (l2-lamb)/dl*fx1y + (lamb-l1)/dl*fx2y
-                            elif dp==0 and dl==0:
-                                xymap[j,i] = zmap[jlat,jlon]
-                            else:
-                                fxy1 = (l2-lamb)/dl*zmap[jlat1,jlon1] + (lamb-l1)/dl*zmap[jlat1,jlon2]
-                                fxy2 = (l2-lamb)/dl*zmap[jlat2,jlon1] + (lamb-l1)/dl*zmap[jlat2,jlon2]
-                                xymap[j,i] = (p2-phi)/dp*fxy1 + (phi-p1)/dp*fxy2
-                        except BaseException as err:
-                            print(p1,p2,l1,l2,jlat1,jlat2,jlon1,jlon2)
-                            raise err
-                    else:
-                        #print jlat1,jlat2,jlon1,jlon2
-                        jlat1=-200
-                        jlat2=-200
-                        xymap[j,i] = zmap[jlat,jlon]
-                else:
-                    #print "not bilinear"
-                    xymap[j,i] = zmap[jlat,jlon]
-                    
-    return xymap
-    
-
-
-def load(filename,csvbuffersize=1):
+        nframes = views.size
+    views = [view for view in views]
+    if len(views)==1:
+        views = views*nframes
+    
+    #The expensive part of a projection depends only on the central latitude; a central
+    #longitude just rolls the map by a whole number of columns. So frames that share a
+    #latitude are rolled to a common longitude and projected together in one product.
+    groups = {}
+    for n,(clon,clat) in enumerate(views):
+        groups.setdefault(clat,[]).append((n,clon))
+    frames = None
+    for clat,group in groups.items():
+        geometry = _orthogeometry(lon,lat,central_latitude=clat,ny=ny,nx=nx,interp=interp)
+        members = [n for n,clon in group]
+        shifts = [_orthoshift(geometry,clon) for n,clon in group]
+        stencil = _shiftedstencil(geometry,shifts[0])
+        if not timeseries:
+            stack = imaps[np.newaxis,...]
+        elif len(members)==nframes:
+            stack = imaps
+        else:
+            stack = imaps[members]
+        if any(shift!=shifts[0] for shift in shifts):
+            nlon = geometry["nlon"]
+            rolled = np.empty((len(members),)+stack.shape[1:])
+            for m,shift in enumerate(shifts):
+                source = stack[m if timeseries else 0]
+                shift = (shift-shifts[0])%nlon
+                rolled[m,:,:nlon-shift] = source[:,shift:]
+                rolled[m,:,nlon-shift:] = source[:,:shift]
+            stack = rolled
+        projected = _applyorthostack(stencil,stack)
+        if len(groups)==1:
+            if projected.shape[0]<nframes:
+                projected = np.repeat(projected,nframes,axis=0)
+            return projected
+        if frames is None:
+            frames = np.empty((nframes,)+projected.shape[1:])
+        frames[members] = projected
+    return frames
+    
+
+def load(filename,csvbuffersize=1,cache=False):
     '''Open a postprocessed ExoPlaSim output file.
     
     Supported formats include netCDF, CSV/TXT (can be compressed), NumPy, and HDF5. If the data
@@ -1709,6 +2045,11 @@ def load(filename,csvbuffersize=1):
     csvbuffersize : int, optional
         If the file (or group of files) is a file archive such as a directory, tarball, etc, this is
         the number of variables to keep in a memory buffer when the archive is accessed.
+    cache : bool, optional
+        If True, return an already-open dataset for this file if there is one (and the file has
+        not been modified since it was opened), and keep the dataset open for later calls. The
+        most recently used files are kept open, up to a limit set by :py:func:`setcachesize`.
+        Calling ``close()`` on a cached dataset has no effect; use :py:func:`invalidate` instead.
         
     Returns
     -------
@@ -1722,6 +2063,8 @@ def load(filename,csvbuffersize=1):
             csvbuffersize = int(csvbuffersize)
         except:
             csvbuffersize = 1
+    if cache:
+        return _cachedload(filename,csvbuffersize=csvbuffersize)
     output=_Dataset(filename,csvbuffersize=csvbuffersize) #Usually _Dataset calls load(), but _Dataset calls _loadnetcdf
                                   #directly, so here we're going to defer to _Dataset and make use
                                   #of the close() functionality
@@ -1738,6 +2081,103 @@ def load(filename,csvbuffersize=1):
     
     return output
     
+def _probe(filename,variable,csvbuffersize=1):
+    """Return the shape and dtype of a variable in a file, closing the file afterwards.
+    
+    For NumPy archives only the header of the variable's array is read, and NetCDF and HDF5
+    variables are read lazily, so only their headers are touched; the values are returned as
+    None. Other formats have to be read in full to get the shape, so the values are returned
+    too, and the file never needs to be read again.
+    """
+    if filename.split('.')[-1]=="npz":
+        import zipfile
+        with zipfile.ZipFile(filename) as archive:
+            with archive.open(variable+".npy") as member:
+                version = np.lib.format.read_magic(member)
+                if version==(1,0):
+                    shape,fortran,dtype = np.lib.format.read_array_header_1_0(member)
+                else:
+                    shape,fortran,dtype = np.lib.format.read_array_header_2_0(member)
+        return tuple(shape),dtype,None
+    data = load(filename,csvbuffersize=csvbuffersize)
+    try:
+        values = data.variables[variable]
+        if not isinstance(values,np.ndarray):
+            return tuple(values.shape),np.dtype(values.dtype),None
+        values = np.asarray(values)
+        return values.shape,values.dtype,values
+    finally:
+        data.close()
+
+def _readinto(filename,variable,output,start,csvbuffersize=1):
+    """Read a variable from a file into output[start:start+ntimes], closing the file afterwards."""
+    data = load(filename,csvbuffersize=csvbuffersize)
+    try:
+        values = data.variables[variable][:]
+        output[start:start+values.shape[0],...] = values
+    finally:
+        data.close()
+
+def loadseries(filenames,variable,threads=None,csvbuffersize=1):
+    '''Read one variable from a sequence of output files, concatenated along the time axis.
+    
+    The output array is allocated once, using the time length of each file, and each file is
+    read directly into its slice of the array and closed straight away, so the cost is linear
+    in the total size rather than growing with every file appended, and only one file's worth
+    of data is held at a time on top of the output. The time lengths come from the headers of
+    NumPy, NetCDF, and HDF5 files; CSV archives have no header, so they are read once, up front.
+    
+    Parameters
+    ----------
+    filenames : list(str)
+        Output files to read, in order
+    variable : str
+        Name of the variable to read. Must have time as its first dimension.
+    threads : int, optional
+        If greater than 1, read NumPy archives concurrently with this many threads. This helps
+        when decompressing them is the bottleneck. Other formats are always read one at a time,
+        since the NetCDF and HDF5 libraries are not safe to call from several threads at once.
+    csvbuffersize : int, optional
+        See :py:func:`load`
+        
+    Returns
+    -------
+    numpy.ndarray
+        The concatenated data
+    '''
+    filenames = list(filenames)
+    if len(filenames)==0:
+        raise DatafileError("No files given")
+    probes = [_probe(f,variable,csvbuffersize=csvbuffersize) for f in filenames]
+    shapes = [probe[0] for probe in probes]
+    for shape in shapes[1:]:
+        if shape[1:]!=shapes[0][1:]:
+            raise DimensionError("%s has shape %s in one file and %s in another"%
+                                 (variable,str(shapes[0]),str(shape)))
+    starts = np.concatenate([[0],np.cumsum([shape[0] for shape in shapes])])
+    output = np.zeros((starts[-1],)+shapes[0][1:],dtype=probes[0][1])
+    archives = []
+    for n,probe in enumerate(probes):
+        if probe[2] is not None:
+            output[starts[n]:starts[n+1],...] = probe[2]
+        elif filenames[n].split('.')[-1]=="npz":
+            archives.append((filenames[n],variable,output,starts[n],csvbuffersize))
+        else:
+            _readinto(filenames[n],variable,output,starts[n],csvbuffersize=csvbuffersize)
+    probes = None #Release the arrays that have been copied
+    if threads is not None and threads>1 and len(archives)>1:
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(min(threads,len(archives)))
+        try:
+            pool.starmap(_readinto,archives)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for archive in archives:
+            _readinto(*archive)
+    return output
+    
 
 #def rhines(U,lat,lon,plarad=6371.0,daylen=15.0,beta=None):
     #'''Return the nondimensional Rhines length scale L_R/a
@@ -1,7 +1,6 @@
 import os
 import numpy as np
-import time
-from batch_system import SUB, BATCHSCRIPT
+from batch_system import BATCHSCRIPT, submitjob
 
 # Options:
 #   noutput
@@ -646,7 +645,6 @@ def prep(job):
   rs.close()
   
 def submit(job):
-  os.system("cd plasim/job"+str(job.home)+" && "+SUB+" runplasim && cd "+job.top)
-  time.sleep(1.0)
-  tag = job.getID()
+  #The scheduler tells us the job ID on submission, so there's no need to look it up
+  job.tag = submitjob("plasim/job"+str(job.home),job.jobname)
   job.write()
\ No newline at end of file
@@ -1,7 +1,6 @@
 import os
 import numpy as np
-import time
-from batch_system import SUB, BATCHSCRIPT
+from batch_system import BATCHSCRIPT, submitjob
 from identity import USER
 import glob
 
@@ -683,9 +682,24 @@ def prep(job):
   rs.write(jobscript)
   rs.close()
   
+  #The same run without a batch system or node scratch, for pilot.py (and for running by hand).
+  #Instead of resubmitting itself when the run script leaves a keepgoing file, it just loops.
+  runcommand = "./"+scriptfile+" "+str(job.ncores)+" "+str(nlevs)+" "+histargs
+  localscript = ("#!/bin/bash                                                      \n"+
+                 "set -e                                                           \n"+
+                 "rm -f keepgoing                                                  \n"+
+                 runcommand+"                                                      \n"+
+                 "while [ -e keepgoing ]                                           \n"+
+                 "do                                                               \n"+
+                 "   rm keepgoing                                                  \n"+
+                 "   "+runcommand+"                                                \n"+
+                 "done                                                             \n"+
+                 "python synthoutput.py MOST 1                                     \n")
+  rs = open(workdir+"/runlocal","w")
+  rs.write(localscript)
+  rs.close()
+  
 def submit(job):
-    
-  os.system("cd "+job.home+" && "+SUB+" runplasim && cd "+job.top)
-  time.sleep(1.0)
-  tag = job.getID()
+  #The scheduler tells us the job ID on submission, so there's no need to look it up
+  job.tag = submitjob(job.home,job.jobname)
   job.write()
\ No newline at end of file
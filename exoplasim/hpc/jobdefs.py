@@ -1,7 +1,67 @@
 import os
+import time
+import pickle
+import subprocess
 import numpy as np
 from identity import *
 
+REFRESH = 30.0 #Seconds before the job list is fetched from the scheduler again
+
+class JobQuery:
+  '''Cached view of our jobs in the batch queue.
+
+  The whole list is fetched with a single scheduler call (``query``, a function returning a list
+  of dicts with at least "tag" and "name") and reused until it is ``refresh`` seconds old, so
+  looking up many jobs doesn't mean polling the scheduler once per job.
+  '''
+  def __init__(self,query,refresh=REFRESH):
+    self.query = query
+    self.refresh = refresh
+    self.time = None
+    self.entries = []
+    self.jobfiles = {}
+    
+  def jobs(self,refresh=None):
+    if refresh is None:
+      refresh = self.refresh
+    if self.time is None or time.time()-self.time>refresh:
+      self.entries = self.query()
+      self.time = time.time()
+    return self.entries
+  
+  def find(self,name):
+    '''Return the tag of our job called ``name``, or None'''
+    for entry in self.jobs():
+      if entry["name"]==name:
+        return entry["tag"]
+    for entry in self.jobs(refresh=0.0): #Not there yet--maybe it was just submitted
+      if entry["name"]==name:
+        return entry["tag"]
+    return None
+    
+  def add(self,tag,name,**fields):
+    '''Record a job we just submitted, so it can be found without polling again'''
+    entry = {"tag":tag,"name":name}
+    entry.update(fields)
+    self.entries.append(entry)
+    
+  def loadjob(self,workdir):
+    '''Load the Job saved in a job directory (cached, since it doesn't change)
+
+    Returns None if there is no readable job.npy yet (e.g. the job was only just set up),
+    in which case it is tried again next time.
+    '''
+    if workdir not in self.jobfiles:
+      try:
+        self.jobfiles[workdir] = np.load(workdir+"/job.npy",allow_pickle=True).item()
+      except (OSError,ValueError,EOFError,pickle.UnpicklingError):
+        return None
+    return self.jobfiles[workdir]
+
+def run(command,cwd=None):
+  '''Run a scheduler command and return its output as text'''
+  return subprocess.check_output(command,cwd=cwd,universal_newlines=True)
+
 class Job:
   def __init__(self,header,args,resource):
     self.args = args.split()
@@ -24,19 +84,8 @@ class Job:
     self.jobname = self.name+".cl"
     
   def getID(self):
-    os.system("qstat -u "+USER+" > cjobs.tmp")
-    jf = open("cjobs.tmp","r")
-    jlist = jf.read().split('\n')[5:-1]
-    jf.close()
-    os.system("rm cjobs.tmp")
-    tag = None
-    if len(jlist)>0:
-      for j in jlist:
-        job = j.split()
-        name = job[3]
-        if name==self.jobname:
-          tag = job[0]
-          break
+    from batch_system import SCHEDULER #batch_system imports this module
+    tag = SCHEDULER.find(self.jobname)
     self.tag = tag
     return tag
 
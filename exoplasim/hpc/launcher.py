@@ -5,7 +5,7 @@ import sys
 import numpy as np
 from jobdefs import *
 from batch_system import *
-from sets import Set
+from taskstore import TaskStore
 
 
 if __name__=="__main__":    
@@ -43,80 +43,34 @@ if __name__=="__main__":
     #rf.close()
 
   njobs=0
-  #print "Moving on to normal tasks"
-  #print running,nnodes
-  capacityflag = False
-  openjobs=True
-  while openjobs: #We are using less than our full allocation, and the priority list is empty.
+  
+  #Pull any new tasks from tasks.crwl into the task store. Tasks that are already there keep
+  #their status, so it's safe to keep appending to tasks.crwl between runs.
+  store = TaskStore("tasks.db")
+  nnew = store.importcrwl("tasks.crwl")
+  f=open("tasklog.crwl","a")
+  f.write("\nImported %d new tasks"%nnew)
+  f.close()
+  
+  while True:
     
     #Get next task
-    
-    f=open("tasks.crwl","r")
-    tasks=f.read().split('\n')
-    f.close()
-    ready=False
-    queued = False
     print("Getting job....")
-    while not ready:       #Search for a job to run 
-      queued = False
-      for i in range(0,len(tasks)-1):
-        if tasks[i]!='':
-          if tasks[i][0]!="#":
-            task = tasks[i].split()
-            if int(task[1])==0:
-              queued=True
-              taskname = task[0]
-              mark=i                                     #so a plasim job might put us over the limit.
-              f=open("tasklog.crwl","a")
-              f.write("\nFound job "+' '.join(task))
-              f.close()
-              break
-      if not queued:
-          openjobs=False
-          ready=False
-          print("We have run out of jobs and ARE TRYING TO BREAK")
-          break
-      ready=False
-      f=open("tasklog.crwl","a")
-      f.write("\nSearching for header...")
-      f.close()
-      header=False
-      for i in range(mark,-1,-1): #Find header for the task
-        if tasks[i][0]=="#":
-          header = tasks[i]
-          if (len(header.split())-1)==(len(task)): #first header with the right number of args
-            break
-          else:
-            header=False
-      if not header:                #None match!
-        f=open("tasklog.crwl","a")
-        f.write("\nTask "+str(queued)+" header mismatch; skipping")
-        f.close()
-      else:                         #We found the header. Onward!
-        ready=True
-        f=open("tasklog.crwl","a")
-        f.write("\nTask "+str(queued)+" header found")
-        f.close()          
-      
+    claimed = store.claim()
+    if claimed is None:
+      print("We have run out of jobs")
+      break
+    taskname,header,task = claimed
+    f=open("tasklog.crwl","a")
+    f.write("\nFound job "+task)
+    f.close()
 
     #Engage next task
-    if ready:
-      
-      print("Creating a Job with header\n",header,"\n and arguments \n",' '.join(task)) 
-      newjob = Job(header,' '.join(task),-1)       #Collect and organize the job parameters
-      
+    print("Creating a Job with header\n",header,"\n and arguments \n",task) 
+    try:
+      newjob = Job(header,task,-1)       #Collect and organize the job parameters
       newjob.home = taskname
       
-
-      task[1] = '1'
-      task = ' '.join(task)
-      tasks[mark] = task
-      tasks='\n'.join(tasks)
-      if not Set(task).issubset(Set(" \n")): #Make sure we have something to write!
-          f=open("tasks.crwl","w")
-          f.write(tasks)
-          f.close()
-      
       launchset.newtask(newjob,dryrun=dryrun)            #Set up the job and submit it
       np.save(newjob.home+'/job.npy',newjob)
       if not dryrun:
@@ -124,9 +78,17 @@ if __name__=="__main__":
       else:
           newjob.tag='xxxxx.doug'
       newjob.write()
-      
-      njobs+=1
-      
+    except Exception as e:
+      retry = store.failed(taskname,message=repr(e))
+      f=open("tasklog.crwl","a")
+      f.write("\nTask "+taskname+" failed: "+repr(e)+("; will retry" if retry else "; giving up"))
+      f.close()
+      continue
+    store.launched(taskname,tag=newjob.tag)
+    
+    njobs+=1
+  store.close()
+  
     
   #folders = []
   ##print MODELS.keys()
@@ -0,0 +1,240 @@
+'''
+Pilot-job worker: run many small PlaSim jobs side by side inside one allocation.
+
+Instead of one batch submission per task, submit (or just run) this script once. It claims
+tasks from the crawler's task store (tasks.db, filled from tasks.crwl exactly as launcher.py
+does), sets each one up with the usual build<model>job.prep, and runs its ``runlocal`` script
+in the job folder, starting as many as fit in the cores and memory it has. Whenever a run
+finishes, the freed cores go to the next task. When there are no tasks left and every run has
+finished, the worker exits. Several pilots can share one task store.
+
+Usage: python pilot.py [cores=N] [memory=MB] [mempercore=MB] [poll=SECONDS] [nosub]
+
+    cores       Cores to fill. Defaults to the allocation's (SLURM_CPUS_ON_NODE or PBS_NP),
+                or every core on this machine.
+    memory      Memory to fill, in MB. Defaults to the allocation's (SLURM_MEM_PER_NODE), or
+                the memory currently available on this machine.
+    mempercore  Memory each run needs per core, in MB (default 2000, as in the batch scripts).
+    poll        Seconds between checks on running jobs (default 10).
+    nosub       Set the jobs up, but don't run them.
+
+Each task's NCORES field from tasks.crwl is the number of cores it is given. Output from each
+run goes to pilot.log in its job folder. Runs that exit with an error are put back in the
+queue (see taskstore.py for the retry limit).
+'''
+import os
+import sys
+import time
+import signal
+import importlib
+import subprocess
+from taskstore import TaskStore
+from jobdefs import Job
+
+MEMPERCORE = 2000.0 #MB
+POLL = 10.0 #seconds
+
+def allocatedcores():
+    '''Number of cores in this allocation (or on this machine, outside a batch job)'''
+    for var in ("SLURM_CPUS_ON_NODE","PBS_NP","NCPUS"):
+        if var in os.environ:
+            return int(os.environ[var])
+    return os.cpu_count()
+
+def allocatedmemory():
+    '''Memory in this allocation (or available on this machine), in MB'''
+    if "SLURM_MEM_PER_NODE" in os.environ:
+        return float(os.environ["SLURM_MEM_PER_NODE"])
+    try:
+        with open("/proc/meminfo","r") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return float(line.split()[1])/1024.0
+    except IOError:
+        pass
+    return float("inf")
+
+def _terminated(signum,frame):
+    '''Turn SIGTERM into an exception, so the pilot cleans up before it exits'''
+    signal.signal(signal.SIGTERM,signal.SIG_IGN) #Let the cleanup finish
+    raise SystemExit(128+signum)
+
+class Pilot:
+    '''Pack tasks from a task store into a fixed number of cores and amount of memory.
+
+    Parameters
+    ----------
+    store : TaskStore
+        Where to get tasks from
+    cores : int, optional
+        Cores available to runs
+    memory : float, optional
+        Memory available to runs, in MB
+    mempercore : float, optional
+        Memory each run needs per core, in MB
+    dryrun : bool, optional
+        Set jobs up but don't run them (like launcher.py nosub)
+    '''
+    def __init__(self,store,cores=None,memory=None,mempercore=MEMPERCORE,dryrun=False):
+        self.store = store
+        if cores is None:
+            cores = allocatedcores()
+        if memory is None:
+            memory = allocatedmemory()
+        self.cores = cores
+        self.memory = memory
+        self.mempercore = mempercore
+        self.dryrun = dryrun
+        self.worker = "pilot:%s:%d"%(os.uname()[1],os.getpid())
+        self.running = {} #name: (process, log, cores)
+        self.waiting = None #A claimed task too big to start until something finishes
+        self.finished = 0
+        self.failures = 0
+
+    def freecores(self):
+        return self.cores-sum([run[2] for run in self.running.values()])
+
+    def freememory(self):
+        return self.memory-sum([run[2] for run in self.running.values()])*self.mempercore
+
+    def log(self,message):
+        print(time.strftime("%Y-%m-%d %H:%M:%S")+" "+message)
+        sys.stdout.flush()
+
+    def _fail(self,name,message,retry=True):
+        self.failures += 1
+        if retry:
+            retry = self.store.failed(name,message=message)
+        else:
+            self.store.failed(name,message=message,maxretries=0)
+        self.log("Task %s failed (%s)%s"%(name,message,"; requeued" if retry else ""))
+
+    def start(self,name,header,task):
+        '''Set up a claimed task and start running it'''
+        try:
+            job = Job(header,task,-1)
+            job.home = name
+            os.system("mkdir -p "+job.home)
+            os.system("cp jobdefs.py "+job.home+"/")
+            setjob = importlib.import_module("build"+job.model+"job")
+            setjob.prep(job)
+            if not os.path.exists(job.home+"/runlocal"):
+                raise IOError("prep did not write "+job.home+"/runlocal")
+        except Exception as e:
+            self._fail(name,"setup: "+repr(e))
+            return
+        job.tag = self.worker
+        if self.dryrun:
+            self.store.launched(name,tag=self.worker)
+            self.log("Set up %s"%name)
+            return
+        log = None
+        try:
+            log = open(job.home+"/pilot.log","a")
+            #A session of its own, so the run and everything it starts can be stopped together
+            process = subprocess.Popen(["bash","runlocal"],cwd=job.home,stdout=log,
+                                       stderr=subprocess.STDOUT,start_new_session=True)
+        except OSError as e:
+            if log is not None:
+                log.close()
+            self._fail(name,"launch: "+repr(e))
+            return
+        self.running[name] = (process,log,job.ncores)
+        self.store.launched(name,tag=self.worker)
+        self.log("Started %s on %d cores (%d free)"%(name,job.ncores,self.freecores()))
+
+    def reap(self):
+        '''Collect runs that have finished'''
+        for name in list(self.running.keys()):
+            process,log,ncores = self.running[name]
+            code = process.poll()
+            if code is None:
+                continue
+            log.close()
+            del self.running[name]
+            if code==0:
+                self.finished += 1
+                self.log("Finished %s"%name)
+            else:
+                self._fail(name,"exit code %d"%code)
+
+    def fill(self):
+        '''Start tasks until the next one doesn't fit. Returns False if the queue is empty.'''
+        while True:
+            if self.waiting is None:
+                self.waiting = self.store.claim(worker=self.worker)
+                if self.waiting is None:
+                    return False
+            name,header,task = self.waiting
+            try:
+                ncores = int(task.split()[2])
+            except (IndexError,ValueError):
+                self.waiting = None
+                self._fail(name,"malformed task line: %s"%task,retry=False)
+                continue
+            if ncores>self.cores or ncores*self.mempercore>self.memory:
+                self.waiting = None
+                self._fail(name,"needs %d cores and %.0f MB; this pilot has %d and %.0f MB"%(
+                                ncores,ncores*self.mempercore,self.cores,self.memory),retry=False)
+                continue
+            if ncores>self.freecores() or ncores*self.mempercore>self.freememory():
+                self.store.touch(name) #Keep other pilots from taking it over while we wait
+                return True #Wait for something to finish
+            self.waiting = None
+            self.start(name,header,task)
+
+    def run(self,poll=POLL):
+        '''Run tasks until the queue is empty and every run has finished.
+
+        If the pilot is stopped (including by SIGTERM, as a scheduler sends at the end of the
+        allocation), its runs are terminated and their tasks put back in the queue.
+        '''
+        self.log("%s: %d cores, %.0f MB"%(self.worker,self.cores,self.memory))
+        try:
+            previous = signal.signal(signal.SIGTERM,_terminated)
+        except ValueError: #Not the main thread; signals can't be caught here
+            previous = None
+        try:
+            while True:
+                self.reap()
+                more = self.fill()
+                if not more and len(self.running)==0:
+                    break
+                time.sleep(poll)
+        except BaseException:
+            #Don't leave orphaned runs behind, and let their tasks be picked up again
+            for name in self.running:
+                try:
+                    os.killpg(self.running[name][0].pid,signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+                self.store.failed(name,message="pilot stopped")
+            if self.waiting is not None:
+                self.store.failed(self.waiting[0],message="pilot stopped")
+            raise
+        finally:
+            if previous is not None:
+                signal.signal(signal.SIGTERM,previous)
+        self.log("Queue empty: %d runs finished, %d failures"%(self.finished,self.failures))
+        return self.finished
+
+
+if __name__=="__main__":
+    options = {}
+    for arg in sys.argv[1:]:
+        if "=" in arg:
+            options[arg.split("=")[0]] = arg.split("=")[1]
+    cores = None
+    memory = None
+    if "cores" in options:
+        cores = int(options["cores"])
+    if "memory" in options:
+        memory = float(options["memory"])
+    store = TaskStore("tasks.db")
+    if os.path.exists("tasks.crwl"):
+        store.importcrwl("tasks.crwl")
+    pilot = Pilot(store,cores=cores,memory=memory,
+                  mempercore=float(options.get("mempercore",MEMPERCORE)),
+                  dryrun=("nosub" in sys.argv[1:]))
+    pilot.run(poll=float(options.get("poll",POLL)))
+    store.close()
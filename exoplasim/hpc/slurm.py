@@ -2,10 +2,11 @@
 
 import os
 import numpy as np
-from crawldefs import Job
+from jobdefs import JobQuery, run
 from identity import *
 
 SUB = "sbatch"
+QUERY = "squeue" #Either of these can point at a stand-in script for testing
 
 USER = "t-98b023"
 
@@ -36,60 +37,41 @@ MODELS = {"rossby-block":8,     #tasks per node (1 workq node on Sunnyvale has 8
                                 #HPC convention of a task being a thread or process. This way our
                                 #code is MPI/OpenMP-agnostic.
 
-def getjobs():
+def _query():
+    #One call for every field we need: job ID, name, state, CPUs, and working directory
+    output = run([QUERY,"--noheader","-u",USER,"-o","%i|%j|%T|%C|%Z"])
+    jobs = []
+    for line in output.split('\n'):
+        fields = line.strip().split('|')
+        if len(fields)<5:
+            continue
+        jobs.append({"tag":fields[0],"name":fields[1],"state":fields[2],
+                     "ncpus":int(fields[3]),"workdir":fields[4]})
+    return jobs
+
+SCHEDULER = JobQuery(_query)
+
+def submitjob(workdir,name,script="runplasim"):
+    '''Submit a job script from its directory, and return the job's ID'''
+    tag = run([SUB,"--parsable",script],cwd=workdir).strip().split(";")[0]
+    SCHEDULER.add(tag,name,state="PENDING",workdir=os.path.abspath(workdir))
+    return tag
+
+def getjobs(refresh=None):
     print("Checking jobs")
-    os.system("squeue -u "+USER+" > cjobs.tmp")
-    cjf = open("cjobs.tmp","r")
-    joblist = cjf.read().split('\n')[1:-1]
-    cjf.close()
-    os.system("rm cjobs.tmp")
     resources={}
     for m in list(MODELS.keys()):
         resources[m] = np.zeros(256)
-    tags = []
-    for j in joblist:
-        job = j.split()
-        tags.append(job[0])
-    for t in tags:
-        print("Looking up job "+t)
-        os.system("scontrol show job "+t+" > jinfo.tmp")
-        jf = open("jinfo.tmp","r")
-        jinfo = jf.read().split('\n')[:-2]
-        while '' in jinfo:
-            jinfo.remove('')
-        jf.close()
-        os.system("rm jinfo.tmp")
-        ncpus = 1
-        for l in jinfo:
-            if len(l.split('='))>0:
-                if l.split('=')[0]=="WorkDir":
-                    workdir = l.split('=')[1]
-                #if l.split()[0]=="Resource_List.ncpus":
-                    #ncpus = int(l.split()[2])
-                if l.split()[0].split('=')[0]=="NumNodes":
-                    ncpus = int(l.split()[1].split("=")[1])
-        ourjob=True
-        try:
-            job = np.load(workdir+"/job.npy").item()
-        except:
-            #for nl in range(0,len(jinfo)):
-                #l = jinfo[nl]
-                #if len(l.split())>0:
-                    #if l.split()[0]=="init_work_dir":
-                        #try:
-                            #workdir = l.split()[2] + jinfo[nl+1].split()[0]
-                        #except:
-                            #workdir = l.split()[2]
-            try:
-                job = np.load(workdir+"/job.npy").item()
-            except:
-                ourjob=False
-        if ourjob:
+    for entry in SCHEDULER.jobs(refresh):
+        if "ncpus" not in entry: #Submitted since the last poll
+            continue
+        job = SCHEDULER.loadjob(entry["workdir"])
+        if job is not None:
             jid = job.home
             if jid>=len(resources[job.model]):
                 tmp = np.zeros(jid+100)
                 tmp[:len(resources[job.model])] = resources[job.model][:]
                 resources[job.model] = tmp
-            resources[job.model][jid] = float(ncpus)/8.0#MODELS[job.model]
+            resources[job.model][jid] = float(entry["ncpus"])/8.0#MODELS[job.model]
     
     return resources
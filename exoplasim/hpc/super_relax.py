@@ -3,6 +3,10 @@ import os
 import sys
 import netCDF4 as nc
 import glob
+try:
+    from exoplasim.gcmt import getgrid
+except ImportError: #Running from a job directory without ExoPlaSim installed
+    getgrid = None
 import time
 
 gplasim = True
@@ -10,32 +14,30 @@ TIMELIMIT = 1.44e5
 
 #This version lets the model relax.
 
-def spatialmath(lt,ln,variable,mean=True,radius=6.371e6):
-    lt1 = np.zeros(len(lt)+1)
-    lt1[0] = 90
-    for n in range(0,len(lt)-1):
-        lt1[n+1] = 0.5*(lt[n]+lt[n+1])
-    lt1[-1] = -90
-    ln1 = np.zeros(len(ln)+1)
-    ln1[0] = -2.8125
-    for n in range(0,len(ln)-1):
-        ln1[n+1] = 0.5*(ln[n]+ln[n+1])
-    ln1[-1] = 360.0-2.8125
-    
-    lt1*=np.pi/180.0
-    ln1*=np.pi/180.0
-    
-    darea = np.zeros((len(lt),len(ln)))
-    for jlat in range(0,len(lt)):
-        for jlon in range(0,len(ln)):
-            dln = ln1[jlon+1]-ln1[jlon]
-            darea[jlat,jlon] = (np.sin(lt1[jlat])-np.sin(lt1[jlat+1]))*dln
+def spatialmath(lt,ln,variable,mean=True,radius=6.371e6,grid=None):
+    if grid is None:
+        if getgrid is not None:
+            grid = getgrid(lt,ln,radius=radius,centered=True)
+        else:
+            dln = np.diff(ln)[0]
+            ln1 = np.zeros(len(ln)+1)
+            ln1[0] = ln[0]-0.5*dln
+            ln1[1:-1] = 0.5*(ln[:-1]+ln[1:])
+            ln1[-1] = ln[-1]+0.5*dln
+            lt1 = np.zeros(len(lt)+1)
+            lt1[0] = 90
+            lt1[1:-1] = 0.5*(lt[:-1]+lt[1:])
+            lt1[-1] = -90
+            darea = np.outer(np.sin(lt1[:-1]*np.pi/180.0)-np.sin(lt1[1:]*np.pi/180.0),
+                             np.diff(ln1)*np.pi/180.0)
+            if mean:
+                return np.sum(variable*darea)/np.sum(darea)
+            return np.sum(variable*darea) * radius**2
     
-    svar = variable*darea
     if mean:
-        outvar = np.sum(svar)/np.sum(darea)
+        outvar = grid.mean(variable,ignoreNaNs=False)
     else:
-        outvar = np.sum(svar) * radius**2
+        outvar = grid.sum(variable,ignoreNaNs=False)
     
     return outvar
 
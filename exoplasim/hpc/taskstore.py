@@ -0,0 +1,291 @@
+'''
+Transactional task store for the crawler, backed by SQLite.
+
+tasks.crwl is still the way to *write* a sweep (see the README), but launcher.py no longer
+scans and rewrites it for every job. Instead its header and job lines are imported into
+tasks.db, where each task is one indexed row with a status, a retry count, and timestamps.
+Claiming the next task is a single transaction, so several launchers can work through the same
+sweep without handing out a task twice or losing each other's status updates.
+
+Usage: python taskstore.py import [tasks.crwl] [--replace]
+       python taskstore.py status
+       python taskstore.py retry
+
+    import   Add any new tasks from a .crwl file (default tasks.crwl). Tasks already in the
+             store keep their status. Names that clash with a different line are reported, and
+             with --replace the new line replaces the stored task.
+    status   Print the number of tasks with each status.
+    retry    Put failed tasks back in the queue, with their retry counts reset.
+'''
+import os
+import sys
+import time
+import sqlite3
+
+PENDING  = 0   #Same meaning as STATUS=0 in tasks.crwl
+LAUNCHED = 1   #Same meaning as STATUS=1 in tasks.crwl
+CLAIMED  = 2   #A launcher is setting the task up right now
+FAILED   = -1  #Setup or submission failed MAXRETRIES times
+
+STATUSNAMES = {PENDING:"pending",LAUNCHED:"launched",CLAIMED:"claimed",FAILED:"failed"}
+
+MAXRETRIES = 3
+STALE = 3600.0 #Seconds after which a claimed task is assumed to belong to a dead launcher
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS headers (
+    id      INTEGER PRIMARY KEY,
+    header  TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    id       INTEGER PRIMARY KEY,
+    name     TEXT UNIQUE NOT NULL,
+    status   INTEGER NOT NULL DEFAULT 0,
+    header   INTEGER NOT NULL REFERENCES headers(id),
+    args     TEXT NOT NULL,
+    retries  INTEGER NOT NULL DEFAULT 0,
+    created  REAL NOT NULL,
+    claimed  REAL,
+    finished REAL,
+    worker   TEXT,
+    tag      TEXT,
+    message  TEXT
+);
+CREATE INDEX IF NOT EXISTS taskstatus ON tasks(status,id);
+'''
+
+def parsecrwl(filename):
+    '''Read a .crwl file and return a list of (header, task line) pairs.
+
+    Each task is matched with the nearest header above it that has the right number of
+    fields, exactly as launcher.py has always done. Tasks with no matching header are
+    returned with a header of None.
+    '''
+    with open(filename,"r") as f:
+        lines = f.read().split('\n')
+    headers = [] #Headers seen so far, most recent last
+    pairs = []
+    for line in lines:
+        if line.strip()=='':
+            continue
+        if line[0]=="#":
+            headers.append(line)
+            continue
+        task = line.split()
+        match = None
+        for header in headers[::-1]:
+            if (len(header.split())-1)==len(task): #first header with the right number of args
+                match = header
+                break
+        pairs.append((match,' '.join(task)))
+    return pairs
+
+class TaskStore:
+    '''A queue of crawler tasks in an SQLite database.
+
+    Parameters
+    ----------
+    filename : str, optional
+        Database file. Created if it does not exist.
+    timeout : float, optional
+        Seconds to wait for another launcher to release the database before giving up.
+    '''
+    def __init__(self,filename="tasks.db",timeout=120.0):
+        self.filename = filename
+        self.db = sqlite3.connect(filename,timeout=timeout,isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(_SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def _transaction(self):
+        #BEGIN IMMEDIATE takes the write lock up front, so two launchers can't both read the
+        #same pending task before either marks it claimed.
+        self.db.execute("BEGIN IMMEDIATE")
+
+    def importcrwl(self,filename="tasks.crwl",replace=False):
+        '''Add the tasks in a .crwl file to the store.
+
+        Tasks that are already in the store with the same line are left alone, so a .crwl file
+        can be appended to and re-imported at any time. Tasks with no matching header are
+        skipped. A name that appears more than once in the file, or that is already in the store
+        with a different line, is a conflict: a warning is printed, and only the first line is
+        kept unless ``replace`` is True.
+
+        Parameters
+        ----------
+        filename : str, optional
+            The .crwl file to import
+        replace : bool, optional
+            If True, a conflicting line replaces the stored task, which goes back in the queue
+            (or is marked launched, following the line's STATUS) with its retry count reset.
+
+        Returns
+        -------
+        int
+            Number of tasks added
+        '''
+        pairs = parsecrwl(filename)
+        now = time.time()
+        added = 0
+        conflicts = 0
+        seen = set()
+        self._transaction()
+        try:
+            headerids = {}
+            for header,task in pairs:
+                if header is None:
+                    print("Task "+task.split()[0]+" header mismatch; skipping")
+                    continue
+                if header not in headerids:
+                    self.db.execute("INSERT OR IGNORE INTO headers(header) VALUES (?)",(header,))
+                    headerids[header] = self.db.execute("SELECT id FROM headers WHERE header=?",
+                                                        (header,)).fetchone()[0]
+                fields = task.split()
+                status = LAUNCHED if int(fields[1])!=0 else PENDING
+                cursor = self.db.execute("INSERT OR IGNORE INTO tasks(name,status,header,args,created)"+
+                                         " VALUES (?,?,?,?,?)",
+                                         (fields[0],status,headerids[header],task,now))
+                added += cursor.rowcount
+                if cursor.rowcount==0:
+                    stored = self.db.execute("SELECT header,args FROM tasks WHERE name=?",
+                                             (fields[0],)).fetchone()
+                    repeated = fields[0] in seen
+                    if repeated or tuple(stored)!=(headerids[header],task):
+                        conflicts += 1
+                        if repeated:
+                            print("Task "+fields[0]+" appears more than once in "+filename+"; "+
+                                  ("replacing" if replace else "keeping the first"))
+                        else:
+                            print("Task "+fields[0]+" is already in the store with different"+
+                                  " arguments; "+("replacing" if replace else "keeping the stored task"))
+                        if replace:
+                            self.db.execute("UPDATE tasks SET status=?,header=?,args=?,retries=0,"+
+                                            "created=?,claimed=NULL,finished=NULL,worker=NULL,"+
+                                            "tag=NULL,message=NULL WHERE name=?",
+                                            (status,headerids[header],task,now,fields[0]))
+                seen.add(fields[0])
+            self.db.execute("COMMIT")
+        except:
+            self.db.execute("ROLLBACK")
+            raise
+        if conflicts>0:
+            print("%d conflicting task%s in %s"%(conflicts,"s"*(conflicts!=1),filename))
+        return added
+
+    def claim(self,worker=None,stale=STALE):
+        '''Atomically claim the next pending task.
+
+        Tasks claimed more than ``stale`` seconds ago without being marked launched or failed
+        are treated as pending again.
+
+        Parameters
+        ----------
+        worker : str, optional
+            Identifier for the launcher claiming the task (defaults to host:pid)
+        stale : float, optional
+            Seconds after which a claim expires
+
+        Returns
+        -------
+        tuple or None
+            (name, header, task line) of the claimed task, or None if there are none left.
+            The task line has its STATUS field set to 1, as launcher.py would have written it.
+        '''
+        if worker is None:
+            worker = "%s:%d"%(os.uname()[1],os.getpid())
+        now = time.time()
+        self._transaction()
+        try:
+            row = self.db.execute("SELECT tasks.id,name,args,headers.header FROM tasks"+
+                                  " JOIN headers ON tasks.header=headers.id"+
+                                  " WHERE status=? OR (status=? AND claimed<?)"+
+                                  " ORDER BY tasks.id LIMIT 1",
+                                  (PENDING,CLAIMED,now-stale)).fetchone()
+            if row is not None:
+                self.db.execute("UPDATE tasks SET status=?,claimed=?,worker=? WHERE id=?",
+                                (CLAIMED,now,worker,row["id"]))
+            self.db.execute("COMMIT")
+        except:
+            self.db.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        task = row["args"].split()
+        task[1] = '1'
+        return row["name"],row["header"],' '.join(task)
+
+    def touch(self,name):
+        '''Renew the claim on a task, so it doesn't expire while its worker waits to start it.'''
+        self.db.execute("UPDATE tasks SET claimed=? WHERE name=? AND status=?",
+                        (time.time(),name,CLAIMED))
+
+    def launched(self,name,tag=None):
+        '''Mark a claimed task as set up (and submitted, if it was).'''
+        self.db.execute("UPDATE tasks SET status=?,finished=?,tag=?,message=NULL WHERE name=?",
+                        (LAUNCHED,time.time(),tag,name))
+
+    def failed(self,name,message="",maxretries=MAXRETRIES):
+        '''Release a claimed task after an error.
+
+        The task goes back in the queue until it has failed ``maxretries`` times, after which
+        it is marked failed and left for the user to look at.
+
+        Returns
+        -------
+        bool
+            True if the task will be retried
+        '''
+        self.db.execute("UPDATE tasks SET retries=retries+1,message=?,finished=?,"+
+                        " status=CASE WHEN retries+1>=? THEN ? ELSE ? END WHERE name=?",
+                        (str(message),time.time(),maxretries,FAILED,PENDING,name))
+        row = self.db.execute("SELECT status FROM tasks WHERE name=?",(name,)).fetchone()
+        return row is not None and row["status"]==PENDING
+
+    def retry(self):
+        '''Put every failed task back in the queue with its retry count reset.
+
+        Returns
+        -------
+        int
+            Number of tasks requeued
+        '''
+        return self.db.execute("UPDATE tasks SET status=?,retries=0 WHERE status=?",
+                               (PENDING,FAILED)).rowcount
+
+    def counts(self):
+        '''Return a dictionary of the number of tasks with each status.'''
+        counts = dict([(STATUSNAMES[s],0) for s in STATUSNAMES])
+        for row in self.db.execute("SELECT status,COUNT(*) FROM tasks GROUP BY status"):
+            counts[STATUSNAMES.get(row[0],str(row[0]))] = row[1]
+        return counts
+
+    def tasks(self,status=None):
+        '''Return the tasks in the store (optionally only those with a given status) as dicts.'''
+        query = ("SELECT name,status,args,retries,created,claimed,finished,worker,tag,message"+
+                 " FROM tasks")
+        if status is None:
+            rows = self.db.execute(query+" ORDER BY id")
+        else:
+            rows = self.db.execute(query+" WHERE status=? ORDER BY id",(status,))
+        return [dict(row) for row in rows]
+
+
+if __name__=="__main__":
+    if len(sys.argv)<2 or sys.argv[1] not in ("import","status","retry"):
+        print(__doc__)
+        sys.exit(1)
+    store = TaskStore()
+    if sys.argv[1]=="import":
+        args = [arg for arg in sys.argv[2:] if arg!="--replace"]
+        crwl = "tasks.crwl"
+        if len(args)>0:
+            crwl = args[0]
+        print("Imported %d new tasks from %s"%(store.importcrwl(crwl,replace=("--replace" in sys.argv)),crwl))
+    elif sys.argv[1]=="retry":
+        print("Requeued %d failed tasks"%store.retry())
+    counts = store.counts()
+    for status in counts:
+        print("%10s: %d"%(status,counts[status]))
+    store.close()
@@ -2,10 +2,11 @@
 
 import os
 import numpy as np
-from jobdefs import Job
+from jobdefs import JobQuery, run
 from identity import *
 
 SUB = "qsub"
+QUERY = "qstat" #Either of these can point at a stand-in script for testing
 
 _BATCHSCRIPT = ("#!/bin/bash -l                                                  \n"+
               "#PBS -l nodes=%d:ppn=%d                                         \n"+
@@ -36,63 +37,56 @@ MODELS = {"plasim":1,                #tasks per node (1 workq node on Sunnyvale
           "lmdz":8,
           "mitgcm":6}             
 
-def getjobs():
+def _query():
+    #One full listing of the queue, parsed in memory. Long values wrap onto lines that start
+    #with a tab, so those are joined back onto the attribute they continue.
+    output = run([QUERY,"-f"])
+    blocks = []
+    for line in output.split('\n'):
+        if line.startswith("Job Id:"):
+            blocks.append({"tag":line.split(":",1)[1].strip()})
+            key = None
+        elif len(blocks)>0 and line.startswith("\t") and key is not None:
+            blocks[-1][key] += line.strip()
+        elif len(blocks)>0 and " = " in line:
+            key,value = line.split(" = ",1)
+            key = key.strip()
+            blocks[-1][key] = value.strip()
+    jobs = []
+    for block in blocks:
+        if block.get("Job_Owner","").split("@")[0]!=USER:
+            continue
+        ncpus = 1
+        if "Resource_List.nodes" in block and "=" in block["Resource_List.nodes"]:
+            ncpus = int(block["Resource_List.nodes"].split("=")[1])
+        jobs.append({"tag":block["tag"],"name":block.get("Job_Name",""),
+                     "state":block.get("job_state",""),"ncpus":ncpus,
+                     "workdir":block.get("init_work_dir","")})
+    return jobs
+
+SCHEDULER = JobQuery(_query)
+
+def submitjob(workdir,name,script="runplasim"):
+    '''Submit a job script from its directory, and return the job's ID'''
+    tag = run([SUB,script],cwd=workdir).strip()
+    SCHEDULER.add(tag,name,state="Q",workdir=os.path.abspath(workdir))
+    return tag
+
+def getjobs(refresh=None):
     print("Checking jobs")
-    os.system("qstat -u "+USER+" > cjobs.tmp")
-    cjf = open("cjobs.tmp","r")
-    joblist = cjf.read().split('\n')[5:-1]
-    cjf.close()
-    os.system("rm cjobs.tmp")
     resources={}
     for m in list(MODELS.keys()):
         resources[m] = np.zeros(256)
-    tags = []
-    #This part may need changing depending on how job tags are handled.
-    for j in joblist:
-        job = j.split()
-        #if job[3][5:]!="lmdz-":
-            #tags.append(job[0])
-        tags.append(job[0])
-    for t in tags:
-        print("Looking up "+t)
-        os.system("qstat -f "+t+" > jinfo.tmp")
-        jf = open("jinfo.tmp","r")
-        jinfo = jf.read().split('\n')[1:-2]
-        while '' in jinfo:
-            jinfo.remove('')
-        jf.close()
-        os.system("rm jinfo.tmp")
-        ncpus = 1
-        for l in jinfo:
-            if len(l.split())>0:
-                if l.split()[0]=="init_work_dir":
-                    workdir = l.split()[2]
-                #if l.split()[0]=="Resource_List.ncpus":
-                    #ncpus = int(l.split()[2])
-                if l.split()[0]=="Resource_List.nodes":
-                    ncpus = int(l.split()[2].split("=")[1])
-        ourjob=True
-        try:
-            job = np.load(workdir+"/job.npy").item()
-        except:
-            for nl in range(0,len(jinfo)):
-                l = jinfo[nl]
-                if len(l.split())>0:
-                    if l.split()[0]=="init_work_dir":
-                        try:
-                            workdir = l.split()[2] + jinfo[nl+1].split()[0]
-                        except:
-                            workdir = l.split()[2]
-            try:
-                job = np.load(workdir+"/job.npy").item()
-            except:
-                ourjob=False
-        if ourjob:
+    for entry in SCHEDULER.jobs(refresh):
+        if "ncpus" not in entry: #Submitted since the last poll
+            continue
+        job = SCHEDULER.loadjob(entry["workdir"])
+        if job is not None:
             jid = job.home
             if jid>=len(resources[job.model]):
                 tmp = np.zeros(jid+100)
                 tmp[:len(resources[job.model])] = resources[job.model][:]
                 resources[job.model] = tmp
-            resources[job.model][jid] = float(ncpus)/8.0#MODELS[job.model]
+            resources[job.model][jid] = float(entry["ncpus"])/8.0#MODELS[job.model]
     
     return resources
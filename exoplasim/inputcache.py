@@ -0,0 +1,317 @@
+"""
+Content-addressed cache for the input files models read: stellar spectra, land and topography
+maps, and other resources.
+
+Each file is stored once under the SHA-256 digest of its contents, and work directories get a
+hard link to the cached copy (or a symlink, across filesystems) instead of a copy of their own,
+so a sweep of hundreds of models around one star and one continent map stores those inputs only
+once. Converted stellar spectra (see :py:func:`convertspectrum`) are cached under a key made
+from the source spectrum and the conversion settings, so each star is resampled only once.
+
+Entries record the digest, size, and modification time of each of their files. Before an entry
+is linked anywhere, its files are checked against that record, and an entry that has been
+changed or damaged is thrown away and rebuilt from the source file.
+"""
+import os
+import glob
+import json
+import time
+import shutil
+import hashlib
+from exoplasim.buildcache import _FileLock
+
+_sourcedir = os.path.dirname(os.path.abspath(__file__))
+
+_digests = {}
+
+def cachedir():
+    '''Return the directory in which input files are cached.
+
+    This is ``exoplasim/plasim/inputcache`` inside the installed package, unless the
+    ``EXOPLASIM_INPUTCACHE`` environment variable is set, in which case that path is used.
+
+    Returns
+    -------
+    str
+        Absolute path to the input cache
+    '''
+    path = os.environ.get("EXOPLASIM_INPUTCACHE",_sourcedir+"/plasim/inputcache")
+    path = os.path.abspath(os.path.expanduser(path))
+    os.makedirs(path,exist_ok=True)
+    return path
+
+def filedigest(filename):
+    '''Compute the SHA-256 digest of a file's contents.
+
+    The digest is memoized on the file's modification time and size, so repeated calls are cheap.
+
+    Parameters
+    ----------
+    filename : str
+        File to hash
+
+    Returns
+    -------
+    str
+        SHA-256 hex digest
+    '''
+    filename = os.path.abspath(filename)
+    stat = os.stat(filename)
+    stamp = (stat.st_mtime_ns,stat.st_size)
+    if filename in _digests and _digests[filename][0]==stamp:
+        return _digests[filename][1]
+    digest = hashlib.sha256()
+    with open(filename,"rb") as f:
+        for block in iter(lambda: f.read(1<<20),b""):
+            digest.update(block)
+    _digests[filename] = (stamp,digest.hexdigest())
+    return _digests[filename][1]
+
+def _link(src,dest):
+    '''Hard-link src to dest, falling back to a symlink and then a copy.'''
+    if os.path.lexists(dest):
+        os.remove(dest)
+    try:
+        os.link(src,dest)
+    except OSError:
+        try:
+            os.symlink(os.path.abspath(src),dest)
+        except OSError:
+            shutil.copy2(src,dest)
+
+def _readmeta(entry):
+    try:
+        with open(entry+"/meta.json","r") as metaf:
+            return json.load(metaf)
+    except (OSError,ValueError):
+        return None
+
+def verify(entry,full=False):
+    '''Check that a cache entry's files are what was originally stored.
+
+    Parameters
+    ----------
+    entry : str
+        Path to the cache entry
+    full : bool, optional
+        If True, rehash every file. Otherwise files are only rehashed if their size or
+        modification time has changed since they were stored.
+
+    Returns
+    -------
+    bool
+        True if the entry is complete and intact
+    '''
+    meta = _readmeta(entry)
+    if meta is None:
+        return False
+    for name,record in meta["files"].items():
+        filename = entry+"/"+name
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return False
+        if stat.st_size!=record["size"]:
+            return False
+        if full or stat.st_mtime_ns!=record["mtime"]:
+            if filedigest(filename)!=record["sha256"]:
+                return False
+    return True
+
+def _fill(entry,files,meta):
+    '''Write files into a (locked, empty) cache entry, with its metadata last.'''
+    os.makedirs(entry,exist_ok=True)
+    records = {}
+    for name,src in files.items():
+        shutil.copyfile(src,entry+"/"+name)
+        stat = os.stat(entry+"/"+name)
+        records[name] = {"sha256":filedigest(entry+"/"+name),
+                         "size"  :stat.st_size,
+                         "mtime" :stat.st_mtime_ns}
+    meta = dict(meta)
+    meta["files"] = records
+    meta["created"] = time.time()
+    with open(entry+"/meta.json.tmp","w") as metaf:
+        json.dump(meta,metaf,indent=1)
+    os.replace(entry+"/meta.json.tmp",entry+"/meta.json") #The entry is complete once this exists
+
+def _touch(entry):
+    with open(entry+"/lastused","w") as lastf:
+        lastf.write("%f\n"%time.time())
+
+def store(filename):
+    '''Add a file to the cache (if it isn't there already) and return the path to the cached copy.
+
+    Parameters
+    ----------
+    filename : str
+        File to cache
+
+    Returns
+    -------
+    str
+        Path to the cached copy of the file
+    '''
+    key = filedigest(filename)
+    entry = cachedir()+"/"+key
+    with _FileLock(entry+".lock"):
+        if not verify(entry):
+            shutil.rmtree(entry,ignore_errors=True)
+            _fill(entry,{"data":filename},{"key":key,"kind":"file",
+                                           "source":os.path.abspath(filename)})
+        _touch(entry)
+    return entry+"/data"
+
+def stage(filename,dest):
+    '''Link a file into a work directory through the cache.
+
+    Parameters
+    ----------
+    filename : str
+        Input file
+    dest : str
+        Where the file should appear (e.g. ``workdir+"/N032_surf_0172.sra"``). Anything already
+        there is unlinked first, so nothing is ever written through an old link.
+
+    Returns
+    -------
+    str
+        ``dest``
+    '''
+    if os.path.exists(dest) and os.path.samefile(filename,dest):
+        return dest
+    _link(store(filename),dest)
+    return dest
+
+def convertspectrum(spectrumfile,numwavelengths=2048,normalize=False,wavefile=None):
+    '''Convert a stellar spectrum with :py:func:`makestellarspec.convert <exoplasim.makestellarspec.convert>`, caching the result.
+
+    The result is keyed on the contents of the spectrum (and wavelength) files, the wavelength
+    grid ExoPlaSim uses, and the conversion settings, so converting the same star again (from
+    any path) just returns the cached spectrum.
+
+    Parameters
+    ----------
+    spectrumfile : str
+        Phoenix spectrum to convert (see :py:mod:`exoplasim.makestellarspec`)
+    numwavelengths : int, optional
+        Number of wavelengths to use for the hi-res spectrum. Default 2048
+    normalize : bool, optional
+        If set, output spectra will be normalized.
+    wavefile : str, optional
+        For FITS spectra without their own wavelengths, the PHOENIX wavelength FITS file.
+
+    Returns
+    -------
+    str
+        Path to the cached ``.dat`` spectrum, suitable for ``starspec``. The hi-res spectrum
+        is next to it, as ExoPlaSim expects.
+    '''
+    import exoplasim.makestellarspec as makestellarspec
+    config = {"kind"           : "spectrum",
+              "source"         : filedigest(spectrumfile),
+              "wavefile"       : filedigest(wavefile) if wavefile is not None else None,
+              "wvref"          : filedigest(_sourcedir+"/wvref.txt"),
+              "numwavelengths" : int(numwavelengths),
+              "normalize"      : bool(normalize)}
+    key = hashlib.sha256(json.dumps(config,sort_keys=True).encode()).hexdigest()
+    entry = cachedir()+"/"+key
+    with _FileLock(entry+".lock"):
+        if not verify(entry):
+            shutil.rmtree(entry,ignore_errors=True)
+            scratch = entry+".tmp"
+            os.makedirs(scratch,exist_ok=True)
+            try:
+                makestellarspec.convert(spectrumfile,scratch+"/spectrum",numwavelengths=numwavelengths,
+                                        normalize=normalize,wavefile=wavefile)
+                config["key"] = key
+                config["source"] = os.path.abspath(spectrumfile)
+                _fill(entry,{"spectrum.dat"   :scratch+"/spectrum.dat",
+                             "spectrum_hr.dat":scratch+"/spectrum_hr.dat"},config)
+            finally:
+                shutil.rmtree(scratch,ignore_errors=True)
+        _touch(entry)
+    return entry+"/spectrum.dat"
+
+def _entries():
+    '''Return metadata for every complete entry in the cache.'''
+    entries = []
+    for metafile in glob.glob(cachedir()+"/*/meta.json"):
+        meta = _readmeta(os.path.dirname(metafile))
+        if meta is None:
+            continue
+        meta["path"] = os.path.dirname(metafile)
+        try:
+            meta["lastused"] = os.stat(meta["path"]+"/lastused").st_mtime
+        except OSError:
+            meta["lastused"] = meta.get("created",0.0)
+        entries.append(meta)
+    return entries
+
+def listcache():
+    '''List the entries currently in the input cache, most recently used first.
+
+    Returns
+    -------
+    list(dict)
+        Metadata for each entry, including its path, kind, source, and files.
+    '''
+    return sorted(_entries(),key=lambda meta: meta["lastused"],reverse=True)
+
+def _inuse(meta):
+    '''True if any of an entry's files is hard-linked from somewhere else, e.g. a work directory.'''
+    for name in meta["files"]:
+        try:
+            if os.stat(meta["path"]+"/"+name).st_nlink>1:
+                return True
+        except OSError:
+            pass
+    return False
+
+def evict(maxentries=None,maxbytes=None,maxage=None,force=False):
+    '''Remove least-recently-used entries from the cache.
+
+    Entries that are locked, or whose files are still hard-linked into a work directory, are
+    never removed unless ``force`` is set. Work directories keep their hard links either way;
+    only work directories that got symlinks (because the cache is on another filesystem) lose
+    their inputs when an entry they use is forcibly removed.
+
+    Parameters
+    ----------
+    maxentries : int, optional
+        Maximum number of entries to keep. Defaults to the ``EXOPLASIM_INPUTCACHE_MAX``
+        environment variable, or 256.
+    maxbytes : int, optional
+        Maximum total size of the cache in bytes.
+    maxage : float, optional
+        Remove entries that have not been used in this many days.
+    force : bool, optional
+        Remove entries even if they are still linked into work directories.
+
+    Returns
+    -------
+    list(str)
+        Paths of the removed entries
+    '''
+    if maxentries is None:
+        maxentries = int(os.environ.get("EXOPLASIM_INPUTCACHE_MAX",256))
+    entries = listcache()
+    now = time.time()
+    total = 0
+    removed = []
+    for n,meta in enumerate(entries):
+        size = sum([record["size"] for record in meta["files"].values()])
+        total += size
+        expired = (n>=maxentries)
+        expired = expired or (maxbytes is not None and total>maxbytes)
+        expired = expired or (maxage is not None and now-meta["lastused"]>maxage*86400.0)
+        if not expired or (not force and _inuse(meta)):
+            continue
+        try:
+            with _FileLock(meta["path"]+".lock",blocking=False):
+                shutil.rmtree(meta["path"],ignore_errors=True)
+            removed.append(meta["path"])
+            total -= size
+        except BlockingIOError:
+            pass
+    return removed
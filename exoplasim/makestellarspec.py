@@ -3,14 +3,20 @@ import sys
 from pathlib import Path
 import argparse as ag
 
+try:
+    _trapezoid = np.trapezoid
+except AttributeError: #NumPy older than 2.0
+    _trapezoid = np.trapz
+
 
 cc = 299792458.0 #Speed of light
 
-def readspec(sfile,cgs=False):
+def readspec(sfile,cgs=False,wavefile=None):
     """Read a Phoenix stellar spectrum and return wavelengths, fluxes, and units
     
     Takes as input a spectrum file generated by the Phoenix stellar spectrum web simulator,
-    https://phoenix.ens-lyon.fr/simulator-jsf22-26.
+    https://phoenix.ens-lyon.fr/simulator-jsf22-26, or a PHOENIX-ACES high-resolution FITS
+    spectrum (which requires astropy, and the library's wavelength file).
     
     Parameters
     ----------
@@ -18,19 +24,24 @@ def readspec(sfile,cgs=False):
         Path to the spectrum file
     cgs : bool, optional
         Whether or not we should try to use CGS units (irrelevant for exoplasim)
+    wavefile : str, optional
+        For FITS spectra, the FITS file containing the wavelengths (e.g.
+        WAVE_PHOENIX-ACES-AGSS-COND-2011.fits). Not needed if the spectrum file has its own
+        wavelength extension.
         
     Returns
     -------
     numpy.ndarray, numpy.ndarray, str
         Returns wavelengths, fluxes, and the units
     """
-    f=open(sfile,"r")
-    ftxt = f.read()
+    if str(sfile).lower().endswith((".fits",".fits.gz",".fit")):
+        return _readfits(sfile,cgs=cgs,wavefile=wavefile)
+    with open(sfile,"r") as f:
+        ftxt = f.read()
     if ftxt[0]=='#':
        newstyle=True
     else:
        newstyle=False
-    f.close()
     if newstyle:
        lines = ftxt.split('\n')[:-2] #chop off timing line
        nhl = 0
@@ -42,31 +53,15 @@ def readspec(sfile,cgs=False):
        units = lines[nhl-2].split()[-1]
        if lines[nhl-2].split()[1]=="(ANGSTROM)":
           cgs=False
-       nhi = 0
-       for entry in lines[nhl:]:
-          if float(entry.split()[0])<0.1: #angstroms
-             nhi+=1
-          else:
-             break
+       wvls,fluxes = _parsecolumns(lines[nhl:])
+       nhi = np.argmax(wvls>=0.1) #angstroms
        print("Cutting at %d: "%(nhl+nhi),lines[nhl+nhi])
-       lines = lines[nhl+nhi:]
-       wvls = np.zeros(len(lines))
-       fluxes = np.zeros(len(lines))
-       n=0
-       for l in lines:
-          wvls[n] = float(l.split()[0])
-          fluxes[n] = float(l.split()[1])
-          n+=1
-          #print l.split()
+       wvls = wvls[nhi:]
+       fluxes = fluxes[nhi:]
     else:      
        lines = ftxt.split('\n')[:-1]
-       wvls = np.zeros(len(lines))
-       fluxes = np.zeros(len(lines))
-       n=0
-       for l in lines:
-           wvls[n] = float(l.split()[0])
-           fluxes[n] = 10**(float(l.split()[1].replace('D','E'))-8.0)
-           n+=1
+       wvls,fluxes = _parsecolumns([l.replace('D','E') for l in lines])
+       fluxes = 10**(fluxes-8.0)
        units='ergs/sec/cm^2/angstrom'
     if not cgs:
         units='W/m^2/micron'
@@ -74,6 +69,41 @@ def readspec(sfile,cgs=False):
         fluxes[:] = fluxes[:]*10.0 #W/m^2/micron
     return wvls,fluxes,units
 
+def _readfits(sfile,cgs=False,wavefile=None):
+    """Read a PHOENIX-ACES FITS spectrum (flux in erg/s/cm^2/cm, wavelengths in Angstroms)"""
+    from astropy.io import fits
+    wvls = None
+    with fits.open(sfile) as hdus:
+        fluxes = np.asarray(hdus[0].data,dtype=float).ravel()
+        if wavefile is None and len(hdus)>1: #Some files carry their own wavelength grid
+            wdata = hdus[1].data
+            if wdata.dtype.names is not None:
+                wdata = wdata[wdata.dtype.names[0]]
+            wvls = np.asarray(wdata,dtype=float).ravel()
+    if wavefile is not None:
+        with fits.open(wavefile) as hdus:
+            wvls = np.asarray(hdus[0].data,dtype=float).ravel()
+    if wvls is None:
+        raise ValueError("%s has no wavelengths; the PHOENIX wavelength file must be given as wavefile"%sfile)
+    if len(wvls)!=len(fluxes):
+        raise ValueError("%s has %d fluxes but %d wavelengths"%(sfile,len(fluxes),len(wvls)))
+    fluxes = fluxes*1.0e-8 #erg/s/cm^2/cm -> erg/s/cm^2/angstrom
+    units='ergs/sec/cm^2/angstrom'
+    if not cgs:
+        units='W/m^2/micron'
+        wvls = wvls*1.0e-4 #microns
+        fluxes = fluxes*10.0 #W/m^2/micron
+    return wvls,fluxes,units
+
+def _parsecolumns(lines):
+    """Parse whitespace-separated numeric rows all at once, returning the first two columns"""
+    ncols = len(lines[0].split())
+    try:
+        data = np.array(' '.join(lines).split(),dtype=float).reshape(-1,ncols)
+    except ValueError: #Ragged rows; fall back to reading them one at a time
+        data = np.array([l.split()[:2] for l in lines],dtype=float)
+    return data[:,0].copy(),data[:,1].copy()
+
 def _coarsen(wvls,fluxes,w1,w2,num=5000):
     inds = np.arange(len(wvls))
     nlow = (inds[wvls>w1])[0]
@@ -81,30 +111,29 @@ def _coarsen(wvls,fluxes,w1,w2,num=5000):
     
     inc = int(nhigh-nlow)//num
     
-    waves = np.zeros(num)
-    energ = wvls*fluxes
-    flxs2 = np.zeros(num)
+    if inc<1:
+        raise ValueError("Only %d points between %g and %g; cannot make %d bins"%(nhigh-nlow,w1,w2,num))
     
-    for n in range(0,num):
-        v0 = nlow+n*inc-1
-        v1 = nlow+n*inc
-        intg = 0.0
-        for v in range(0,inc):
-            intg+=0.5*(wvls[v1+v]-wvls[v0+v])*(fluxes[v1+v]+fluxes[v0+v])
-        dnu = wvls[v1+inc]-wvls[v0]
-        waves[n] = 0.5*(wvls[v1+inc]+wvls[v0])
-        flxs2[n] = intg/dnu
+    #Each bin integrates inc consecutive trapezoids. Summing them bin by bin (rather than
+    #differencing a running total) keeps the full precision of each bin's integral.
+    wvls = np.asarray(wvls,dtype=np.float64)
+    fluxes = np.asarray(fluxes,dtype=np.float64)
+    trapezoids = 0.5*np.diff(wvls)*(fluxes[1:]+fluxes[:-1])
+    v0 = nlow+np.arange(num)*inc-1
+    intg = np.add.reduceat(trapezoids[:v0[-1]+inc],v0)
+    dnu = wvls[v0+inc+1]-wvls[v0]
+    waves = 0.5*(wvls[v0+inc+1]+wvls[v0])
+    flxs2 = intg/dnu
         
     return waves,flxs2
 
 def _integrate_trap(x,y):
-    net = 0
-    for n in range(1,len(y)):
-        net += 0.5*(x[n]-x[n-1])*(y[n]+y[n-1])
-    return net
+    x = np.asarray(x,dtype=np.float64)
+    y = np.asarray(y,dtype=np.float64)
+    return np.sum(0.5*(x[1:]-x[:-1])*(y[1:]+y[:-1]))
 
 def _normalize(wvls,fluxes):
-    netf = np.trapz(fluxes,x=wvls)
+    netf = _trapezoid(fluxes,x=wvls)
     factor = 1366.941858/netf
     return fluxes*factor
 
@@ -125,33 +154,34 @@ def writedat(wvls,fluxes,name):
     name.dat
         The provided spectrum in a format ExoPlaSim can read.
     """
-    f=open(name+".dat","w")
-    sdat = ' Wavelength    Flux  \n'
-    for n in range(0,len(wvls)):
-        sdat+=str(wvls[n])+' '+str(fluxes[n])+'\n'
-    f.write(sdat)
-    f.close()
+    rows = ["%r %r"%row for row in zip(np.asarray(wvls,dtype=float).tolist(),
+                                        np.asarray(fluxes,dtype=float).tolist())]
+    with open(name+".dat","w") as f:
+        f.write(' Wavelength    Flux  \n'+'\n'.join(rows)+'\n')
     
 def _processArgs():
     
     parser = ag.ArgumentParser(description="""Convert spectral files to exoplasim-compliant formats, including resampling to the necessary resolutions.
                                
     Must give as input a spectrum file generated by the Phoenix stellar spectrum web simulator,
-    https://phoenix.ens-lyon.fr/simulator-jsf22-26.""")
-    parser.add_argument("spectrumfile",help="Path to the spectrum file",)
-    parser.add_argument("name",help="Name of the star")
+    https://phoenix.ens-lyon.fr/simulator-jsf22-26, a PHOENIX-ACES FITS spectrum, or a directory of them.""")
+    parser.add_argument("spectrumfile",help="Path to the spectrum file, or to a directory of spectrum files to convert them all",)
+    parser.add_argument("name",help="Name of the star (or, if spectrumfile is a directory, the directory to write the converted spectra to)")
     parser.add_argument("-p","--plot",action="store_true",help="Display plots of the converted spectrum")
     parser.add_argument('-w',"--numwavelengths",default=2048,type=int,help="Number of wavelengths in the hi-res spectrum")
     parser.add_argument('-n',"--normalize",action="store_true",help="Normalize the output spectra")
+    parser.add_argument("--wavefile",default=None,help="FITS file with the wavelengths for PHOENIX-ACES FITS spectra")
+    parser.add_argument("--pattern",default="*",help="Glob pattern for the files to convert in a directory")
+    parser.add_argument('-c',"--ncpus",default=1,type=int,help="Number of spectra to convert at once in a directory")
     args = parser.parse_args()
     
     return args
     
-def convert(spectrumfile, name, plot=False, numwavelengths=2048, normalize=False):
+def convert(spectrumfile, name, plot=False, numwavelengths=2048, normalize=False, wavefile=None):
     """Convert spectral files to exoplasim-compliant formats, including resampling to the necessary resolutions.
 
     Must give as input a spectrum file generated by the Phoenix stellar spectrum web simulator,
-    https://phoenix.ens-lyon.fr/simulator-jsf22-26. 
+    https://phoenix.ens-lyon.fr/simulator-jsf22-26, or a PHOENIX-ACES FITS spectrum.
     
     Parameters
     ----------------
@@ -165,6 +195,8 @@ def convert(spectrumfile, name, plot=False, numwavelengths=2048, normalize=False
         Number of wavelengths to use for the hi-res spectrum. Default 2048
     normalize : bool, optional
         If set, output spectra will be normalized.
+    wavefile : str, optional
+        For FITS spectra without their own wavelengths, the PHOENIX wavelength FITS file.
 
     Yields
     ------
@@ -180,7 +212,7 @@ def convert(spectrumfile, name, plot=False, numwavelengths=2048, normalize=False
     #wave1 = float(sys.argv[4]) #microns
     numw = numwavelengths
     norm = normalize
-    w,f,u = readspec(sfile)
+    w,f,u = readspec(sfile,wavefile=wavefile)
     print(u,w.min(),w.max())
     if plot:
         import matplotlib.pyplot as plt
@@ -201,14 +233,14 @@ def convert(spectrumfile, name, plot=False, numwavelengths=2048, normalize=False
         plt.yscale('log')
         plt.show()
     f2 = np.interp(w2,w,f)
-    E0 = np.trapz(f,x=w)
-    E1 = np.trapz(f2,x=w2)
+    E0 = _trapezoid(f,x=w)
+    E1 = _trapezoid(f2,x=w2)
     print(abs(E0-E1)/E0)
     if norm:
         factor = 1366.941858/E1
         f2*=factor
-        print(np.trapz(f2,x=w2))
-        print(np.trapz(_normalize(w,f),x=w))
+        print(_trapezoid(f2,x=w2))
+        print(_trapezoid(_normalize(w,f),x=w))
     #print f2[np.argwhere(w2>40.0)],w[-10:]
     if plot:
         plt.plot(w2,f2)
@@ -218,7 +250,7 @@ def convert(spectrumfile, name, plot=False, numwavelengths=2048, normalize=False
         plt.xlabel("$\lambda$ [$\mu$m]")
         plt.ylabel("$F_\lambda$ [W/m$^2$/$\mu$m]")
         plt.show()
-    wvref = np.loadtxt(Path(__file__).parent.resolve()+"/wvref.txt")
+    wvref = np.loadtxt(str(Path(__file__).parent.resolve())+"/wvref.txt")
     f3 = np.interp(wvref,w2,f2)
     writedat(w2,f2/cc,name+"_hr")
     writedat(wvref,f3/cc,name)
@@ -229,16 +261,93 @@ def convert(spectrumfile, name, plot=False, numwavelengths=2048, normalize=False
         plt.xlabel("$\lambda$ [$\mu$m]")
         plt.ylabel("$\lambda F_\lambda$ [W/m$^2$]")
         plt.show()
+
+def _spectrumname(spectrumfile):
+    name = Path(spectrumfile).name
+    for ext in (".fits.gz",".fits",".fit",".txt",".dat",".7",".spec"):
+        if name.lower().endswith(ext):
+            return name[:-len(ext)]
+    return name
+
+def _convertone(job):
+    spectrumfile,name,kwargs = job
+    try:
+        convert(spectrumfile,name,**kwargs)
+    except Exception as e:
+        return spectrumfile,repr(e)
+    return spectrumfile,None
+
+def convertall(directory, outputdir=None, pattern="*", numwavelengths=2048, normalize=False,
+               wavefile=None, ncpus=1):
+    """Convert every stellar spectrum in a directory to exoplasim-compliant formats.
+    
+    Each spectrum is read, resampled, and written exactly as by :py:func:`convert`, with the
+    star's name taken from the file name (minus its extension).
+    
+    Parameters
+    ----------
+    directory : str
+        Directory containing the spectrum files
+    outputdir : str, optional
+        Directory to write the converted spectra to. Defaults to ``directory``.
+    pattern : str, optional
+        Glob pattern selecting the files to convert, e.g. ``"lte*.fits"``
+    numwavelengths : int, optional
+        Number of wavelengths to use for the hi-res spectra. Default 2048
+    normalize : bool, optional
+        If set, output spectra will be normalized.
+    wavefile : str, optional
+        For FITS spectra without their own wavelengths, the PHOENIX wavelength FITS file.
+        It is skipped if it matches ``pattern``.
+    ncpus : int, optional
+        Number of spectra to convert at once.
+        
+    Returns
+    -------
+    list
+        (spectrum file, error) for each spectrum that could not be converted
+        
+    Yields
+    ------
+    name.dat, name_hr.dat
+        For each spectrum file name.ext in ``directory``
+    """
+    if outputdir is None:
+        outputdir = directory
+    Path(outputdir).mkdir(parents=True,exist_ok=True)
+    kwargs = {"numwavelengths":numwavelengths,"normalize":normalize,"wavefile":wavefile}
+    skip = None
+    if wavefile is not None:
+        skip = Path(wavefile).resolve()
+    jobs = []
+    for sfile in sorted(Path(directory).glob(pattern)):
+        if not sfile.is_file() or sfile.suffix==".dat" or sfile.resolve()==skip:
+            continue
+        jobs.append((str(sfile),str(Path(outputdir)/_spectrumname(sfile)),kwargs))
+    if ncpus>1 and len(jobs)>1:
+        import multiprocessing as mp
+        with mp.Pool(min(ncpus,len(jobs))) as pool:
+            results = pool.map(_convertone,jobs)
+    else:
+        results = [_convertone(job) for job in jobs]
+    failures = [result for result in results if result[1] is not None]
+    for sfile,error in failures:
+        print("Could not convert %s: %s"%(sfile,error))
+    print("Converted %d of %d spectra"%(len(jobs)-len(failures),len(jobs)))
+    return failures
     
 def main():
     """Convert spectral files to exoplasim-compliant formats, including resampling to the necessary resolutions.
 
     Must give as input a spectrum file generated by the Phoenix stellar spectrum web simulator,
-    https://phoenix.ens-lyon.fr/simulator-jsf22-26. **Do not use as an imported function; only call directly as a command-line program.**
+    https://phoenix.ens-lyon.fr/simulator-jsf22-26, or a PHOENIX-ACES FITS spectrum. If given
+    a directory instead, every spectrum in it is converted (see :py:func:`convertall`), and
+    ``name`` is the directory to write them to. **Do not use as an imported function; only call directly as a command-line program.**
 
     **Usage**
     
     >>> python makestellarspec.py [spectrumfile] [name] --plot --numwavelengths --normalize
+    >>> python makestellarspec.py [directory] [outputdir] --pattern --ncpus --numwavelengths --normalize
     
     Parameters
     ----------------
@@ -248,6 +357,12 @@ def main():
         Number of wavelengths to use for the hi-res spectrum. Default 2048
     -n, --normalize : bool, optional
         If set, output spectra will be normalized.
+    --wavefile : str, optional
+        For FITS spectra without their own wavelengths, the PHOENIX wavelength FITS file.
+    --pattern : str, optional
+        For a directory, the glob pattern selecting the files to convert. Default "*"
+    -c, --ncpus : int, optional
+        For a directory, the number of spectra to convert at once. Default 1
 
     Yields
     ------
@@ -258,63 +373,15 @@ def main():
 
     """
     args = _processArgs()
-    if args.plot:
-        import matplotlib.pyplot as plt
-    
-    sfile = args.spectrumfile
-    name = args.name
-    #wave0 = float(sys.argv[3]) #microns
-    #wave1 = float(sys.argv[4]) #microns
-    numw = args.numwavelengths
-    norm = args.normalize
-    w,f,u = readspec(sfile)
-    print(u,w.min(),w.max())
-    if args.plot:
-        plt.plot(w,f)
-        plt.xscale('log')
-        plt.yscale('log')
-        plt.show()
-    #wc,fc = _coarsen(w,f,wave0,wave1,num=numw*4)
-    #plt.plot(wc,fc)
-    #plt.xscale('log')
-    #plt.yscale('log')
-    #plt.xlabel("$\lambda$ [$\mu$m]")
-    #plt.ylabel("$F_\lambda$ [W/m$^2$/$\mu$m]")
-    #plt.show()
-    w2 = np.concatenate([np.geomspace(0.2,0.75,num=int(numw/2)+1)[:-1],np.geomspace(0.75,100.0,num=int(numw/2))])
-    if args.plot:
-        plt.plot(w2)
-        plt.yscale('log')
-        plt.show()
-    f2 = np.interp(w2,w,f)
-    E0 = np.trapz(f,x=w)
-    E1 = np.trapz(f2,x=w2)
-    print(abs(E0-E1)/E0)
-    if norm:
-        factor = 1366.941858/E1
-        f2*=factor
-        print(np.trapz(f2,x=w2))
-        print(np.trapz(_normalize(w,f),x=w))
-    #print f2[np.argwhere(w2>40.0)],w[-10:]
-    if args.plot:
-        plt.plot(w2,f2)
-        #plt.plot(wc,fc)
-        plt.xscale('log')
-        plt.yscale('log')
-        plt.xlabel("$\lambda$ [$\mu$m]")
-        plt.ylabel("$F_\lambda$ [W/m$^2$/$\mu$m]")
-        plt.show()
-    wvref = np.loadtxt(Path(__file__).parent.resolve()+"/wvref.txt")
-    f3 = np.interp(wvref,w2,f2)
-    writedat(w2,f2/cc,name+"_hr")
-    writedat(wvref,f3/cc,name)
-    if args.plot:
-        plt.plot(wvref,f3)
-        plt.xscale('log')
-        plt.yscale('log')
-        plt.xlabel("$\lambda$ [$\mu$m]")
-        plt.ylabel("$\lambda F_\lambda$ [W/m$^2$]")
-        plt.show()
+    if Path(args.spectrumfile).is_dir():
+        failures = convertall(args.spectrumfile,outputdir=args.name,pattern=args.pattern,
+                              numwavelengths=args.numwavelengths,normalize=args.normalize,
+                              wavefile=args.wavefile,ncpus=args.ncpus)
+        if len(failures)>0:
+            sys.exit(1)
+    else:
+        convert(args.spectrumfile,args.name,plot=args.plot,numwavelengths=args.numwavelengths,
+                normalize=args.normalize,wavefile=args.wavefile)
 
 if __name__=="__main__" and (Path(sys.argv[0]).name!="sphinx-build" and 
                              Path(sys.argv[0]).name!="build.py"):
@@ -0,0 +1,203 @@
+"""
+Watch a running PlaSim year for numerical blow-ups, and stop it as soon as one appears.
+
+:py:func:`Model.integritycheck <exoplasim.Model.integritycheck>` can only look for NaNs once a
+year has finished and been postprocessed, so a model that goes unstable in its first month still
+spends the rest of the year (and the postprocessing) producing garbage. :py:class:`HealthMonitor`
+instead follows ``plasim_output`` and ``plasim_diag`` while PlaSim is writing them. Each time it
+checks, it reads only the bytes added since the last check. It skips over records it was not
+asked to check, and decodes the rest with pyburn's record reader. If a checked field has
+non-finite or out-of-bounds values, or the diagnostics print NaN or Infinity, PlaSim is stopped
+and the reason is reported.
+"""
+import os
+import signal
+import subprocess
+import numpy as np
+import exoplasim.pyburn as pyburn
+
+#Variable code: (lower bound, upper bound). None means unbounded; every checked field must be
+#finite. Surface temperature (139) is gridpoint data in the raw output; temperature (130) is
+#spectral, so only its finiteness is checked.
+BOUNDS = {139:(1.0,1.0e4),
+          130:(None,None)}
+
+INTERVAL = 5.0 #seconds
+
+class HealthMonitor:
+    '''Incrementally check PlaSim's raw output and diagnostics for signs of a blow-up.
+
+    Parameters
+    ----------
+    workdir : str
+        Model work directory, where PlaSim writes ``plasim_output`` and ``plasim_diag``
+    bounds : dict, optional
+        Fields to check, as {code: (lower, upper)}, using pyburn's variable codes. Defaults
+        to :py:data:`BOUNDS`.
+    interval : float, optional
+        Seconds between checks while PlaSim is running
+    '''
+    def __init__(self,workdir,bounds=None,interval=INTERVAL):
+        if bounds is None:
+            bounds = BOUNDS
+        self.workdir = workdir
+        self.bounds = dict([(int(code),bounds[code]) for code in bounds])
+        self.interval = interval
+        self.outputfile = workdir+"/plasim_output"
+        self.diagfile = workdir+"/plasim_diag"
+        self.reason = None
+        self.reset()
+
+    def reset(self):
+        '''Forget everything read so far, e.g. before a new year starts.'''
+        self.offset = 0
+        self.pending = b""
+        self.layout = None
+        self.mainheader = False
+        self.diagoffset = 0
+        self.records = 0
+
+    def _newbytes(self,filename,offset):
+        '''Read whatever has been added to a file since offset. Returns the bytes and whether
+        the file was truncated (i.e. started over).'''
+        try:
+            size = os.path.getsize(filename)
+        except OSError:
+            return b"",False
+        if size<offset:
+            with open(filename,"rb") as f:
+                return f.read(),True
+        with open(filename,"rb") as f:
+            f.seek(offset)
+            return f.read(),False
+
+    def _checkoutput(self):
+        data,truncated = self._newbytes(self.outputfile,self.offset)
+        if truncated:
+            self.reset()
+        self.offset += len(data)
+        fbuffer = self.pending+data
+        if len(fbuffer)<16:
+            self.pending = fbuffer
+            return None
+        if self.layout is None:
+            en = pyburn._getEndian(fbuffer)
+            ml,mf = pyburn._getwordlength(fbuffer,0,en)
+            self.layout = (en,ml,mf,np.dtype(en+"i%d"%ml))
+        en,ml,mf,mtype = self.layout
+        n = 0
+        reason = None
+        while reason is None:
+            #A header record and a data record, each with a leading and trailing marker
+            if n+ml>len(fbuffer):
+                break
+            hlength = int(np.frombuffer(fbuffer,dtype=mtype,count=1,offset=n)[0])
+            if n+2*ml+hlength+ml>len(fbuffer):
+                break
+            dlength = int(np.frombuffer(fbuffer,dtype=mtype,count=1,offset=n+2*ml+hlength)[0])
+            end = n+4*ml+hlength+dlength
+            if end>len(fbuffer):
+                break
+            if not self.mainheader: #The first record holds the sigma levels
+                self.mainheader = True
+            else:
+                code = int(np.frombuffer(fbuffer,dtype=en+"i4",count=1,offset=n+ml)[0])
+                if code in self.bounds:
+                    header,field,m = pyburn.readrecord(fbuffer[n:end],0,en,ml,mf)
+                    reason = self._checkfield(code,header,np.array(field))
+                self.records += 1
+            n = end
+        self.pending = fbuffer[n:]
+        return reason
+
+    def _checkfield(self,code,header,field):
+        name = pyburn.ilibrary.get(str(code),[str(code)])[0]
+        step = header[6]
+        if not np.all(np.isfinite(field)):
+            return "non-finite %s (code %d) at step %d"%(name,code,step)
+        lower,upper = self.bounds[code]
+        if lower is not None and np.min(field)<lower:
+            return "%s (code %d) fell to %g at step %d, below %g"%(name,code,np.min(field),step,lower)
+        if upper is not None and np.max(field)>upper:
+            return "%s (code %d) reached %g at step %d, above %g"%(name,code,np.max(field),step,upper)
+        return None
+
+    def _checkdiag(self):
+        data,truncated = self._newbytes(self.diagfile,self.diagoffset)
+        if truncated:
+            self.diagoffset = 0
+        #Only look at complete lines, so a number being written isn't split
+        end = data.rfind(b"\n")+1
+        self.diagoffset += end
+        for line in data[:end].split(b"\n"):
+            if b"NaN" in line or b"Infinity" in line:
+                return "diagnostics report %s"%line.decode("ascii",errors="replace").strip()
+        return None
+
+    def check(self):
+        '''Read anything new in the output and diagnostics, and check it.
+
+        Returns
+        -------
+        str or None
+            Why the model should be stopped, or None if everything looks fine
+        '''
+        reason = self._checkoutput()
+        if reason is None:
+            reason = self._checkdiag()
+        if reason is not None:
+            self.reason = reason
+        return reason
+
+    def run(self,command):
+        '''Run PlaSim, checking on it every ``interval`` seconds and stopping it at the first sign of trouble.
+
+        Parameters
+        ----------
+        command : str
+            Shell command that runs PlaSim (in ``workdir``)
+
+        Returns
+        -------
+        str or None
+            Why PlaSim was stopped, or None if it finished and nothing was found
+
+        Raises
+        ------
+        subprocess.CalledProcessError
+            If PlaSim exits with an error on its own
+        '''
+        self.reset()
+        self.reason = None
+        #A session of its own, so that mpiexec and all its ranks can be stopped together
+        process = subprocess.Popen(command,shell=True,cwd=self.workdir,start_new_session=True,
+                                   stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL)
+        try:
+            while True:
+                try:
+                    process.wait(timeout=self.interval)
+                    break
+                except subprocess.TimeoutExpired:
+                    pass
+                if self.check() is not None:
+                    self.stop(process)
+                    return self.reason
+        except BaseException:
+            self.stop(process)
+            raise
+        if process.returncode!=0:
+            raise subprocess.CalledProcessError(process.returncode,command)
+        return self.check() #Whatever was written after the last check
+
+    def stop(self,process,grace=10.0):
+        '''Stop PlaSim and everything it started, forcibly if it doesn't stop within ``grace`` seconds.'''
+        if process.poll() is not None:
+            return
+        try:
+            os.killpg(process.pid,signal.SIGTERM)
+            process.wait(timeout=grace)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid,signal.SIGKILL)
+            process.wait()
+        except ProcessLookupError:
+            pass
@@ -7,6 +7,8 @@ from petitRADTRANS import nat_cst as nc
 #import exoplasim.constants
 #from exoplasim.constants import smws
 import exoplasim.pyburn
+import exoplasim.gcmt
+import exoplasim.gcmt as gcmt
 import exoplasim.surfacespecs
 import exoplasim.surfacespecs as spec
 import exoplasim.constants
@@ -14,6 +16,7 @@ from exoplasim.constants import smws
 from itertools import repeat
 import exoplasim.colormatch
 import exoplasim.colormatch as cmatch
+import exoplasim.telemetry as telemetry
 
 
 def _log(destination,string):
@@ -98,28 +101,34 @@ def _smooth(array,xcoords=None,xN=None,centerweight=0.95):
     
     Parameters
     ----------
-    array : 1D array
-        Data array to be smoothed.
-    xcoords : 1D array (optional)
+    array : array-like
+        Data array to be smoothed. Smoothing is along the last axis, so a 2D array is treated
+        as a stack of columns.
+    xcoords : array-like (optional)
         If provided, must have same shape as array. xN must also be provided.
-    xN : float, optional
-        Bookend value to use at the upper end of the array when computing dx.
+    xN : float or array-like, optional
+        Bookend value to use at the upper end of the array when computing dx (one per column
+        for a 2D array).
     centerweight : float, optional
         The fraction of each cell that should be kept in the cell.
         
     Returns
     -------
-    1D array
+    array-like
         Smoothed array
     '''
-    padded = np.append(np.append([0.,],array),[0.,])
+    array = np.asarray(array,dtype=float)
+    padded = np.pad(array,[(0,0),]*(array.ndim-1)+[(1,1),])
     edgeweight = 0.5*(1-centerweight)
     if xcoords is None:
-        newarr = edgeweight*padded[:-2] + centerweight*padded[1:-1] + edgeweight*padded[2:]
+        newarr = edgeweight*padded[...,:-2] + centerweight*padded[...,1:-1] + edgeweight*padded[...,2:]
     else:
-        dx = np.diff(np.append(np.append(0.5*xcoords[0],0.5*(xcoords[:-1]+xcoords[1:])),xN))
-        padded[1:-1] *= dx #brings us from density to mass
-        newarr = (edgeweight*padded[:-2] + centerweight*padded[1:-1] + edgeweight*padded[2:])/dx
+        xcoords = np.asarray(xcoords,dtype=float)
+        xN = np.broadcast_to(np.asarray(xN,dtype=float)[...,np.newaxis],xcoords.shape[:-1]+(1,))
+        dx = np.diff(np.concatenate([0.5*xcoords[...,:1],0.5*(xcoords[...,:-1]+xcoords[...,1:]),xN],
+                                    axis=-1),axis=-1)
+        padded[...,1:-1] *= dx #brings us from density to mass
+        newarr = (edgeweight*padded[...,:-2] + centerweight*padded[...,1:-1] + edgeweight*padded[...,2:])/dx
     return newarr
 
 def _airmass(pa,ps,ta,hus,gascon,gravity):
@@ -128,13 +137,13 @@ def _airmass(pa,ps,ta,hus,gascon,gravity):
     Parameters
     ----------
     pa : array-like
-        1D array of mid-layer pressures in hPa.
-    ps : float
-        Surface pressure in hPa.
+        1D array of mid-layer pressures in hPa, or a 2D array of columns.
+    ps : float or array-like
+        Surface pressure in hPa (one per column for 2D arrays).
     ta : array-like
-        1D array of layer air temperatures in K.
+        Layer air temperatures in K.
     hus : array-like
-        1D array of specific humidity in kg/kg.
+        Specific humidity in kg/kg.
     gascon : float
         Specific gas constant of dry air, in J/kg/K.
     gravity : float
@@ -145,10 +154,12 @@ def _airmass(pa,ps,ta,hus,gascon,gravity):
     array-like
         Mass per area contribution (kg/m^2) of each layer in the column.
     '''
+    pa = np.asarray(pa,dtype=float)
+    ps = np.broadcast_to(np.asarray(ps,dtype=float)[...,np.newaxis],pa.shape[:-1]+(1,))
     e = gascon/461.5 #Rd/Rv
-    hp = np.append(0.5*pa[0],np.append(0.5*(pa[:-1]+pa[1:]),ps))
+    hp = np.concatenate([0.5*pa[...,:1],0.5*(pa[...,:-1]+pa[...,1:]),ps],axis=-1)
     vtemp =ta*(hus+e)/(e*(1+hus)) #virtual temperature
-    dz = gascon*vtemp/gravity*np.log(hp[1:]/hp[:-1])
+    dz = gascon*vtemp/gravity*np.log(hp[...,1:]/hp[...,:-1])
     airdensity = pa*100./(gascon*vtemp)
     return airdensity*dz
 
@@ -161,7 +172,8 @@ def _fill(hum,airmass,minvalue=1.0e-6):
     Parameters
     ----------
     hum : array-like
-        The humidity array to be adjusted. Must be a mixing ratio in kg/kg.
+        The humidity array to be adjusted. Must be a mixing ratio in kg/kg. A 2D array is
+        treated as a stack of columns, with the vertical along the last axis.
     airmass : array-like
         The mass per area contribution of each layer, such that the sum is equal to the total column density, in kg/m^2.
     minvalue : float, optional
@@ -172,152 +184,200 @@ def _fill(hum,airmass,minvalue=1.0e-6):
     array-like
         Adjusted humidity array.
     '''
-    cloud=False
-    newhum = np.copy(hum)
-    for k in range(len(hum)):
-        if hum[k]>minvalue: #Everything below this needs to be filled.
-            cloud=True
-        if cloud:
-            newhum[k] = max(hum[k],minvalue)
-    if cloud:
-        excess = newhum-hum
-        excessmass = excess*airmass
-        if np.sum(excessmass)>np.sum(hum*airmass):
-            print("More water was dumped in than was in the cloud layers....")
-            print(np.sum(excessmass),np.sum(hum*airmass))
-        for k in range(len(hum)-1,-1,-1):
-            if excessmass[k]>0:
-                for j in range(k,-1,-1):
-                    if newhum[j]>minvalue:
-                        if (newhum[j]-minvalue)*airmass[j]>=excessmass[k]:
-                            newhum[j] = (newhum[j]*airmass[j] - excessmass[k])/airmass[j]
-                            excessmass[k] = 0.0
-                            break
-                        elif newhum[j]>minvalue:
-                            dhum = newhum[j]-minvalue
-                            excessmass[k] -= dhum*airmass[j]
-                            newhum[j] = minvalue
-    return newhum
+    hum = np.asarray(hum,dtype=float)
+    shape = hum.shape
+    hum = np.reshape(hum,(-1,shape[-1]))
+    airmass = np.reshape(np.asarray(airmass,dtype=float),hum.shape)
+    cloud = np.maximum.accumulate(hum>minvalue,axis=1) #Everything below a wet layer needs filling
+    newhum = np.where(cloud,np.maximum(hum,minvalue),hum)
+    excessmass = (newhum-hum)*airmass
+    overfilled = np.sum(excessmass,axis=1)>np.sum(hum*airmass,axis=1)
+    if np.any(overfilled):
+        print("More water was dumped in than was in the cloud layers in %d columns...."%np.sum(overfilled))
+    #Take each filled layer's excess from the wet layers above it, nearest first, one level at a
+    #time for every column at once.
+    for k in range(hum.shape[1]-1,-1,-1):
+        remaining = np.copy(excessmass[:,k])
+        for j in range(k,-1,-1):
+            active = (remaining>0)&(newhum[:,j]>minvalue)
+            if not np.any(active):
+                if not np.any(remaining>0):
+                    break
+                continue
+            available = (newhum[:,j]-minvalue)*airmass[:,j]
+            enough = active&(available>=remaining)
+            newhum[enough,j] = (newhum[enough,j]*airmass[enough,j] - remaining[enough])/airmass[enough,j]
+            remaining[enough] = 0.0
+            short = active&~enough
+            remaining[short] -= available[short]
+            newhum[short,j] = minvalue
+    return np.reshape(newhum,shape)
 
-def _transitcolumn(atmosphere, pressures, psurf, temperature, humidity, clouds, 
-                   gases_vmr, gascon, gravity, rplanet,
-                   h2o_lines,cloudfunc,smooth,smoothweight,ozone,ozoneheight,ozonespread,num):
-    '''Compute the transit spectrum through a single column.
+def columnprofiles(pressures, temperature, humidity, clouds, gases_vmr, gascon, gravity,
+                   h2o_lines='HITEMP', smooth=False, smoothweight=0.95, fill=0.0, ozone=0.0,
+                   ozoneheight=20000., ozonespread=5000., transit=False):
+    '''Compute the petitRADTRANS inputs for many atmospheric columns at once.
+    
+    Each column is extended upwards with a 20-layer isothermal, dry ghost stratosphere,
+    optionally smoothed and filled, and converted to mass fractions for each species, with
+    ozone from ExoPlaSim's ozone parameterization. This is done for all the columns together,
+    so the results can be handed to worker processes ready to use (or inspected).
     
     Parameters
     ----------
-    atmosphere : Radtrans.Atmosphere
-        Initialized Atmosphere object
     pressures : numpy.ndarray
-        Pressure array in hPa, with the surface at the end of the array
-    psurf : float
-        Surface pressure in hPa
+        (ncolumns,nlevels) array of pressures in hPa, with the surface at the end of each column
     temperature : numpy.ndarray
-        Array of air temperatures, with the surface at the end of the array
+        (ncolumns,nlevels) array of air temperatures, with the surface at the end
     humidity : numpy.ndarray
-        Specific humidity in the column [kg/kg]
+        (ncolumns,nlevels) specific humidity [kg/kg]
     clouds : numpy.ndarray
-        Cloud water mass fraction in each cell [kg/kg]
+        (ncolumns,nlevels) cloud water mass fraction [kg/kg]
     gases_vmr : dict
         Dictionary of component gases and their volume mixing ratios
     gascon : float
         Specific gas constant
     gravity : float
-        Surface gravity in SI units
-    rplanet : float
-        Planet radius in kilometers
-    h2o_lines : {'HITEMP', 'EXOMOL'}
-        Line list to use for H2O absorption. Options are 'HITEMP' or 'EXOMOL'.
-    cloudfunc : function
-        A routine which takes pressure, temperature, and cloud water content
-        as arguments, and returns keyword arguments to be unpacked into calc_flux_transm.
-    smooth : bool
-        Whether or not to smooth humidity and cloud columns. As of Nov 12, 2021, it 
-        is recommended that you use smooth=True for well-behaved spectra. This is a
-        conservative smoothing operation, meaning the water and cloud column mass should
-        be conserved--what this does is move some water from the water-rich layers into
-        the layers directly above and below.
-    smoothweight : float
+        Surface gravity in CGS units
+    h2o_lines : {'HITEMP', 'EXOMOL'}, optional
+        Line list to use for H2O absorption.
+    smooth : bool, optional
+        Whether or not to conservatively smooth humidity, cloud, and ozone columns.
+    smoothweight : float, optional
         The fraction of the water in a layer that should be retained during smoothing.
-        A higher value means the smoothing is less severe. 0.95 is probably the upper
-        limit for well-behaved spectra.
-    ozone : float
-        Ozone column amount [cm-STP]
-    ozoneheight : float
+    fill : float, optional
+        If nonzero, the floor value for water humidity when moist layers are present above dry layers.
+    ozone : float or numpy.ndarray, optional
+        Ozone column amount [cm-STP], either one value or one per column
+    ozoneheight : float, optional
         Altitude of maximum ozone concentration [m]
-    ozonespread : float
+    ozonespread : float, optional
         Width of the ozone gaussian distribution [m]
-    num : int, float
-        Which number column this is (used for reporting)
-        
+    transit : bool, optional
+        If True, cloud water is excluded from the gas mass fractions, as for transmission spectra.
         
     Returns
     -------
-    numpy.ndarray
-        Transmission radius in kilometers
+    dict
+        "pressure" [hPa], "temperature" [K], "clouds" [kg/kg], and "mmw" [g/mol], each with
+        shape (ncolumns,nlevels+20), and "mass_fractions", a dictionary of (ncolumns,nlevels+20)
+        arrays for each species. Use :py:func:`columninputs` to get the inputs for one column.
     '''
-    
-    print("Doing column %d"%num)
-    
-    
-    temperature = temperature[0]
-    pressures = pressures[0]
-    humidity = humidity[0]
-    clouds = clouds[0]
-    
+    pressures = np.atleast_2d(np.ma.getdata(pressures)).astype(float)
+    temperature = np.atleast_2d(np.ma.getdata(temperature)).astype(float)
+    humidity = np.atleast_2d(np.ma.getdata(humidity)).astype(float)
+    clouds = np.atleast_2d(np.ma.getdata(clouds)).astype(float)
+    ncols = pressures.shape[0]
+    psurf = pressures[:,-1]
     
     #Define vertical profiles with ghost stratosphere
-    extp = np.append(np.geomspace(1.0e-6,0.5*pressures[0],num=20),pressures)
-    try:
-        extta = np.append(np.ones(20)*temperature[0],temperature)
-    except:
-        print(temperature.shape)
-        raise
-    exthus = np.append(np.zeros(20),humidity)
-    extcl = np.append(np.zeros(20),clouds)
+    extp = np.concatenate([np.geomspace(1.0e-6,0.5*pressures[:,0],num=20,axis=1),pressures],axis=1)
+    extta = np.concatenate([np.repeat(temperature[:,:1],20,axis=1),temperature],axis=1)
+    exthus = np.concatenate([np.zeros((ncols,20)),humidity],axis=1)
+    extcl = np.concatenate([np.zeros((ncols,20)),clouds],axis=1)
     
     if smooth:
         exthus = _smooth(exthus,xcoords=extp,xN=psurf,centerweight=smoothweight)
         extcl = _smooth(extcl,xcoords=extp,xN=psurf,centerweight=smoothweight)
     
-    #Set up atmosphere
-    atmosphere.setup_opa_structure(extp*1.0e-3)
+    if fill>0.0:
+        airmass = _airmass(extp[:,:-1],psurf,extta[:,:-1],exthus[:,:-1],gascon,gravity)
+        extcl[:,:-1] = _fill(extcl[:,:-1],airmass,minvalue=fill)
+        exthus[:,:-1] = _fill(exthus[:,:-1],airmass,minvalue=fill)
+    
     MMW = 8.31446261815324/gascon*1.0e3*np.ones_like(extp) #grams per mole
     
     #Set absorber fractions
+    if transit:
+        dry = 1-exthus-extcl
+    else:
+        dry = 1-exthus
     mass_fractions = {}
     for gas in gases_vmr:
         mmass = smws['m'+gas]
-        mass_fractions[gas] = gases_vmr[gas] * mmass/MMW * (1-exthus-extcl)
+        mass_fractions[gas] = gases_vmr[gas] * mmass/MMW * dry
         
-    mass_fractions['H2O_'+h2o_lines] = exthus*(1-extcl)
+    if transit:
+        mass_fractions['H2O_'+h2o_lines] = exthus*(1-extcl)
+    else:
+        mass_fractions['H2O_'+h2o_lines] = exthus
     mass_fractions['H2O(c)'] = extcl
-    kwargs = cloudfunc(extp,extta,extcl)
     
     #Compute ozone from parameterization
-    mass_fractions['O3'] = np.zeros_like(extp)
+    o3 = np.zeros_like(extp)
+    ozone = np.ones(ncols)*np.ma.getdata(ozone)
     zfo3 = 100./2.14
-    zo3t = ozone
+    zo3t = np.copy(ozone)
     bo3 = ozoneheight
     co3 = ozonespread
-    zh = 0.0
+    zh = np.zeros(ncols)
     zconst  = np.exp(-bo3/co3)
     ga = gravity*0.01 #SI units
-    extdp = np.gradient(extp)*1e2
-    for k in range(len(extp)-1,0,-1):
-        zh -= extta[k]*gascon/ga*np.log(extp[k-1]/extp[k])
+    extdp = np.gradient(extp,axis=1)*1e2
+    for k in range(extp.shape[1]-1,0,-1):
+        zh -= extta[:,k]*gascon/ga*np.log(extp[:,k-1]/extp[:,k])
         zo3 = -(ozone + ozone*zconst)/(1.+np.exp((zh-bo3)/co3))+zo3t
-        mass_fractions['O3'][k]=zo3*ga/(zfo3*extdp[k])
+        o3[:,k] = zo3*ga/(zfo3*extdp[:,k])
         zo3t -= zo3
-    mass_fractions['O3'][0] = zo3t * ga / (zfo3 * extdp[0])
+    o3[:,0] = zo3t * ga / (zfo3 * extdp[:,0])
     
     if smooth:
-        mass_fractions['O3'] = _smooth(mass_fractions['O3'],xcoords=extp,xN=psurf,centerweight=smoothweight)
+        o3 = _smooth(o3,xcoords=extp,xN=psurf,centerweight=smoothweight)
+    mass_fractions['O3'] = o3
+    
+    return {"pressure":extp,"temperature":extta,"clouds":extcl,"mmw":MMW,
+            "mass_fractions":mass_fractions}
+
+def columninputs(profiles,n):
+    '''Extract the inputs for one column from the output of :py:func:`columnprofiles`.'''
+    profile = {"mass_fractions":{}}
+    for key in ("pressure","temperature","clouds","mmw"):
+        profile[key] = profiles[key][n,:]
+    for gas in profiles["mass_fractions"]:
+        profile["mass_fractions"][gas] = profiles["mass_fractions"][gas][n,:]
+    return profile
+
+def _columns(profiles):
+    '''Iterate over the columns in the output of :py:func:`columnprofiles`.'''
+    for n in range(profiles["pressure"].shape[0]):
+        yield columninputs(profiles,n)
+
+def _transitcolumn(atmosphere, profile, psurf, gravity, rplanet, cloudfunc, num):
+    '''Compute the transit spectrum through a single column.
+    
+    Parameters
+    ----------
+    atmosphere : Radtrans.Atmosphere
+        Initialized Atmosphere object
+    profile : dict
+        Inputs for the column, from :py:func:`columnprofiles` (see :py:func:`columninputs`)
+    psurf : float
+        Surface pressure in hPa
+    gravity : float
+        Surface gravity in CGS units
+    rplanet : float
+        Planet radius in kilometers
+    cloudfunc : function
+        A routine which takes pressure, temperature, and cloud water content
+        as arguments, and returns keyword arguments to be unpacked into calc_flux_transm.
+    num : int, float
+        Which number column this is (used for reporting)
+        
+        
+    Returns
+    -------
+    numpy.ndarray
+        Transmission radius in kilometers
+    '''
     
+    print("Doing column %d"%num)
     
+    #Set up atmosphere
+    atmosphere.setup_opa_structure(profile["pressure"]*1.0e-3)
+    kwargs = cloudfunc(profile["pressure"],profile["temperature"],profile["clouds"])
     
     #Compute flux
-    atmosphere.calc_transm(extta, mass_fractions, gravity, MMW, \
+    atmosphere.calc_transm(profile["temperature"], profile["mass_fractions"], gravity, profile["mmw"], \
                            P0_bar=psurf*1.0e-3, R_pl=rplanet*1e5,**kwargs)
     
     return atmosphere.transm_rad*1e-5 #kilometers
@@ -510,28 +570,29 @@ def transit(output,transittimes,gases_vmr, gascon=287.0, gravity=9.80665,
         
         transits.append(np.zeros((nterm,len(atmosphere.freq))))
         
+        columnspan = telemetry.start("prt.transitcolumns",columns=nterm,processes=num_cpus)
+        profiles = columnprofiles(press[:,0,:],temp[:,0,:],h2o[:,0,:],clc[:,0,:],gases_vmr,
+                                  gascon,gravity,h2o_lines=h2o_lines,smooth=smooth,
+                                  smoothweight=smoothweight,ozone=o3,ozoneheight=bo3,
+                                  ozonespread=co3,transit=True)
         if num_cpus>1:
             _log(logfile,"\n")
             _log(logfile,"%d processes will be spun up; if this uses a substantial fraction\n"%num_cpus+
                          "of the computer's resources, it may become unresponsive for a while.")
-            args = zip(repeat(atmosphere),press,psurf,temp,h2o,clc,repeat(gases_vmr),
-                       repeat(gascon),repeat(gravity),repeat(rplanet),repeat(h2o_lines),
-                       repeat(cloudfunc),repeat(smooth),repeat(smoothweight),o3,
-                       repeat(bo3),repeat(co3),np.arange(nterm))
+            args = zip(repeat(atmosphere),_columns(profiles),psurf[:,0],repeat(gravity),
+                       repeat(rplanet),repeat(cloudfunc),np.arange(nterm))
             with mp.Pool(num_cpus) as pool:
                 spectra = pool.starmap(_transitcolumn,args)
-            for i,column in enumerate(spectra):
-                transits[-1][i,:] = column[:]
+            for i,spectrum in enumerate(spectra):
+                transits[-1][i,:] = spectrum[:]
         else:
             _log(logfile,"\n")
             _log(logfile,"Running in single-process mode; this may take a while.")
             for i in range(nterm):
                 print(i)
-                transits[-1][i,:] = _transitcolumn(atmosphere,press[i,:],psurf[i],
-                                                   temp[i,:],h2o[i,:],clc[i,:],
-                                                   gases_vmr,gascon,gravity,
-                                                   rplanet,h2o_lines,cloudfunc,
-                                                   smooth,smoothweight,o3[i],bo3,co3,i)
+                transits[-1][i,:] = _transitcolumn(atmosphere,columninputs(profiles,i),psurf[i,0],
+                                                   gravity,rplanet,cloudfunc,i)
+        telemetry.stop(columnspan)
         _log(logfile,"\n")
         _log(logfile,"All columns computed! Mean transit spectrum is now being computed.")
         _log(logfile,"\n")
@@ -552,35 +613,20 @@ def transit(output,transittimes,gases_vmr, gascon=287.0, gravity=9.80665,
     return atmosphere,nc.c/atmosphere.freq*1e4,nptransits,npcoords,npweights,meantransits
         
 
-def _imgcolumn(atmosphere, pressures, surface, temperature, humidity, clouds,
-               gases_vmr, gascon, h2o_lines,
-               gravity, Tstar, Rstar,
-               starseparation,zenith,cloudfunc,smooth,smoothweight,fill,
-               ozone,ozoneheight,ozonespread,num):
+def _imgcolumn(atmosphere, profile, surface, gravity, Tstar, Rstar,
+               starseparation,zenith,cloudfunc,num):
     '''Compute the reflectance/emission spectrum for a column of atmosphere.
     
     Parameters
     ----------
     atmosphere : Radtrans.Atmosphere
         Initialized Atmosphere object
-    pressures : numpy.ndarray
-        Pressure array in hPa, with the surface at the end of the array
+    profile : dict
+        Inputs for the column, from :py:func:`columnprofiles` (see :py:func:`columninputs`)
     surface : array-like
         Wavelength-array giving the surface reflectance, in decimal form.
-    temperature : numpy.ndarray
-        Array of air temperatures, with the surface at the end of the array
-    humidity : numpy.ndarray
-        Specific humidity in the column [kg/kg]
-    clouds : numpy.ndarray
-        Cloud water mass fraction in each cell [kg/kg]
-    gases_vmr : dict
-        Dictionary of component gases and their volume mixing ratios
-    gascon : float
-        Specific gas constant
     gravity : float
-        Surface gravity in SI units
-    h2o_lines : {'HITEMP', 'EXOMOL'}
-        Line list to use for H2O absorption. Options are 'HITEMP' or 'EXOMOL'.
+        Surface gravity in CGS units
     Tstar : float
         Effective temperature of the parent star [K]
     Rstar : float
@@ -592,91 +638,21 @@ def _imgcolumn(atmosphere, pressures, surface, temperature, humidity, clouds,
     cloudfunc : function
         A routine which takes pressure, temperature, and cloud water content
         as arguments, and returns keyword arguments to be unpacked into calc_flux_transm.
-    smooth : bool
-        Whether or not to smooth humidity and cloud columns. As of Nov 12, 2021, it 
-        is recommended that you use smooth=True for well-behaved spectra. This is a
-        conservative smoothing operation, meaning the water and cloud column mass should
-        be conserved--what this does is move some water from the water-rich layers into
-        the layers directly above and below.
-    smoothweight : float
-        The fraction of the water in a layer that should be retained during smoothing.
-        A higher value means the smoothing is less severe. 0.95 is probably the upper
-        limit for well-behaved spectra.
-    fill : float
-        If nonzero, the floor value for water humidity when moist layers are present above dry layers.
-    ozone : float
-        Ozone column amount [cm-STP]
-    ozoneheight : float
-        Altitude of maximum ozone concentration [m]
-    ozonespread : float
-        Width of the ozone gaussian distribution [m]
     num : int
         Column number, for diagnostic purposes
     
     Returns
     -------
-    numpy.ndarray
-        Transmission radius in meters
+    numpy.ndarray, numpy.ndarray
+        Emergent flux and incident stellar flux [erg cm-2 s-1 Hz-1]. True-colour intensities
+        are computed from the fluxes for all columns at once afterwards.
     '''
     
     print("Doing column %d"%num)
     
-    #Define vertical profiles with ghost stratosphere
-    extp = np.append(np.geomspace(1.0e-6,0.5*pressures[0],num=20),pressures)
-    extta = np.append(np.ones(20)*temperature[0],temperature)
-    exthus = np.append(np.zeros(20),humidity)
-    ##THIS BIT BC DRY LAYERS BREAK PRT
-    #firstwater = np.argwhere(exthus>0.)[0][0]+1
-    #exthus[firstwater:] = np.maximum(exthus[firstwater:],1.0e-5)
-    ##REMOVE ONCE FIXED
-    extcl = np.append(np.zeros(20),clouds)
-    
-    psurf = pressures[-1]
-    
-    if smooth:
-        exthus = _smooth(exthus,xcoords=extp,xN=psurf,centerweight=smoothweight)
-        extcl = _smooth(extcl,xcoords=extp,xN=psurf,centerweight=smoothweight)
-    
-    if fill>0.0:
-        airmass = _airmass(extp[:-1],psurf,extta[:-1],exthus[:-1],gascon,gravity)
-        extcl[:-1] = _fill(extcl[:-1],airmass,minvalue=fill)
-        exthus[:-1] = _fill(exthus[:-1],airmass,minvalue=fill)
-    
     #Set up atmosphere
-    atmosphere.setup_opa_structure(extp*1.0e-3)
-    MMW = 8.31446261815324/gascon*1.0e3*np.ones_like(extp) #grams per mole
-    
-    #Set absorber fractions
-    mass_fractions = {}
-    for gas in gases_vmr:
-        mmass = smws['m'+gas]
-        mass_fractions[gas] = gases_vmr[gas] * mmass/MMW * (1-exthus)
-        
-    mass_fractions['H2O_'+h2o_lines] = exthus
-    mass_fractions['H2O(c)'] = extcl
-    kwargs = cloudfunc(extp,extta,extcl)
-    
-    #Compute ozone from parameterization
-    mass_fractions['O3'] = np.zeros_like(extp)
-    zfo3 = 100./2.14
-    zo3t = ozone
-    bo3 = ozoneheight
-    co3 = ozonespread
-    zh = 0.0
-    zconst  = np.exp(-bo3/co3)
-    ga = gravity*0.01 #SI units
-    extdp = np.gradient(extp)*1e2
-    for k in range(len(extp)-1,0,-1):
-        zh -= extta[k]*gascon/ga*np.log(extp[k-1]/extp[k])
-        zo3 = -(ozone + ozone*zconst)/(1.+np.exp((zh-bo3)/co3))+zo3t
-        mass_fractions['O3'][k]=zo3*ga/(zfo3*extdp[k])
-        zo3t -= zo3
-    mass_fractions['O3'][0] = zo3t * ga / (zfo3 * extdp[0])
-    
-    if smooth:
-        mass_fractions['O3'] = _smooth(mass_fractions['O3'],xcoords=extp,xN=psurf,centerweight=smoothweight)
-    
-    
+    atmosphere.setup_opa_structure(profile["pressure"]*1.0e-3)
+    kwargs = cloudfunc(profile["pressure"],profile["temperature"],profile["clouds"])
     
     #Source hi-res surface spectrum from modelspecs, and make sure it matches the model
     #albedo
@@ -689,30 +665,16 @@ def _imgcolumn(atmosphere, pressures, surface, temperature, humidity, clouds,
         kwargs["Rstar"]=Rstar
         kwargs["semimajoraxis"]=starseparation
     
-    extta = np.ma.getdata(extta)
-    for gas in mass_fractions:
-        mass_fractions[gas] = np.ma.getdata(mass_fractions[gas])
-    MMW = np.ma.getdata(MMW)
-    
     #Compute flux
-    atmosphere.calc_flux(extta, mass_fractions, gravity, MMW,
+    atmosphere.calc_flux(profile["temperature"], profile["mass_fractions"], gravity, profile["mmw"],
                          geometry='non-isotropic',**kwargs)
     
-    wvl = nc.c/atmosphere.freq/1e-4 #wavelength in microns
-    
     flux = atmosphere.flux*1e6
     flux[(flux>10.0)|(flux<0)] = np.nan
     
-    
-    intensities = makeintensities(wvl,flux*(atmosphere.freq)*1.0e-3/wvl) 
-                                                           #1e-3 for cm-2 erg s-1 -> W m-2
-    #We need to give the spectrum in W m-2 um-1
-    
-    
-    return flux,intensities,\
+    return flux,\
            atmosphere.stellar_intensity*np.maximum(0.0,np.cos(zenith*np.pi/180.))*np.pi*1e6 #erg cm-2 s-1 Hz-1
 
-
 def _lognorm(x):
     v = np.log10(np.maximum(x,1.0e-15))
     vmin = np.amin(v)
@@ -729,13 +691,15 @@ def makeintensities(wvl,fluxes):
     wvl : array-like
         Wavelengths in microns
     fluxes : array-like
-        Spectrum in fluxes (units are arbitrary)
+        Spectrum in fluxes (units are arbitrary), or a 2D array of spectra
         
     Returns
     -------
-    (float,float,float)
-        (x,y,Y) tuple
+    (float,float,float) or numpy.ndarray
+        (x,y,Y) tuple, or an (N,3) array of them for 2D ``fluxes``
     '''
+    if np.ndim(fluxes)>1:
+        return cmatch.makexyzs(wvl*1.0e3,fluxes)
     intensities = cmatch.makexyz(wvl*1.0e3,fluxes)
     return intensities
     
@@ -890,18 +854,10 @@ def makecolors(intensities,gamma=True,colorspace="sRGB"):
     #flatintensities[:,2] -= np.nanmin(flatintensities[:,2]) #So we have 0-F range
     #Is the above line necessary? It's the source of discrepancy with specs2rgb.
     norms = flatintensities[:,2]/np.nanmax(flatintensities[:,2])
-    colors = np.zeros((flatshape,3))
-    for k in range(flatshape):
-        colors[k,:] = cmatch.xyz2rgb(flatintensities[k,0],flatintensities[k,1],
-                                     norms[k],gamut=colorspace)
+    colors = cmatch.xyzs2rgb(flatintensities[:,0],flatintensities[:,1],norms,gamut=colorspace)
     colors /= np.nanmax(colors)
     colors = np.reshape(colors,ogshape)
-    if gamma is True:
-        colors[colors<0.0031308] = 12.92*colors[colors<0.0031308]
-        colors[colors>=0.0031308] = 1.055*colors[colors>=0.0031308]**(1./2.4)-0.055
-    elif gamma is not None:
-        colors = colors**(1./gamma)
-    return colors
+    return cmatch.gammacorrect(colors,gamma=gamma)
     
     
 def image(output,imagetimes,gases_vmr, obsv_coords, gascon=287.0, gravity=9.80665, 
@@ -909,7 +865,7 @@ def image(output,imagetimes,gases_vmr, obsv_coords, gascon=287.0, gravity=9.8066
             num_cpus=4,cloudfunc=None,smooth=True,smoothweight=0.50,filldry=0.0,
             stellarspec=None,ozone=False,stepsperyear=11520.,logfile=None,debug=False,
             orennayar=True,sigma=None,allforest=False,baremountainz=5.0e4,
-            colorspace="sRGB",gamma=True,consistency=True,vegpowerlaw=1.0):
+            colorspace="sRGB",gamma=True,consistency=True,vegpowerlaw=1.0,grid=None):
     '''Compute reflection+emission spectra for snapshot output
     
     This routine computes the reflection+emission spectrum for the planet at each
@@ -1008,6 +964,9 @@ def image(output,imagetimes,gases_vmr, obsv_coords, gascon=287.0, gravity=9.8066
         Scale the apparent vegetation fraction by a power law. Setting this to 0.1, for example,
         will increase the area that appears partially-vegetated, while setting it to 1.0 leaves
         vegetation unchanged.
+    grid : exoplasim.gcmt.Grid, optional
+        Precomputed grid geometry for the output's latitudes and longitudes. If not given, a
+        cached one is looked up with :py:func:`exoplasim.gcmt.getgrid`.
         
         
     Returns
@@ -1087,27 +1046,9 @@ def image(output,imagetimes,gases_vmr, obsv_coords, gascon=287.0, gravity=9.8066
     ilons = lons.flatten()
     ilats = lats.flatten()
     
-    lt1 = np.zeros(len(lat)+1)
-    lt1[0] = 90
-    for n in range(0,len(lat)-1):
-        lt1[n+1] = 0.5*(lat[n]+lat[n+1])
-    lt1[-1] = -90
-    dln = np.diff(lon)[0]
-    ln1 = np.zeros(len(lon)+1)
-    ln1[0] = -dln
-    for n in range(0,len(lon)-1):
-        ln1[n+1] = 0.5*(lon[n]+lon[n+1])
-    ln1[-1] = 360.0-dln
-    
-    lt1*=np.pi/180.0
-    ln1*=np.pi/180.0
-    
-    darea = np.zeros((nlat,nlon))
-    for jlat in range(0,nlat):
-        for jlon in range(0,nlon):
-            dln = ln1[jlon+1]-ln1[jlon]
-            darea[jlat,jlon] = abs(np.sin(lt1[jlat])-np.sin(lt1[jlat+1]))*abs(dln)
-    darea = darea.flatten()
+    if grid is None:
+        grid = gcmt.getgrid(lat,lon)
+    darea = grid.darea.flatten()
     
     surfaces = [spec.modelspecs["groundblend"]*0.01,
                 spec.basespecs["USGSocean"]*0.01,
@@ -1285,18 +1226,21 @@ def image(output,imagetimes,gases_vmr, obsv_coords, gascon=287.0, gravity=9.8066
             projectedareas[idx,idv,:][view<np.pi/2] = np.cos(view[view<np.pi/2])*darea[view<np.pi/2]
         
         
+        columnspan = telemetry.start("prt.imagecolumns",columns=ncols,processes=num_cpus)
+        profiles = columnprofiles(pa,ta,hus,dql,gases_vmr,gascon,gravity,h2o_lines=h2o_lines,
+                                  smooth=smooth,smoothweight=smoothweight,fill=filldry,
+                                  ozone=o3,ozoneheight=bo3,ozonespread=co3)
         if num_cpus>1:
-            args = zip(repeat(atmosphere),pa,surfspecs,ta,hus,dql,repeat(gases_vmr),
-                       repeat(gascon),repeat(h2o_lines),repeat(gravity),
+            args = zip(repeat(atmosphere),_columns(profiles),surfspecs,repeat(gravity),
                        repeat(Tstar),repeat(Rstar*nc.r_sun),repeat(starseparation*nc.AU),
-                       zenith,repeat(cloudfunc),repeat(smooth),repeat(smoothweight),repeat(filldry),
-                       o3,repeat(bo3),repeat(co3),np.arange(ncols))
+                       zenith,repeat(cloudfunc),np.arange(ncols))
             with mp.Pool(num_cpus) as pool:
                 spectra = pool.starmap(_imgcolumn,args)
             for i,column in enumerate(spectra):
                 images[idx,  i,:] = column[0][:]
-                photos[idx,0,i,:] = column[1][:]
-                influxes[idx,i,:] = column[2][:]
+                influxes[idx,i,:] = column[1][:]
+            #True-colour intensities for every column at once (1e-3 for cm-2 erg s-1 -> W m-2)
+            photos[idx,0,:,:] = makeintensities(wvl,images[idx,...]*atmosphere.freq*1.0e-3/wvl)
             inrad = influxes[idx,:,:visible]
             outrad  = images[idx,:,:visible]
             reflectivity = outrad/inrad
@@ -1324,16 +1268,14 @@ def image(output,imagetimes,gases_vmr, obsv_coords, gascon=287.0, gravity=9.8066
             
         else:
             for i in range(ncols):
-                column = _imgcolumn(atmosphere,pa[i,:],surfspecs[i,:],
-                                    ta[i,:],hus[i,:],dql[i,:],
-                                    gases_vmr,gascon,h2o_lines,
+                column = _imgcolumn(atmosphere,columninputs(profiles,i),surfspecs[i,:],
                                     gravity,Tstar,Rstar*nc.r_sun,
                                     starseparation*nc.AU,zenith[i],
-                                    cloudfunc,smooth,smoothweight,filldry,o3[i],
-                                    bo3,co3,i)
+                                    cloudfunc,i)
                 images[idx,  i,:] = column[0][:]
-                photos[idx,0,i,:] = column[1][:]
-                influxes[idx,i,:] = column[2][:]
+                influxes[idx,i,:] = column[1][:]
+            #True-colour intensities for every column at once (1e-3 for cm-2 erg s-1 -> W m-2)
+            photos[idx,0,:,:] = makeintensities(wvl,images[idx,...]*atmosphere.freq*1.0e-3/wvl)
             inrad = influxes[idx,:,:visible]
             outrad = images[idx,:,:visible]
             reflectivity = outrad/inrad
@@ -1351,6 +1293,7 @@ def image(output,imagetimes,gases_vmr, obsv_coords, gascon=287.0, gravity=9.8066
                     photos[idx,idv+1,:,2] = orennayarcorrection(photos[idx,0,:,2],ilons,ilats,sollon,sollat,
                                                                 zenith,observers[idv,:],broadrefl,sigma)
                     photos[idx,idv+1,:,:2] = photos[idx,0,:,:2]
+        telemetry.stop(columnspan)
         
         if debug:
             broadreflmap[idx,...] = broadrefl[:]
@@ -1452,12 +1395,13 @@ def image(output,imagetimes,gases_vmr, obsv_coords, gascon=287.0, gravity=9.8066
         surfspecs[n,:] *= fudge_factor
             
             
-    column = _imgcolumn(atmosphere,pa[0,:],surfspecs[0,:],ta[0,:],hus[0,:],dql[0,:],
-                        gases_vmr,gascon,h2o_lines,gravity,Tstar,Rstar*nc.r_sun,
-                        starseparation*nc.AU,0.0,cloudfunc,smooth,smoothweight,filldry,o3[0],
-                        bo3,co3,-1)
+    profiles = columnprofiles(pa[:1,:],ta[:1,:],hus[:1,:],dql[:1,:],gases_vmr,gascon,gravity,
+                              h2o_lines=h2o_lines,smooth=smooth,smoothweight=smoothweight,
+                              fill=filldry,ozone=o3[:1],ozoneheight=bo3,ozonespread=co3)
+    column = _imgcolumn(atmosphere,columninputs(profiles,0),surfspecs[0,:],gravity,Tstar,
+                        Rstar*nc.r_sun,starseparation*nc.AU,0.0,cloudfunc,-1)
     if atmosphere.stellar_intensity is None:
-        atmosphere.stellar_intensity = column[2]*1.0e-6/np.pi
+        atmosphere.stellar_intensity = column[1]*1.0e-6/np.pi
     images = np.reshape(images,(len(imagetimes),nlat,nlon,len(atmosphere.freq)))
     photos = np.reshape(photos,(len(imagetimes),obsv_coords.shape[1]+1,nlat,nlon,3))
     if debug:
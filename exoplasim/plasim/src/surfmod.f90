@@ -102,8 +102,10 @@
       integer :: io            ! iostat
       integer :: ih(8)         ! header
       character (len=18) :: yf ! filename
+      character (len=18) :: yb ! binary filename
       character (len=16) :: yc ! formatted array name
       logical :: lex           ! exists
+      logical :: lbin          ! binary file
 
       kread = 0 ! Initialize as "not read"
       icode = 0
@@ -122,20 +124,31 @@
       endif
 
       call code_surf_file(icode,yf)
+
+!     Prefer an unformatted copy <NXXX_surf_CCCC.srb> if one exists
+
+      yb = yf(1:15) // 'srb'
+      inquire(file=yb,exist=lbin)
+      if (lbin) yf = yb
+
       inquire(file=yf,exist=lex)
       if (lex) then
-         open (ncodunit,file=yf,form='formatted')
+         if (lbin) then
+            open (ncodunit,file=yf,form='unformatted')
+         else
+            open (ncodunit,file=yf,form='formatted')
+         endif
          if (klot == 1) then ! single array (no annual cycle)
-            read (ncodunit,*,iostat=io) ih(:)
+            call read_surf_header(ncodunit,lbin,ih,io)
             call checkio(io,'get_surf_array 1')
-            read (ncodunit,*,iostat=io) pa(:,1)
+            call read_surf_data(ncodunit,lbin,pa(:,1),kdim,io)
             call checkio(io,'get_surf_array 2')
             ilot = 1
          else                ! annual cycle (12 or 14 months)
             do jlot = 1 , klot
-               read (ncodunit,*,iostat=io) ih(:)
+               call read_surf_header(ncodunit,lbin,ih,io)
                if (io /= 0) exit ! end-of-file
-               read (ncodunit,*,iostat=io) pa(:,jlot)
+               call read_surf_data(ncodunit,lbin,pa(:,jlot),kdim,io)
                call checkio(io,'get_surf_array 3')
                ilot = jlot ! arrays read so far
             enddo
@@ -173,6 +186,45 @@
       end subroutine get_surf_array
 
 
+!     ===========================
+!     SUBROUTINE READ_SURF_HEADER
+!     ===========================
+
+      subroutine read_surf_header(kunit,lbin,kh,kio)
+      integer :: kunit         ! unit to read from
+      logical :: lbin          ! unformatted (.srb) file
+      integer :: kh(8)         ! header
+      integer :: kio           ! iostat
+
+      if (lbin) then
+         read (kunit,iostat=kio) kh(:)
+      else
+         read (kunit,*,iostat=kio) kh(:)
+      endif
+      return
+      end subroutine read_surf_header
+
+
+!     =========================
+!     SUBROUTINE READ_SURF_DATA
+!     =========================
+
+      subroutine read_surf_data(kunit,lbin,pa,kdim,kio)
+      integer :: kunit         ! unit to read from
+      logical :: lbin          ! unformatted (.srb) file
+      integer :: kdim          ! dim of array
+      real :: pa(kdim)         ! array to receive values
+      integer :: kio           ! iostat
+
+      if (lbin) then
+         read (kunit,iostat=kio) pa(:)
+      else
+         read (kunit,*,iostat=kio) pa(:)
+      endif
+      return
+      end subroutine read_surf_data
+
+
 !     =========================
 !     SUBROUTINE CODE_SURF_FILE
 !     =========================
@@ -6,6 +6,7 @@ import struct
 import exoplasim.gcmt
 import exoplasim.gcmt as gcmt
 import exoplasim.filesupport
+import exoplasim.telemetry as telemetry
 from exoplasim.filesupport import SUPPORTED
 import scipy, scipy.integrate, scipy.interpolate
 import os, sys
@@ -550,6 +551,7 @@ def refactorvariable(variable,header,ntimes=None,nlev=10):
             
     return newvar
 
+@telemetry.timed("pyburn.read")
 def readfile(filename):
     '''Extract all variables from a raw plasim output file and refactor them into the right shapes
     
@@ -620,6 +622,7 @@ def readfile(filename):
 
     return data
 
+@telemetry.timed("pyburn.transform")
 def _transformvar(lon,lat,variable,meta,nlat,nlon,nlev,ntru,ntime,mode='grid',
                   substellarlon=180.0,physfilter=False,zonal=False,presync=False):
     '''Ensure a variable is in a given horizontal mode.
@@ -957,6 +960,7 @@ def _transformvar(lon,lat,variable,meta,nlat,nlon,nlev,ntru,ntime,mode='grid',
     return (outvar,meta)
     
 
+@telemetry.timed("pyburn.transform")
 def _transformvectorvar(lon,uvar,vvar,umeta,vmeta,lats,nlon,nlev,ntru,ntime,mode='grid',
                         substellarlon=180.0,physfilter=False,zonal=False,radius=6371220.0):
     '''Ensure a variable is in a given horizontal mode.
@@ -1347,6 +1351,7 @@ def _transformvectorvar(lon,uvar,vvar,umeta,vmeta,lats,nlon,nlev,ntru,ntime,mode
     return (outuvar,outvvar,umeta,vmeta)
     
 
+@telemetry.timed("pyburn.derive")
 def dataset(filename, variablecodes, mode='grid', zonal=False, substellarlon=180.0, physfilter=False,
             radius=1.0,gravity=9.80665,gascon=287.0,logfile=None):
     '''Read a raw output file, and construct a dataset.
@@ -2163,6 +2168,7 @@ def dataset(filename, variablecodes, mode='grid', zonal=False, substellarlon=180
     return rdataset
 
 
+@telemetry.timed("pyburn.derive")
 def advancedDataset(filename, variablecodes, mode='grid', substellarlon=180.0,
                     radius=1.0,gravity=9.80665,gascon=287.0,physfilter=False,logfile=None):
     '''Read a raw output file, and construct a dataset.
@@ -3544,6 +3550,7 @@ def hdf5(rdataset,filename="most_output.hdf5",append=False,logfile=None):
     return hdfile
              
 
+@telemetry.timed("pyburn.postprocess")
 def postprocess(rawfile,outfile,logfile=None,namelist=None,variables=None,mode='grid',
                 zonal=False, substellarlon=180.0, physfilter=False,timeaverage=True,stdev=False,
                 times=12,interpolatetimes=True,radius=1.0,gravity=9.80665,gascon=287.0,mars=False):
@@ -3748,6 +3755,7 @@ def postprocess(rawfile,outfile,logfile=None,namelist=None,variables=None,mode='
         
     # Compute time averages, binning, stdev, etc
     
+    averaging = telemetry.start("pyburn.average")
     dtimes = data["time"][0]
     ntimes = len(dtimes)
     
@@ -3951,6 +3959,8 @@ def postprocess(rawfile,outfile,logfile=None,namelist=None,variables=None,mode='
             data[var+"_std"] = (stdvar,stdmeta)
     
         
+    telemetry.stop(averaging)
+        
     # Write to output
     
     _log(logfile,"\n")
@@ -3959,20 +3969,21 @@ def postprocess(rawfile,outfile,logfile=None,namelist=None,variables=None,mode='
     _log(logfile,("--------" +"-"*len(outfile) + "----"))
     _log(logfile,"\n")
     
-    fileparts = outfile.split('.')
-    if fileparts[-1] == "nc":
-        output=netcdf(data,filename=outfile,logfile=logfile)
-        output.close()
-    elif fileparts[-1] == "npz" or fileparts[-1] == "npy":
-        output=npsavez(data,filename=outfile,logfile=logfile)
-    elif (fileparts[-1] in ("csv","txt","gz","tar") or \
-          (fileparts[-2]+"."+fileparts[-1]) in ("tar.gz","tar.bz2","tar.xz")):
-        output=csv(data,filename=outfile,logfile=logfile)
-    elif fileparts[-1] in ("hdf5","h5","he5"):
-        output=hdf5(data,filename=outfile,logfile=logfile)
-        output.close()
-    else:
-        raise Exception("Unsupported output format detected. Supported formats are:\n\t\n\t%s"%("\n\t".join(SUPPORTED)))
+    with telemetry.span("pyburn.write"):
+        fileparts = outfile.split('.')
+        if fileparts[-1] == "nc":
+            output=netcdf(data,filename=outfile,logfile=logfile)
+            output.close()
+        elif fileparts[-1] == "npz" or fileparts[-1] == "npy":
+            output=npsavez(data,filename=outfile,logfile=logfile)
+        elif (fileparts[-1] in ("csv","txt","gz","tar") or \
+              (fileparts[-2]+"."+fileparts[-1]) in ("tar.gz","tar.bz2","tar.xz")):
+            output=csv(data,filename=outfile,logfile=logfile)
+        elif fileparts[-1] in ("hdf5","h5","he5"):
+            output=hdf5(data,filename=outfile,logfile=logfile)
+            output.close()
+        else:
+            raise Exception("Unsupported output format detected. Supported formats are:\n\t\n\t%s"%("\n\t".join(SUPPORTED)))
     
     _log(logfile,"\n")
     _log(logfile,"%s closed."%outfile)
@@ -2,6 +2,7 @@ import numpy as np
 #import matplotlib.pyplot as plt
 #import matplotlib.colors as colors
 from scipy import interpolate
+import exoplasim.boundaries as boundaries
 import os, sys
 import argparse as ag
 from pathlib import Path
@@ -34,26 +35,7 @@ def writeSRA(name,kcode,field,NLAT,NLON):
         
     """
     label=name+'_surf_%04d.sra'%kcode
-    header=[kcode,0,20170927,0,NLON,NLAT,0,0]
-    fmap = field.reshape((int(NLAT*NLON//8),8))
-    sheader = ''
-    for h in header:
-        sheader+=" %11d"%h
-    
-    lines=[]
-    i=0
-    while i<NLAT*NLON/8:
-        l=''
-        for n in fmap[i,:]:
-            l+=' %9.3f'%n
-        lines.append(l)
-        i+=1
-
-    text=sheader+'\n'+'\n'.join(lines)+'\n' 
-
-    f=open(label,'w')
-    f.write(text)
-    f.close()
+    boundaries.writesra(label,np.reshape(field,(NLAT,NLON)),kcode,date=20170927)
     
     
 def writePGM(name,heightfield):    
@@ -78,67 +60,58 @@ def writePGM(name,heightfield):
     with open(name+".pgm","w") as fw:
         fw.write(filetext)
 
-def generate(name="Alderaan",continents=7,landfraction=0.29,maxz=10.0,nlats=32,hemispherelongitude=np.nan,
-             ntopo=False,orthographic=False,plot=False):
-    '''Randomly generate continents up to specified land fraction. Topography optional.
+def _padsphere(field):
+    '''Pad the (lat,lon) trailing axes of a field by one cell on every side.
 
-    Generates name_surf_0172.sra, the land mask file, and (if requested) 
-    name_surf_0129.sra, the topography file.
+    Longitude wraps around, and the rows beyond each pole are the first/last latitude row
+    shifted by 180 degrees of longitude, i.e. the cells on the far side of the pole.
+    Any leading axes (e.g. a stack of worlds) are carried along.
+    '''
+    nlon = field.shape[-1]
+    padded = np.zeros(field.shape[:-2]+(field.shape[-2]+2,nlon+2))
+    padded[...,1:-1,1:-1] = field
+    padded[...,0,1:-1] = np.roll(field[...,0,:],-(nlon//2),axis=-1)
+    padded[...,-1,1:-1] = np.roll(field[...,-1,:],-(nlon//2),axis=-1)
+    padded[...,:,0] = padded[...,:,-2]
+    padded[...,:,-1] = padded[...,:,1]
+    return padded
 
-    Parameters
-    ----------
-    name : str, optional
-        Name for the planet; will be used in filenames.
-    continents : int, optional
-        Number of initial continental cratons. Note that due to craton collisions,
-        this may not be the number of final landmasses.
-    landfraction : float, optional
-        Target land fraction (may deviate slightly).
-    maxz : float, optional
-        Maximum surface elevation under Earth gravity (non-Earth gravity will change the final elevation)
-    nlats : int, optional
-        Number of latitudes. If set to False, T21 Gaussian latitudes will be used (requires netCDF4).
-        Longitudes are 2*nlats.
-    hemispherelongitude : float, optional
-        If finite, confine land to a hemisphere centered on this longitude.
-    topo : bool, optional
-        If True, compute topography.
-    orthorgraphic : bool, optional
-        If True, plot orthographic projections centered on hemispherelongitude.
-    plot : bool, optional
-        If True, display plots of the continents being generated. Requires matplotlib.
+def _neighbors(padded):
+    '''Stack the 8 neighbors of every cell of a field padded by :py:func:`_padsphere`.'''
+    ny = padded.shape[-2]-2
+    nx = padded.shape[-1]-2
+    return np.stack([padded[...,1+dj:ny+1+dj,1+di:nx+1+di] for dj in (-1,0,1) for di in (-1,0,1)
+                     if dj or di])
 
-    Returns
-    ------
-    np.ndarray(2*nlat), np.ndarray(nlat), np.ndarray(nlat,2*nlat)[, np.ndarray(nlat,2*nlat)]
-        Longitude, Latitude, land-sea mask, and if requested, surface geopotential (topography)
-    '''
+def _nanmean0(stack):
+    '''NaN-ignoring mean along the first axis, returning NaN (without a warning) where empty.'''
+    valid = np.isfinite(stack)
+    count = np.sum(valid,axis=0)
+    total = np.sum(np.where(valid,stack,0.0),axis=0)
+    mean = np.zeros(count.shape)+np.nan
+    mean[count>0] = total[count>0]/count[count>0]
+    return mean
 
+def _geometry(nlats,hemispherelongitude):
+    '''Set up the lat-lon grid, cell areas, and projection coordinates used by the generator.'''
     if not nlats:
         import netCDF4 as nc
         dims = nc.Dataset("/".join(__file__.split("/")[:-1])+"T21.nc","r")
-    
+
         lts = dims.variables['lat'][:]
         lns = dims.variables['lon'][:]
     else:
         lts = np.linspace(90,-90,num=nlats+2)[1:-1]
         lns = np.linspace(0,360,num=nlats*2+1)[:-1]
-    lons, lats = np.meshgrid(lns,lts)
-    
-    if plot:
-        import matplotlib.pyplot as plt
-        import matplotlib.colors as colors
-    
+
     minlon=0.0
     maxlon=360.0
-    lonrange=360.0
     l0 = 0.5*(minlon+maxlon)
     wraplon=False
     if np.isfinite(hemispherelongitude):
         l0 = hemispherelongitude
         minlon=hemispherelongitude-90.0
         maxlon=hemispherelongitude+90.0
-        lonrange=180.0
         if minlon<0:
             minlon+=360.0
             wraplon=True
@@ -150,25 +123,9 @@ def generate(name="Alderaan",continents=7,landfraction=0.29,maxz=10.0,nlats=32,h
             z2 = maxlon
             minlon = min(z1,z2)
             maxlon = max(z1,z2)
-    
-    
-    darea = np.zeros((len(lts),len(lns)))
+
     NLAT = len(lts)
-    lts1 = np.zeros(NLAT)
-    lts2 = np.zeros(NLAT)
-    lts1[0] = 0.5*np.pi
-    lts1[NLAT-1] = 0.5*(lts[NLAT-2]+lts[NLAT-1])*np.pi/180.0
-    lts2[0] = 0.5*(lts[0]+lts[1])*np.pi/180.0
-    lts2[NLAT-1] = -0.5*np.pi
-    for jlat in range(1,NLAT-1):
-        lts1[jlat] = 0.5*(lts[jlat-1]+lts[jlat])*np.pi/180.0
-        lts2[jlat] = 0.5*(lts[jlat+1]+lts[jlat])*np.pi/180.0
     NLON = len(lns)
-    for jlat in range(0,NLAT):
-        darea[jlat,:] = 0.5/NLON*(np.sin(lts1[jlat])-np.sin(lts2[jlat]))
-    
-    globalarea = np.sum(darea)
-    
     hlns = np.zeros(NLON+1)
     hlts = np.zeros(NLAT+1)
     hlts[0] = 90.0
@@ -178,346 +135,342 @@ def generate(name="Alderaan",continents=7,landfraction=0.29,maxz=10.0,nlats=32,h
     hlns[-1] = lns[-1]+0.5*(lns[-1]-lns[-2])
     hlns[1:-1] = 0.5*(lns[:-1]+lns[1:])
     hlons, hlats = np.meshgrid(hlns,hlts)
-    
+
+    #Fraction of the sphere covered by each cell
+    sinbounds = np.sin(hlts*np.pi/180.0)
+    darea = np.zeros((NLAT,NLON)) + (0.5/NLON*(sinbounds[:-1]-sinbounds[1:]))[:,np.newaxis]
+
+    if wraplon:
+        allowed = ~((lns>minlon)&(lns<maxlon))
+    else:
+        allowed = (lns>=minlon)&(lns<=maxlon)
+    allowed = np.zeros((NLAT,NLON)) + allowed[np.newaxis,:]
+
     rlats = hlats*np.pi/180.0
     rlons = hlons*np.pi/180.0
     rl0 = l0*np.pi/180.0
     rcoord = 2*np.arcsin(np.sqrt(np.sin(0.5*rlats)**2+np.cos(rlats)*np.sin(0.5*(rlons-rl0))**2))
     thetacoord = np.arctan2(np.cos(rlats)*np.sin(rlons-rl0),np.sin(rlats))
     thetacoord[thetacoord<0] += 2*np.pi
-    
-    latsw=_wrap2d(lats,lats[:,0])
-    lonsw=_wrap2d(lons,360.0)
-    hlatsw=_wrap2d(hlats,hlats[:,0])
-    hlonsw=_wrap2d(hlons,360.0)
-    
-    ncontinents = continents #There's no guarantee you actually get this many if it's >1, since continents can merge
-    
+
+    return {"lts":lts,"lns":lns,"hlts":hlts,"hlns":hlns,"hlats":hlats,"hlons":hlons,
+            "darea":darea,"allowed":allowed,"minlon":minlon,"maxlon":maxlon,"wraplon":wraplon,
+            "rcoord":rcoord,"thetacoord":thetacoord}
+
+def _grow(rng,darea,allowed,continents,landfraction,batchfraction=0.05):
+    '''Seed continental cratons and grow them until the target land fraction is reached.
+
+    Seeds are drawn all at once, with probability proportional to cell area. Each growth step
+    then adds a batch of distinct coastal ocean cells, drawn from the current coastline with
+    probability proportional to cell area, and weighted by 10 if the cell has at least 5 land
+    neighbors (biasing growth towards filling in land-locked ocean). New land joins the mean
+    craton of its land neighbors.
+
+    Returns
+    -------
+    numpy.ndarray, numpy.ndarray, numpy.ndarray
+        Land-sea mask, craton index (NaN over ocean), and craton seed locations
+    '''
+    NLAT,NLON = darea.shape
     grid = np.zeros((NLAT,NLON))
-    wgrid = np.zeros((NLAT+2,NLON+2))
-    cratons = np.zeros((NLAT+2,NLON+2))+np.nan
+    cratons = np.zeros((NLAT,NLON))+np.nan
     seams = np.zeros((NLAT,NLON))
-    landarea = 0.0
-    
-    ilons,ilats = np.meshgrid(range(NLON),range(NLAT))
-    ilns1 = ilons.flatten()
-    ilts1 = ilats.flatten()
-    
-    for c in range(ncontinents):
-        while True:
-            #theta = np.random.uniform()*360.0
-            #phi = np.arcsin(1-2*np.random.uniform())*180.0/np.pi
-            idx = np.random.choice(range(NLAT*NLON),p=darea.flatten())
-            #ilt = np.argmin(abs(phi-lts))
-            #iln = np.argmin(abs(theta-lns))
-            ilt = ilts1[idx]
-            iln = ilns1[idx]
-            keeppoint = True
-            if wraplon:
-                if lns[iln]>minlon and lns[iln]<maxlon:
-                    keeppoint=False
-            else:
-                if lns[iln]<minlon or lns[iln]>maxlon:
-                    keeppoint=False
-            if grid[ilt,iln]<0.5 and keeppoint:
-                grid[ilt,iln] = 1.0
-                cratons[ilt+1,iln+1] = c
-                seams[ilt,iln] = 1.0
-                landarea += darea[ilt,iln]
-                break
-        wgrid[1:-1,1:-1] = grid[:,:]
-        wgrid[0,1:-1] = grid[0,:][::-1]
-        wgrid[-1,1:-1] = grid[-1,:][::-1]
-        wgrid[:,0] = wgrid[:,-2]
-        wgrid[:,-1] = wgrid[:,1]
-        cratons[0,1:-1] = cratons[1,1:-1][::-1]
-        cratons[-1,1:-1] = cratons[-2,1:-1][::-1]
-        cratons[:,0] = cratons[:,-2]
-        cratons[:,-1] = cratons[:,1]
-        
-    history=[]
-    while landarea<=landfraction-np.nanmin(darea):
-        while True:
-            theta = np.random.uniform()*lonrange
-            if wraplon:
-                theta += maxlon
-                if theta>360.0:
-                    theta-=360.0
-            else:
-                theta += minlon
-                if theta>360.0:
-                    theta-=360.0
-            phi = np.arcsin(1-2*np.random.uniform())*180.0/np.pi
-            ilt = np.argmin(abs(phi-lts))
-            iln = np.argmin(abs(theta-lns))
-            if grid[ilt,iln]<0.5 and np.sum(wgrid[ilt:ilt+3,iln:iln+3])>0.5:
-                goodtogo=True
-                if np.sum(wgrid[ilt:ilt+3,iln:iln+3])<5.0: #Try to bias towards land-locked ocean cells
-                    if np.random.uniform()<0.9:
-                        goodtogo=False
-                if goodtogo:
-                    grid[ilt,iln] = 1.0
-                    crsq = cratons[ilt:ilt+3,iln:iln+3]
-                    cratons[ilt+1,iln+1] = np.nanmean(crsq[crsq>0.0])
-                    #crsqm = crsq.min()
-                    #if crsqm==0.0:
-                    #    crsqm = crsq[crsq>0.0].min()
-                    #if crsq.max()-crsqm > 0.0:
-                        #seams[ilt,iln]=1.0
-                    landarea += darea[ilt,iln]
-                    history.append(landarea)
-                    break
-        wgrid[1:-1,1:-1] = grid[:,:]
-        wgrid[0,1:-1] = grid[0,:][::-1]
-        wgrid[-1,1:-1] = grid[-1,:][::-1]
-        wgrid[:,0] = wgrid[:,-2]
-        wgrid[:,-1] = wgrid[:,1]
-        cratons[0,1:-1] = cratons[1,1:-1][::-1]
-        cratons[-1,1:-1] = cratons[-2,1:-1][::-1]
-        cratons[:,0] = cratons[:,-2]
-        cratons[:,-1] = cratons[:,1]
-    
-    
-    print(orthographic)
-    
-    if not orthographic and plot:
-        tm = plt.pcolormesh(hlons,hlats,grid,cmap='gist_earth',vmin=-0.3,vmax=2.5)
+
+    #There's no guarantee you actually get this many if it's >1, since continents can merge
+    weights = (darea*allowed).flatten()
+    seeds = rng.choice(NLAT*NLON,size=continents,replace=False,p=weights/np.sum(weights))
+    grid.flat[seeds] = 1.0
+    cratons.flat[seeds] = np.arange(continents)
+    seams.flat[seeds] = 1.0
+    landarea = np.sum(darea.flat[seeds])
+
+    target = landfraction-np.nanmin(darea)
+    while landarea<=target:
+        nland = np.sum(_neighbors(_padsphere(grid)),axis=0)
+        weights = darea*allowed*(grid<0.5)*(nland>0.5)*np.where(nland<5.0,0.1,1.0)
+        weights = weights.flatten()
+        nfront = np.count_nonzero(weights)
+        if nfront==0:
+            break
+        nbatch = min(nfront,max(1,int(nfront*batchfraction)))
+        cells = rng.choice(NLAT*NLON,size=nbatch,replace=False,p=weights/np.sum(weights))
+        added = darea.flat[cells]
+        cells = cells[np.cumsum(added)-added<=target-landarea] #Stop once we pass the target
+        crats = _neighbors(_padsphere(cratons))
+        crats[~(crats>0.0)] = np.nan
+        grid.flat[cells] = 1.0
+        cratons.flat[cells] = _nanmean0(crats).flat[cells]
+        landarea += np.sum(darea.flat[cells])
+
+    return grid,cratons,seams
+
+def _uplift(grid,cratons,seeds,lts,lns,maxz):
+    '''Raise mountains along the seams where cratons meet.'''
+    gcratonsx,gcratonsy = np.gradient(cratons,lts,lns)
+    seams = np.sqrt(gcratonsx**2+gcratonsy**2)
+    seams[np.isnan(seams)]=0.0
+
+    g0 = 9.80665
+    if np.nanmax(seams)>0.0:
+        geopotential = g0*(seams/np.nanmax(seams))*maxz*1000.0
+    else:
+        geopotential = g0*(grid*0.1+seeds*3.0)*maxz*1000.0
+        seams = np.copy(seeds)
+    geopotential[grid==0.0] = np.nan
+    return geopotential,seams
+
+def _refine(geopotential,grid,geo):
+    '''Spline the coarse geopotential and land mask onto the fine grid used for smoothing.'''
+    lts = geo["lts"]
+    lns = geo["lns"]
+    hlnsz = np.linspace(geo["hlns"][0],geo["hlns"][-1],num=max(400,len(lns)*2))
+    hltsz = np.linspace(geo["hlts"][0],geo["hlts"][-1],num=max(200,len(lts)*2))
+    lnsz = 0.5*(hlnsz[:-1]+hlnsz[1:])
+    ltsz = 0.5*(hltsz[:-1]+hltsz[1:])
+    gz = np.copy(geopotential)
+    gz[np.isnan(geopotential)] = 0.0
+
+    kx=3
+    ky=3
+    if len(lts)>128:
+        kx=1
+        ky=1
+
+    geozspline = interpolate.RectBivariateSpline(lns,lts[::-1],np.transpose(gz[::-1,:]),bbox=[lnsz[0],lnsz[-1],ltsz[-1],ltsz[0]],kx=kx,ky=ky)
+    geoz = np.transpose(geozspline(lnsz,ltsz[::-1]))
+    geoz = geoz[::-1,:]
+    contzspline = interpolate.RectBivariateSpline(lns,lts[::-1],np.transpose(grid[::-1,:]),bbox=[lnsz[0],lnsz[-1],ltsz[-1],ltsz[0]],kx=kx,ky=ky)
+    contz = np.transpose(contzspline(lnsz,ltsz[::-1]))
+    contz = contz[::-1,:]
+    return lnsz,ltsz,geoz,contz
+
+def _smoothtopo(topo,geoz,niters):
+    '''Erode topography by repeatedly blending each cell with the mean of its 8 neighbors.
+
+    Works on a single (lat,lon) field or on a stack of fields with leading axes.
+    '''
+    for i in range(0,niters):
+        topo = np.maximum(topo,geoz)
+        topo[np.isnan(geoz)]=0.0
+        topo = 0.2*topo+0.8*_nanmean0(_neighbors(_padsphere(topo)))
+    return topo
+
+def _coarsen(topo,lnsz,ltsz,geopotential,lns,lts):
+    '''Interpolate smoothed fine-grid topography back onto the model grid.'''
+    topospline = interpolate.RegularGridInterpolator((ltsz[::-1],lnsz),topo[::-1,:],method='linear',
+                                                     bounds_error=False,fill_value=None)
+    lons,lats = np.meshgrid(lns,lts)
+    dtopo = topospline((lats,lons))
+    dtopo[np.isnan(geopotential)] = 0.0
+    return dtopo
+
+def _plotmap(name,suffix,title,field,geo,orthographic,cbarlabel=None,**kwargs):
+    '''Save a rectangular or orthographic (hemispheric) plot of a map.'''
+    import matplotlib.pyplot as plt
+    lts = geo["lts"]
+    lns = geo["lns"]
+    plt.close('all')
+    if not orthographic:
+        t = plt.pcolormesh(geo["hlons"],geo["hlats"],field,**kwargs)
         plt.xlabel('Degrees Longitude')
         plt.ylabel('Degrees Latitude')
         plt.ylim(np.amin(lts),np.amax(lts))
         plt.xlim(np.amin(lns),np.amax(lns))
-        plt.title("Continents")
-        plt.savefig(name+"_lsm.png",bbox_inches='tight')
-        plt.savefig(name+"_lsm.pdf",bbox_inches='tight')
-        plt.close('all')  
     else:
-        iln0 = np.argmin(abs(lns-minlon))
-        iln1 = np.argmin(abs(lns-maxlon))
+        NLON = len(lns)
+        iln0 = np.argmin(abs(lns-geo["minlon"]))
+        iln1 = np.argmin(abs(lns-geo["maxlon"]))
         shift = iln0
-        if wraplon:
+        if geo["wraplon"]:
             shift = iln1
-        x = np.roll(thetacoord,-shift,axis=1)[:,:int(NLON//2)+1]
-        y = np.roll(rcoord,-shift,axis=1)[:,:int(NLON//2)+1]
-        z = np.roll(grid,-shift,axis=1)[:,:int(NLON//2)]
-        if plot:
-            fig,ax=plt.subplots(subplot_kw={"projection":"polar"},figsize=(9,9))
-            ax.set_theta_zero_location('N')
-            ax.pcolormesh(x,np.sin(y),z,cmap='gist_earth',vmin=-0.3,vmax=2.5)
-            ax.set_rticks([])
-            ax.set_thetagrids([])
-            plt.title("Continents")
-            plt.savefig(name+"_lsm.png",bbox_inches='tight')
-            plt.savefig(name+"_lsm.pdf",bbox_inches='tight')
-            plt.close('all')  
-        
-    
+        x = np.roll(geo["thetacoord"],-shift,axis=1)[:,:int(NLON//2)+1]
+        y = np.roll(geo["rcoord"],-shift,axis=1)[:,:int(NLON//2)+1]
+        z = np.roll(field,-shift,axis=1)[:,:int(NLON//2)]
+        fig,ax=plt.subplots(subplot_kw={"projection":"polar"},figsize=(9,9))
+        ax.set_theta_zero_location('N')
+        t = ax.pcolormesh(x,np.sin(y),z,**kwargs)
+        ax.set_rticks([])
+        ax.set_thetagrids([])
+    if cbarlabel is not None:
+        plt.colorbar(t,label=cbarlabel)
+    plt.title(title)
+    plt.savefig(name+"_%s.png"%suffix,bbox_inches='tight')
+    plt.savefig(name+"_%s.pdf"%suffix,bbox_inches='tight')
+    plt.close('all')
+
+def generate(name="Alderaan",continents=7,landfraction=0.29,maxz=10.0,nlats=32,hemispherelongitude=np.nan,
+             ntopo=False,orthographic=False,plot=False,seed=None,batchfraction=0.05):
+    '''Randomly generate continents up to specified land fraction. Topography optional.
+
+    Generates name_surf_0172.sra, the land mask file, and (if requested)
+    name_surf_0129.sra, the topography file.
+
+    Parameters
+    ----------
+    name : str, optional
+        Name for the planet; will be used in filenames.
+    continents : int, optional
+        Number of initial continental cratons. Note that due to craton collisions,
+        this may not be the number of final landmasses.
+    landfraction : float, optional
+        Target land fraction (may deviate slightly).
+    maxz : float, optional
+        Maximum surface elevation under Earth gravity (non-Earth gravity will change the final elevation)
+    nlats : int, optional
+        Number of latitudes. If set to False, T21 Gaussian latitudes will be used (requires netCDF4).
+        Longitudes are 2*nlats.
+    hemispherelongitude : float, optional
+        If finite, confine land to a hemisphere centered on this longitude.
+    ntopo : bool, optional
+        If True, compute topography.
+    orthorgraphic : bool, optional
+        If True, plot orthographic projections centered on hemispherelongitude.
+    plot : bool, optional
+        If True, display plots of the continents being generated. Requires matplotlib.
+    seed : int or numpy.random.Generator, optional
+        Seed for the random number generator. The same seed and arguments always produce
+        the same world.
+    batchfraction : float, optional
+        Fraction of the current coastline that may be converted to land in a single growth
+        step. Smaller values follow the cell-by-cell growth process more closely; larger
+        values are faster.
+
+    Returns
+    ------
+    np.ndarray(2*nlat), np.ndarray(nlat), np.ndarray(nlat,2*nlat)[, np.ndarray(nlat,2*nlat)]
+        Longitude, Latitude, land-sea mask, and if requested, surface geopotential (topography)
+    '''
+
+    geo = _geometry(nlats,hemispherelongitude)
+    lts = geo["lts"]
+    lns = geo["lns"]
+    NLAT = len(lts)
+    NLON = len(lns)
+
+    if plot:
+        import matplotlib.colors as colors
+
+    rng = np.random.default_rng(seed)
+    grid,cratons,seams = _grow(rng,geo["darea"],geo["allowed"],continents,landfraction,
+                               batchfraction=batchfraction)
+
+    if plot:
+        _plotmap(name,"lsm","Continents",grid,geo,orthographic,cmap='gist_earth',vmin=-0.3,vmax=2.5)
+
     writeSRA(name,172,grid,NLAT,NLON)
-    
+
     if plot:
-        plt.close('all')
-    if not orthographic and plot:
-        t = plt.pcolormesh(hlons,hlats,cratons[1:-1,1:-1],cmap='gist_ncar',
-                                       vmin=-0.3,vmax=ncontinents+2)
-        plt.xlabel('Degrees Longitude')
-        plt.ylabel('Degrees Latitude')
-        plt.ylim(np.amin(lts),np.amax(lts))
-        plt.xlim(np.amin(lns),np.amax(lns))
-        plt.title("Continental Cratons")
-        plt.savefig(name+"_cratons.png",bbox_inches='tight')
-        plt.savefig(name+"_cratons.pdf",bbox_inches='tight')
-    
-        plt.close('all')
-    else:
-        iln0 = np.argmin(abs(lns-minlon))
-        iln1 = np.argmin(abs(lns-maxlon))
-        shift = iln0
-        if wraplon:
-            shift = iln1
-        x = np.roll(thetacoord,-shift,axis=1)[:,:int(NLON//2)+1]
-        y = np.roll(rcoord,-shift,axis=1)[:,:int(NLON//2)+1]
-        z = np.roll(cratons[1:-1,1:-1],-shift,axis=1)[:,:int(NLON//2)]
-        if plot:
-            fig,ax=plt.subplots(subplot_kw={"projection":"polar"},figsize=(9,9))
-            ax.set_theta_zero_location('N')
-            ax.pcolormesh(x,np.sin(y),z,cmap='gist_ncar',vmin=-0.3,vmax=ncontinents+2)
-            ax.set_rticks([])
-            ax.set_thetagrids([])
-            plt.title("Continental Cratons")
-            plt.savefig(name+"_cratons.png",bbox_inches='tight')
-            plt.savefig(name+"_cratons.pdf",bbox_inches='tight')
-            plt.close('all')  
-    
-    dtopo = np.zeros_like(grid)
-    
-    if ntopo:
-        seeds = np.copy(seams)
-        gcratonsx,gcratonsy = np.gradient(cratons[1:-1,1:-1],lts,lns)
-        seams[:] = np.sqrt(gcratonsx**2+gcratonsy**2)
-        seams[np.isnan(seams)]=0.0
-        
-        g0 = 9.80665
-        if np.nanmax(seams)>0.0:
-            geopotential = g0*(seams/np.nanmax(seams))*maxz*1000.0
-        else:
-            geopotential = g0*(grid*0.1+seeds*3.0)*maxz*1000.0
-            seams[:] = seeds[:]
-        geopotential[grid==0.0] = np.nan
-        
-        if not orthographic and plot:
-            tm = plt.pcolormesh(hlons,hlats,grid+seams*3.0,cmap='plasma')
-            plt.title("Craton Seams")
-            plt.xlabel("Degrees Longitude")
-            plt.ylabel("Degrees Latitude")
-            plt.ylim(np.amin(lts),np.amax(lts))
-            plt.xlim(np.amin(lns),np.amax(lns))
-            plt.savefig(name+"_seams.png",bbox_inches='tight')
-            plt.savefig(name+"_seams.pdf",bbox_inches='tight')
-            plt.close('all')
-        else:
-            iln0 = np.argmin(abs(lns-minlon))
-            iln1 = np.argmin(abs(lns-maxlon))
-            shift = iln0
-            if wraplon:
-                shift = iln1
-            x = np.roll(thetacoord,-shift,axis=1)[:,:int(NLON//2)+1]
-            y = np.roll(rcoord,-shift,axis=1)[:,:int(NLON//2)+1]
-            z = np.roll(grid+seams*3.0,-shift,axis=1)[:,:int(NLON//2)]
-            if plot:
-                fig,ax=plt.subplots(subplot_kw={"projection":"polar"},figsize=(9,9))
-                ax.set_theta_zero_location('N')
-                t=ax.pcolormesh(x,np.sin(y),z,cmap='plasma',vmin=-0.3,vmax=2.5)
-                ax.set_rticks([])
-                ax.set_thetagrids([])
-                plt.colorbar(t)
-                plt.title("Craton Seams")
-                plt.savefig(name+"_seams.png",bbox_inches='tight')
-                plt.savefig(name+"_seams.pdf",bbox_inches='tight')
-                plt.close('all')  
-    
-        hlnsz = np.linspace(hlns[0],hlns[-1],num=max(400,NLON*2))
-        hltsz = np.linspace(hlts[0],hlts[-1],num=max(200,NLAT*2))
-        lnsz = 0.5*(hlnsz[:-1]+hlnsz[1:])
-        ltsz = 0.5*(hltsz[:-1]+hltsz[1:])
-    #lnsz = np.linspace(lns[0],lns[-1],num=128)
-    #ltsz = np.linspace(lts[0],lts[-1],num=64)
-        geo = np.copy(geopotential)
-        geo[np.isnan(geopotential)] = 0.0
-        
-        kx=3
-        ky=3
-        if NLAT>128:
-            kx=1
-            ky=1
-        
-        print(lns.min(),lns.max(),lts.min(),lts.max())
-        print(lnsz[0],lnsz[-1],ltsz[-1],ltsz[0])
-        geozspline = interpolate.RectBivariateSpline(lns,lts[::-1],np.transpose(geo[::-1,:]),bbox=[lnsz[0],lnsz[-1],ltsz[-1],ltsz[0]],kx=kx,ky=ky)
-        geoz = np.transpose(geozspline(lnsz,ltsz[::-1]))
-        geoz = geoz[::-1,:]
-        contzspline = interpolate.RectBivariateSpline(lns,lts[::-1],np.transpose(grid[::-1,:]),bbox=[lnsz[0],lnsz[-1],ltsz[-1],ltsz[0]],kx=kx,ky=ky)
-        contz = np.transpose(contzspline(lnsz,ltsz[::-1]))
-        contz = contz[::-1,:]
-        
-        topo = np.copy(geoz)+contz*g0*10.0 #Default lowlands of 10 meters above sea level
-    
-        maxiters = 10*int(np.sqrt(int(NLAT//32)))
-    
-        NLATZ = len(ltsz)
-        NLONZ = len(lnsz)
-    
-        dl1 = int(NLONZ//2)+2
-        dl2 = int(NLONZ//2)
-        dl3 = int(NLONZ//2)-2
-    
-        for i in range(0,maxiters):
-            topo = np.maximum(topo,geoz)
-            topo[np.isnan(geoz)]=0.0
-            nutop = np.zeros(contz.shape)
-            for jlat in range(0,NLATZ):
-                j1 = jlat-1
-                j2 = jlat+1
-                flip1=False
-                flip2=False
-                if j1<0:
-                    j1=0
-                    flip1=True
-                if j2==NLATZ:
-                    j2=NLATZ-1
-                    flip2=True
-                for jlon in range(0,NLONZ):
-                    l1 = jlon-1
-                    l2 = jlon+1
-                    if l1<0:
-                        l1=NLONZ-1
-                    if l2==NLONZ:
-                        l2=0
-                    try:
-                        c1 = topo[j1,(l1  +flip1*dl1)%NLONZ]
-                        c2 = topo[j1,(jlon+flip1*dl2)%NLONZ]
-                        c3 = topo[j1,(l2  +flip1*dl3)%NLONZ]
-                        c4 = topo[jlat,l1]
-                        c5 = topo[jlat,l2]
-                        c6 = topo[j2,(l1  +flip2*dl1)%NLONZ]
-                        c7 = topo[j2,(jlon+flip2*dl2)%NLONZ]
-                        c8 = topo[j2,(l2  +flip2*dl3)%NLONZ]
-                    except BaseException as err:
-                        print(j1,l1,flip1,dl1,NLONZ)
-                        print((l1+flip1*dl1)%NLONZ)
-                        print(l1+flip1*dl1)
-                        print(err)
-                        raise err
-                    nutop[jlat,jlon] = 0.2*topo[jlat,jlon]+np.nanmean([c1,c2,c3,c4,c5,c6,c7,c8])*0.8
-            topo[:] = nutop[:]
-        topospline = interpolate.interp2d(lnsz,ltsz[::-1],(topo[::-1,:]),kind='linear')
-        dtopo = (topospline(lns,lts[::-1]))
-        dtopo = dtopo[::-1,:]
-        dtopo[np.isnan(geopotential)] = 0.0
-        
-        writeSRA(name,129,dtopo,NLAT,NLON)
-        
-        if not orthographic and plot:
-            plt.close('all')
-            t=plt.pcolormesh(hlons,hlats,dtopo,cmap='gist_earth',norm=colors.LogNorm(vmin=10.0))
-            plt.xlabel('Degrees Longitude')
-            plt.ylabel('Degrees Latitude')
-            plt.ylim(np.amin(lts),np.amax(lts))
-            plt.xlim(np.amin(lns),np.amax(lns))
-            plt.title("Topography")
-            plt.colorbar(t,label="Geopotential [m$^2$/s$^2$]")
-            plt.savefig(name+"_geoz.png",bbox_inches='tight')
-            plt.savefig(name+"_geoz.pdf",bbox_inches='tight')
-        else:
-            iln0 = np.argmin(abs(lns-minlon))
-            iln1 = np.argmin(abs(lns-maxlon))
-            shift = iln0
-            if wraplon:
-                shift = iln1
-            x = np.roll(thetacoord,-shift,axis=1)[:,:int(NLON//2)+1]
-            y = np.roll(rcoord,-shift,axis=1)[:,:int(NLON//2)+1]
-            z = np.roll(dtopo,-shift,axis=1)[:,:int(NLON//2)]
-            if plot:
-                fig,ax=plt.subplots(subplot_kw={"projection":"polar"},figsize=(9,9))
-                ax.set_theta_zero_location('N')
-                t=ax.pcolormesh(x,np.sin(y),z,cmap='gist_earth',norm=colors.LogNorm(vmin=10.0))
-                ax.set_rticks([])
-                ax.set_thetagrids([])
-                plt.title("Topography")
-                plt.colorbar(t,label="Geopotential [m$^2$/s$^2$]")
-                plt.savefig(name+"_geoz.png",bbox_inches='tight')
-                plt.savefig(name+"_geoz.pdf",bbox_inches='tight')
-                plt.close('all')  
-        
-        hf = np.copy(dtopo)
-        hf[grid>0.5] += 1000.0
-        
-        writePGM(name,hf)
-        
-        if ntopo:
-            return lns,lts,grid,dtopo
-        else:
-            return lnt,lts,grid
-        
-        
+        _plotmap(name,"cratons","Continental Cratons",cratons,geo,orthographic,cmap='gist_ncar',
+                 vmin=-0.3,vmax=continents+2)
+
+    if not ntopo:
+        return lns,lts,grid
+
+    geopotential,seams = _uplift(grid,cratons,seams,lts,lns,maxz)
+
+    if plot:
+        _plotmap(name,"seams","Craton Seams",grid+seams*3.0,geo,orthographic,cmap='plasma')
+
+    lnsz,ltsz,geoz,contz = _refine(geopotential,grid,geo)
+    topo = np.copy(geoz)+contz*9.80665*10.0 #Default lowlands of 10 meters above sea level
+    topo = _smoothtopo(topo,geoz,10*int(np.sqrt(int(NLAT//32))))
+    dtopo = _coarsen(topo,lnsz,ltsz,geopotential,lns,lts)
+
+    writeSRA(name,129,dtopo,NLAT,NLON)
+
+    if plot:
+        _plotmap(name,"geoz","Topography",dtopo,geo,orthographic,cmap='gist_earth',
+                 norm=colors.LogNorm(vmin=10.0),cbarlabel="Geopotential [m$^2$/s$^2$]")
+
+    hf = np.copy(dtopo)
+    hf[grid>0.5] += 1000.0
+
+    writePGM(name,hf)
+
+    return lns,lts,grid,dtopo
+
+def generatemany(nworlds,name="Alderaan",continents=7,landfraction=0.29,maxz=10.0,nlats=32,
+                 hemispherelongitude=np.nan,ntopo=False,seed=None,batchfraction=0.05,write=True):
+    '''Randomly generate many worlds at once, sharing the grid setup and batching topography.
+
+    Each world gets its own independent random stream spawned from ``seed``, so world ``n``
+    is reproducible regardless of how many worlds are generated alongside it. Topography
+    smoothing, the most expensive step, is done for all worlds simultaneously.
+
+    Parameters
+    ----------
+    nworlds : int
+        Number of worlds to generate.
+    name : str, optional
+        Name stem for the planets. World ``n`` will be written as ``<name>_<n>``, with n
+        zero-padded to 3 digits.
+    continents : int, optional
+        Number of initial continental cratons per world.
+    landfraction : float, optional
+        Target land fraction (may deviate slightly).
+    maxz : float, optional
+        Maximum surface elevation under Earth gravity (non-Earth gravity will change the final elevation)
+    nlats : int, optional
+        Number of latitudes. If set to False, T21 Gaussian latitudes will be used (requires netCDF4).
+        Longitudes are 2*nlats.
+    hemispherelongitude : float, optional
+        If finite, confine land to a hemisphere centered on this longitude.
+    ntopo : bool, optional
+        If True, compute topography.
+    seed : int, optional
+        Seed from which the random streams of all the worlds are derived.
+    batchfraction : float, optional
+        Fraction of the current coastline that may be converted to land in a single growth step.
+    write : bool, optional
+        If True, write .sra (and, with topography, .pgm) files for every world.
+
+    Returns
+    -------
+    np.ndarray(2*nlat), np.ndarray(nlat), np.ndarray(nworlds,nlat,2*nlat)[, np.ndarray(nworlds,nlat,2*nlat)]
+        Longitude, Latitude, land-sea masks, and if requested, surface geopotentials (topography)
+    '''
+    geo = _geometry(nlats,hemispherelongitude)
+    lts = geo["lts"]
+    lns = geo["lns"]
+    NLAT = len(lts)
+    NLON = len(lns)
+    names = ["%s_%03d"%(name,n) for n in range(nworlds)]
+
+    grids = np.zeros((nworlds,NLAT,NLON))
+    cratons = np.zeros((nworlds,NLAT,NLON))
+    seams = np.zeros((nworlds,NLAT,NLON))
+    for n,stream in enumerate(np.random.SeedSequence(seed).spawn(nworlds)):
+        grids[n],cratons[n],seams[n] = _grow(np.random.default_rng(stream),geo["darea"],
+                                             geo["allowed"],continents,landfraction,
+                                             batchfraction=batchfraction)
+        if write:
+            writeSRA(names[n],172,grids[n],NLAT,NLON)
+
+    if not ntopo:
+        return lns,lts,grids
+
+    geopotentials = np.zeros((nworlds,NLAT,NLON))
+    topos = []
+    geozs = []
+    for n in range(nworlds):
+        geopotentials[n],seams[n] = _uplift(grids[n],cratons[n],seams[n],lts,lns,maxz)
+        lnsz,ltsz,geoz,contz = _refine(geopotentials[n],grids[n],geo)
+        topos.append(np.copy(geoz)+contz*9.80665*10.0)
+        geozs.append(geoz)
+    topos = _smoothtopo(np.array(topos),np.array(geozs),10*int(np.sqrt(int(NLAT//32))))
+
+    dtopos = np.zeros((nworlds,NLAT,NLON))
+    for n in range(nworlds):
+        dtopos[n] = _coarsen(topos[n],lnsz,ltsz,geopotentials[n],lns,lts)
+        if write:
+            writeSRA(names[n],129,dtopos[n],NLAT,NLON)
+            hf = np.copy(dtopos[n])
+            hf[grids[n]>0.5] += 1000.0
+            writePGM(names[n],hf)
+
+    return lns,lts,grids,dtopos
+
+
 def main():
     """Command-line tool to randomly generate continents up to specified land fraction. Topography optional.
     
@@ -542,6 +495,8 @@ def main():
             Display plots of the generated continents
         -o,--orthographic   
             Plot orthographic projections centered on hemispherelongitude 
+        -s,--seed
+            Seed for the random number generator, for reproducible worlds
 
     Yields
     ------
@@ -564,12 +519,14 @@ def main():
     parser.add_argument("-l","--hemispherelongitude",type=float,default=np.nan,help="Confine land to a hemisphere centered on a given longitude")
     parser.add_argument("-o","--orthographic",action="store_true",help="Plot orthographic projections centered on hemispherelongitude")
     parser.add_argument("-p","--plot",action="store_true",help="Display plots of the generated continents")
+    parser.add_argument("-s","--seed",type=int,help="Seed for the random number generator")
     args = parser.parse_args()
     
     output = generate(name=args.name,continents=args.continents,
                                 landfraction=args.landfraction,maxz=args.maxz,
                                 nlats=args.nlats,hemispherelongitude=args.hemispherelongitude,
-                                topo=args.topo,orthographic=args.orthographic, plot=args.plot)
+                                ntopo=args.topo,orthographic=args.orthographic, plot=args.plot,
+                                seed=args.seed)
     
         
 if __name__=="__main__" and (Path(sys.argv[0]).name!="sphinx-build" and 
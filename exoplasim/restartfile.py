@@ -0,0 +1,286 @@
+"""
+Read, patch, and write PlaSim restart files (``plasim_status``, ``plasim_restart``, and
+``MOST_REST.XXXXX``) without running the model.
+
+A restart file is a sequence of Fortran unformatted records in pairs: a 16-character variable
+name, then that variable's data. The data are integer scalars (step counters and dimensions),
+an integer array (the random number seed), a real scalar, or real arrays written as
+``pa(1:k1,1:klev)``, where k1 is NRSP for spectral fields and NLAT*NLON for gridpoint fields.
+:py:class:`RestartFile` memory-maps the file and exposes each variable as a NumPy view with the
+shape (klev, k1), so variables are only read when they are used. If the file is opened for
+writing, assigning to a view patches the file in place.
+
+Gridpoint fields keep PlaSim's internal horizontal ordering, which is not a plain
+(NLAT, NLON) grid, so they should be treated as flat arrays of NLAT*NLON points per level.
+
+Example
+-------
+
+>>> import numpy as np
+>>> from exoplasim.restartfile import RestartFile
+>>> with RestartFile("spinup/MOST_REST.00100") as base:
+...     for n in range(1000):
+...         with base.clone("members/plasim_restart.%04d"%n) as member:
+...             member["st"] += np.random.normal(scale=1.0e-4,size=member["st"].shape)
+
+Here, 1000 copies of a spun-up state are written, each with a small perturbation to the
+spectral temperature field, without running PlaSim or copying the file through the shell.
+"""
+import os
+import gzip
+import shutil
+import numpy as np
+import exoplasim.pyburn as pyburn
+
+#Records written with put_restart_integer or put_restart_seed; everything else is real.
+INTEGERS = ("nstep","naccuout","naccu","nlat","nlon","nlev","nrsp","naccuice","naccuo",
+            "nicec2d","nlsoil","nlev_oce","naccuoce","naccua","seed")
+
+NAMELENGTH = 16
+
+def _layout(fbuffer):
+    '''Work out the byte order and record marker length of a restart file.'''
+    en = pyburn._getEndian(fbuffer)
+    ml = pyburn._getmarkerlength(fbuffer,en)
+    mtype = np.dtype(en+"i%d"%ml)
+    if int(np.frombuffer(fbuffer,dtype=mtype,count=1,offset=ml+NAMELENGTH)[0])!=NAMELENGTH:
+        #8-byte markers written little-endian start with a nonzero word, so pyburn's check takes
+        #them for 4-byte markers. The name record's closing marker settles it.
+        ml = 8
+        mtype = np.dtype(en+"i8")
+        if int(np.frombuffer(fbuffer,dtype=mtype,count=1,offset=ml+NAMELENGTH)[0])!=NAMELENGTH:
+            raise ValueError("Not a PlaSim restart file: the first record is not a variable name")
+    return en,ml
+
+class RestartFile:
+    '''A memory-mapped PlaSim restart file.
+
+    Variables are accessed by name, e.g. ``restart["st"]`` or ``restart["nstep"]``. Arrays are
+    views into the file; scalars are returned as Python numbers.
+
+    Parameters
+    ----------
+    filename : str
+        Restart file to open. Gzipped checkpoints (``MOST_REST.XXXXX.gz``, see
+        :py:mod:`exoplasim.checkpoints`) are decompressed into memory, and can only be saved to
+        a new file.
+    mode : str, optional
+        "r" to read, "r+" to patch the file in place, or "c" to make changes in memory only
+        (copy-on-write), e.g. before :py:meth:`save`.
+    precision : int, optional
+        Bytes per real (4 or 8). Detected from the file if not given.
+    '''
+    def __init__(self,filename,mode="r",precision=None):
+        if mode not in ("r","r+","c"):
+            raise ValueError("mode must be 'r', 'r+', or 'c'; got %s"%str(mode))
+        self.filename = filename
+        self.mode = mode
+        if filename[-3:]==".gz":
+            if mode=="r+":
+                raise ValueError("Gzipped restart files can't be patched in place; use mode='c' and save()")
+            with gzip.open(filename,"rb") as zipped:
+                self.buffer = np.frombuffer(bytearray(zipped.read()),dtype=np.uint8)
+            if mode=="r":
+                self.buffer.flags.writeable = False
+        else:
+            self.buffer = np.memmap(filename,dtype=np.uint8,mode=mode)
+        if len(self.buffer)==0:
+            raise ValueError("%s is empty"%filename)
+        self.byteorder,self.markerlength = _layout(self.buffer)
+        self._index()
+        self.intsize = 4
+        for name in ("nstep","nrsp","nlev"):
+            if name in self.records:
+                self.intsize = self.records[name][1]
+                break
+        if precision is None:
+            precision = 8
+            if "sp" in self.records and "nrsp" in self.records:
+                precision = self.records["sp"][1]//int(self["nrsp"])
+            elif "fixedlon" in self.records:
+                precision = self.records["fixedlon"][1]
+        if precision not in (4,8):
+            raise ValueError("Precision must be 4 or 8 bytes; got %s"%str(precision))
+        self.precision = precision
+
+    def _index(self):
+        '''Find the offset and length of every record.'''
+        mtype = np.dtype(self.byteorder+"i%d"%self.markerlength)
+        ml = self.markerlength
+        self.records = {}
+        n = 0
+        while n<len(self.buffer):
+            length = int(np.frombuffer(self.buffer,dtype=mtype,count=1,offset=n)[0])
+            name = bytes(self.buffer[n+ml:n+ml+length]).decode("ascii",errors="replace").strip()
+            n += 2*ml+length
+            if n>=len(self.buffer):
+                raise ValueError("%s ends after the name of variable %s"%(self.filename,name))
+            length = int(np.frombuffer(self.buffer,dtype=mtype,count=1,offset=n)[0])
+            if n+2*ml+length>len(self.buffer):
+                raise ValueError("%s is truncated in variable %s"%(self.filename,name))
+            self.records[name] = (n+ml,length)
+            n += 2*ml+length
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+    def __contains__(self,name):
+        return name in self.records
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def keys(self):
+        '''Return the names of the variables in the file, in file order.'''
+        return list(self.records.keys())
+
+    def _dtype(self,name):
+        if name in INTEGERS:
+            return np.dtype(self.byteorder+"i%d"%self.intsize)
+        return np.dtype(self.byteorder+"f%d"%self.precision)
+
+    def shape(self,name):
+        '''Return the shape of a variable as it is presented: () for scalars, (n,) for the seed,
+        and (levels, points) for arrays, where points is NRSP or NLAT*NLON if it can be
+        identified from the file's dimensions.'''
+        offset,length = self.records[name]
+        size = length//self._dtype(name).itemsize
+        if size==1:
+            return ()
+        if name in INTEGERS:
+            return (size,)
+        for dims in (("nrsp",),("nlat","nlon")):
+            if all([dim in self.records for dim in dims]):
+                points = int(np.prod([int(self[dim]) for dim in dims]))
+                if size%points==0:
+                    return (size//points,points)
+        return (size,)
+
+    def __getitem__(self,name):
+        if name not in self.records:
+            raise KeyError("No variable %s in %s"%(name,self.filename))
+        offset,length = self.records[name]
+        dtype = self._dtype(name)
+        if length%dtype.itemsize!=0:
+            raise ValueError("Variable %s has %d bytes, which is not a whole number of %d-byte words"%(
+                              name,length,dtype.itemsize))
+        data = np.ndarray((length//dtype.itemsize,),dtype=dtype,buffer=self.buffer,offset=offset)
+        if length==dtype.itemsize:
+            return data[0].item()
+        return data.reshape(self.shape(name))
+
+    def __setitem__(self,name,value):
+        if self.mode=="r":
+            raise IOError("%s was opened read-only; use mode='r+' or 'c' to change it"%self.filename)
+        if name not in self.records:
+            raise KeyError("No variable %s in %s; variables can't be added in place"%(name,
+                                                                                       self.filename))
+        offset,length = self.records[name]
+        dtype = self._dtype(name)
+        data = np.ndarray((length//dtype.itemsize,),dtype=dtype,buffer=self.buffer,offset=offset)
+        value = np.asarray(value)
+        if value.size!=data.size and value.size!=1:
+            raise ValueError("Variable %s has %d values; got %d"%(name,data.size,value.size))
+        data[:] = value.ravel()
+
+    def flush(self):
+        '''Write any changes made in "r+" mode to disk.'''
+        if isinstance(self.buffer,np.memmap) and self.mode=="r+":
+            self.buffer.flush()
+
+    def close(self):
+        '''Flush changes and release the file.'''
+        self.flush()
+        self.buffer = None
+
+    def todict(self):
+        '''Read every variable into memory.
+
+        Returns
+        -------
+        dict
+            Copies of each variable, in file order
+        '''
+        variables = {}
+        for name in self.records:
+            value = self[name]
+            variables[name] = np.array(value) if isinstance(value,np.ndarray) else value
+        return variables
+
+    def save(self,filename):
+        '''Write the file, including any changes, to a new file.
+
+        Parameters
+        ----------
+        filename : str
+            File to write
+        '''
+        self.flush()
+        with open(filename+".tmp","wb") as f:
+            self.buffer.tofile(f)
+        os.replace(filename+".tmp",filename)
+
+    def clone(self,filename):
+        '''Copy the file and open the copy for patching in place.
+
+        Parameters
+        ----------
+        filename : str
+            File to write
+
+        Returns
+        -------
+        RestartFile
+            The copy, opened with mode "r+"
+        '''
+        if isinstance(self.buffer,np.memmap) and self.mode!="c":
+            self.flush()
+            shutil.copyfile(self.filename,filename)
+        else:
+            self.save(filename)
+        return RestartFile(filename,mode="r+",precision=self.precision)
+
+def write(filename,variables,precision=8,byteorder="=",markerlength=4,intsize=4):
+    '''Write a restart file from scratch.
+
+    Parameters
+    ----------
+    filename : str
+        File to write
+    variables : dict
+        Variables to write, in order, as e.g. returned by :py:meth:`RestartFile.todict`. Names
+        in :py:data:`INTEGERS` are written as integers, and everything else as reals. Arrays are
+        written in the (levels, points) layout :py:class:`RestartFile` presents.
+    precision : int, optional
+        Bytes per real (4 or 8). Must match the precision PlaSim was compiled with.
+    byteorder : str, optional
+        "<" for little-endian, ">" for big-endian, or "=" for the native byte order.
+    markerlength : int, optional
+        Bytes per record marker (4, as gfortran writes by default, or 8)
+    intsize : int, optional
+        Bytes per integer
+    '''
+    if precision not in (4,8):
+        raise ValueError("Precision must be 4 or 8 bytes; got %s"%str(precision))
+    mtype = np.dtype(byteorder+"i%d"%markerlength)
+    itype = np.dtype(byteorder+"i%d"%intsize)
+    rtype = np.dtype(byteorder+"f%d"%precision)
+    with open(filename+".tmp","wb") as f:
+        for name,value in variables.items():
+            if len(name)>NAMELENGTH:
+                raise ValueError("Variable names are at most %d characters; got %s"%(NAMELENGTH,name))
+            label = name.ljust(NAMELENGTH).encode("ascii")
+            if name in INTEGERS:
+                data = np.asarray(value).astype(itype).tobytes()
+            else:
+                data = np.asarray(value).astype(rtype).tobytes()
+            for record in (label,data):
+                marker = np.array([len(record)],dtype=mtype).tobytes()
+                f.write(marker+record+marker)
+    os.replace(filename+".tmp",filename)
@@ -0,0 +1,467 @@
+"""
+Record how long each model year takes, and use that to plan runs against a time limit.
+
+As each year finishes, :py:class:`Telemetry` appends a record of the walltime spent running
+the model, moving files around, postprocessing, and analysing the output to a JSON-lines file
+in the model's work directory (``telemetry.log``). Each record is tagged with the session
+(the run, e.g. one batch job) that wrote it. :py:class:`Scheduler` uses the recent records from
+the current session to forecast how much longer the next years will take, and decides how many
+more years can be run before a time limit while leaving enough time to stop cleanly.
+
+For a finer breakdown, the model, the postprocessor, and pRT are instrumented with named spans
+(see :py:func:`span`). When enabled, either with :py:func:`enable`,
+:py:func:`Model.profile() <exoplasim.Model.profile>`, or by setting the ``EXOPLASIM_TIMING``
+environment variable to the path of a log file, each model year (or other outermost span) is
+written as one JSON line with its walltime, the time spent in each stage inside it (e.g.
+"plasim", "pyburn.read", "pyburn.transform", "pyburn.derive", "pyburn.average",
+"pyburn.write"), and optionally its peak memory and a cProfile dump. Setting
+``EXOPLASIM_PROFILE=cprofile,tracemalloc`` turns on the optional captures.
+"""
+import os
+import json
+import time
+import socket
+import cProfile
+import functools
+import threading
+import tracemalloc
+import numpy as np
+try:
+    import resource
+except ImportError: #Not available on Windows
+    resource = None
+
+PHASES = ["model","io","postprocess","analysis"]
+
+class Telemetry(object):
+    """Per-year walltime records for a model run.
+
+    Parameters
+    ----------
+    workdir : str, optional
+        Directory in which to keep the log. If not given, records are only kept in memory.
+    filename : str, optional
+        Name of the log file within workdir.
+    session : str, optional
+        Identifier for this run, written into every new record. Defaults to host:pid:start
+        time, so that records from earlier jobs in the same work directory (which are still
+        loaded from the log) can be told apart from this one's.
+
+    Attributes
+    ----------
+    records : list(dict)
+        One dictionary per recorded year, with the year, the session, a Unix timestamp, the
+        time in seconds spent in each phase ("model", "io", "postprocess", "analysis"), and the
+        total. Records written before sessions were recorded have no session.
+    session : str
+        Identifier for this run
+    """
+    def __init__(self,workdir=None,filename="telemetry.log",session=None):
+        if session is None:
+            session = "%s:%d:%d"%(socket.gethostname(),os.getpid(),int(time.time()))
+        self.session = session
+        self.records = []
+        self.logfile = None
+        if workdir is not None:
+            self.logfile = os.path.join(workdir,filename)
+            if os.path.exists(self.logfile):
+                with open(self.logfile,"r") as logf:
+                    for line in logf:
+                        try:
+                            self.records.append(json.loads(line))
+                        except ValueError: #Partially-written line from a killed job
+                            pass
+
+    def __len__(self):
+        return len(self.records)
+
+    def record(self,year,**phases):
+        """Record the time taken by a year that has just finished.
+
+        Parameters
+        ----------
+        year : int
+            The model year
+        **phases : float
+            Seconds spent in each phase, e.g. ``model=120.3,postprocess=14.2``.
+
+        Returns
+        -------
+        dict
+            The new record
+        """
+        entry = {"year":int(year),"session":getattr(self,"session",None),"timestamp":time.time()}
+        for phase in PHASES:
+            entry[phase] = float(phases.pop(phase,0.0))
+        for phase in phases:
+            entry[phase] = float(phases[phase])
+        entry["total"] = sum([entry[phase] for phase in entry if phase not in
+                              ("year","session","timestamp")])
+        self.records.append(entry)
+        if self.logfile is not None:
+            with open(self.logfile,"a") as logf:
+                logf.write(json.dumps(entry)+"\n")
+        return entry
+
+    def get(self,phase="total",recent=None,since=None,session=None):
+        """Return the recorded times for a phase.
+
+        Parameters
+        ----------
+        phase : str, optional
+            "total", or one of "model", "io", "postprocess", "analysis".
+        recent : int, optional
+            If given, only return the most recent N records.
+        since : float, optional
+            If given, only return records made after this Unix time.
+        session : str, optional
+            If given, only return records from this session (e.g. ``self.session``).
+
+        Returns
+        -------
+        numpy.ndarray
+            Seconds spent in that phase, per year
+        """
+        records = self.records
+        if session is not None:
+            records = [entry for entry in records if entry.get("session")==session]
+        if since is not None:
+            records = [entry for entry in records if entry["timestamp"]>=since]
+        if recent is not None:
+            records = records[-recent:]
+        return np.array([entry.get(phase,0.0) for entry in records])
+
+    def summary(self,recent=None):
+        """Return the mean seconds per year spent in each phase.
+
+        Parameters
+        ----------
+        recent : int, optional
+            If given, only use the most recent N records.
+
+        Returns
+        -------
+        dict
+        """
+        summary = {}
+        for phase in PHASES+["total"]:
+            times = self.get(phase,recent=recent)
+            summary[phase] = np.mean(times) if len(times)>0 else np.nan
+        return summary
+
+class Scheduler(object):
+    """Decide how many more model years fit within a walltime limit.
+
+    The time per year is forecast from the most recent years recorded in the current session of
+    a :py:class:`Telemetry` store, as their mean plus some number of standard deviations, so that
+    occasional slow years (e.g. from filesystem hiccups) do not push the job past its limit.
+    Years from earlier jobs are left out, since they may have run on different hardware. A
+    reserve is held back at the end so that the last year can be wrapped up and the model
+    checkpointed before the limit is reached.
+
+    Parameters
+    ----------
+    telemetry : Telemetry
+        Walltime records to forecast from
+    timelimit : float
+        Time limit in minutes, counted from when the Scheduler is created (or from ``start``).
+    margin : float, optional
+        Fraction of the time limit to hold in reserve.
+    minmargin : float, optional
+        Minimum reserve in seconds.
+    window : int, optional
+        Number of recent years from the current session to forecast from.
+    nsigma : float, optional
+        Number of standard deviations of the recent per-year times to add to their mean.
+    start : float, optional
+        Unix time at which the time limit started. Defaults to now.
+    """
+    def __init__(self,telemetry,timelimit,margin=0.05,minmargin=60.0,window=10,nsigma=1.0,
+                 start=None):
+        if start is None:
+            start = time.time()
+        self.telemetry = telemetry
+        self.timelimit = timelimit
+        self.start = start
+        self.deadline = start+timelimit*60.0
+        self.reserve = max(minmargin,margin*timelimit*60.0)
+        self.window = window
+        self.nsigma = nsigma
+
+    def elapsed(self):
+        """Seconds since the start of the time limit."""
+        return time.time()-self.start
+
+    def remaining(self):
+        """Seconds left before the time limit, less the reserve."""
+        return self.deadline-time.time()-self.reserve
+
+    def peryear(self):
+        """Forecast seconds needed for the next year, or None if nothing has been recorded."""
+        times = self.telemetry.get("total",recent=self.window,
+                                   session=getattr(self.telemetry,"session",None))
+        if len(times)==0:
+            return None
+        if len(times)==1:
+            return times[0]
+        return np.mean(times)+self.nsigma*np.std(times)
+
+    def yearsleft(self):
+        """Forecast number of whole years that can still be completed, or None if unknown."""
+        tau = self.peryear()
+        if tau is None:
+            return None
+        return max(0,int(self.remaining()//max(tau,1.0e-3)))
+
+    def canrun(self,years=1):
+        """Whether there is (forecast to be) time to run another ``years`` years."""
+        left = self.yearsleft()
+        if left is None: #Nothing to go on yet; only refuse if we are already out of time
+            return self.remaining()>0
+        return left>=years
+
+    def forecast(self,years):
+        """Forecast the seconds needed to run a number of years.
+
+        Parameters
+        ----------
+        years : int
+            Number of years
+
+        Returns
+        -------
+        float
+            Forecast seconds, or NaN if nothing has been recorded.
+        """
+        tau = self.peryear()
+        if tau is None:
+            return np.nan
+        return tau*years
+
+#Hot-path instrumentation. Spans time a named section of code; nested spans are folded into
+#the outermost span that encloses them, which is written as one JSON line to the timing log
+#with the (exclusive) seconds spent in each nested stage. Everything here is a no-op unless
+#enable() has been called, or the EXOPLASIM_TIMING environment variable names a log file.
+
+_profiling = {"logfile":None,"cprofile":False,"memory":False,"context":{}}
+_spans = threading.local()
+
+def enable(logfile,cprofile=False,memory=False):
+    """Start writing timing records for instrumented code to a JSON-lines log.
+
+    Parameters
+    ----------
+    logfile : str
+        File to which records are appended
+    cprofile : bool, optional
+        If True, profile each outermost span with :py:mod:`cProfile`, and save the statistics
+        next to the log, in ``profiles/<span>.<year>.prof`` (or numbered, if there is no year).
+    memory : bool, optional
+        If True, trace allocations with :py:mod:`tracemalloc` and record the peak memory
+        allocated during each outermost span. This slows things down noticeably.
+    """
+    _profiling["logfile"] = os.path.abspath(logfile)
+    _profiling["cprofile"] = cprofile
+    _profiling["memory"] = memory
+    reset()
+
+def disable():
+    """Stop writing timing records."""
+    _profiling["logfile"] = None
+    reset()
+
+def enabled():
+    """Whether timing records are being written."""
+    return _profiling["logfile"] is not None
+
+def setcontext(**context):
+    """Set fields (such as ``model`` and ``year``) to be included in every record.
+
+    Fields set to None are removed.
+    """
+    for key in context:
+        if context[key] is None:
+            _profiling["context"].pop(key,None)
+        else:
+            _profiling["context"][key] = context[key]
+
+def reset():
+    """Discard any spans left open (e.g. by an exception) in this thread."""
+    _spans.stack = []
+
+def _stack():
+    if not hasattr(_spans,"stack"):
+        _spans.stack = []
+    return _spans.stack
+
+class _Span(object):
+    """A timed section of code. Use through :py:func:`span`, :py:func:`start`, or :py:func:`timed`."""
+    def __init__(self,name,fields):
+        self.name = name
+        self.fields = fields
+        self.children = 0.0
+        self.stages = {}
+        self.profiler = None
+        self.tracing = False
+
+    def __enter__(self):
+        stack = _stack()
+        self.root = len(stack)==0
+        stack.append(self)
+        if self.root:
+            self.timestamp = time.time()
+            if _profiling["memory"]:
+                self.tracing = not tracemalloc.is_tracing()
+                if self.tracing:
+                    tracemalloc.start()
+                tracemalloc.reset_peak()
+            if _profiling["cprofile"]:
+                self.profiler = cProfile.Profile()
+                try:
+                    self.profiler.enable()
+                except ValueError: #Another profiler is already running
+                    self.profiler = None
+        self.tstart = time.perf_counter()
+        return self
+
+    def __exit__(self,*exc):
+        seconds = time.perf_counter()-self.tstart
+        stack = _stack()
+        if self not in stack: #Already closed along with an enclosing span
+            return False
+        while stack[-1] is not self: #Inner spans abandoned by an exception
+            stack[-1].__exit__(None,None,None)
+        stack.pop()
+        if not self.root:
+            if len(stack)>0:
+                stack[-1].children += seconds
+                root = stack[0]
+                stage = root.stages.setdefault(self.name,{"seconds":0.0,"calls":0})
+                stage["seconds"] += seconds-self.children
+                stage["calls"] += 1
+            return False
+        record = {"span":self.name,"timestamp":self.timestamp,"seconds":seconds,
+                  "self":seconds-self.children}
+        record.update(_profiling["context"])
+        record.update(self.fields)
+        record["stages"] = self.stages
+        if _profiling["memory"]:
+            record["peakmemory"] = tracemalloc.get_traced_memory()[1]/1.0e6
+            if self.tracing:
+                tracemalloc.stop()
+        if resource is not None:
+            record["maxrss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1.0e3
+        if self.profiler is not None:
+            self.profiler.disable()
+            record["profile"] = self._dumpprofile(record)
+        logfile = _profiling["logfile"]
+        if logfile is not None:
+            with open(logfile,"a") as logf:
+                logf.write(json.dumps(record,default=float)+"\n")
+        return False
+
+    def _dumpprofile(self,record):
+        profdir = os.path.join(os.path.dirname(_profiling["logfile"]),"profiles")
+        os.makedirs(profdir,exist_ok=True)
+        if "year" in record:
+            stem = os.path.join(profdir,"%s.%05d"%(self.name,int(record["year"])))
+        else:
+            stem = os.path.join(profdir,self.name)
+        filename = stem+".prof"
+        n = 1
+        while os.path.exists(filename):
+            filename = "%s.%d.prof"%(stem,n)
+            n += 1
+        self.profiler.dump_stats(filename)
+        return filename
+
+class _NullSpan(object):
+    def __enter__(self):
+        return self
+    def __exit__(self,*exc):
+        return False
+
+_nullspan = _NullSpan()
+
+def span(name,**fields):
+    """Time a section of code, if timing is enabled.
+
+    Parameters
+    ----------
+    name : str
+        Name of the span, e.g. "pyburn.write"
+    **fields : optional
+        Extra fields for the record (only used if this is the outermost span).
+
+    Returns
+    -------
+    context manager
+
+    Examples
+    --------
+
+    >>> with telemetry.span("pyburn.write",format="npz"):
+    ...     npsavez(data,filename=outfile)
+    """
+    if _profiling["logfile"] is None:
+        return _nullspan
+    return _Span(name,fields)
+
+def start(name,**fields):
+    """Open a span without a ``with`` block. Close it with :py:func:`stop`.
+
+    Returns
+    -------
+    object
+        The open span (None if timing is disabled)
+    """
+    if _profiling["logfile"] is None:
+        return None
+    return _Span(name,fields).__enter__()
+
+def stop(openspan):
+    """Close a span opened with :py:func:`start`, along with any spans left open inside it."""
+    if openspan is not None:
+        openspan.__exit__(None,None,None)
+
+def timed(name):
+    """Decorator that wraps every call to a function in a :py:func:`span`."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args,**kwargs):
+            if _profiling["logfile"] is None:
+                return function(*args,**kwargs)
+            with _Span(name,{}):
+                return function(*args,**kwargs)
+        return wrapper
+    return decorator
+
+def readlog(logfile,span=None):
+    """Read the records from a timing log.
+
+    Parameters
+    ----------
+    logfile : str
+        JSON-lines log written while timing was enabled
+    span : str, optional
+        Only return records for this span
+
+    Returns
+    -------
+    list(dict)
+    """
+    records = []
+    with open(logfile,"r") as logf:
+        for line in logf:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if span is None or record["span"]==span:
+                records.append(record)
+    return records
+
+if os.environ.get("EXOPLASIM_TIMING"):
+    _options = os.environ.get("EXOPLASIM_PROFILE","").lower().split(",")
+    enable(os.environ["EXOPLASIM_TIMING"],cprofile="cprofile" in _options,
+           memory="tracemalloc" in _options)